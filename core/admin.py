@@ -1,9 +1,36 @@
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 from django.db import models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.forms import Textarea
+from django.urls import reverse
 from django.utils import timezone
-from .models import Proprietario, Imovel, Cliente, PrecoPorFinalidade, FotoImovel, InfraCondominio
+from . import compatibilidade, contadores, tarefas
+from .models import (
+    Proprietario, Imovel, Cliente, CompatibilidadeCliente, PrecoPorFinalidade, FotoImovel, InfraCondominio,
+    TarefaLote, HistoricoPreco, EstatisticaPreco, AcessoImovelDiario,
+)
+
+
+def _contagem(consulta, campo):
+    """COUNT correlacionado de ``consulta`` por ``campo`` = pk da linha externa, sem JOIN na listagem"""
+    totais = consulta.filter(**{campo: OuterRef('pk')}).order_by().values(campo).annotate(
+        total=Count('pk')
+    ).values('total')
+    return Coalesce(Subquery(totais, output_field=IntegerField()), Value(0))
+
+
+def _enfileirar(modeladmin, request, queryset, operacao, descricao, **parametros):
+    """Grava a ação como tarefa em lote e avisa onde acompanhar o progresso"""
+    ids = list(queryset.values_list('pk', flat=True))
+    tarefa = tarefas.enfileirar(
+        operacao, ids, f'{descricao} ({len(ids)})', solicitante=request.user.get_username(), **parametros
+    )
+    modeladmin.message_user(request, format_html(
+        '{} registro(s) enviados para processamento. Acompanhe em <a href="{}">{}</a>.',
+        len(ids), reverse('admin:core_tarefalote_change', args=[tarefa.pk]), tarefa
+    ))
 
 
 @admin.register(Proprietario)
@@ -23,8 +50,12 @@ class ProprietarioAdmin(admin.ModelAdmin):
         }),
     )
     
+    def get_queryset(self, request):
+        # Os totais das colunas vêm na mesma consulta da listagem
+        return super().get_queryset(request).annotate(_total_imoveis=_contagem(Imovel.objects, 'proprietario'))
+    
     def total_imoveis(self, obj):
-        count = obj.imoveis.count()
+        count = obj._total_imoveis
         if count > 0:
             return format_html(
                 '<span style="color: #C8A866; font-weight: bold;">{}</span>',
@@ -32,6 +63,34 @@ class ProprietarioAdmin(admin.ModelAdmin):
             )
         return format_html('<span style="color: #7A7A7A;">0</span>')
     total_imoveis.short_description = 'Total de Imóveis'
+    total_imoveis.admin_order_field = '_total_imoveis'
+
+
+class CompatibilidadeClienteInline(admin.TabularInline):
+    model = CompatibilidadeCliente
+    extra = 0
+    can_delete = False
+    verbose_name_plural = 'Imóveis Compatíveis'
+    fields = ['imovel_link', 'pontuacao_formatada', 'finalidade', 'valor', 'calculado_em']
+    readonly_fields = fields
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('imovel')
+    
+    def imovel_link(self, obj):
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse('admin:core_imovel_change', args=[obj.imovel_id]),
+            obj.imovel.titulo
+        )
+    imovel_link.short_description = 'Imóvel'
+    
+    def pontuacao_formatada(self, obj):
+        return format_html('<span style="color: #C8A866; font-weight: bold;">{}</span>', f'{obj.pontuacao:.0f}')
+    pontuacao_formatada.short_description = 'Pontuação'
 
 
 @admin.register(Cliente)
@@ -45,9 +104,10 @@ class ClienteAdmin(admin.ModelAdmin):
         'status', 'origem', 'finalidade_interesse', 'criado_em', 
         'ultimo_contato'
     ]
-    search_fields = ['nome_completo', 'email', 'telefone']
+    search_fields = ['nome_completo', 'email', 'telefone', '=telefone_normalizado']
     readonly_fields = ['criado_em', 'atualizado_em', 'total_imoveis_interesse']
     filter_horizontal = ['imoveis_interesse']
+    inlines = [CompatibilidadeClienteInline]
     date_hierarchy = 'criado_em'
     
     fieldsets = (
@@ -141,24 +201,41 @@ class ClienteAdmin(admin.ModelAdmin):
     ultimo_contato_formatado.short_description = 'Último Contato'
     
     def get_queryset(self, request):
-        return super().get_queryset(request).prefetch_related('imoveis_interesse')
+        return super().get_queryset(request).annotate(
+            _total_imoveis_interesse=_contagem(Cliente.imoveis_interesse.through.objects, 'cliente')
+        )
     
-    actions = ['marcar_como_lead_quente', 'marcar_como_cliente_ativo', 'atualizar_ultimo_contato']
+    def total_imoveis_interesse(self, obj):
+        return obj._total_imoveis_interesse
+    total_imoveis_interesse.short_description = 'Imóveis de interesse'
+    total_imoveis_interesse.admin_order_field = '_total_imoveis_interesse'
+    
+    actions = [
+        'marcar_como_lead_quente', 'marcar_como_cliente_ativo', 'atualizar_ultimo_contato',
+        'recalcular_compatibilidade'
+    ]
     
+    # As ações viram tarefas em lote (core.tarefas), processadas pelo comando processar_tarefas
     def marcar_como_lead_quente(self, request, queryset):
-        count = queryset.update(status='lead_quente')
-        self.message_user(request, f'{count} cliente(s) marcado(s) como Lead Quente.')
+        _enfileirar(self, request, queryset, 'cliente_status', 'Marcar clientes como Lead Quente', status='lead_quente')
     marcar_como_lead_quente.short_description = 'Marcar como Lead Quente'
     
     def marcar_como_cliente_ativo(self, request, queryset):
-        count = queryset.update(status='cliente_ativo')
-        self.message_user(request, f'{count} cliente(s) marcado(s) como Cliente Ativo.')
+        _enfileirar(
+            self, request, queryset, 'cliente_status', 'Marcar clientes como Cliente Ativo', status='cliente_ativo'
+        )
     marcar_como_cliente_ativo.short_description = 'Marcar como Cliente Ativo'
     
     def atualizar_ultimo_contato(self, request, queryset):
-        count = queryset.update(ultimo_contato=timezone.now())
-        self.message_user(request, f'Último contato atualizado para {count} cliente(s).')
+        _enfileirar(self, request, queryset, 'cliente_ultimo_contato', 'Atualizar último contato')
     atualizar_ultimo_contato.short_description = 'Atualizar último contato para hoje'
+    
+    def recalcular_compatibilidade(self, request, queryset):
+        if not compatibilidade.disponivel():
+            self.message_user(request, 'O NumPy não está instalado.', level='error')
+            return
+        _enfileirar(self, request, queryset, 'cliente_compatibilidade', 'Recalcular imóveis compatíveis')
+    recalcular_compatibilidade.short_description = 'Recalcular imóveis compatíveis'
 
 
 class PrecoPorFinalidadeInline(admin.TabularInline):
@@ -183,26 +260,40 @@ class FotoImovelInline(admin.TabularInline):
         if obj.imagem:
             return format_html(
                 '<img src="{}" style="max-height: 60px; max-width: 80px; border-radius: 4px; border: 2px solid #C8A866;" />',
-                obj.imagem.url
+                obj.url_miniatura
             )
         return '-'
     preview.short_description = 'Preview'
 
 
+class HistoricoPrecoInline(admin.TabularInline):
+    model = HistoricoPreco
+    extra = 0
+    can_delete = False
+    verbose_name_plural = 'Histórico de Preços'
+    fields = ['finalidade', 'valor', 'registrado_em']
+    readonly_fields = fields
+    ordering = ['-registrado_em']
+    classes = ['collapse']
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Imovel)
 class ImovelAdmin(admin.ModelAdmin):
     list_display = [
         'titulo_resumido', 'proprietario', 'tipo_badge', 'cidade', 'bairro', 
-        'status_badge', 'preco_resumo', 'quartos', 'tem_fotos_badge', 'criado_em'
+        'status_badge', 'preco_resumo', 'quartos', 'tem_fotos_badge', 'visualizacoes_30_dias', 'criado_em'
     ]
     list_filter = [
         'status', 'tipo', 'cidade', 'bairro', 'quartos', 'pet_friendly', 
         'aceita_financiamento', 'mobilia', 'criado_em'
     ]
     search_fields = ['titulo', 'endereco', 'bairro', 'cidade', 'proprietario__nome_completo']
-    readonly_fields = ['criado_em', 'atualizado_em']
+    readonly_fields = ['criado_em', 'atualizado_em', 'acessos_recentes']
     filter_horizontal = ['infraestrutura']
-    inlines = [PrecoPorFinalidadeInline, FotoImovelInline]
+    inlines = [PrecoPorFinalidadeInline, FotoImovelInline, HistoricoPrecoInline]
     date_hierarchy = 'criado_em'
     
     fieldsets = (
@@ -231,6 +322,10 @@ class ImovelAdmin(admin.ModelAdmin):
             'fields': ('infraestrutura',),
             'classes': ('collapse',)
         }),
+        ('Acessos', {
+            'fields': ('acessos_recentes',),
+            'classes': ('collapse',)
+        }),
         ('Controle do Sistema', {
             'fields': ('criado_em', 'atualizado_em'),
             'classes': ('collapse',)
@@ -269,7 +364,7 @@ class ImovelAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Status'
     
     def preco_resumo(self, obj):
-        precos = obj.precos.all()
+        precos = list(obj.precos.all())
         if not precos:
             return format_html('<span style="color: #7A7A7A;">-</span>')
         
@@ -285,47 +380,161 @@ class ImovelAdmin(admin.ModelAdmin):
                 resumo.append("Valor inválido")
         
         result = ' | '.join(resumo)
-        if precos.count() > 2:
+        if len(precos) > 2:
             result += '...'
         
         return format_html('<span style="color: #C8A866; font-weight: bold;">{}</span>', result)
     preco_resumo.short_description = 'Preços'
     
     def tem_fotos_badge(self, obj):
-        if obj.tem_fotos:
-            count = obj.fotos.count()
+        count = obj._total_fotos
+        if count:
             return format_html(
                 '<span style="background-color: #D4AF37; color: #0D0D0D; padding: 3px 8px; border-radius: 8px; font-size: 0.8rem; font-weight: bold;"><i class="fas fa-camera"></i> {}</span>',
                 count
             )
         return format_html('<span style="background-color: #dc3545; color: white; padding: 3px 8px; border-radius: 8px; font-size: 0.8rem;">Sem fotos</span>')
     tem_fotos_badge.short_description = 'Fotos'
+    tem_fotos_badge.admin_order_field = '_total_fotos'
+    
+    def visualizacoes_30_dias(self, obj):
+        return obj._visualizacoes_30_dias
+    visualizacoes_30_dias.short_description = 'Visualizações (30 dias)'
+    visualizacoes_30_dias.admin_order_field = '_visualizacoes_30_dias'
+    
+    def acessos_recentes(self, obj):
+        if obj.pk is None:
+            return '-'
+        dias = obj.acessos.all()[:30]
+        if not dias:
+            return 'Nenhum acesso registrado.'
+        linhas = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td></tr>',
+            ((f'{dia.dia:%d/%m/%Y}', dia.visualizacoes, dia.impressoes) for dia in dias),
+        )
+        return format_html(
+            '<table><thead><tr><th>Dia</th><th>Visualizações</th><th>Impressões</th></tr></thead>'
+            '<tbody>{}</tbody></table>',
+            linhas
+        )
+    acessos_recentes.short_description = 'Últimos 30 dias com acesso'
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('proprietario').prefetch_related('precos', 'fotos')
+        # As fotos e as visualizações são apenas contadas; os preços exibidos vêm de um único prefetch
+        return super().get_queryset(request).select_related('proprietario').annotate(
+            _total_fotos=_contagem(FotoImovel.objects, 'imovel'),
+            _visualizacoes_30_dias=contadores.visualizacoes_recentes(30),
+        ).prefetch_related('precos')
     
     actions = ['marcar_como_vendido', 'marcar_como_alugado', 'marcar_como_ativo']
     
     def marcar_como_vendido(self, request, queryset):
-        count = queryset.update(status='vendido')
-        self.message_user(request, f'{count} imóvel(is) marcado(s) como vendido(s).')
+        _enfileirar(self, request, queryset, 'imovel_status', 'Marcar imóveis como vendidos', status='vendido')
     marcar_como_vendido.short_description = 'Marcar como vendido'
     
     def marcar_como_alugado(self, request, queryset):
-        count = queryset.update(status='alugado')
-        self.message_user(request, f'{count} imóvel(is) marcado(s) como alugado(s).')
+        _enfileirar(self, request, queryset, 'imovel_status', 'Marcar imóveis como alugados', status='alugado')
     marcar_como_alugado.short_description = 'Marcar como alugado'
     
     def marcar_como_ativo(self, request, queryset):
-        count = queryset.update(status='ativo')
-        self.message_user(request, f'{count} imóvel(is) marcado(s) como ativo(s).')
+        _enfileirar(self, request, queryset, 'imovel_status', 'Marcar imóveis como ativos', status='ativo')
     marcar_como_ativo.short_description = 'Marcar como ativo'
+
+
+@admin.register(TarefaLote)
+class TarefaLoteAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'status_badge', 'progresso', 'solicitante', 'criado_em', 'concluido_em']
+    list_filter = ['status', 'operacao', 'criado_em']
+    fields = [
+        'descricao', 'operacao', 'parametros', 'status_badge', 'progresso', 'solicitante',
+        'criado_em', 'iniciado_em', 'concluido_em', 'erro',
+    ]
+    readonly_fields = fields
+    actions = ['reenfileirar']
+    
+    def has_add_permission(self, request):
+        return False
     
-    class Media:
-        css = {
-            'all': ('admin/css/custom_admin.css',)
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def status_badge(self, obj):
+        colors = {
+            'pendente': '#7A7A7A',
+            'executando': '#C8A866',
+            'concluida': '#28a745',
+            'falhou': '#dc3545',
         }
-        js = ('admin/js/custom_admin.js',)
+        return format_html(
+            '<span style="background-color: {}; color: white; padding: 4px 8px; border-radius: 12px; font-size: 0.8rem; font-weight: bold;">{}</span>',
+            colors.get(obj.status, '#7A7A7A'),
+            obj.get_status_display()
+        )
+    status_badge.short_description = 'Status'
+    
+    def progresso(self, obj):
+        return format_html(
+            '<div style="width: 160px; background: #eee; border-radius: 6px;">'
+            '<div style="width: {}%; background: #C8A866; border-radius: 6px; text-align: center; color: #0D0D0D; font-size: 0.8rem;">{}%</div>'
+            '</div><small>{} de {}</small>',
+            obj.percentual, obj.percentual, obj.processados, obj.total
+        )
+    progresso.short_description = 'Progresso'
+    
+    def reenfileirar(self, request, queryset):
+        # Continua do último lote concluído
+        count = queryset.filter(status=TarefaLote.Status.FALHOU).update(
+            status=TarefaLote.Status.PENDENTE, erro='', concluido_em=None
+        )
+        self.message_user(request, f'{count} tarefa(s) com falha voltaram para a fila.')
+    reenfileirar.short_description = 'Reenfileirar tarefas com falha'
+
+
+@admin.register(EstatisticaPreco)
+class EstatisticaPrecoAdmin(admin.ModelAdmin):
+    list_display = [
+        'mes_formatado', 'cidade', 'bairro_ou_todos', 'tipo_ou_todos', 'finalidade', 'quantidade',
+        'preco_mediano', 'preco_m2_mediano',
+    ]
+    list_filter = ['finalidade', 'tipo', 'mes', 'cidade']
+    search_fields = ['cidade', 'bairro']
+    date_hierarchy = 'mes'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def mes_formatado(self, obj):
+        return f'{obj.mes:%m/%Y}'
+    mes_formatado.short_description = 'Mês'
+    mes_formatado.admin_order_field = 'mes'
+    
+    def bairro_ou_todos(self, obj):
+        return obj.bairro or format_html('<span style="color: #7A7A7A;">Cidade inteira</span>')
+    bairro_ou_todos.short_description = 'Bairro'
+    bairro_ou_todos.admin_order_field = 'bairro'
+    
+    def tipo_ou_todos(self, obj):
+        return obj.get_tipo_display() if obj.tipo else format_html('<span style="color: #7A7A7A;">Todos</span>')
+    tipo_ou_todos.short_description = 'Tipo'
+    tipo_ou_todos.admin_order_field = 'tipo'
+
+
+@admin.register(AcessoImovelDiario)
+class AcessoImovelDiarioAdmin(admin.ModelAdmin):
+    list_display = ['dia', 'imovel', 'visualizacoes', 'impressoes']
+    list_filter = ['dia']
+    search_fields = ['imovel__titulo']
+    date_hierarchy = 'dia'
+    list_select_related = ['imovel']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 # Personalização global do Admin
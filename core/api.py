@@ -0,0 +1,263 @@
+"""
+API JSON somente leitura do catálogo de imóveis ativos.
+
+- ``api/imoveis/``: listagem com os mesmos filtros e ordenações de
+  ``lista_imoveis``, paginada por cursor; com ``formato=ndjson`` devolve o
+  resultado inteiro, um imóvel por linha, em streaming e com memória
+  constante.
+- ``api/imoveis/<pk>/``: um imóvel, com preços, fotos e infraestrutura.
+- ``api/imoveis/facetas/``: total e contagens por cidade, tipo e quartos do
+  filtro atual, mais as listas usadas nos filtros.
+
+``fields=titulo,cidade,preco_venda`` escolhe os campos; a consulta carrega
+só as colunas necessárias para eles.
+"""
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.files.storage import default_storage
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+
+from . import cache_paginas, facetas, motor_colunar, replicas
+from .busca import buscar_imoveis
+from .filtros import aplicar_filtros, em_ordem, filtros_aplicados, ler_filtros, paginar
+from .geo import haversine_km
+from .models import Imovel
+from .paginacao import POR_PAGINA, contagem_em_cache
+
+# Campo da API -> colunas lidas (caminhos do ORM a partir de Imovel)
+CAMPOS = {
+    'id': ['pk'],
+    'titulo': ['titulo'],
+    'descricao': ['descricao'],
+    'tipo': ['tipo'],
+    'endereco': ['endereco'],
+    'bairro': ['bairro'],
+    'cidade': ['cidade'],
+    'estado': ['estado'],
+    'cep': ['cep'],
+    'latitude': ['latitude'],
+    'longitude': ['longitude'],
+    'area_util': ['area_util'],
+    'area_total': ['area_total'],
+    'quartos': ['quartos'],
+    'suites': ['suites'],
+    'banheiros': ['banheiros'],
+    'vagas_garagem': ['vagas_garagem'],
+    'andar': ['andar'],
+    'ano_construcao': ['ano_construcao'],
+    'mobilia': ['mobilia'],
+    'pet_friendly': ['pet_friendly'],
+    'aceita_financiamento': ['aceita_financiamento'],
+    'valor_condominio': ['valor_condominio'],
+    'valor_iptu': ['valor_iptu'],
+    'preco_venda': ['resumo__preco_venda'],
+    'preco_aluguel': ['resumo__preco_aluguel'],
+    'preco_temporada': ['resumo__preco_temporada'],
+    'foto_capa': ['resumo__foto_capa'],
+    'total_fotos': ['resumo__total_fotos'],
+    'criado_em': ['criado_em'],
+    'atualizado_em': ['atualizado_em'],
+    'url': [],
+    'distancia_km': ['latitude', 'longitude'],
+}
+
+CAMPOS_PADRAO = [
+    'id', 'titulo', 'tipo', 'bairro', 'cidade', 'area_util', 'quartos', 'banheiros', 'vagas_garagem',
+    'preco_venda', 'preco_aluguel', 'preco_temporada', 'foto_capa', 'url',
+]
+
+# Só no detalhe: listas lidas das tabelas relacionadas
+CAMPOS_DETALHE = ['precos', 'fotos', 'infraestrutura']
+
+# Coordenadas saem como número, como em views.imoveis_mapa; os demais decimais como texto
+CAMPOS_REAIS = {'latitude', 'longitude'}
+
+LIMITE_MAXIMO = 100
+
+
+class CamposInvalidos(ValueError):
+    pass
+
+
+def ler_campos(params, permitidos, padrao):
+    bruto = params.get('fields', '').strip()
+    if not bruto:
+        return list(padrao)
+    campos = list(dict.fromkeys(campo.strip() for campo in bruto.split(',') if campo.strip()))
+    invalidos = [campo for campo in campos if campo not in permitidos]
+    if invalidos:
+        raise CamposInvalidos(
+            f"Campos desconhecidos: {', '.join(invalidos)}. Disponíveis: {', '.join(permitidos)}."
+        )
+    return campos
+
+
+def projetar(consulta, campos):
+    """Carrega só as colunas dos ``campos``; o resumo entra no mesmo SELECT quando necessário"""
+    # criado_em é a chave de ordenação padrão do cursor; sem ela cada item faria uma consulta
+    colunas = {'pk', 'criado_em'}
+    for campo in campos:
+        colunas.update(CAMPOS.get(campo, []))
+    if any(coluna.startswith('resumo__') for coluna in colunas):
+        consulta = consulta.select_related('resumo')
+    return consulta.only(*sorted(colunas))
+
+
+def _valor(imovel, campo, geo):
+    if campo == 'url':
+        return reverse('core:detalhe_imovel', args=[imovel.pk])
+    if campo == 'distancia_km':
+        if geo is None or imovel.latitude is None:
+            return None
+        return round(haversine_km(*geo['centro'], float(imovel.latitude), float(imovel.longitude)), 3)
+    valor = imovel
+    for parte in CAMPOS[campo][0].split('__'):
+        valor = getattr(valor, parte)
+    if campo == 'foto_capa':
+        return default_storage.url(valor) if valor else ''
+    if isinstance(valor, Decimal):
+        return float(valor) if campo in CAMPOS_REAIS else str(valor)
+    return valor
+
+
+def serializar(imovel, campos, geo=None):
+    return {campo: _valor(imovel, campo, geo) for campo in campos}
+
+
+def _erro(mensagem, status=400):
+    return JsonResponse({'erro': mensagem}, status=status)
+
+
+def _consulta(params):
+    """(filtros, ids da busca, queryset filtrado) com a mesma semântica de lista_imoveis"""
+    filtros = ler_filtros(params)
+    ids_busca = buscar_imoveis(filtros['busca']) if filtros['busca'] else None
+    imoveis = aplicar_filtros(Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO), filtros, ids_busca)
+    return filtros, ids_busca, imoveis
+
+
+def _filtros_contagem(params):
+    return {k: v for k, v in filtros_aplicados(params).items() if k != 'ordenacao'}
+
+
+@replicas.leitura
+@cache_paginas.pagina_publica('api-lista', cache_paginas.por_catalogo)
+def imoveis(request):
+    """Listagem paginada por cursor, ou o resultado inteiro em NDJSON com ``formato=ndjson``"""
+    try:
+        campos = ler_campos(request.GET, list(CAMPOS), CAMPOS_PADRAO)
+    except CamposInvalidos as erro:
+        return _erro(str(erro))
+
+    filtros, ids_busca, consulta = _consulta(request.GET)
+    if request.GET.get('formato') == 'ndjson':
+        return _streaming(consulta, filtros, ids_busca, campos)
+
+    try:
+        limite = max(1, min(int(request.GET.get('limite', POR_PAGINA)), LIMITE_MAXIMO))
+    except ValueError:
+        limite = POR_PAGINA
+
+    cursor = request.GET.get('cursor')
+    if motor_colunar.ativo():
+        # O motor decide a página; o banco só lê as colunas pedidas desses imóveis
+        pagina, total, _ = motor_colunar.motor.consultar(filtros, ids_busca, cursor, limite)
+        carregados = projetar(Imovel.objects, campos).in_bulk(pagina.object_list)
+        itens = [carregados[pk] for pk in pagina.object_list if pk in carregados]
+    else:
+        total = contagem_em_cache(consulta.order_by().values('pk'), _filtros_contagem(request.GET))
+        pagina = paginar(projetar(consulta, campos), filtros, ids_busca, cursor, limite)
+        itens = pagina.object_list
+
+    return JsonResponse({
+        'total': total,
+        'cursor_proximo': pagina.cursor_proximo,
+        'cursor_anterior': pagina.cursor_anterior,
+        'imoveis': [serializar(imovel, campos, filtros['geo']) for imovel in itens],
+    })
+
+
+def _streaming(consulta, filtros, ids_busca, campos):
+    tamanho = getattr(settings, 'API_STREAMING_CHUNK_SIZE', 2000)
+
+    def linhas():
+        for imovel in em_ordem(projetar(consulta, campos), filtros, ids_busca, tamanho):
+            yield json.dumps(serializar(imovel, campos, filtros['geo']), cls=DjangoJSONEncoder) + '\n'
+
+    return StreamingHttpResponse(linhas(), content_type='application/x-ndjson; charset=utf-8')
+
+
+@replicas.leitura
+@cache_paginas.pagina_publica('api-imovel', cache_paginas.por_imovel)
+def imovel(request, pk):
+    if request.versao_pagina is None:
+        return _erro('Imóvel não encontrado.', status=404)
+    permitidos = [campo for campo in CAMPOS if campo != 'distancia_km'] + CAMPOS_DETALHE
+    try:
+        campos = ler_campos(request.GET, permitidos, permitidos)
+    except CamposInvalidos as erro:
+        return _erro(str(erro))
+
+    consulta = projetar(Imovel.objects.all(), campos)
+    if 'precos' in campos:
+        consulta = consulta.prefetch_related('precos')
+    if 'fotos' in campos:
+        consulta = consulta.prefetch_related('fotos')
+    if 'infraestrutura' in campos:
+        consulta = consulta.prefetch_related('infraestrutura')
+    encontrado = consulta.filter(pk=pk, status=Imovel.StatusImovel.ATIVO).first()
+    if encontrado is None:
+        return _erro('Imóvel não encontrado.', status=404)
+
+    dados = serializar(encontrado, [campo for campo in campos if campo not in CAMPOS_DETALHE])
+    if 'precos' in campos:
+        dados['precos'] = [
+            {
+                'finalidade': preco.finalidade,
+                'valor': str(preco.valor),
+                'diaria_minima': preco.diaria_minima,
+                'taxa_limpeza': None if preco.taxa_limpeza is None else str(preco.taxa_limpeza),
+                'capacidade_hospedes': preco.capacidade_hospedes,
+            }
+            for preco in encontrado.precos.all()
+        ]
+    if 'fotos' in campos:
+        dados['fotos'] = [
+            {'url': foto.imagem.url, 'legenda': foto.legenda, 'eh_capa': foto.eh_capa, 'variantes': foto.variantes}
+            for foto in encontrado.fotos.all()
+        ]
+    if 'infraestrutura' in campos:
+        dados['infraestrutura'] = [infra.nome for infra in encontrado.infraestrutura.all()]
+    return JsonResponse(dados)
+
+
+@replicas.leitura
+@cache_paginas.pagina_publica('api-facetas', cache_paginas.por_catalogo)
+def facetas_imoveis(request):
+    """Total e contagens por faceta do filtro atual"""
+    filtros, ids_busca, consulta = _consulta(request.GET)
+    if motor_colunar.ativo():
+        _, total, contagens = motor_colunar.motor.consultar(filtros, ids_busca, por_pagina=0)
+    else:
+        filtros_contagem = _filtros_contagem(request.GET)
+        total = contagem_em_cache(consulta.order_by().values('pk'), filtros_contagem)
+        contagens = facetas.contagens_por_faceta(consulta, filtros_contagem)
+
+    escolhas = facetas.listas_de_escolha()
+    return JsonResponse({
+        'total': total,
+        'cidades': [
+            {'cidade': cidade, 'total': contagens['cidades'].get(cidade, 0)} for cidade in facetas.cidades_ativas()
+        ],
+        'tipos': [
+            {'tipo': codigo, 'nome': nome, 'total': contagens['tipos'].get(codigo, 0)}
+            for codigo, nome in escolhas['tipos']
+        ],
+        'quartos': [{'minimo': minimo, 'total': total} for minimo, total in contagens['quartos'].items()],
+        'finalidades': [{'finalidade': codigo, 'nome': nome} for codigo, nome in escolhas['finalidades']],
+        'infraestrutura': [{'id': infra.pk, 'nome': infra.nome} for infra in facetas.infraestruturas()],
+    })
@@ -0,0 +1,244 @@
+"""
+Índice de busca textual dos imóveis.
+
+No SQLite a busca usa a tabela virtual FTS5 ``search_index`` (criada na
+migração 0003). Quando o FTS5 não está disponível, ou em outros bancos, os
+termos são indexados em ``TermoBusca`` e a pontuação é somada no banco
+(GROUP BY imovel). Nos dois casos os acentos são ignorados ("Sao Paulo"
+encontra "São Paulo").
+
+Cada busca consulta o índice uma vez: ``buscar_imoveis`` devolve todos os
+encontrados, do mais ao menos relevante, e essa lista filtra a listagem
+(``filtrar_ids``) e dá a ordem por relevância (a posição nela).
+"""
+import json
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from functools import reduce
+from operator import add, or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections, router
+from django.db.models import Count, Q, Sum, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Imovel, TermoBusca
+
+TABELA_FTS = 'search_index'
+
+# Campos indexados e seus pesos no ranking (mesma ordem das colunas do FTS5)
+PESOS_CAMPOS = {
+    'titulo': 10.0,
+    'endereco': 3.0,
+    'bairro': 5.0,
+    'cidade': 5.0,
+    'descricao': 1.0,
+}
+
+TAMANHO_MAX_TERMO = 64
+
+CHAVE_TOTAL_IMOVEIS = 'busca:total_imoveis'
+
+_fts_disponivel = {}
+
+
+def normalizar(texto):
+    """Remove acentos e converte para minúsculas"""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    return [t[:TAMANHO_MAX_TERMO] for t in re.findall(r'\w+', normalizar(texto))]
+
+
+def usa_fts():
+    """Indica se o banco atual tem a tabela FTS5 de busca"""
+    backend = getattr(settings, 'BUSCA_BACKEND', 'auto')
+    if backend == 'python' or connection.vendor != 'sqlite':
+        return False
+    chave = connection.settings_dict['NAME']
+    if chave not in _fts_disponivel:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                [TABELA_FTS]
+            )
+            _fts_disponivel[chave] = cursor.fetchone() is not None
+    return _fts_disponivel[chave]
+
+
+def _termos_ponderados(imovel):
+    pesos = defaultdict(float)
+    for campo, peso in PESOS_CAMPOS.items():
+        for termo in tokenizar(getattr(imovel, campo)):
+            pesos[termo] += peso
+    return pesos
+
+
+def indexar_imovel(imovel):
+    """Insere ou atualiza um imóvel no índice"""
+    if usa_fts():
+        colunas = list(PESOS_CAMPOS)
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABELA_FTS} WHERE rowid = %s", [imovel.pk])
+            cursor.execute(
+                f"INSERT INTO {TABELA_FTS} (rowid, {', '.join(colunas)}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(colunas))})",
+                [imovel.pk] + [getattr(imovel, campo) or '' for campo in colunas]
+            )
+        return
+
+    TermoBusca.objects.filter(imovel_id=imovel.pk).delete()
+    TermoBusca.objects.bulk_create([
+        TermoBusca(termo=termo, imovel_id=imovel.pk, peso=peso)
+        for termo, peso in _termos_ponderados(imovel).items()
+    ])
+
+
+def indexar_lote(imoveis):
+    """Insere ou atualiza vários imóveis no índice com poucas instruções (importação em lote)"""
+    imoveis = list(imoveis)
+    ids = [imovel.pk for imovel in imoveis]
+    if not ids:
+        return
+    if usa_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {TABELA_FTS} WHERE rowid IN ({', '.join(['%s'] * len(ids))})", ids
+            )
+            _inserir_lote_fts(cursor, [
+                [imovel.pk] + [getattr(imovel, campo) or '' for campo in PESOS_CAMPOS] for imovel in imoveis
+            ])
+        return
+
+    TermoBusca.objects.filter(imovel_id__in=ids).delete()
+    TermoBusca.objects.bulk_create([
+        TermoBusca(termo=termo, imovel_id=imovel.pk, peso=peso)
+        for imovel in imoveis
+        for termo, peso in _termos_ponderados(imovel).items()
+    ], batch_size=1000)
+
+
+def remover_imovel(imovel_id):
+    """Remove um imóvel do índice"""
+    if usa_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABELA_FTS} WHERE rowid = %s", [imovel_id])
+    else:
+        TermoBusca.objects.filter(imovel_id=imovel_id).delete()
+
+
+def reconstruir_indice(tamanho_lote=1000):
+    """Recria o índice inteiro a partir da tabela de imóveis. Retorna o total indexado."""
+    campos = ['pk'] + list(PESOS_CAMPOS)
+    imoveis = Imovel.objects.only(*campos).order_by('pk').iterator(chunk_size=tamanho_lote)
+
+    total = 0
+    if usa_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABELA_FTS}")
+            lote = []
+            for imovel in imoveis:
+                lote.append([imovel.pk] + [getattr(imovel, campo) or '' for campo in PESOS_CAMPOS])
+                if len(lote) >= tamanho_lote:
+                    _inserir_lote_fts(cursor, lote)
+                    total += len(lote)
+                    lote = []
+            if lote:
+                _inserir_lote_fts(cursor, lote)
+                total += len(lote)
+        return total
+
+    TermoBusca.objects.all().delete()
+    lote = []
+    for imovel in imoveis:
+        lote.extend(
+            TermoBusca(termo=termo, imovel_id=imovel.pk, peso=peso)
+            for termo, peso in _termos_ponderados(imovel).items()
+        )
+        total += 1
+        if len(lote) >= tamanho_lote:
+            TermoBusca.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        TermoBusca.objects.bulk_create(lote)
+    return total
+
+
+def _inserir_lote_fts(cursor, lote):
+    colunas = list(PESOS_CAMPOS)
+    cursor.executemany(
+        f"INSERT INTO {TABELA_FTS} (rowid, {', '.join(colunas)}) "
+        f"VALUES (%s, {', '.join(['%s'] * len(colunas))})",
+        lote
+    )
+
+
+def _consulta_fts(termos):
+    # Cada termo vira um prefixo entre aspas, o que também neutraliza a sintaxe do FTS5
+    return ' '.join(f'"{termo}"*' for termo in termos)
+
+
+def filtrar_ids(imoveis, ids):
+    """Restringe o queryset aos ``ids`` encontrados por ``buscar_imoveis``, sem consultar o índice de novo"""
+    if connections[imoveis.db].vendor == 'sqlite':
+        # Uma lista longa passaria do limite de parâmetros do SQLite: vai inteira em um, como JSON
+        return imoveis.filter(pk__in=RawSQL('SELECT value FROM json_each(%s)', [json.dumps(ids)]))
+    return imoveis.filter(pk__in=ids)
+
+
+def buscar_imoveis(texto, limite=None):
+    """
+    Ids dos imóveis que contêm todos os termos, do mais ao menos relevante
+    (empates pela pk); ``limite`` None devolve todos.
+    """
+    termos = tokenizar(texto)
+    if not termos:
+        return []
+
+    if usa_fts():
+        pesos = ', '.join(str(peso) for peso in PESOS_CAMPOS.values())
+        # SQL direto: o banco de leitura (réplica, na página pública) vem do roteador
+        with connections[router.db_for_read(Imovel)].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {TABELA_FTS} WHERE {TABELA_FTS} MATCH %s "
+                f"ORDER BY bm25({TABELA_FTS}, {pesos}), rowid LIMIT %s",
+                [_consulta_fts(termos), -1 if limite is None else limite]
+            )
+            return [linha[0] for linha in cursor.fetchall()]
+
+    return _buscar_indice_invertido(termos, limite)
+
+
+def _total_imoveis():
+    # Só entra no IDF: um valor de alguns minutos atrás não muda o ranking de forma perceptível
+    return cache.get_or_set(CHAVE_TOTAL_IMOVEIS, Imovel.objects.count, 600) or 1
+
+
+def _buscar_indice_invertido(termos, limite):
+    """Ids por relevância no índice invertido, pontuados e ordenados no banco; ``limite`` None devolve todos"""
+    # Intervalo em vez de LIKE para aproveitar o índice (termo, imovel)
+    faixas = [Q(termo__gte=termo, termo__lt=termo + '\uffff') for termo in sorted(set(termos))]
+    postings = TermoBusca.objects.filter(reduce(or_, faixas))
+
+    # Imóveis com cada termo, para o IDF
+    frequencias = postings.aggregate(**{
+        f'termo_{posicao}': Count('imovel_id', distinct=True, filter=faixa) for posicao, faixa in enumerate(faixas)
+    })
+    if not all(frequencias.values()):
+        return []
+    total_imoveis = _total_imoveis()
+
+    # Um Sum por termo: só os imóveis com todos eles, pontuados pelo peso vezes o IDF
+    somas = {f'termo_{posicao}': Sum('peso', filter=faixa) for posicao, faixa in enumerate(faixas)}
+    pontuacao = reduce(add, [
+        soma * Value(math.log(1 + total_imoveis / frequencias[nome])) for nome, soma in somas.items()
+    ])
+    ranking = postings.values('imovel_id').annotate(**somas).filter(
+        **{f'{nome}__isnull': False for nome in somas}
+    ).annotate(pontuacao=pontuacao).order_by('-pontuacao', 'imovel_id').values_list('imovel_id', flat=True)
+    return list(ranking if limite is None else ranking[:limite])
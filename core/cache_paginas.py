@@ -0,0 +1,131 @@
+"""
+Cache das páginas públicas e GET condicional (ETag/Last-Modified).
+
+- Detalhe do imóvel: o HTML inteiro fica em cache, com a chave formada pela
+  pk e pela versão da página: o ``atualizado_em`` do imóvel (os signals de
+  core.signals o avançam quando mudam preços, fotos ou infraestrutura) ou a
+  versão do catálogo, se for mais nova, porque o bloco de similares mostra
+  outros imóveis. Uma alteração gera uma chave nova e a antiga só expira. Da
+  querystring só entram na chave os parâmetros que a página usa, para que
+  URLs inventadas não encham o cache.
+- Cards da home e da listagem: fragmentos ``{% cache %}`` com a pk e o
+  ``atualizado_em`` do resumo.
+- Home e listagem: a versão do catálogo (instante da última alteração em
+  qualquer imóvel ativo ou infraestrutura) fica no cache e é avançada pelos
+  signals; dela saem o ETag e o Last-Modified. O cache (CACHES) precisa ser
+  compartilhado entre os processos: a versão avançada pelo admin, pelo
+  ``processar_tarefas`` ou por um comando de importação tem de chegar aos
+  workers que respondem ao site.
+
+O ETag e o Last-Modified permitem que visitantes e proxies recebam 304 sem
+que a página seja montada. As páginas públicas não usam sessão nem CSRF, para
+que a resposta seja a mesma para todos e possa ser guardada por um proxy; o
+formulário de interesse do detalhe pede o token CSRF a ``views.token_csrf``.
+"""
+import hashlib
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_safe
+
+from .models import Imovel
+
+CHAVE_CATALOGO = 'paginas:catalogo'
+
+
+def ativo():
+    """Cache de páginas e fragmentos; desligado por padrão em DEBUG"""
+    return getattr(settings, 'CACHE_PAGINAS', not settings.DEBUG)
+
+
+def tempo_cache():
+    """Validade das páginas e fragmentos em cache; 0 (não guarda) com o cache desligado"""
+    return getattr(settings, 'CACHE_PAGINAS_TIMEOUT', 600) if ativo() else 0
+
+
+def versao_catalogo():
+    return cache.get_or_set(CHAVE_CATALOGO, timezone.now, None)
+
+
+def invalidar_catalogo():
+    cache.set(CHAVE_CATALOGO, timezone.now(), None)
+
+
+def por_catalogo(request, *args, **kwargs):
+    """Versão das páginas que dependem do catálogo inteiro (home, listagem)"""
+    return versao_catalogo()
+
+
+def por_imovel(request, pk):
+    """Versão da página de um imóvel ativo; None se ele não existe ou não está ativo"""
+    return Imovel.objects.filter(
+        pk=pk, status=Imovel.StatusImovel.ATIVO
+    ).values_list('atualizado_em', flat=True).first()
+
+
+def por_detalhe(request, pk):
+    """Versão da página de detalhe: a do imóvel ou a do catálogo, que cobre os similares exibidos"""
+    atualizado_em = por_imovel(request, pk)
+    return atualizado_em and max(atualizado_em, versao_catalogo())
+
+
+def _etag(prefixo, versao, request):
+    # A querystring e o host entram no ETag: a mesma versão gera páginas diferentes por filtro
+    variacao = hashlib.sha1(request.get_full_path().encode() + request.get_host().encode()).hexdigest()[:12]
+    return f'{prefixo}-{versao.timestamp():.6f}-{variacao}'
+
+
+def pagina_publica(prefixo, versao):
+    """
+    Decorador das páginas públicas: só GET/HEAD, sem CSRF, com ETag e
+    Last-Modified tirados de ``versao(request, *args, **kwargs)`` (um datetime
+    ou None, guardado em ``request.versao_pagina``) e respostas 304 quando o
+    cliente já tem a versão atual.
+    """
+    def _versao(request, *args, **kwargs):
+        # condition() pede o ETag e o Last-Modified separadamente; a versão é lida uma vez
+        # e fica em request.versao_pagina para a view
+        if not hasattr(request, 'versao_pagina'):
+            request.versao_pagina = versao(request, *args, **kwargs)
+        return request.versao_pagina
+
+    def etag(request, *args, **kwargs):
+        atual = _versao(request, *args, **kwargs)
+        return _etag(prefixo, atual, request) if atual else None
+
+    def decorador(view):
+        @wraps(view)
+        def _view(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                patch_cache_control(response, public=True, max_age=getattr(settings, 'CACHE_PAGINAS_MAX_AGE', 60))
+            return response
+        return require_safe(csrf_exempt(condition(etag_func=etag, last_modified_func=_versao)(_view)))
+    return decorador
+
+
+def pagina_em_cache(request, chave, montar, parametros=()):
+    """
+    Resposta guardada em ``chave`` (mais o endereço da página e os
+    ``parametros`` da querystring que ela lê) ou montada por ``montar()`` e
+    guardada se for 200. O que não está em ``parametros`` não pode mudar o HTML.
+    """
+    if not ativo():
+        return montar()
+    endereco = request.build_absolute_uri(request.path) + '?' + urlencode(
+        [(parametro, request.GET.get(parametro, '')) for parametro in parametros]
+    )
+    chave = f"pagina:{chave}:{hashlib.sha1(endereco.encode()).hexdigest()}"
+    conteudo = cache.get(chave)
+    if conteudo is not None:
+        return HttpResponse(conteudo)
+    response = montar()
+    if response.status_code == 200:
+        cache.set(chave, response.content, tempo_cache())
+    return response
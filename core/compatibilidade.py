@@ -0,0 +1,353 @@
+"""
+Motor de compatibilidade entre clientes (leads) e imóveis ativos.
+
+Cada cliente em aberto (leads e clientes ativos) é comparado com todos os
+imóveis ativos, em lotes de imóveis, com matrizes do NumPy:
+
+- finalidade: o imóvel precisa ter preço em uma das finalidades de interesse
+  (sem interesse informado, todas valem);
+- orçamento: o preço da finalidade é comparado com ``orcamento_max``; até o
+  orçamento a nota é máxima a partir de 70% dele, e até 10% acima ainda é
+  aceito com nota menor;
+- tipo: os tipos preferidos saem dos imóveis de interesse do cliente e dos
+  tipos citados nas observações.
+
+As ``TOP`` melhores sugestões de cada cliente ficam em
+``CompatibilidadeCliente``. A execução incremental relê apenas os imóveis e
+clientes alterados desde a última execução concluída.
+"""
+import logging
+import re
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .busca import normalizar
+from .models import (
+    Cliente, CompatibilidadeCliente, ExecucaoCompatibilidade, Imovel, PrecoPorFinalidade,
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependência opcional
+    np = None
+
+logger = logging.getLogger(__name__)
+
+STATUS_ABERTOS = [
+    Cliente.StatusCliente.LEAD_FRIO,
+    Cliente.StatusCliente.LEAD_MORNO,
+    Cliente.StatusCliente.LEAD_QUENTE,
+    Cliente.StatusCliente.CLIENTE_ATIVO,
+]
+
+FINALIDADES = list(PrecoPorFinalidade.Finalidade.values)
+TIPOS = list(Imovel.TipoImovel.values)
+
+# finalidade_interesse do cliente -> finalidades de preço aceitas
+FINALIDADES_DO_INTERESSE = {
+    'venda': ['venda'],
+    'aluguel': ['aluguel'],
+    'temporada': ['temporada'],
+    'venda_aluguel': ['venda', 'aluguel'],
+    '': FINALIDADES,
+}
+
+# Palavras (sem acento) que indicam cada tipo nas observações
+PALAVRAS_TIPO = {
+    'apartamento': ['apartamento', 'apto', 'ap'],
+    'casa': ['casa'],
+    'sobrado': ['sobrado'],
+    'kitnet': ['kitnet', 'kitinete', 'quitinete', 'studio'],
+    'loft': ['loft'],
+    'sala_comercial': ['sala comercial', 'sala'],
+    'terreno': ['terreno', 'lote'],
+    'chacara': ['chacara', 'sitio'],
+    'galpao': ['galpao', 'barracao'],
+}
+
+TOP = 20
+PESO_ORCAMENTO = 0.6
+PESO_TIPO = 0.4
+TOLERANCIA_ORCAMENTO = 0.10
+
+# Elementos (clientes x imóveis x finalidades) por lote de imóveis
+ELEMENTOS_POR_LOTE = 3_000_000
+
+
+def disponivel():
+    return np is not None
+
+
+def tipos_nas_observacoes(texto):
+    texto = normalizar(texto)
+    return {
+        tipo for tipo, palavras in PALAVRAS_TIPO.items()
+        if any(re.search(rf'\b{re.escape(palavra)}\b', texto) for palavra in palavras)
+    }
+
+
+class _Clientes:
+    """Preferências dos clientes em matrizes, na ordem de ``ids``"""
+
+    def __init__(self, clientes, tipos_interesse):
+        self.ids = np.array([cliente['pk'] for cliente in clientes], dtype=np.int64)
+        self.aceita = np.array([
+            [finalidade in FINALIDADES_DO_INTERESSE.get(cliente['finalidade_interesse'], FINALIDADES)
+             for finalidade in FINALIDADES]
+            for cliente in clientes
+        ], dtype=bool).reshape(len(clientes), len(FINALIDADES))
+        self.orcamento = np.array([
+            float(cliente['orcamento_max']) if cliente['orcamento_max'] else np.nan
+            for cliente in clientes
+        ], dtype=np.float64)
+        self.tipos = np.zeros((len(clientes), len(TIPOS)), dtype=bool)
+        for linha, cliente in enumerate(clientes):
+            preferidos = tipos_interesse.get(cliente['pk'], set()) | tipos_nas_observacoes(cliente['observacoes'])
+            for tipo in preferidos:
+                self.tipos[linha, TIPOS.index(tipo)] = True
+        self.tem_preferencia = self.tipos.any(axis=1)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def carregar_clientes(cliente_ids=None, excluir=()):
+    clientes = Cliente.objects.filter(status__in=STATUS_ABERTOS)
+    if cliente_ids is not None:
+        clientes = clientes.filter(pk__in=cliente_ids)
+    if excluir:
+        clientes = clientes.exclude(pk__in=excluir)
+    clientes = list(clientes.order_by('pk').values('pk', 'finalidade_interesse', 'orcamento_max', 'observacoes'))
+
+    tipos_interesse = {}
+    relacoes = Cliente.imoveis_interesse.through.objects.filter(
+        cliente_id__in=[cliente['pk'] for cliente in clientes]
+    ).values_list('cliente_id', 'imovel__tipo')
+    for cliente_id, tipo in relacoes:
+        tipos_interesse.setdefault(cliente_id, set()).add(tipo)
+    return _Clientes(clientes, tipos_interesse)
+
+
+def lotes_de_imoveis(tamanho, imovel_ids=None):
+    """
+    Imóveis ativos em lotes de ``tamanho``: (ids, preços (n, finalidades) com NaN, códigos do tipo).
+
+    Os lotes seguem a pk, então cada um é uma consulta por intervalo de chave.
+    """
+    ultimo = 0
+    while True:
+        resumos = Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO, pk__gt=ultimo)
+        if imovel_ids is not None:
+            resumos = resumos.filter(pk__in=imovel_ids)
+        linhas = list(
+            resumos.order_by('pk').values_list(
+                'pk', 'tipo', *[f'resumo__preco_{finalidade}' for finalidade in FINALIDADES]
+            )[:tamanho]
+        )
+        if not linhas:
+            return
+        ultimo = linhas[-1][0]
+        ids = np.array([linha[0] for linha in linhas], dtype=np.int64)
+        tipos = np.array([TIPOS.index(linha[1]) for linha in linhas], dtype=np.int64)
+        precos = np.array(
+            [[np.nan if valor is None else float(valor) for valor in linha[2:]] for linha in linhas],
+            dtype=np.float64
+        )
+        yield ids, precos, tipos
+
+
+def pontuar(clientes, precos, tipos):
+    """
+    Notas (clientes x imóveis) de 0 a 100, -inf onde não há compatibilidade,
+    e a finalidade usada em cada par (índice em FINALIDADES).
+    """
+    sem_orcamento = np.isnan(clientes.orcamento)[:, None, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        razao = precos[None, :, :] / clientes.orcamento[:, None, None]
+        # Até o orçamento: 1 a partir de 70% dele, caindo para 0.3 nos imóveis muito mais baratos.
+        # Acima: de 1 a 0.5 dentro da tolerância.
+        nota_orcamento = np.where(
+            razao <= 1,
+            1 - np.clip(0.7 - razao, 0, 0.7),
+            1 - (razao - 1) * (0.5 / TOLERANCIA_ORCAMENTO),
+        )
+        valido = (
+            clientes.aceita[:, None, :]
+            & ~np.isnan(precos)[None, :, :]
+            & (sem_orcamento | (razao <= 1 + TOLERANCIA_ORCAMENTO))
+        )
+    nota_orcamento = np.where(sem_orcamento, 0.5, nota_orcamento)
+    nota_orcamento = np.where(valido, nota_orcamento, -np.inf)
+    finalidade = nota_orcamento.argmax(axis=2)
+    melhor_orcamento = nota_orcamento.max(axis=2)
+
+    nota_tipo = np.where(clientes.tem_preferencia[:, None], clientes.tipos[:, tipos], 0.5)
+    # Arredondada como é gravada, para a execução incremental desempatar igual à completa
+    notas = np.round(100 * (PESO_ORCAMENTO * melhor_orcamento + PESO_TIPO * nota_tipo), 2)
+    return notas, finalidade
+
+
+class _Melhores:
+    """
+    As ``top`` maiores notas de cada cliente, acumuladas lote a lote.
+
+    Empates ficam com o imóvel de menor pk, para o resultado não depender da
+    ordem dos lotes.
+    """
+
+    def __init__(self, quantidade_clientes, top):
+        self.top = top
+        self.notas = np.full((quantidade_clientes, 0), -np.inf)
+        self.imoveis = np.zeros((quantidade_clientes, 0), dtype=np.int64)
+        self.finalidades = np.zeros((quantidade_clientes, 0), dtype=np.int64)
+
+    def acrescentar(self, notas, imoveis, finalidades):
+        notas = np.hstack([self.notas, notas])
+        imoveis = np.hstack([self.imoveis, np.broadcast_to(imoveis, notas[:, self.notas.shape[1]:].shape)])
+        finalidades = np.hstack([self.finalidades, finalidades])
+        escolhidos = np.lexsort((imoveis, -notas), axis=1)[:, :self.top]
+        linhas = np.arange(notas.shape[0])[:, None]
+        self.notas = notas[linhas, escolhidos]
+        self.imoveis = imoveis[linhas, escolhidos]
+        self.finalidades = finalidades[linhas, escolhidos]
+
+    def por_cliente(self, cliente_ids):
+        """{cliente_id: [(imovel_id, nota, finalidade)]}, da maior nota para a menor"""
+        return {
+            cliente_id: [
+                (int(imovel_id), float(nota), FINALIDADES[finalidade])
+                for imovel_id, nota, finalidade in zip(self.imoveis[linha], self.notas[linha], self.finalidades[linha])
+                if np.isfinite(nota)
+            ]
+            for linha, cliente_id in enumerate(cliente_ids.tolist())
+        }
+
+
+def _varrer(clientes, top, imovel_ids=None, melhores=None):
+    """Pontua os clientes contra os imóveis ativos (todos ou ``imovel_ids``), lote a lote"""
+    melhores = melhores or _Melhores(len(clientes), top)
+    tamanho = max(1, ELEMENTOS_POR_LOTE // max(1, len(clientes) * len(FINALIDADES)))
+    avaliados = 0
+    for ids, precos, tipos in lotes_de_imoveis(tamanho, imovel_ids):
+        notas, finalidades = pontuar(clientes, precos, tipos)
+        melhores.acrescentar(notas, ids, finalidades)
+        avaliados += len(ids)
+    return melhores, avaliados
+
+
+def _gravar(sugestoes):
+    """Substitui as sugestões dos clientes de ``sugestoes`` ({cliente_id: [(imovel_id, nota, finalidade)]})"""
+    valores = {
+        (imovel_id, finalidade): None
+        for lista in sugestoes.values() for imovel_id, _, finalidade in lista
+    }
+    if valores:
+        for imovel_id, finalidade, valor in PrecoPorFinalidade.objects.filter(
+            imovel_id__in={imovel_id for imovel_id, _ in valores}
+        ).values_list('imovel_id', 'finalidade', 'valor'):
+            valores[(imovel_id, finalidade)] = valor
+
+    CompatibilidadeCliente.objects.filter(cliente_id__in=list(sugestoes)).delete()
+    CompatibilidadeCliente.objects.bulk_create([
+        CompatibilidadeCliente(
+            cliente_id=cliente_id, imovel_id=imovel_id, pontuacao=nota,
+            finalidade=finalidade, valor=valores[(imovel_id, finalidade)]
+        )
+        for cliente_id, lista in sugestoes.items()
+        for imovel_id, nota, finalidade in lista
+    ], batch_size=1000)
+
+
+def _limpar_encerrados():
+    """Remove sugestões de clientes encerrados e de imóveis que saíram do ar"""
+    CompatibilidadeCliente.objects.exclude(cliente__status__in=STATUS_ABERTOS).delete()
+    CompatibilidadeCliente.objects.exclude(imovel__status=Imovel.StatusImovel.ATIVO).delete()
+
+
+def recalcular(cliente_ids=None, top=TOP):
+    """Varredura completa dos clientes em aberto (todos ou ``cliente_ids``). Retorna (clientes, imóveis)."""
+    clientes = carregar_clientes(cliente_ids)
+    melhores, avaliados = _varrer(clientes, top)
+    with transaction.atomic():
+        _limpar_encerrados()
+        _gravar(melhores.por_cliente(clientes.ids))
+    return len(clientes), avaliados
+
+
+def recalcular_incremental(desde, top=TOP):
+    """
+    Atualiza as sugestões considerando só o que mudou desde ``desde``.
+
+    Clientes alterados, e os que tinham entre as sugestões um imóvel
+    alterado, são varridos por completo; os demais mantêm as sugestões atuais
+    e só são comparados com os imóveis alterados.
+    Retorna (clientes regravados, imóveis avaliados).
+    """
+    imoveis_alterados = set(Imovel.objects.filter(atualizado_em__gte=desde).values_list('pk', flat=True))
+    # Quem já tinha um imóvel alterado entre as sugestões pode ter perdido uma vaga
+    # que só a varredura completa preenche
+    clientes_alterados = set(
+        Cliente.objects.filter(status__in=STATUS_ABERTOS).filter(
+            Q(atualizado_em__gte=desde) | Q(compatibilidades__imovel_id__in=imoveis_alterados)
+        ).values_list('pk', flat=True)
+    )
+
+    with transaction.atomic():
+        _limpar_encerrados()
+
+    regravados, avaliados = 0, 0
+    if clientes_alterados:
+        regravados, avaliados = recalcular(clientes_alterados, top)
+    if not imoveis_alterados:
+        return regravados, avaliados
+
+    demais = carregar_clientes(excluir=clientes_alterados)
+
+    # Sugestões atuais; nenhuma delas é de imóvel alterado
+    atuais = {}
+    for cliente_id, imovel_id, nota, finalidade in CompatibilidadeCliente.objects.filter(
+        cliente_id__in=demais.ids.tolist()
+    ).values_list('cliente_id', 'imovel_id', 'pontuacao', 'finalidade'):
+        atuais.setdefault(cliente_id, []).append((imovel_id, nota, finalidade))
+
+    melhores = _Melhores(len(demais), top)
+    largura = max([len(lista) for lista in atuais.values()] + [0])
+    notas = np.full((len(demais), largura), -np.inf)
+    imoveis = np.zeros((len(demais), largura), dtype=np.int64)
+    finalidades = np.zeros((len(demais), largura), dtype=np.int64)
+    for linha, cliente_id in enumerate(demais.ids.tolist()):
+        for coluna, (imovel_id, nota, finalidade) in enumerate(atuais.get(cliente_id, [])):
+            notas[linha, coluna], imoveis[linha, coluna] = nota, imovel_id
+            finalidades[linha, coluna] = FINALIDADES.index(finalidade)
+    melhores.notas, melhores.imoveis, melhores.finalidades = notas, imoveis, finalidades
+
+    melhores, avaliados_agora = _varrer(demais, top, imoveis_alterados, melhores)
+    novas = melhores.por_cliente(demais.ids)
+
+    # Só regrava quem teve a lista alterada
+    mudaram = {
+        cliente_id: lista for cliente_id, lista in novas.items()
+        if lista != sorted(atuais.get(cliente_id, []), key=lambda item: (-item[1], item[0]))
+    }
+    with transaction.atomic():
+        _gravar(mudaram)
+    return regravados + len(mudaram), avaliados + avaliados_agora
+
+
+def executar(incremental=False, top=TOP):
+    """Roda o motor e registra a execução; a incremental sem execução anterior vira completa"""
+    anterior = ExecucaoCompatibilidade.objects.filter(concluido_em__isnull=False).first()
+    modo = ExecucaoCompatibilidade.Modo.INCREMENTAL if incremental and anterior else ExecucaoCompatibilidade.Modo.COMPLETA
+    execucao = ExecucaoCompatibilidade.objects.create(modo=modo, iniciado_em=timezone.now())
+
+    if modo == ExecucaoCompatibilidade.Modo.INCREMENTAL:
+        clientes, imoveis = recalcular_incremental(anterior.iniciado_em, top)
+    else:
+        clientes, imoveis = recalcular(top=top)
+
+    execucao.concluido_em = timezone.now()
+    execucao.clientes, execucao.imoveis = clientes, imoveis
+    execucao.save(update_fields=['concluido_em', 'clientes', 'imoveis'])
+    return execucao
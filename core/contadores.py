@@ -0,0 +1,204 @@
+"""
+Contadores de acesso dos imóveis, gravados em segundo plano (write-behind).
+
+Cada abertura da página de detalhe conta uma visualização e cada card
+mostrado na home ou na listagem conta uma impressão. As contagens ficam em
+memória no processo e vão para ``AcessoImovelDiario`` (uma linha por imóvel e
+dia) em um único upsert por gravação, feito por uma thread do próprio
+processo:
+
+- a cada CONTADORES_INTERVALO segundos (padrão 30);
+- antes disso, quando se acumulam CONTADORES_EVENTOS_POR_GRAVACAO eventos
+  (padrão 1000);
+- na saída do processo (``atexit``).
+
+A requisição só incrementa um dicionário; nenhuma escrita no banco acontece
+no caminho da página. O que estava em memória quando o processo morreu sem
+encerrar normalmente se perde: os números servem para ranking e tendência,
+não para cobrança.
+
+Com CONTADORES_ATIVOS = False nada é contado.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import escritor
+from .models import AcessoImovelDiario, Imovel
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = 500
+
+
+def ativos():
+    return getattr(settings, 'CONTADORES_ATIVOS', True)
+
+
+def intervalo():
+    return getattr(settings, 'CONTADORES_INTERVALO', 30)
+
+
+def eventos_por_gravacao():
+    return getattr(settings, 'CONTADORES_EVENTOS_POR_GRAVACAO', 1000)
+
+
+class Contadores:
+    """Contagens pendentes do processo, por (imóvel, dia), e a thread que as grava"""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._visualizacoes = Counter()
+        self._impressoes = Counter()
+        self._eventos = 0
+        self._acordar = threading.Event()
+        self._thread = None
+
+    def registrar(self, visualizacoes=(), impressoes=()):
+        if not ativos():
+            return
+        dia = timezone.localdate()
+        with self._trava:
+            for imovel_id in visualizacoes:
+                self._visualizacoes[imovel_id, dia] += 1
+                self._eventos += 1
+            for imovel_id in impressoes:
+                self._impressoes[imovel_id, dia] += 1
+                self._eventos += 1
+            cheio = self._eventos >= eventos_por_gravacao()
+            if self._thread is None:
+                self._iniciar()
+        if cheio:
+            self._acordar.set()
+
+    def _iniciar(self):
+        # Só no primeiro evento: comandos e migrações não abrem a thread
+        self._thread = threading.Thread(target=self._laco, name='contadores-acesso', daemon=True)
+        self._thread.start()
+        atexit.register(self.gravar)
+
+    def _laco(self):
+        while True:
+            self._acordar.wait(intervalo())
+            self._acordar.clear()
+            try:
+                self.gravar()
+            except Exception:
+                logger.exception('Falha ao gravar os contadores de acesso')
+            finally:
+                close_old_connections()
+
+    def _retirar(self):
+        with self._trava:
+            visualizacoes, impressoes = self._visualizacoes, self._impressoes
+            self._visualizacoes, self._impressoes, self._eventos = Counter(), Counter(), 0
+        return visualizacoes, impressoes
+
+    def _devolver(self, visualizacoes, impressoes):
+        with self._trava:
+            self._visualizacoes.update(visualizacoes)
+            self._impressoes.update(impressoes)
+            self._eventos += sum(visualizacoes.values()) + sum(impressoes.values())
+
+    def gravar(self):
+        """Soma as contagens pendentes às linhas diárias. Retorna quantas linhas (imóvel, dia) gravou."""
+        visualizacoes, impressoes = self._retirar()
+        chaves = list(visualizacoes.keys() | impressoes.keys())
+        if not chaves:
+            return 0
+        try:
+            return escritor.executar(_gravar_linhas, chaves, visualizacoes, impressoes)
+        except Exception:
+            # Tenta de novo na próxima gravação
+            self._devolver(visualizacoes, impressoes)
+            raise
+
+
+def _gravar_linhas(chaves, visualizacoes, impressoes):
+    gravadas = 0
+    with transaction.atomic():
+        for inicio in range(0, len(chaves), TAMANHO_LOTE):
+            gravadas += _somar([
+                (imovel_id, dia, visualizacoes[imovel_id, dia], impressoes[imovel_id, dia])
+                for imovel_id, dia in chaves[inicio:inicio + TAMANHO_LOTE]
+            ])
+    return gravadas
+
+
+def _somar(linhas):
+    # Imóveis excluídos depois de vistos ficam de fora (a chave estrangeira recusaria a linha)
+    existentes = set(Imovel.objects.filter(pk__in={linha[0] for linha in linhas}).values_list('pk', flat=True))
+    linhas = [linha for linha in linhas if linha[0] in existentes]
+    if not linhas:
+        return 0
+    tabela = connection.ops.quote_name(AcessoImovelDiario._meta.db_table)
+    # Incremento no próprio banco: vários processos gravam nas mesmas linhas sem ler antes
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {tabela} (imovel_id, dia, visualizacoes, impressoes) VALUES (%s, %s, %s, %s) '
+            f'ON CONFLICT (imovel_id, dia) DO UPDATE SET '
+            f'visualizacoes = {tabela}.visualizacoes + excluded.visualizacoes, '
+            f'impressoes = {tabela}.impressoes + excluded.impressoes',
+            linhas,
+        )
+    return len(linhas)
+
+
+contadores = Contadores()
+
+
+def registrar_visualizacao(imovel_id):
+    contadores.registrar(visualizacoes=[imovel_id])
+
+
+def registrar_impressoes(imovel_ids):
+    contadores.registrar(impressoes=imovel_ids)
+
+
+def conta_visualizacao(view):
+    """
+    Decorador da página de detalhe: conta a visualização nas respostas 200 e
+    304 (o visitante viu a página, montada agora ou guardada no navegador).
+    Vai por fora de ``pagina_publica`` para enxergar também os 304.
+    """
+    @wraps(view)
+    def _view(request, pk, *args, **kwargs):
+        response = view(request, pk, *args, **kwargs)
+        if request.method == 'GET' and response.status_code in (200, 304):
+            registrar_visualizacao(int(pk))
+        return response
+    return _view
+
+
+def visualizacoes_recentes(dias=30, campo='pk'):
+    """Soma das visualizações dos últimos ``dias`` para anotar consultas de imóveis (0 sem acessos)"""
+    desde = timezone.localdate() - timedelta(days=dias - 1)
+    total = AcessoImovelDiario.objects.filter(imovel=OuterRef(campo), dia__gte=desde).order_by().values(
+        'imovel'
+    ).annotate(total=Sum('visualizacoes')).values('total')
+    return Coalesce(Subquery(total, output_field=IntegerField()), Value(0))
+
+
+def mais_vistos(dias=30, limite=10):
+    """Imóveis ativos mais vistos nos últimos ``dias``, com o total em ``visualizacoes_periodo``"""
+    desde = timezone.localdate() - timedelta(days=dias - 1)
+    ranking = AcessoImovelDiario.objects.filter(
+        dia__gte=desde, imovel__status=Imovel.StatusImovel.ATIVO
+    ).values('imovel').annotate(total=Sum('visualizacoes')).filter(total__gt=0).order_by('-total', 'imovel')[:limite]
+    totais = {linha['imovel']: linha['total'] for linha in ranking}
+    imoveis = Imovel.objects.in_bulk(list(totais))
+    resultado = []
+    for imovel_id, total in totais.items():
+        imovel = imoveis[imovel_id]
+        imovel.visualizacoes_periodo = total
+        resultado.append(imovel)
+    return resultado
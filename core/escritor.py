@@ -0,0 +1,61 @@
+"""
+Fila única das escritas em segundo plano do processo.
+
+Os contadores de acesso, a fila de leads e as variantes de fotos gravam em
+threads próprias. Com ESCRITOR_UNICO = True essas gravações passam por uma
+só thread, uma de cada vez: entre si elas nunca disputam a trava de escrita
+do SQLite, e as requisições do admin concorrem com no máximo uma escrita de
+fundo por processo. Sem a opção (padrão) cada uma grava na própria thread.
+
+``executar(funcao, *args)`` espera a gravação terminar e devolve o resultado
+ou levanta a exceção, então quem chama trata erros como antes.
+"""
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def ativo():
+    return getattr(settings, 'ESCRITOR_UNICO', False)
+
+
+class Escritor:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._fila = queue.Queue()
+        self._thread = None
+
+    def executar(self, funcao, *args, **kwargs):
+        # Na própria thread do escritor (uma gravação que chama outra) a fila travaria
+        if not ativo() or threading.current_thread() is self._thread:
+            return funcao(*args, **kwargs)
+        with self._trava:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._laco, name='escritor-unico', daemon=True)
+                self._thread.start()
+        futuro = Future()
+        self._fila.put((futuro, funcao, args, kwargs))
+        return futuro.result()
+
+    def _laco(self):
+        while True:
+            futuro, funcao, args, kwargs = self._fila.get()
+            try:
+                futuro.set_result(funcao(*args, **kwargs))
+            except Exception as erro:
+                futuro.set_exception(erro)
+            finally:
+                close_old_connections()
+
+
+escritor = Escritor()
+
+
+def executar(funcao, *args, **kwargs):
+    return escritor.executar(funcao, *args, **kwargs)
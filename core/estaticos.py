@@ -0,0 +1,158 @@
+"""
+Arquivos estáticos de produção: nome com hash do conteúdo e cópias comprimidas.
+
+O CSS e o JS do site e do admin ficam em static/ (css/site.css, css/home.css,
+js/detalhe.js...), e não mais dentro dos templates: o navegador baixa cada
+arquivo uma vez e o reaproveita em todas as páginas.
+
+- ``EstaticosComprimidos`` (STORAGES['staticfiles'] fora do DEBUG) é o
+  ManifestStaticFilesStorage do Django: o ``collectstatic`` grava cada arquivo
+  também com o hash do conteúdo no nome (``css/site.3f2a9c1b7e4d.css``) e o
+  ``{% static %}`` passa a apontar para essa versão. Em seguida grava, ao lado
+  de cada arquivo de texto, as cópias ``.gz`` e ``.br`` (esta só com o pacote
+  ``brotli`` instalado), comprimidas uma vez no nível máximo.
+- ``servir`` entrega STATIC_ROOT quando o próprio Django responde /static/:
+  a cópia comprimida que o navegador aceita e, para os nomes com hash,
+  ``Cache-Control: public, max-age=31536000, immutable``. Um arquivo alterado
+  ganha outro nome, então o navegador nunca precisa revalidar o antigo.
+
+Com um servidor web na frente, ele faz o papel de ``servir``; no nginx::
+
+    location /static/ {
+        alias /caminho/para/staticfiles/;
+        gzip_static on;
+        brotli_static on;  # módulo ngx_brotli
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+"""
+import gzip
+import logging
+import mimetypes
+import os
+from functools import cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Só vale comprimir texto; imagens e fontes woff já vêm comprimidas
+EXTENSOES_TEXTO = ('.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.xml', '.html', '.ico', '.ttf', '.eot')
+
+# Abaixo disso o cabeçalho do gzip come o ganho
+TAMANHO_MINIMO = 256
+
+# Em ordem de preferência: codificação do Accept-Encoding -> extensão da cópia
+CODIFICACOES = {'br': '.br', 'gzip': '.gz'}
+
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+# Nomes sem hash (referências antigas, arquivos fora do manifesto) mudam de conteúdo no deploy
+CACHE_SEM_HASH = 'public, max-age=300'
+
+
+def comprimir(conteudo):
+    """Cópias comprimidas de ``conteudo``: extensão -> bytes, só as que ficam menores que o original"""
+    if len(conteudo) < TAMANHO_MINIMO:
+        return {}
+    # mtime=0: o mesmo arquivo gera sempre o mesmo .gz
+    copias = {'.gz': gzip.compress(conteudo, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        copias['.br'] = brotli.compress(conteudo, mode=brotli.MODE_TEXT, quality=11)
+    return {extensao: dados for extensao, dados in copias.items() if len(dados) < len(conteudo)}
+
+
+class EstaticosComprimidos(ManifestStaticFilesStorage):
+    """Manifesto com hash no nome e, no collectstatic, cópias .gz e .br dos arquivos de texto"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        if brotli is None:
+            logger.warning('Pacote brotli não instalado: só as cópias .gz foram geradas')
+        # Os originais (referências sem hash continuam funcionando) e as versões com hash
+        nomes = {*paths, *self.hashed_files.values()}
+        comprimidos = 0
+        for nome in sorted(nomes):
+            if nome.lower().endswith(EXTENSOES_TEXTO) and self.exists(nome):
+                comprimidos += self._gravar_copias(nome)
+        logger.info('%d cópias comprimidas gravadas em %s', comprimidos, self.location)
+
+    def _gravar_copias(self, nome):
+        with self.open(nome) as arquivo:
+            conteudo = arquivo.read()
+        copias = comprimir(conteudo)
+        for extensao, dados in copias.items():
+            # Sem o delete o storage gravaria com outro nome, como no post_process do Django
+            if self.exists(nome + extensao):
+                self.delete(nome + extensao)
+            self._save(nome + extensao, ContentFile(dados))
+        return len(copias)
+
+
+@cache
+def _nomes_com_hash():
+    # O manifesto é lido uma vez por processo; um deploy novo reinicia os processos
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def _aceitas(cabecalho):
+    """Codificações do Accept-Encoding, sem as recusadas com q=0"""
+    aceitas = set()
+    for parte in cabecalho.split(','):
+        nome, _, parametros = parte.partition(';')
+        parametros = parametros.replace(' ', '')
+        if parametros.startswith('q='):
+            try:
+                if float(parametros[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        aceitas.add(nome.strip().lower())
+    return aceitas
+
+
+@require_safe
+def servir(request, caminho):
+    """Arquivo de STATIC_ROOT, na cópia comprimida aceita pelo navegador e com cache longo se tiver hash"""
+    try:
+        arquivo = safe_join(settings.STATIC_ROOT, caminho)
+    except SuspiciousFileOperation:
+        raise Http404
+    # As cópias comprimidas só saem como Content-Encoding do original
+    if not os.path.isfile(arquivo) or arquivo.endswith(tuple(CODIFICACOES.values())):
+        raise Http404
+
+    estado = os.stat(arquivo)
+    if not was_modified_since(request.headers.get('If-Modified-Since'), estado.st_mtime):
+        return HttpResponseNotModified()
+
+    content_type, _ = mimetypes.guess_type(arquivo)
+    aceitas = _aceitas(request.headers.get('Accept-Encoding', ''))
+    codificacao = next(
+        (nome for nome, extensao in CODIFICACOES.items() if nome in aceitas and os.path.isfile(arquivo + extensao)),
+        None,
+    )
+    servido = arquivo + CODIFICACOES[codificacao] if codificacao else arquivo
+    response = FileResponse(open(servido, 'rb'), content_type=content_type or 'application/octet-stream')
+    if codificacao:
+        response.headers['Content-Encoding'] = codificacao
+    if caminho.lower().endswith(EXTENSOES_TEXTO):
+        patch_vary_headers(response, ['Accept-Encoding'])
+    response.headers['Last-Modified'] = http_date(estado.st_mtime)
+    response.headers['Cache-Control'] = CACHE_IMUTAVEL if caminho in _nomes_com_hash() else CACHE_SEM_HASH
+    return response
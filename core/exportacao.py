@@ -0,0 +1,191 @@
+"""
+Feed de exportação dos imóveis para os portais (XML ou JSON).
+
+Os imóveis são lidos em blocos pela pk (keyset, sem OFFSET), cada bloco com
+preços, fotos e infraestrutura em três consultas de prefetch, e cada imóvel
+é escrito assim que é lido: o consumo de memória depende do tamanho do bloco,
+não do catálogo. O gerador serve tanto o ``StreamingHttpResponse`` de
+``views.feed_imoveis`` quanto o arquivo (gzip ou não) do comando
+``exportar_feed``.
+
+O XML usa as mesmas tags lidas por ``importacao.ler_xml``. Com ``desde`` o
+feed é incremental: traz os imóveis com ``atualizado_em`` a partir dessa data,
+em qualquer status, para que o portal também retire os que deixaram de estar
+ativos. O ``gerado_em`` do cabeçalho serve de ``desde`` da próxima exportação.
+"""
+import gzip
+import json
+import os
+import tempfile
+from decimal import Decimal
+from xml.etree.ElementTree import Element, SubElement, tostring
+from xml.sax.saxutils import quoteattr
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.urls import reverse
+from django.utils import timezone
+
+from .importacao import CAMPOS_BOOLEANOS, CAMPOS_DECIMAIS, CAMPOS_INTEIROS, CAMPOS_TEXTO
+from .models import FotoImovel, Imovel, PrecoPorFinalidade
+
+FORMATOS = {
+    'xml': 'application/xml; charset=utf-8',
+    'json': 'application/json; charset=utf-8',
+}
+
+CAMPOS_EXTRAS_TEMPORADA = ['diaria_minima', 'taxa_limpeza', 'capacidade_hospedes']
+
+
+def tamanho_bloco():
+    return getattr(settings, 'EXPORTACAO_TAMANHO_BLOCO', 500)
+
+
+def _consulta():
+    return Imovel.objects.defer('geohash').prefetch_related(
+        Prefetch('precos', queryset=PrecoPorFinalidade.objects.order_by('finalidade')),
+        Prefetch('fotos', queryset=FotoImovel.objects.only('imovel_id', 'imagem', 'legenda', 'eh_capa', 'ordem')),
+        'infraestrutura',
+    )
+
+
+def imoveis_em_blocos(desde=None, tamanho=None):
+    """Imóveis do feed em ordem de pk, lidos ``tamanho`` por vez"""
+    tamanho = tamanho or tamanho_bloco()
+    if desde is not None:
+        # O índice de atualizado_em acha os alterados; os blocos saem deles pela pk
+        ids = sorted(Imovel.objects.filter(atualizado_em__gte=desde).values_list('pk', flat=True))
+        for inicio in range(0, len(ids), tamanho):
+            yield from _consulta().filter(pk__in=ids[inicio:inicio + tamanho]).order_by('pk')
+        return
+
+    ativos = _consulta().filter(status=Imovel.StatusImovel.ATIVO).order_by('pk')
+    ultimo = 0
+    while True:
+        bloco = list(ativos.filter(pk__gt=ultimo)[:tamanho])
+        if not bloco:
+            return
+        yield from bloco
+        ultimo = bloco[-1].pk
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'sim' if valor else 'nao'
+    return str(valor)
+
+
+def registro(imovel, url_base=''):
+    """Dados de um imóvel no feed; decimais como texto, como em api.serializar"""
+    dados = {'codigo': imovel.codigo_externo or str(imovel.pk), 'id': imovel.pk}
+    for campo in ['tipo', 'status', 'mobilia'] + CAMPOS_TEXTO + CAMPOS_INTEIROS + CAMPOS_BOOLEANOS:
+        dados[campo] = getattr(imovel, campo)
+    for campo in CAMPOS_DECIMAIS:
+        valor = getattr(imovel, campo)
+        dados[campo] = None if valor is None else str(valor)
+    dados['ano_construcao'] = imovel.ano_construcao
+    dados['url'] = url_base + reverse('core:detalhe_imovel', args=[imovel.pk])
+    dados['atualizado_em'] = imovel.atualizado_em.isoformat()
+
+    precos = []
+    for preco in imovel.precos.all():
+        item = {'finalidade': preco.finalidade, 'valor': str(preco.valor)}
+        if preco.finalidade == PrecoPorFinalidade.Finalidade.TEMPORADA:
+            for campo in CAMPOS_EXTRAS_TEMPORADA:
+                valor = getattr(preco, campo)
+                item[campo] = str(valor) if isinstance(valor, Decimal) else valor
+        precos.append(item)
+    dados['precos'] = precos
+    dados['infraestrutura'] = [infra.nome for infra in imovel.infraestrutura.all()]
+    dados['fotos'] = [
+        {'url': url_base + foto.imagem.url, 'legenda': foto.legenda, 'capa': foto.eh_capa}
+        for foto in imovel.fotos.all()
+    ]
+    return dados
+
+
+def _xml_imovel(dados):
+    elemento = Element('imovel', codigo=dados['codigo'])
+    for campo, valor in dados.items():
+        if campo in ('codigo', 'precos', 'infraestrutura', 'fotos'):
+            continue
+        SubElement(elemento, campo).text = _texto(valor)
+    precos = SubElement(elemento, 'precos')
+    for preco in dados['precos']:
+        atributos = {campo: _texto(valor) for campo, valor in preco.items() if campo != 'valor' and valor is not None}
+        SubElement(precos, 'preco', atributos).text = preco['valor']
+    infraestrutura = SubElement(elemento, 'infraestrutura')
+    for nome in dados['infraestrutura']:
+        SubElement(infraestrutura, 'item').text = nome
+    fotos = SubElement(elemento, 'fotos')
+    for foto in dados['fotos']:
+        atributos = {'capa': _texto(foto['capa'])}
+        if foto['legenda']:
+            atributos['legenda'] = foto['legenda']
+        SubElement(fotos, 'foto', atributos).text = foto['url']
+    return tostring(elemento, encoding='unicode')
+
+
+def gerar_feed(formato='xml', desde=None, url_base='', tamanho=None, estatisticas=None):
+    """
+    Partes (str) do feed, em ordem; ``formato`` é 'xml' ou 'json'. Se
+    ``estatisticas`` (dict) é passado, recebe o total em 'imoveis'.
+    """
+    gerado_em = timezone.now().isoformat()
+    if estatisticas is None:
+        estatisticas = {}
+    estatisticas['imoveis'] = 0
+
+    def contar(imovel):
+        estatisticas['imoveis'] += 1
+        return registro(imovel, url_base)
+
+    imoveis = (contar(imovel) for imovel in imoveis_em_blocos(desde, tamanho))
+
+    if formato == 'json':
+        cabecalho = {'gerado_em': gerado_em, 'desde': desde.isoformat() if desde else None}
+        # Sem o '}' final, para continuar o objeto com a lista de imóveis
+        yield json.dumps(cabecalho)[:-1] + ', "imoveis": ['
+        for posicao, dados in enumerate(imoveis):
+            yield (',\n' if posicao else '\n') + json.dumps(dados, cls=DjangoJSONEncoder, ensure_ascii=False)
+        yield '\n]}\n'
+        return
+
+    atributos = f' gerado_em={quoteattr(gerado_em)}'
+    if desde is not None:
+        atributos += f' desde={quoteattr(desde.isoformat())}'
+    yield f'<?xml version="1.0" encoding="UTF-8"?>\n<imoveis{atributos}>\n'
+    for dados in imoveis:
+        yield _xml_imovel(dados) + '\n'
+    yield '</imoveis>\n'
+
+
+def exportar_arquivo(caminho, formato='xml', desde=None, url_base='', comprimir=None, tamanho=None):
+    """
+    Grava o feed em ``caminho`` (gzip se ``comprimir`` ou se termina em .gz) e
+    retorna o número de imóveis. O arquivo é escrito ao lado e renomeado no
+    final, então quem lê o feed nunca vê um arquivo pela metade.
+    """
+    if comprimir is None:
+        comprimir = caminho.endswith('.gz')
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, prefix='.feed-')
+    estatisticas = {}
+    try:
+        with os.fdopen(descritor, 'wb') as bruto:
+            saida = gzip.GzipFile(fileobj=bruto, mode='wb') if comprimir else bruto
+            try:
+                for parte in gerar_feed(formato, desde, url_base, tamanho, estatisticas):
+                    saida.write(parte.encode('utf-8'))
+            finally:
+                if comprimir:
+                    saida.close()
+        os.chmod(temporario, 0o644)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+    return estatisticas['imoveis']
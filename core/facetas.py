@@ -0,0 +1,110 @@
+"""
+Facetas dos filtros de busca (cidades, infraestruturas, tipos e quartos).
+
+As listas usadas para montar os filtros ficam no cache compartilhado entre
+os processos e são invalidadas pelos signals de core.signals somente quando
+muda o status ou a cidade de um imóvel, ou quando uma infraestrutura é
+editada. Gravações que não passam pelos signals (um ``update()``, outro
+servidor com outro cache) aparecem depois de ``FACETAS_LISTAS_TTL``
+segundos (padrão 600), o prazo das listas no cache.
+
+As contagens por faceta do filtro atual saem de uma única consulta agrupada
+e ficam no cache por alguns minutos.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Value, When
+
+from .models import Imovel, InfraCondominio, PrecoPorFinalidade
+from .paginacao import chave_por_filtros
+
+CHAVE_CIDADES = 'facetas:cidades'
+CHAVE_INFRAESTRUTURAS = 'facetas:infraestruturas'
+
+# Faixas de quartos dos filtros "N+" da listagem
+QUARTOS_MINIMOS = [1, 2, 3, 4]
+
+
+def tempo_listas():
+    return getattr(settings, 'FACETAS_LISTAS_TTL', 600)
+
+
+def cidades_ativas():
+    """Cidades com pelo menos um imóvel ativo, em ordem alfabética"""
+    return cache.get_or_set(
+        CHAVE_CIDADES,
+        lambda: list(
+            Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO)
+            .values_list('cidade', flat=True).distinct().order_by('cidade')
+        ),
+        tempo_listas()
+    )
+
+
+def infraestruturas():
+    return cache.get_or_set(
+        CHAVE_INFRAESTRUTURAS,
+        lambda: list(InfraCondominio.objects.order_by('nome')),
+        tempo_listas()
+    )
+
+
+def listas_de_escolha():
+    """Opções fixas dos filtros; vêm das choices dos modelos, sem consulta"""
+    return {
+        'tipos': Imovel.TipoImovel.choices,
+        'finalidades': PrecoPorFinalidade.Finalidade.choices,
+        'mobilias': Imovel.Mobilia.choices,
+    }
+
+
+def invalidar_cidades():
+    cache.delete(CHAVE_CIDADES)
+
+
+def invalidar_infraestruturas():
+    cache.delete(CHAVE_INFRAESTRUTURAS)
+
+
+def _calcular_contagens(queryset):
+    faixa_quartos = Case(
+        *[When(quartos=n, then=Value(str(n))) for n in range(QUARTOS_MINIMOS[-1])],
+        default=Value(f'{QUARTOS_MINIMOS[-1]}+'),
+        output_field=CharField()
+    )
+    # Um único GROUP BY (cidade, tipo, faixa); as facetas são somadas em Python.
+    # Cada imóvel cai em exatamente um grupo, então as somas não duplicam.
+    linhas = (
+        queryset.order_by()
+        .values('cidade', 'tipo', faixa=faixa_quartos)
+        .annotate(total=Count('pk', distinct=True))
+    )
+
+    cidades, tipos, faixas = {}, {}, {}
+    for linha in linhas:
+        cidades[linha['cidade']] = cidades.get(linha['cidade'], 0) + linha['total']
+        tipos[linha['tipo']] = tipos.get(linha['tipo'], 0) + linha['total']
+        faixa = int(linha['faixa'].rstrip('+'))
+        faixas[faixa] = faixas.get(faixa, 0) + linha['total']
+
+    return {
+        'cidades': cidades,
+        'tipos': tipos,
+        'quartos': {
+            minimo: sum(total for faixa, total in faixas.items() if faixa >= minimo)
+            for minimo in QUARTOS_MINIMOS
+        },
+    }
+
+
+def contagens_por_faceta(queryset, filtros):
+    """
+    Imóveis do ``queryset`` filtrado por cidade, por tipo e por mínimo de quartos.
+
+    ``filtros`` identifica o conjunto de filtros na chave do cache.
+    """
+    return cache.get_or_set(
+        chave_por_filtros('facetas:contagens', filtros),
+        lambda: _calcular_contagens(queryset),
+        getattr(settings, 'IMOVEIS_CONTAGEM_TTL', 300)
+    )
@@ -0,0 +1,201 @@
+"""
+Filtros e ordenações da listagem de imóveis.
+
+A querystring é lida uma vez por ``ler_filtros`` e o resultado pode ser
+aplicado a um queryset (``aplicar_filtros``/``ordenar``) ou ao motor
+colunar, garantindo a mesma semântica nos dois caminhos. Com busca por
+texto, o índice é consultado uma vez (``buscar_imoveis``) e a mesma lista de
+ids filtra e ordena.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, Min, Value
+from django.db.models.functions import Coalesce
+
+from .busca import buscar_imoveis, filtrar_ids
+from .geo import filtrar_area, ler_geo
+from .paginacao import POR_PAGINA, iterar_por_posicao, paginar_por_cursor, paginar_por_posicao
+
+ORDENACOES = ['relevancia', 'mais_recentes', 'preco_menor', 'preco_maior', 'maior_area', 'distancia']
+
+
+def valor_valido(value):
+    return value and value.strip() and value.strip().lower() not in ['none', '']
+
+
+def _inteiro_positivo(value):
+    try:
+        numero = int(value)
+    except (ValueError, TypeError):
+        return None
+    return numero if numero > 0 else None
+
+
+def _decimal_positivo(value):
+    try:
+        numero = float(value)
+    except (ValueError, TypeError):
+        return None
+    return numero if numero > 0 else None
+
+
+def ler_filtros(params):
+    """Converte a querystring em filtros normalizados; valores inválidos viram None"""
+    def texto(chave):
+        valor = params.get(chave, '').strip()
+        return valor if valor_valido(valor) else None
+
+    def numero(chave, conversor):
+        valor = texto(chave)
+        return conversor(valor) if valor else None
+
+    infraestrutura = []
+    for infra_id in params.getlist('infraestrutura') if hasattr(params, 'getlist') else []:
+        try:
+            infraestrutura.append(int(infra_id))
+        except (ValueError, TypeError):
+            pass
+
+    # Raio em volta de um ponto ou área do mapa
+    geo = ler_geo(params)
+
+    ordenacao = params.get('ordenacao', '').strip()
+    if ordenacao not in ORDENACOES or (ordenacao == 'distancia' and geo is None):
+        ordenacao = 'relevancia'
+    return {
+        'busca': texto('busca'),
+        'finalidade': texto('finalidade'),
+        'tipo': texto('tipo'),
+        'cidade': texto('cidade'),
+        'bairro': texto('bairro'),
+        'quartos': numero('quartos', _inteiro_positivo),
+        'banheiros': numero('banheiros', _inteiro_positivo),
+        'vagas': numero('vagas', _inteiro_positivo),
+        'area_min': numero('area_min', _decimal_positivo),
+        'preco_min': numero('preco_min', _decimal_positivo),
+        'preco_max': numero('preco_max', _decimal_positivo),
+        'mobilia': texto('mobilia'),
+        'pet_friendly': params.get('pet_friendly', '').strip() == 'true',
+        'financiamento': params.get('financiamento', '').strip() == 'true',
+        'com_fotos': params.get('com_fotos', '').strip() == 'true',
+        'infraestrutura': infraestrutura,
+        'geo': geo,
+        'ordenacao': ordenacao,
+    }
+
+
+def filtros_aplicados(params):
+    """Filtros da querystring para o template, sem valores None/vazios nem paginação"""
+    aplicados = {}
+    for key, value in params.items():
+        if key not in ('page', 'cursor') and valor_valido(value):
+            aplicados[key] = value
+
+    # Adicionar listas múltiplas
+    infraestrutura_ids = params.getlist('infraestrutura')
+    if infraestrutura_ids:
+        aplicados['infraestrutura'] = infraestrutura_ids
+    return aplicados
+
+
+def aplicar_filtros(imoveis, filtros, ids_busca=None):
+    """
+    Aplica os filtros ao queryset. A busca textual filtra pelos ``ids_busca``
+    (``buscar_imoveis``), todos os encontrados; sem eles o índice é consultado aqui.
+    """
+    if filtros['busca']:
+        imoveis = filtrar_ids(imoveis, buscar_imoveis(filtros['busca']) if ids_busca is None else ids_busca)
+
+    # Finalidade (venda, aluguel, temporada)
+    if filtros['finalidade']:
+        imoveis = imoveis.filter(precos__finalidade=filtros['finalidade'])
+
+    if filtros['tipo']:
+        imoveis = imoveis.filter(tipo=filtros['tipo'])
+    if filtros['cidade']:
+        imoveis = imoveis.filter(cidade__iexact=filtros['cidade'])
+    if filtros['bairro']:
+        imoveis = imoveis.filter(bairro__icontains=filtros['bairro'])
+
+    # Mínimos de quartos, banheiros, vagas e área
+    if filtros['quartos']:
+        imoveis = imoveis.filter(quartos__gte=filtros['quartos'])
+    if filtros['banheiros']:
+        imoveis = imoveis.filter(banheiros__gte=filtros['banheiros'])
+    if filtros['vagas']:
+        imoveis = imoveis.filter(vagas_garagem__gte=filtros['vagas'])
+    if filtros['area_min']:
+        imoveis = imoveis.filter(area_util__gte=filtros['area_min'])
+
+    # Preço mínimo e máximo
+    if filtros['preco_min']:
+        imoveis = imoveis.filter(precos__valor__gte=filtros['preco_min'])
+    if filtros['preco_max']:
+        imoveis = imoveis.filter(precos__valor__lte=filtros['preco_max'])
+
+    if filtros['mobilia']:
+        imoveis = imoveis.filter(mobilia=filtros['mobilia'])
+    if filtros['pet_friendly']:
+        imoveis = imoveis.filter(pet_friendly=True)
+    if filtros['financiamento']:
+        imoveis = imoveis.filter(aceita_financiamento=True)
+    if filtros['com_fotos']:
+        imoveis = imoveis.filter(fotos__isnull=False)
+
+    # Infraestrutura do condomínio (todas as selecionadas)
+    for infra_id in filtros['infraestrutura']:
+        imoveis = imoveis.filter(infraestrutura=infra_id)
+
+    # Área geográfica (anota distancia_km)
+    if filtros['geo']:
+        imoveis = filtrar_area(imoveis, filtros['geo'])
+
+    # Remover duplicatas (devido aos joins com preços)
+    return imoveis.distinct()
+
+
+def ordenar(imoveis, ordenacao):
+    """
+    Anota as chaves de ordenação. Retorna (queryset, chaves, decrescente) para a
+    paginação por cursor; a última chave é sempre a pk, para desempate.
+    A relevância com busca por texto não passa por aqui (``por_relevancia``).
+    """
+    if ordenacao in ('preco_menor', 'preco_maior'):
+        imoveis = imoveis.annotate(preco_ordem=Coalesce(
+            Min('precos__valor'), Value(Decimal('0')), output_field=DecimalField()
+        ))
+        return imoveis, ['preco_ordem', 'pk'], ordenacao == 'preco_maior'
+    if ordenacao == 'maior_area':
+        imoveis = imoveis.annotate(area_ordem=Coalesce(
+            'area_util', Value(Decimal('0')), output_field=DecimalField()
+        ))
+        return imoveis, ['area_ordem', 'pk'], True
+    if ordenacao == 'mais_recentes':
+        return imoveis, ['criado_em', 'pk'], True
+    if ordenacao == 'distancia':  # distancia_km vem de aplicar_filtros
+        return imoveis, ['distancia_km', 'pk'], False
+    # relevancia (padrão)
+    return imoveis, ['criado_em', 'pk'], True
+
+
+def por_relevancia(filtros, ids_busca):
+    """Relevância com busca por texto: a ordem é a do ranking, e não uma chave do SQL"""
+    return filtros['ordenacao'] == 'relevancia' and ids_busca is not None
+
+
+def paginar(imoveis, filtros, ids_busca=None, cursor=None, por_pagina=POR_PAGINA):
+    """Ordena e pagina; com busca por relevância, o cursor é a posição no ranking"""
+    if por_relevancia(filtros, ids_busca):
+        return paginar_por_posicao(imoveis, ids_busca, cursor, por_pagina)
+    imoveis, chaves, decrescente = ordenar(imoveis, filtros['ordenacao'])
+    return paginar_por_cursor(imoveis, chaves, decrescente, cursor, por_pagina)
+
+
+def em_ordem(imoveis, filtros, ids_busca=None, tamanho=2000):
+    """Todos os imóveis do queryset na ordem da listagem, lidos ``tamanho`` por vez"""
+    if por_relevancia(filtros, ids_busca):
+        return iterar_por_posicao(imoveis, ids_busca, tamanho)
+    imoveis, chaves, decrescente = ordenar(imoveis, filtros['ordenacao'])
+    return imoveis.order_by(*[f'-{chave}' if decrescente else chave for chave in chaves]).iterator(
+        chunk_size=tamanho
+    )
@@ -0,0 +1,26 @@
+from django import forms
+
+from .models import PrecoPorFinalidade
+from .telefones import normalizar_telefone
+
+
+class InteresseForm(forms.Form):
+    """Formulário "Quero ser contatado" do detalhe do imóvel"""
+    nome_completo = forms.CharField(max_length=150, min_length=3)
+    telefone = forms.CharField(max_length=20)
+    email = forms.EmailField(required=False)
+    finalidade = forms.ChoiceField(
+        choices=[('', 'Tanto faz')] + PrecoPorFinalidade.Finalidade.choices, required=False
+    )
+    mensagem = forms.CharField(max_length=1000, required=False, widget=forms.Textarea)
+    # Escondido na página: só robôs preenchem
+    website = forms.CharField(required=False)
+
+    def clean_nome_completo(self):
+        return ' '.join(self.cleaned_data['nome_completo'].split())
+
+    def clean_telefone(self):
+        telefone = self.cleaned_data['telefone'].strip()
+        if len(normalizar_telefone(telefone)) < 10:
+            raise forms.ValidationError('Informe o telefone com DDD.')
+        return telefone
@@ -0,0 +1,182 @@
+"""
+Busca geográfica dos imóveis por raio ou por área do mapa.
+
+Cada imóvel geocodificado guarda o geohash das suas coordenadas
+(``Imovel.geohash``, indexado junto com o status). Uma consulta primeiro
+cobre a área pedida com poucas células de geohash, que viram intervalos
+contíguos lidos pelo índice; depois restringe os candidatos à caixa exata
+de latitude/longitude e só então calcula a distância de haversine, para que
+a trigonometria nunca rode sobre a tabela inteira.
+"""
+import math
+
+from django.conf import settings
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Power, Radians, Sin, Sqrt
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precisão gravada no banco (células de ~5 m)
+PRECISAO = 9
+
+RAIO_TERRA_KM = 6371.0088
+KM_POR_GRAU = 111.32
+
+# Limite de células da cobertura; a precisão é a maior que cabe nele
+MAX_CELULAS = 32
+
+RAIO_MAXIMO_KM = 200
+
+
+def codificar_geohash(latitude, longitude, precisao=PRECISAO):
+    latitude, longitude = float(latitude), float(longitude)
+    lat_min, lat_max, lng_min, lng_max = -90.0, 90.0, -180.0, 180.0
+    geohash, bits, valor, longitude_par = [], 0, 0, True
+    while len(geohash) < precisao:
+        if longitude_par:
+            meio = (lng_min + lng_max) / 2
+            valor = valor * 2 + (longitude >= meio)
+            lng_min, lng_max = (meio, lng_max) if longitude >= meio else (lng_min, meio)
+        else:
+            meio = (lat_min + lat_max) / 2
+            valor = valor * 2 + (latitude >= meio)
+            lat_min, lat_max = (meio, lat_max) if latitude >= meio else (lat_min, meio)
+        longitude_par = not longitude_par
+        bits += 1
+        if bits == 5:
+            geohash.append(BASE32[valor])
+            bits, valor = 0, 0
+    return ''.join(geohash)
+
+
+def _tamanho_celula(precisao):
+    """(altura, largura) em graus de uma célula com ``precisao`` caracteres"""
+    bits = 5 * precisao
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def _indices(caixa, precisao):
+    sul, oeste, norte, leste = caixa
+    altura, largura = _tamanho_celula(precisao)
+    linhas = range(int((sul + 90) // altura), int((min(norte, 90 - 1e-9) + 90) // altura) + 1)
+    colunas = range(int((oeste + 180) // largura), int((min(leste, 180 - 1e-9) + 180) // largura) + 1)
+    return linhas, colunas, altura, largura
+
+
+def _sucessor(prefixo):
+    """Menor geohash maior que todos os que começam com ``prefixo``"""
+    posicoes = [BASE32.index(c) for c in prefixo]
+    for i in range(len(posicoes) - 1, -1, -1):
+        if posicoes[i] < len(BASE32) - 1:
+            return prefixo[:i] + BASE32[posicoes[i] + 1]
+    return '~'  # depois de 'z' na ordem ASCII
+
+
+def intervalos_cobrindo(caixa, max_celulas=MAX_CELULAS):
+    """
+    Intervalos [início, fim) de geohash que cobrem a caixa (sul, oeste, norte, leste).
+
+    Escolhe a maior precisão com até ``max_celulas`` células e junta as
+    células vizinhas na ordem do geohash em um único intervalo.
+    """
+    precisao = 1
+    for candidata in range(PRECISAO, 0, -1):
+        linhas, colunas, _, _ = _indices(caixa, candidata)
+        if len(linhas) * len(colunas) <= max_celulas:
+            precisao = candidata
+            break
+
+    linhas, colunas, altura, largura = _indices(caixa, precisao)
+    celulas = sorted({
+        codificar_geohash(-90 + (linha + 0.5) * altura, -180 + (coluna + 0.5) * largura, precisao)
+        for linha in linhas for coluna in colunas
+    })
+
+    intervalos = []
+    for celula in celulas:
+        if intervalos and intervalos[-1][1] == celula:
+            intervalos[-1][1] = _sucessor(celula)
+        else:
+            intervalos.append([celula, _sucessor(celula)])
+    return [tuple(intervalo) for intervalo in intervalos]
+
+
+def caixa_do_raio(latitude, longitude, raio_km):
+    """Caixa (sul, oeste, norte, leste) que contém o círculo"""
+    delta_lat = raio_km / KM_POR_GRAU
+    cos_lat = math.cos(math.radians(latitude))
+    delta_lng = 180.0 if cos_lat < 1e-6 else min(180.0, raio_km / (KM_POR_GRAU * cos_lat))
+    return (
+        max(-90.0, latitude - delta_lat), max(-180.0, longitude - delta_lng),
+        min(90.0, latitude + delta_lat), min(180.0, longitude + delta_lng),
+    )
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(a))
+
+
+def expressao_distancia(latitude, longitude, campo_lat='latitude', campo_lng='longitude'):
+    """Haversine em SQL entre o ponto e os campos do queryset, em km"""
+    lat0 = math.radians(latitude)
+    lat = Radians(F(campo_lat), output_field=FloatField())
+    metade_dlat = (lat - Value(lat0)) / Value(2.0)
+    metade_dlng = (Radians(F(campo_lng), output_field=FloatField()) - Value(math.radians(longitude))) / Value(2.0)
+    a = (
+        Power(Sin(metade_dlat), 2)
+        + Value(math.cos(lat0)) * Cos(lat) * Power(Sin(metade_dlng), 2)
+    )
+    return Value(2 * RAIO_TERRA_KM) * ASin(Sqrt(a), output_field=FloatField())
+
+
+def ler_geo(params):
+    """
+    Lê ``lat``/``lng``/``raio`` (km) ou ``bbox=sul,oeste,norte,leste`` da querystring.
+
+    Retorna None ou {'centro': (lat, lng), 'raio_km': float ou None, 'caixa': (...)};
+    sem ``raio`` vale ``GEO_RAIO_PADRAO_KM``.
+    """
+    bbox = params.get('bbox', '').strip()
+    if bbox:
+        try:
+            sul, oeste, norte, leste = (float(parte) for parte in bbox.split(','))
+        except ValueError:
+            return None
+        if not (-90 <= sul < norte <= 90 and -180 <= oeste < leste <= 180):
+            return None
+        return {'centro': ((sul + norte) / 2, (oeste + leste) / 2), 'raio_km': None,
+                'caixa': (sul, oeste, norte, leste)}
+
+    try:
+        latitude = float(params.get('lat', ''))
+        longitude = float(params.get('lng', ''))
+    except ValueError:
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    try:
+        raio_km = float(params.get('raio', ''))
+    except ValueError:
+        raio_km = None
+    if raio_km is None or not 0 < raio_km <= RAIO_MAXIMO_KM:
+        # Sem raio a distância teria de ser calculada para a tabela inteira
+        raio_km = getattr(settings, 'GEO_RAIO_PADRAO_KM', 10)
+    return {'centro': (latitude, longitude), 'raio_km': raio_km,
+            'caixa': caixa_do_raio(latitude, longitude, raio_km)}
+
+
+def filtrar_area(imoveis, geo):
+    """Restringe o queryset à área pedida e anota ``distancia_km`` até o centro"""
+    sul, oeste, norte, leste = geo['caixa']
+    celulas = Q()
+    for inicio, fim in intervalos_cobrindo(geo['caixa']):
+        celulas |= Q(geohash__gte=inicio, geohash__lt=fim)
+    # Células do índice, depois a caixa exata; a distância só é calculada para o que sobrar
+    imoveis = imoveis.filter(celulas).filter(
+        latitude__range=(sul, norte), longitude__range=(oeste, leste)
+    ).annotate(distancia_km=expressao_distancia(*geo['centro']))
+    if geo['raio_km'] is not None:
+        imoveis = imoveis.filter(distancia_km__lte=geo['raio_km'])
+    return imoveis
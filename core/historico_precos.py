@@ -0,0 +1,179 @@
+"""
+Histórico de preços e estatísticas mensais de mercado.
+
+O histórico (``HistoricoPreco``) só recebe inserções: ``sincronizar`` compara
+o preço em vigor de cada imóvel e finalidade (o valor, se o imóvel está
+ativo; nada, se não está) com a última linha do histórico e grava uma linha
+nova só onde eles diferem. Por isso a mesma função serve aos signals (um
+imóvel), às ações em lote e à importação (um lote), sem depender de saber o
+que mudou.
+
+As estatísticas (``EstatisticaPreco``) guardam, por mês, cidade, bairro,
+tipo e finalidade, a mediana do preço e do preço por m² (``area_util``) dos
+imóveis com preço em vigor no fim do mês. Como o histórico só cresce com
+linhas datadas de agora, um cálculo incremental só precisa refazer o mês
+atual e os meses com linhas gravadas depois do último cálculo. Cidade,
+bairro, tipo e área vêm do cadastro atual do imóvel; depois de corrigir
+esses dados em massa, ``calcular_estatisticas(completo=True)`` refaz tudo.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+from statistics import median
+
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import EstatisticaPreco, HistoricoPreco, Imovel, PrecoPorFinalidade
+
+TAMANHO_LOTE = 1000
+
+CENTAVOS = Decimal('0.01')
+
+
+def sincronizar(imovel_ids=None):
+    """Grava no histórico as mudanças de preço dos imóveis (todos, sem ``imovel_ids``). Retorna quantas."""
+    if imovel_ids is None:
+        imovel_ids = Imovel.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=TAMANHO_LOTE)
+    gravadas, lote = 0, []
+    for imovel_id in imovel_ids:
+        lote.append(imovel_id)
+        if len(lote) == TAMANHO_LOTE:
+            gravadas += _sincronizar_lote(lote)
+            lote = []
+    if lote:
+        gravadas += _sincronizar_lote(lote)
+    return gravadas
+
+
+def _sincronizar_lote(imovel_ids):
+    em_vigor = {
+        (imovel_id, finalidade): valor
+        for imovel_id, finalidade, valor in PrecoPorFinalidade.objects.filter(
+            imovel_id__in=imovel_ids, imovel__status=Imovel.StatusImovel.ATIVO
+        ).values_list('imovel_id', 'finalidade', 'valor')
+    }
+    ultimas = HistoricoPreco.objects.filter(imovel_id__in=imovel_ids).values(
+        'imovel_id', 'finalidade'
+    ).annotate(ultima=Max('pk')).values_list('ultima', flat=True)
+    registrados = {
+        (imovel_id, finalidade): valor
+        for imovel_id, finalidade, valor in HistoricoPreco.objects.filter(pk__in=list(ultimas)).values_list(
+            'imovel_id', 'finalidade', 'valor'
+        )
+    }
+
+    agora = timezone.now()
+    novas = [
+        HistoricoPreco(imovel_id=imovel_id, finalidade=finalidade, valor=em_vigor.get(chave), registrado_em=agora)
+        for chave in em_vigor.keys() | registrados.keys()
+        if em_vigor.get(chave) != registrados.get(chave)
+        for imovel_id, finalidade in [chave]
+    ]
+    HistoricoPreco.objects.bulk_create(novas)
+    return len(novas)
+
+
+def inicio_do_mes(momento):
+    local = timezone.localtime(momento)
+    return date(local.year, local.month, 1)
+
+
+def proximo_mes(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def limites_do_mes(mes):
+    """(início, fim) do mês no fuso atual, para filtros ``__gte``/``__lt``"""
+    return tuple(timezone.make_aware(datetime.combine(dia, time.min)) for dia in (mes, proximo_mes(mes)))
+
+
+def meses_entre(inicio, fim):
+    mes = inicio
+    while mes <= fim:
+        yield mes
+        mes = proximo_mes(mes)
+
+
+def _mediana(valores):
+    return Decimal(median(valores)).quantize(CENTAVOS)
+
+
+def calcular_mes(mes, calculado_em=None):
+    """Refaz as estatísticas de ``mes`` (primeiro dia do mês). Retorna quantas linhas gravou."""
+    _, fim = limites_do_mes(mes)
+    ultimas = HistoricoPreco.objects.filter(registrado_em__lt=fim).values(
+        'imovel_id', 'finalidade'
+    ).annotate(ultima=Max('pk')).values_list('ultima', flat=True)
+
+    precos, por_m2 = defaultdict(list), defaultdict(list)
+    for ids in _em_lotes(list(ultimas)):
+        linhas = HistoricoPreco.objects.filter(pk__in=ids, valor__isnull=False).values_list(
+            'finalidade', 'valor', 'imovel__cidade', 'imovel__bairro', 'imovel__tipo', 'imovel__area_util'
+        )
+        for finalidade, valor, cidade, bairro, tipo, area in linhas:
+            # Cada preço entra no bairro e na cidade, no tipo e em "todos os tipos"
+            for grupo in [
+                (finalidade, cidade, bairro, tipo), (finalidade, cidade, bairro, ''),
+                (finalidade, cidade, '', tipo), (finalidade, cidade, '', ''),
+            ]:
+                precos[grupo].append(valor)
+                if area:
+                    por_m2[grupo].append(valor / area)
+
+    calculado_em = calculado_em or timezone.now()
+    estatisticas = [
+        EstatisticaPreco(
+            mes=mes, finalidade=finalidade, cidade=cidade, bairro=bairro, tipo=tipo,
+            quantidade=len(valores), preco_mediano=_mediana(valores),
+            preco_m2_mediano=_mediana(por_m2[grupo]) if por_m2[grupo] else None,
+            calculado_em=calculado_em,
+        )
+        for grupo, valores in precos.items()
+        for finalidade, cidade, bairro, tipo in [grupo]
+    ]
+    with transaction.atomic():
+        EstatisticaPreco.objects.filter(mes=mes).delete()
+        EstatisticaPreco.objects.bulk_create(estatisticas, batch_size=TAMANHO_LOTE)
+    return len(estatisticas)
+
+
+def _em_lotes(ids):
+    for inicio in range(0, len(ids), TAMANHO_LOTE):
+        yield ids[inicio:inicio + TAMANHO_LOTE]
+
+
+def calcular_estatisticas(completo=False):
+    """
+    Refaz os meses afetados desde o último cálculo (ou todos, com ``completo``).
+    Retorna a lista de meses recalculados.
+    """
+    inicio = timezone.now()
+    primeiro = HistoricoPreco.objects.aggregate(primeiro=Min('registrado_em'))['primeiro']
+    if primeiro is None:
+        return []
+    ultimo_calculo = None if completo else EstatisticaPreco.objects.aggregate(
+        ultimo=Max('calculado_em')
+    )['ultimo']
+    if ultimo_calculo is not None:
+        # Linhas gravadas depois do último cálculo mudam o mês delas e os seguintes
+        desde = HistoricoPreco.objects.filter(registrado_em__gte=ultimo_calculo).aggregate(
+            desde=Min('registrado_em')
+        )['desde']
+        primeiro = max(primeiro, min(desde or inicio, inicio))
+
+    meses = list(meses_entre(inicio_do_mes(primeiro), inicio_do_mes(inicio)))
+    if completo:
+        EstatisticaPreco.objects.exclude(mes__in=meses).delete()
+    for mes in meses:
+        calcular_mes(mes, calculado_em=inicio)
+    return meses
+
+
+def tendencia(cidade, finalidade, bairro='', tipo='', meses=12):
+    """Série mensal (mais antiga primeiro) de uma cidade ou bairro, lida das estatísticas"""
+    serie = EstatisticaPreco.objects.filter(
+        cidade=cidade, finalidade=finalidade, bairro=bairro, tipo=tipo
+    ).order_by('-mes')[:meses]
+    return list(reversed(serie))
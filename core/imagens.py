@@ -0,0 +1,176 @@
+"""
+Versões derivadas das fotos dos imóveis (miniatura, card e galeria).
+
+Cada upload gera as três larguras em WebP e em JPEG, com a orientação EXIF
+aplicada e sem metadados. O trabalho pesado (Pillow) roda em um pool de
+processos que recebe e devolve apenas bytes; a gravação no storage e no banco
+fica no processo do Django.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from . import escritor
+from .models import FotoImovel
+from .resumos import atualizar_fotos_resumo
+
+logger = logging.getLogger(__name__)
+
+# Largura máxima de cada variante
+TAMANHOS = {
+    'thumb': 160,
+    'card': 480,
+    'galeria': 1280,
+}
+
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_pool = None
+
+
+def _obter_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=getattr(settings, 'IMAGENS_WORKERS', None))
+    return _pool
+
+
+def gerar_variantes(conteudo):
+    """
+    Gera as variantes a partir dos bytes da imagem original.
+
+    Roda nos processos do pool, então não toca no banco nem no storage.
+    Retorna (largura, altura, {nome: {'largura', 'altura', 'webp': bytes, 'jpeg': bytes}}).
+    """
+    with Image.open(io.BytesIO(conteudo)) as original:
+        imagem = ImageOps.exif_transpose(original)
+        if imagem.mode not in ('RGB', 'RGBA'):
+            imagem = imagem.convert('RGBA' if 'transparency' in imagem.info else 'RGB')
+        if imagem.mode == 'RGBA':
+            fundo = Image.new('RGB', imagem.size, (255, 255, 255))
+            fundo.paste(imagem, mask=imagem.getchannel('A'))
+            imagem = fundo
+        largura, altura = imagem.size
+
+        variantes = {}
+        for nome, largura_max in TAMANHOS.items():
+            copia = imagem.copy()
+            # Nunca amplia: fotos pequenas ficam no tamanho original
+            if copia.width > largura_max:
+                copia.thumbnail((largura_max, copia.height), Image.LANCZOS)
+            variante = {'largura': copia.width, 'altura': copia.height}
+            for formato, (formato_pil, opcoes) in FORMATOS.items():
+                saida = io.BytesIO()
+                # Salvar a partir dos pixels, sem exif/icc, descarta os metadados
+                copia.save(saida, formato_pil, **opcoes)
+                variante[formato] = saida.getvalue()
+            variantes[nome] = variante
+    return largura, altura, variantes
+
+
+def _caminho_variante(foto_id, nome, formato):
+    extensao = 'jpg' if formato == 'jpeg' else formato
+    return f'imoveis/variantes/{foto_id}/{nome}.{extensao}'
+
+
+def salvar_variantes(foto_id, origem, resultado):
+    """Grava os arquivos gerados e atualiza a foto e o resumo do imóvel"""
+    largura, altura, variantes = resultado
+    foto = FotoImovel.objects.filter(pk=foto_id).only('pk', 'imovel_id', 'imagem').first()
+    # A foto foi excluída ou trocada enquanto as variantes eram geradas
+    if foto is None or foto.imagem.name != origem:
+        return
+
+    registro = {'origem': origem}
+    for nome, variante in variantes.items():
+        registro[nome] = {'largura': variante['largura'], 'altura': variante['altura']}
+        for formato in FORMATOS:
+            caminho = _caminho_variante(foto_id, nome, formato)
+            if default_storage.exists(caminho):
+                default_storage.delete(caminho)
+            registro[nome][formato] = default_storage.save(caminho, ContentFile(variante[formato]))
+
+    FotoImovel.objects.filter(pk=foto_id).update(largura=largura, altura=altura, variantes=registro)
+    atualizar_fotos_resumo(foto.imovel_id)
+
+
+def _ler_original(foto):
+    with foto.imagem.open('rb') as arquivo:
+        return arquivo.read()
+
+
+def processar_foto(foto):
+    """Gera as variantes da foto no próprio processo"""
+    origem = foto.imagem.name
+    salvar_variantes(foto.pk, origem, gerar_variantes(_ler_original(foto)))
+
+
+def agendar_processamento(foto):
+    """Envia a foto ao pool depois do commit; a gravação acontece quando o pool termina"""
+    if not getattr(settings, 'IMAGENS_PROCESSAMENTO_ASSINCRONO', True):
+        transaction.on_commit(lambda: processar_foto(foto))
+        return
+
+    def enviar():
+        origem = foto.imagem.name
+        futuro = _obter_pool().submit(gerar_variantes, _ler_original(foto))
+
+        def concluir(futuro):
+            # Chamado na thread de gerenciamento do pool, que tem conexão própria
+            close_old_connections()
+            try:
+                escritor.executar(salvar_variantes, foto.pk, origem, futuro.result())
+            except Exception:
+                logger.exception('Falha ao gerar variantes da foto %s', foto.pk)
+            finally:
+                close_old_connections()
+
+        futuro.add_done_callback(concluir)
+
+    transaction.on_commit(enviar)
+
+
+def precisa_processar(foto):
+    return bool(foto.imagem) and foto.variantes.get('origem') != foto.imagem.name
+
+
+def processar_em_lote(fotos, workers=None):
+    """Processa várias fotos em paralelo. Retorna (processadas, falhas)."""
+    processadas = falhas = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futuros = {}
+        for foto in fotos:
+            try:
+                futuros[pool.submit(gerar_variantes, _ler_original(foto))] = (foto.pk, foto.imagem.name)
+            except OSError:
+                logger.warning('Arquivo da foto %s não encontrado', foto.pk)
+                falhas += 1
+        for futuro in as_completed(futuros):
+            foto_id, origem = futuros[futuro]
+            try:
+                salvar_variantes(foto_id, origem, futuro.result())
+                processadas += 1
+            except Exception:
+                logger.exception('Falha ao gerar variantes da foto %s', foto_id)
+                falhas += 1
+    return processadas, falhas
+
+
+def montar_srcset(variantes, formato, nomes=TAMANHOS):
+    """Monta o atributo srcset ('url 160w, url 480w') com as variantes disponíveis"""
+    partes = []
+    for nome in nomes:
+        variante = variantes.get(nome)
+        if variante and variante.get(formato):
+            partes.append(f"{default_storage.url(variante[formato])} {variante['largura']}w")
+    return ', '.join(partes)
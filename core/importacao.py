@@ -0,0 +1,414 @@
+"""
+Importação de imóveis a partir dos feeds dos portais (CSV ou XML).
+
+O arquivo é lido em streaming (``csv.DictReader`` ou ``iterparse``, que
+descarta cada ``<imovel>`` depois de lido), então o consumo de memória não
+depende do tamanho do feed. Os registros são gravados em lotes, cada um em
+uma transação:
+
+- proprietários identificados pelo e-mail, sem diferenciar maiúsculas, e
+  imóveis pelo ``codigo_externo``,
+  criados com ``bulk_create`` e atualizados com ``bulk_update``;
+- preços com upsert por (imóvel, finalidade); finalidades que saíram do feed
+  são removidas;
+- infraestrutura resolvida pelo nome (sem acentos nem caixa) em um mapa
+  carregado uma vez; nomes novos são criados.
+
+As gravações em lote não disparam os signals, então resumo dos cards,
+índice de busca, histórico de preços, motor colunar e caches são atualizados
+aqui por lote, e os similares no final. As fotos são baixadas (URL) ou lidas (diretório local)
+por um pool de threads enquanto os lotes seguintes são gravados; cada foto é
+salva pelo processo principal, o que dispara a geração das variantes.
+"""
+import csv
+import logging
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import iterparse
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from . import busca, cache_paginas, facetas, historico_precos, resumos, similares
+from .geo import codificar_geohash
+from .motor_colunar import motor
+from .models import FotoImovel, Imovel, InfraCondominio, PrecoPorFinalidade, Proprietario
+
+logger = logging.getLogger(__name__)
+
+# Campos de Imovel lidos do feed (mesmo nome na coluna do CSV e na tag do XML)
+CAMPOS_TEXTO = ['titulo', 'descricao', 'endereco', 'bairro', 'cidade', 'estado', 'cep', 'andar']
+CAMPOS_INTEIROS = ['quartos', 'suites', 'banheiros', 'vagas_garagem']
+CAMPOS_DECIMAIS = ['latitude', 'longitude', 'area_util', 'area_total', 'valor_condominio', 'valor_iptu']
+CAMPOS_BOOLEANOS = ['pet_friendly', 'aceita_financiamento']
+
+CAMPOS_ATUALIZADOS = (
+    ['proprietario', 'tipo', 'status', 'mobilia', 'ano_construcao', 'geohash', 'atualizado_em', 'negociado_em']
+    + CAMPOS_TEXTO + CAMPOS_INTEIROS + CAMPOS_DECIMAIS + CAMPOS_BOOLEANOS
+)
+
+FINALIDADES = list(PrecoPorFinalidade.Finalidade.values)
+
+VERDADEIROS = {'1', 's', 'sim', 'true', 'yes', 'y', 'x'}
+
+# Separador das listas no CSV (infraestrutura e fotos)
+SEPARADOR_LISTA = '|'
+
+TAMANHO_LOTE = 1000
+
+# Fotos em download ao mesmo tempo, por thread do pool
+FOTOS_POR_WORKER = 4
+
+
+class RegistroInvalido(ValueError):
+    pass
+
+
+def _escolha(valor, escolhas, campo, padrao=None):
+    """Código de ``escolhas`` pelo código ou pelo rótulo, sem acentos nem caixa"""
+    chave = busca.normalizar(valor).strip().replace(' ', '_')
+    if not chave:
+        if padrao is None:
+            raise RegistroInvalido(f'{campo} obrigatório')
+        return padrao
+    for codigo, rotulo in escolhas:
+        if chave in (codigo, busca.normalizar(rotulo).replace(' ', '_')):
+            return codigo
+    raise RegistroInvalido(f'{campo} inválido: {valor!r}')
+
+
+def _decimal(valor, campo):
+    texto = (valor or '').replace('R$', '').replace(' ', '').strip()
+    if not texto:
+        return None
+    if ',' in texto:
+        # Formato brasileiro: 1.234,56
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(texto)
+    except InvalidOperation:
+        raise RegistroInvalido(f'{campo} inválido: {valor!r}')
+
+
+def _inteiro(valor, campo):
+    numero = _decimal(valor, campo)
+    return int(numero) if numero is not None else None
+
+
+def normalizar_registro(bruto):
+    """
+    Converte um registro do feed (dict de textos) no formato usado na gravação.
+
+    Listas (preços, infraestrutura e fotos) já chegam separadas quando vêm do
+    XML; no CSV são colunas ``preco_<finalidade>`` e listas separadas por ``|``.
+    """
+    codigo = (bruto.get('codigo') or '').strip()
+    if not codigo:
+        raise RegistroInvalido('codigo obrigatório')
+    email = (bruto.get('proprietario_email') or '').strip().lower()
+    if not email:
+        raise RegistroInvalido('proprietario_email obrigatório')
+
+    campos = {campo: (bruto.get(campo) or '').strip() for campo in CAMPOS_TEXTO}
+    campos['estado'] = campos['estado'].upper() or 'SP'
+    for campo in CAMPOS_INTEIROS:
+        campos[campo] = _inteiro(bruto.get(campo), campo) or 0
+    for campo in CAMPOS_DECIMAIS:
+        campos[campo] = _decimal(bruto.get(campo), campo)
+    # Sem a coluna valem os padrões do modelo
+    for campo in CAMPOS_BOOLEANOS:
+        texto = (bruto.get(campo) or '').strip()
+        campos[campo] = busca.normalizar(texto) in VERDADEIROS if texto else Imovel._meta.get_field(campo).default
+    campos['ano_construcao'] = _inteiro(bruto.get('ano_construcao'), 'ano_construcao')
+    campos['tipo'] = _escolha(bruto.get('tipo'), Imovel.TipoImovel.choices, 'tipo')
+    campos['status'] = _escolha(
+        bruto.get('status'), Imovel.StatusImovel.choices, 'status', Imovel.StatusImovel.ATIVO
+    )
+    campos['mobilia'] = _escolha(bruto.get('mobilia'), Imovel.Mobilia.choices, 'mobilia', Imovel.Mobilia.VAZIO)
+    for obrigatorio in ('titulo', 'endereco', 'bairro', 'cidade'):
+        if not campos[obrigatorio]:
+            raise RegistroInvalido(f'{obrigatorio} obrigatório')
+
+    precos = bruto.get('precos')
+    if precos is None:
+        precos = {finalidade: bruto.get(f'preco_{finalidade}') for finalidade in FINALIDADES}
+    precos = {
+        finalidade: valor for finalidade, valor in (
+            (finalidade, _decimal(texto, f'preco_{finalidade}')) for finalidade, texto in precos.items()
+            if finalidade in FINALIDADES
+        ) if valor is not None
+    }
+
+    def lista(chave):
+        valor = bruto.get(chave) or []
+        if isinstance(valor, str):
+            valor = valor.split(SEPARADOR_LISTA)
+        return [item.strip() for item in valor if item and item.strip()]
+
+    return {
+        'codigo': codigo,
+        'proprietario': {
+            'email': email,
+            'nome_completo': (bruto.get('proprietario_nome') or '').strip() or email,
+            'telefone': (bruto.get('proprietario_telefone') or '').strip(),
+        },
+        'campos': campos,
+        'precos': precos,
+        'infraestrutura': lista('infraestrutura'),
+        'fotos': lista('fotos'),
+    }
+
+
+def ler_csv(caminho, delimitador=','):
+    with open(caminho, newline='', encoding='utf-8-sig') as arquivo:
+        yield from csv.DictReader(arquivo, delimiter=delimitador)
+
+
+def ler_xml(caminho):
+    """
+    Lê ``<imovel>`` a ``<imovel>``. Campos simples são tags filhas; as listas são
+    ``<precos><preco finalidade="venda">...</preco></precos>``,
+    ``<infraestrutura><item>...</item></infraestrutura>`` e
+    ``<fotos><foto>...</foto></fotos>``.
+    """
+    raiz = None
+    for evento, elemento in iterparse(caminho, events=('start', 'end')):
+        if raiz is None:
+            raiz = elemento
+        if evento != 'end' or elemento.tag != 'imovel':
+            continue
+        registro = {}
+        for filho in elemento:
+            if filho.tag == 'precos':
+                registro['precos'] = {(preco.get('finalidade') or '').lower(): preco.text for preco in filho}
+            elif filho.tag in ('infraestrutura', 'fotos'):
+                registro[filho.tag] = [item.text for item in filho]
+            else:
+                registro[filho.tag] = filho.text
+        registro.setdefault('codigo', elemento.get('codigo'))
+        yield registro
+        # Sem isso a raiz guardaria todos os <imovel> já lidos
+        raiz.clear()
+
+
+class Importador:
+    """Grava os registros de um feed em lotes; ``estatisticas`` acumula os totais"""
+
+    def __init__(self, tamanho_lote=TAMANHO_LOTE, diretorio_fotos=None, workers=8, baixar_fotos=True,
+                 progresso=None):
+        self.tamanho_lote = tamanho_lote
+        self.diretorio_fotos = diretorio_fotos
+        self.baixar_fotos = baixar_fotos
+        self.workers = workers
+        self.progresso = progresso
+        self.estatisticas = {'lidos': 0, 'criados': 0, 'atualizados': 0, 'invalidos': 0, 'fotos': 0, 'falhas_fotos': 0}
+        self.alterados = set()
+        self._infraestruturas = {
+            busca.normalizar(nome).strip(): pk for pk, nome in InfraCondominio.objects.values_list('pk', 'nome')
+        }
+        self._infraestrutura_criada = False
+        self._pool = None
+        self._downloads = []
+
+    # Leitura
+
+    def importar(self, registros):
+        inicio = time.perf_counter()
+        lote = []
+        for numero, bruto in enumerate(registros, start=1):
+            self.estatisticas['lidos'] += 1
+            try:
+                lote.append(normalizar_registro(bruto))
+            except RegistroInvalido as erro:
+                self.estatisticas['invalidos'] += 1
+                logger.warning('Registro %s ignorado: %s', numero, erro)
+            if len(lote) >= self.tamanho_lote:
+                self._gravar_lote(lote)
+                lote = []
+                self._salvar_fotos_prontas()
+                self._informar(inicio)
+        if lote:
+            self._gravar_lote(lote)
+        self._salvar_fotos_prontas(esperar=True)
+        self._finalizar()
+        self.estatisticas['segundos'] = time.perf_counter() - inicio
+        self._informar(inicio)
+        return self.estatisticas
+
+    def _informar(self, inicio):
+        if self.progresso:
+            decorrido = time.perf_counter() - inicio
+            self.progresso(dict(self.estatisticas, segundos=decorrido,
+                                por_segundo=self.estatisticas['lidos'] / decorrido if decorrido else 0))
+
+    # Gravação
+
+    def _gravar_lote(self, lote):
+        # Códigos repetidos no mesmo lote: vale o último
+        lote = list({registro['codigo']: registro for registro in lote}.values())
+        agora = timezone.now()
+        with transaction.atomic():
+            proprietarios = self._proprietarios(lote)
+            existentes = {
+                imovel.codigo_externo: imovel
+                for imovel in Imovel.objects.filter(codigo_externo__in=[registro['codigo'] for registro in lote])
+            }
+            novos, atualizados = [], []
+            for registro in lote:
+                imovel = existentes.get(registro['codigo']) or Imovel(codigo_externo=registro['codigo'])
+                status_anterior = imovel.status if imovel.pk else None
+                for campo, valor in registro['campos'].items():
+                    setattr(imovel, campo, valor)
+                if imovel.status != status_anterior:
+                    imovel.negociado_em = agora if imovel.status in Imovel.STATUS_NEGOCIADOS else None
+                imovel.proprietario_id = proprietarios[registro['proprietario']['email']]
+                imovel.geohash = (
+                    codificar_geohash(imovel.latitude, imovel.longitude)
+                    if imovel.latitude is not None and imovel.longitude is not None else ''
+                )
+                imovel.atualizado_em = agora
+                (atualizados if imovel.pk else novos).append(imovel)
+
+            Imovel.objects.bulk_create(novos)
+            Imovel.objects.bulk_update(atualizados, CAMPOS_ATUALIZADOS)
+            imoveis = {imovel.codigo_externo: imovel for imovel in novos + atualizados}
+            self._precos(lote, imoveis)
+            self._infraestrutura(lote, imoveis)
+
+            # Na mesma transação: fora dela cada linha do índice seria um commit
+            ids = [imovel.pk for imovel in imoveis.values()]
+            resumos.reconstruir_resumos(ids)
+            busca.indexar_lote(imoveis.values())
+            historico_precos.sincronizar(ids)
+
+        motor.marcar(ids)
+        self.alterados.update(ids)
+        self.estatisticas['criados'] += len(novos)
+        self.estatisticas['atualizados'] += len(atualizados)
+
+        # Fotos só para imóveis sem fotos, para que reimportar o feed não as duplique
+        com_fotos = set(FotoImovel.objects.filter(imovel_id__in=ids).values_list('imovel_id', flat=True).distinct())
+        if self.baixar_fotos:
+            for registro in lote:
+                imovel = imoveis[registro['codigo']]
+                if imovel.pk not in com_fotos:
+                    for ordem, referencia in enumerate(registro['fotos']):
+                        self._agendar_foto(imovel.pk, ordem, referencia)
+
+    def _proprietarios(self, lote):
+        """{email: owner_id}, criando os que faltam e atualizando nome e telefone"""
+        dados = {registro['proprietario']['email']: registro['proprietario'] for registro in lote}
+        existentes = {}
+        # E-mails do feed já vêm em minúsculas; os do cadastro podem ter sido digitados com maiúsculas
+        cadastrados = Proprietario.objects.alias(email_minusculo=Lower('email'))
+        for proprietario in cadastrados.filter(email_minusculo__in=list(dados)).order_by('criado_em'):
+            existentes.setdefault(proprietario.email.lower(), proprietario)
+
+        alterados = []
+        for email, proprietario in existentes.items():
+            novo = dados[email]
+            if (proprietario.nome_completo, proprietario.telefone) != (novo['nome_completo'], novo['telefone']):
+                proprietario.nome_completo, proprietario.telefone = novo['nome_completo'], novo['telefone']
+                alterados.append(proprietario)
+        Proprietario.objects.bulk_update(alterados, ['nome_completo', 'telefone'])
+
+        # owner_id é um UUID gerado no Python, então as pks são conhecidas sem reler
+        criados = Proprietario.objects.bulk_create([
+            Proprietario(**dados[email]) for email in dados if email not in existentes
+        ])
+        resultado = {email: proprietario.pk for email, proprietario in existentes.items()}
+        resultado.update({proprietario.email: proprietario.pk for proprietario in criados})
+        return resultado
+
+    def _precos(self, lote, imoveis):
+        precos = [
+            PrecoPorFinalidade(imovel_id=imoveis[registro['codigo']].pk, finalidade=finalidade, valor=valor)
+            for registro in lote for finalidade, valor in registro['precos'].items()
+        ]
+        PrecoPorFinalidade.objects.bulk_create(
+            precos, update_conflicts=True, unique_fields=['imovel', 'finalidade'], update_fields=['valor']
+        )
+        for finalidade in FINALIDADES:
+            sem_preco = [
+                imoveis[registro['codigo']].pk for registro in lote if finalidade not in registro['precos']
+            ]
+            PrecoPorFinalidade.objects.filter(imovel_id__in=sem_preco, finalidade=finalidade).delete()
+
+    def _infraestrutura(self, lote, imoveis):
+        nomes = {
+            busca.normalizar(nome).strip(): nome for registro in lote for nome in registro['infraestrutura']
+        }
+        faltando = [nome for chave, nome in nomes.items() if chave not in self._infraestruturas]
+        if faltando:
+            for infra in InfraCondominio.objects.bulk_create([InfraCondominio(nome=nome[:100]) for nome in faltando]):
+                self._infraestruturas[busca.normalizar(infra.nome).strip()] = infra.pk
+            self._infraestrutura_criada = True
+
+        Relacao = Imovel.infraestrutura.through
+        ids = [imovel.pk for imovel in imoveis.values()]
+        Relacao.objects.filter(imovel_id__in=ids).delete()
+        Relacao.objects.bulk_create([
+            Relacao(imovel_id=imoveis[registro['codigo']].pk, infracondominio_id=infra_id)
+            for registro in lote
+            for infra_id in {self._infraestruturas[busca.normalizar(nome).strip()] for nome in registro['infraestrutura']}
+        ])
+
+    def _finalizar(self):
+        if self._pool:
+            self._pool.shutdown()
+        facetas.invalidar_cidades()
+        if self._infraestrutura_criada:
+            facetas.invalidar_infraestruturas()
+        cache_paginas.invalidar_catalogo()
+        if self.alterados and similares.disponivel():
+            if len(self.alterados) > getattr(settings, 'IMPORTACAO_LIMITE_SIMILARES_INCREMENTAL', 500):
+                similares.recalcular_todos()
+            else:
+                similares.atualizar(self.alterados)
+
+    # Fotos
+
+    def _ler_foto(self, referencia):
+        """Roda nas threads do pool: só lê bytes, sem tocar no banco"""
+        if referencia.startswith(('http://', 'https://')):
+            with urllib.request.urlopen(referencia, timeout=getattr(settings, 'IMPORTACAO_TIMEOUT_FOTOS', 30)) as resposta:
+                return resposta.read()
+        caminho = referencia if os.path.isabs(referencia) else os.path.join(self.diretorio_fotos or '', referencia)
+        with open(caminho, 'rb') as arquivo:
+            return arquivo.read()
+
+    def _agendar_foto(self, imovel_id, ordem, referencia):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='importacao-fotos')
+        # Limita as fotos em memória: espera as mais antigas quando a fila enche
+        if len(self._downloads) >= self.workers * FOTOS_POR_WORKER:
+            self._salvar_fotos_prontas(esperar=True, ate=len(self._downloads) // 2)
+        futuro = self._pool.submit(self._ler_foto, referencia)
+        self._downloads.append((futuro, imovel_id, ordem, referencia))
+
+    def _salvar_fotos_prontas(self, esperar=False, ate=None):
+        """Grava as fotos já lidas (ou todas, com ``esperar``; ou as ``ate`` primeiras)"""
+        pendentes = []
+        for posicao, (futuro, imovel_id, ordem, referencia) in enumerate(self._downloads):
+            obrigatoria = esperar and (ate is None or posicao < ate)
+            if not obrigatoria and not futuro.done():
+                pendentes.append((futuro, imovel_id, ordem, referencia))
+                continue
+            try:
+                conteudo = futuro.result()
+            except Exception as erro:
+                self.estatisticas['falhas_fotos'] += 1
+                logger.warning('Foto %s do imóvel %s não lida: %s', referencia, imovel_id, erro)
+                continue
+            nome = os.path.basename(referencia.split('?')[0]) or f'{imovel_id}-{ordem}.jpg'
+            foto = FotoImovel(imovel_id=imovel_id, ordem=ordem, eh_capa=ordem == 0)
+            foto.imagem.save(nome, ContentFile(conteudo), save=False)
+            foto.save()
+            self.estatisticas['fotos'] += 1
+        self._downloads = pendentes
@@ -0,0 +1,199 @@
+"""
+Captura de leads do formulário de interesse do detalhe do imóvel.
+
+Cada envio cria um ``Cliente`` (origem "site") ou atualiza o que já tem o
+mesmo telefone, procurado pela coluna indexada ``telefone_normalizado``, e
+liga o imóvel aos seus ``imoveis_interesse``.
+
+As gravações não são feitas pela requisição: ela põe o lead em uma fila do
+processo e espera. Uma única thread grava os leads acumulados em uma só
+transação, até LEADS_LOTE (padrão 50) por vez, então um pico de campanha vira
+poucas transações em sequência em vez de dezenas de requisições disputando a
+trava de escrita do SQLite. Cada lead tem o seu savepoint: um que falha fica
+com o erro e os demais do lote são gravados. A requisição espera a gravação
+por até LEADS_TEMPO_ESPERA segundos (padrão 5); passado esse tempo ela
+responde que o contato foi recebido e o lead continua na fila. Com a fila cheia
+(LEADS_TAMANHO_FILA, padrão 1000) o envio é recusado. Os que restam na fila
+quando o processo encerra são gravados na saída.
+
+Com LEADS_SINCRONOS = True o lead é gravado na própria requisição (testes e
+desenvolvimento).
+"""
+import atexit
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import escritor
+from .models import Cliente
+from .telefones import normalizar_telefone
+
+logger = logging.getLogger(__name__)
+
+# Clientes que voltam a procurar depois de encerrados reabrem como lead
+STATUS_ENCERRADOS = [Cliente.StatusCliente.CLIENTE_PERDIDO, Cliente.StatusCliente.CLIENTE_FINALIZADO]
+
+
+class FilaCheia(Exception):
+    pass
+
+
+def sincronos():
+    return getattr(settings, 'LEADS_SINCRONOS', False)
+
+
+def tamanho_lote():
+    return getattr(settings, 'LEADS_LOTE', 50)
+
+
+def tempo_espera():
+    return getattr(settings, 'LEADS_TEMPO_ESPERA', 5)
+
+
+class Lead:
+    """Um envio do formulário; ``cliente_id`` e ``erro`` são preenchidos pela gravação"""
+
+    def __init__(self, imovel_id, titulo_imovel, dados):
+        self.imovel_id = imovel_id
+        self.titulo_imovel = titulo_imovel
+        self.dados = dados
+        self.recebido_em = timezone.now()
+        self.cliente_id = None
+        self.erro = None
+        self._gravado = threading.Event()
+
+    def concluir(self):
+        self._gravado.set()
+
+    def aguardar(self, segundos):
+        """True se a gravação terminou (com ou sem erro) dentro do prazo"""
+        return self._gravado.wait(segundos)
+
+
+class FilaLeads:
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._fila = None
+        self._thread = None
+
+    def enviar(self, lead):
+        if sincronos():
+            _gravar_e_concluir([lead])
+            return lead
+        with self._trava:
+            if self._thread is None:
+                self._iniciar()
+        try:
+            self._fila.put_nowait(lead)
+        except queue.Full:
+            raise FilaCheia
+        return lead
+
+    def _iniciar(self):
+        self._fila = queue.Queue(maxsize=getattr(settings, 'LEADS_TAMANHO_FILA', 1000))
+        self._thread = threading.Thread(target=self._laco, name='fila-leads', daemon=True)
+        self._thread.start()
+        atexit.register(self.esvaziar)
+
+    def _proximos(self, primeiro):
+        leads = [primeiro]
+        while len(leads) < tamanho_lote():
+            try:
+                leads.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return leads
+
+    def _laco(self):
+        while True:
+            leads = self._proximos(self._fila.get())
+            try:
+                _gravar_e_concluir(leads)
+            finally:
+                close_old_connections()
+
+    def esvaziar(self):
+        """Grava o que está na fila (na saída do processo)"""
+        while True:
+            try:
+                primeiro = self._fila.get_nowait()
+            except queue.Empty:
+                return
+            _gravar_e_concluir(self._proximos(primeiro))
+
+
+def _gravar_e_concluir(leads):
+    try:
+        escritor.executar(gravar, leads)
+    except Exception as erro:
+        logger.exception('Falha ao gravar %s lead(s)', len(leads))
+        for lead in leads:
+            lead.erro = erro
+    finally:
+        for lead in leads:
+            lead.concluir()
+
+
+def _observacao(lead):
+    linha = f"{timezone.localtime(lead.recebido_em):%d/%m/%Y %H:%M} - Interesse pelo site no imóvel {lead.titulo_imovel} (#{lead.imovel_id})"
+    if lead.dados.get('mensagem'):
+        linha += f": {lead.dados['mensagem']}"
+    return linha
+
+
+def gravar(leads):
+    """Cria ou atualiza os clientes dos leads em uma transação, com um savepoint por lead"""
+    Interesse = Cliente.imoveis_interesse.through
+    with transaction.atomic():
+        telefones = {normalizar_telefone(lead.dados['telefone']) for lead in leads}
+        existentes = _clientes_por_telefone(telefones)
+        interesses = []
+        for lead in leads:
+            chave = normalizar_telefone(lead.dados['telefone'])
+            try:
+                with transaction.atomic():
+                    cliente = _gravar_lead(lead, existentes.get(chave))
+            except Exception as erro:
+                logger.exception('Falha ao gravar o lead do imóvel #%s', lead.imovel_id)
+                lead.erro = erro
+                # O cliente em memória ficou com as alterações desfeitas pelo savepoint
+                existentes.pop(chave, None)
+                existentes.update(_clientes_por_telefone([chave]))
+                continue
+            existentes[chave] = cliente
+            lead.cliente_id = cliente.pk
+            interesses.append(Interesse(cliente_id=cliente.pk, imovel_id=lead.imovel_id))
+        Interesse.objects.bulk_create(interesses, ignore_conflicts=True)
+
+
+def _clientes_por_telefone(telefones):
+    # Com telefones repetidos no cadastro, o cliente atualizado por último recebe o lead
+    return {
+        cliente.telefone_normalizado: cliente
+        for cliente in Cliente.objects.filter(telefone_normalizado__in=telefones).order_by('atualizado_em', 'pk')
+    }
+
+
+def _gravar_lead(lead, cliente):
+    dados = lead.dados
+    if cliente is None:
+        cliente = Cliente(
+            nome_completo=dados['nome_completo'], telefone=dados['telefone'], origem=Cliente.OrigemContato.SITE,
+        )
+    if dados.get('email') and not cliente.email:
+        cliente.email = dados['email']
+    if dados.get('finalidade') and not cliente.finalidade_interesse:
+        cliente.finalidade_interesse = dados['finalidade']
+    if cliente.status in STATUS_ENCERRADOS:
+        cliente.status = Cliente.StatusCliente.LEAD_MORNO
+    cliente.observacoes = '\n'.join(filter(None, [cliente.observacoes, _observacao(lead)]))
+    cliente.ultimo_contato = lead.recebido_em
+    cliente.save()
+    return cliente
+
+
+fila = FilaLeads()
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import relatorios
+
+
+class Command(BaseCommand):
+    help = 'Atualiza as tabelas de resumo do painel de relatórios do admin (só o que mudou desde a última execução)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help='Refaz todas as tabelas')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        execucao = relatorios.atualizar(completo=options['completo'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Relatórios atualizados ({'completo' if execucao.completa else 'incremental'}) "
+            f"em {time.perf_counter() - inicio:.1f} s."
+        ))
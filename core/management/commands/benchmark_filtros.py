@@ -0,0 +1,89 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from core import facetas, motor_colunar
+from core.busca import buscar_imoveis
+from core.filtros import aplicar_filtros, ler_filtros, paginar
+from core.models import Imovel, InfraCondominio
+
+
+def _consultar_orm(filtros):
+    imoveis = Imovel.objects.filter(
+        status=Imovel.StatusImovel.ATIVO
+    ).only('pk', 'criado_em', 'area_util', 'resumo').select_related('resumo')
+    ids_busca = buscar_imoveis(filtros['busca']) if filtros['busca'] else None
+    imoveis = aplicar_filtros(imoveis, filtros, ids_busca)
+    # Sem o cache de contagens, para medir o trabalho completo
+    total = imoveis.order_by().values('pk').count()
+    contagens = facetas._calcular_contagens(imoveis)
+    pagina = paginar(imoveis, filtros, ids_busca)
+    return [imovel.pk for imovel in pagina], total, contagens
+
+
+def _consultar_motor(filtros):
+    pagina, total, contagens = motor_colunar.consultar(filtros)
+    return [resumo.pk for resumo in pagina], total, contagens
+
+
+class Command(BaseCommand):
+    help = 'Compara o tempo da listagem filtrada pelo ORM e pelo motor colunar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=20, help='Execuções de cada consulta')
+
+    def _cenarios(self):
+        ativos = Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO)
+        cidade = ativos.values_list('cidade', flat=True).first() or ''
+        infra = InfraCondominio.objects.values_list('pk', flat=True).first()
+        centro = ativos.filter(latitude__isnull=False).values_list('latitude', 'longitude').first()
+        return {
+            'sem filtros': '',
+            'mais recentes': 'ordenacao=mais_recentes',
+            'cidade': f'cidade={cidade}',
+            'tipo + quartos': 'tipo=apartamento&quartos=2',
+            'venda por preço': 'finalidade=venda&preco_min=100000&preco_max=2000000&ordenacao=preco_menor',
+            'maior área com fotos': 'com_fotos=true&area_min=50&ordenacao=maior_area',
+            'pet + financiamento': 'pet_friendly=true&financiamento=true&ordenacao=preco_maior',
+            'infraestrutura': f'infraestrutura={infra}' if infra else 'vagas=1',
+            'raio de 5 km': f'lat={centro[0]}&lng={centro[1]}&raio=5&ordenacao=distancia' if centro else 'vagas=2',
+        }
+
+    def _medir(self, funcao, filtros, repeticoes):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            resultado = funcao(filtros)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tempos), resultado
+
+    def handle(self, *args, **options):
+        if not motor_colunar.disponivel():
+            raise CommandError('O NumPy não está instalado; o motor colunar não está disponível.')
+
+        cache.clear()
+        inicio = time.perf_counter()
+        colunas = motor_colunar.motor.colunas()
+        self.stdout.write(
+            f'Motor construído com {len(colunas)} imóveis em {(time.perf_counter() - inicio) * 1000:.1f} ms'
+        )
+
+        self.stdout.write(f"{'cenário':<24}{'ORM (ms)':>10}{'motor (ms)':>12}{'ganho':>8}  resultado")
+        divergencias = 0
+        for nome, querystring in self._cenarios().items():
+            filtros = ler_filtros(QueryDict(querystring))
+            tempo_orm, resultado_orm = self._medir(_consultar_orm, filtros, options['repeticoes'])
+            tempo_motor, resultado_motor = self._medir(_consultar_motor, filtros, options['repeticoes'])
+            iguais = resultado_orm == resultado_motor
+            divergencias += not iguais
+            self.stdout.write(
+                f'{nome:<24}{tempo_orm:>10.2f}{tempo_motor:>12.2f}{tempo_orm / tempo_motor:>7.1f}x  '
+                + ('igual' if iguais else self.style.ERROR('DIVERGENTE'))
+            )
+
+        if divergencias:
+            raise CommandError(f'{divergencias} cenário(s) com resultado diferente do ORM.')
+        self.stdout.write(self.style.SUCCESS('Resultados idênticos nos dois caminhos.'))
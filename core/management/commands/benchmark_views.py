@@ -0,0 +1,186 @@
+import json
+import math
+import random
+import resource
+import statistics
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import cache_paginas, motor_colunar
+from core.models import Imovel, InfraCondominio
+
+
+def _percentil(valores, percentual):
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(percentual / 100 * len(ordenados)) - 1)]
+
+
+def _host():
+    hosts = [host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')]
+    return hosts[0] if hosts else 'localhost'
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede home, listagem (filtros e ordenações) e detalhe pelo cliente de teste e informa p50/p95, '
+        'consultas e pico de memória em JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=20, help='Requisições medidas por cenário')
+        parser.add_argument('--imoveis-detalhe', type=int, default=20, help='Imóveis sorteados para o detalhe')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do sorteio dos imóveis')
+        parser.add_argument(
+            '--sem-cache', action='store_true',
+            help='Limpa o cache antes de cada requisição (páginas montadas do zero)',
+        )
+        parser.add_argument('--saida', help='Grava o JSON neste arquivo em vez de escrevê-lo na saída')
+        parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar')
+
+    def _cenarios(self, options):
+        ativos = Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO)
+        if not ativos.exists():
+            raise CommandError('Nenhum imóvel ativo; gere uma base com seed_benchmark_data.')
+        lista = reverse('core:lista_imoveis')
+        cidade, bairro = ativos.values_list('cidade', 'bairro').first()
+        infra = InfraCondominio.objects.values_list('pk', flat=True).first()
+        centro = ativos.filter(latitude__isnull=False).values_list('latitude', 'longitude').first()
+
+        filtros = {
+            'sem filtros': {},
+            'cidade': {'cidade': cidade},
+            'cidade + bairro': {'cidade': cidade, 'bairro': bairro},
+            'tipo + quartos': {'tipo': 'apartamento', 'quartos': 2},
+            'venda por faixa de preço': {'finalidade': 'venda', 'preco_min': 300000, 'preco_max': 900000},
+            'aluguel com pet': {'finalidade': 'aluguel', 'pet_friendly': 'true'},
+            'com fotos e área mínima': {'com_fotos': 'true', 'area_min': 80},
+            'busca por texto': {'busca': 'apartamento reformado'},
+        }
+        if infra:
+            filtros['infraestrutura'] = {'infraestrutura': infra}
+        if centro:
+            filtros['raio de 5 km'] = {'lat': centro[0], 'lng': centro[1], 'raio': 5, 'ordenacao': 'distancia'}
+
+        cenarios = [('home', [reverse('core:home')])]
+        for nome, parametros in filtros.items():
+            cenarios.append((f'lista: {nome}', [f'{lista}?{urlencode(parametros)}' if parametros else lista]))
+        for ordenacao in ['mais_recentes', 'preco_menor', 'preco_maior', 'maior_area']:
+            cenarios.append((
+                f'lista: {cidade} por {ordenacao}', [f"{lista}?{urlencode({'cidade': cidade, 'ordenacao': ordenacao})}"]
+            ))
+
+        # Sorteio reproduzível sem carregar todas as pks: pks ativas a partir de pontos sorteados
+        maior = ativos.order_by('-pk').values_list('pk', flat=True).first()
+        aleatorio = random.Random(options['semente'])
+        detalhes = []
+        for _ in range(options['imoveis_detalhe']):
+            pk = ativos.filter(pk__gte=aleatorio.randint(1, maior)).order_by('pk').values_list('pk', flat=True).first()
+            detalhes.append(reverse('core:detalhe_imovel', args=[pk or maior]))
+        cenarios.append(('detalhe', detalhes))
+        return cenarios
+
+    def _requisitar(self, cliente, url, sem_cache):
+        if sem_cache:
+            cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            response = cliente.get(url)
+            duracao = (time.perf_counter() - inicio) * 1000
+        if response.status_code != 200:
+            raise CommandError(f'{url} respondeu {response.status_code}')
+        return duracao, len(consultas)
+
+    def _medir(self, cliente, urls, repeticoes, sem_cache):
+        # Primeira passada fora da conta: conexões, motor colunar e caches quentes
+        for url in urls:
+            self._requisitar(cliente, url, sem_cache)
+
+        tempos, consultas = [], []
+        for numero in range(repeticoes):
+            duracao, total = self._requisitar(cliente, urls[numero % len(urls)], sem_cache)
+            tempos.append(duracao)
+            consultas.append(total)
+
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            self._requisitar(cliente, urls[0], sem_cache)
+            pico = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'urls': len(urls),
+            'repeticoes': repeticoes,
+            'p50_ms': round(_percentil(tempos, 50), 2),
+            'p95_ms': round(_percentil(tempos, 95), 2),
+            'max_ms': round(max(tempos), 2),
+            'media_ms': round(statistics.fmean(tempos), 2),
+            'consultas': max(consultas),
+            'pico_memoria_kb': pico // 1024,
+        }
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] < 1:
+            raise CommandError('--repeticoes deve ser pelo menos 1.')
+        cliente = Client(HTTP_HOST=_host())
+        resultado = {
+            'gerado_em': timezone.now().isoformat(),
+            'banco': connection.vendor,
+            'imoveis': Imovel.objects.count(),
+            'imoveis_ativos': Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO).count(),
+            'motor_colunar': motor_colunar.ativo(),
+            'cache_paginas': cache_paginas.ativo() and not options['sem_cache'],
+            'cenarios': {},
+        }
+
+        # Sem contar acessos (o ranking não recebe visitas falsas) e sem avisos de orçamento a cada requisição
+        with override_settings(CONTADORES_ATIVOS=False, METRICAS_ORCAMENTOS={}):
+            for nome, urls in self._cenarios(options):
+                medicao = self._medir(cliente, urls, options['repeticoes'], options['sem_cache'])
+                resultado['cenarios'][nome] = dict(medicao, url=urls[0])
+                self.stderr.write(
+                    f"{nome:<44} p50 {medicao['p50_ms']:>8.1f} ms  p95 {medicao['p95_ms']:>8.1f} ms  "
+                    f"{medicao['consultas']:>3} consultas  {medicao['pico_memoria_kb']:>6} KB"
+                )
+        resultado['pico_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        if options['comparar']:
+            self._comparar(options['comparar'], resultado)
+
+        texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+        if options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8') as arquivo:
+                arquivo.write(texto + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Resultado gravado em {options['saida']}"))
+        else:
+            self.stdout.write(texto)
+
+    def _comparar(self, caminho, atual):
+        try:
+            with open(caminho, encoding='utf-8') as arquivo:
+                anterior = json.load(arquivo)
+        except (OSError, ValueError) as erro:
+            raise CommandError(f'Não foi possível ler {caminho}: {erro}')
+        self.stderr.write(f"\nComparação com {caminho} ({anterior.get('gerado_em', '?')}):")
+        for nome, medicao in atual['cenarios'].items():
+            antes = anterior.get('cenarios', {}).get(nome)
+            if not antes:
+                continue
+            variacao = (medicao['p50_ms'] - antes['p50_ms']) / antes['p50_ms'] * 100 if antes['p50_ms'] else 0
+            linha = (
+                f"{nome:<44} p50 {antes['p50_ms']:>8.1f} -> {medicao['p50_ms']:>8.1f} ms ({variacao:+.0f}%)  "
+                f"consultas {antes['consultas']} -> {medicao['consultas']}"
+            )
+            piorou = variacao > 20 or medicao['consultas'] > antes['consultas']
+            self.stderr.write(self.style.WARNING(linha) if piorou else linha)
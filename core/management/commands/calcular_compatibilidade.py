@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import compatibilidade
+
+
+class Command(BaseCommand):
+    help = 'Calcula os imóveis mais compatíveis com cada cliente em aberto (leads e clientes ativos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Considera só imóveis e clientes alterados desde a última execução concluída'
+        )
+        parser.add_argument('--top', type=int, default=compatibilidade.TOP, help='Sugestões guardadas por cliente')
+
+    def handle(self, *args, **options):
+        if not compatibilidade.disponivel():
+            raise CommandError('O NumPy não está instalado.')
+        inicio = time.perf_counter()
+        execucao = compatibilidade.executar(incremental=options['incremental'], top=options['top'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Execução {execucao.get_modo_display().lower()}: {execucao.clientes} cliente(s) regravado(s), '
+            f'{execucao.imoveis} imóvel(is) avaliado(s) em {time.perf_counter() - inicio:.1f} s.'
+        ))
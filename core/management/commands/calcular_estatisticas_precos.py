@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import historico_precos
+from core.models import HistoricoPreco
+
+
+class Command(BaseCommand):
+    help = 'Atualiza as medianas mensais de preço e preço por m² a partir do histórico de preços'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help='Refaz todos os meses, não só os afetados')
+        parser.add_argument(
+            '--sincronizar', action='store_true',
+            help='Antes, compara os preços de todos os imóveis com o histórico (automático com o histórico vazio)'
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['sincronizar'] or not HistoricoPreco.objects.exists():
+            gravadas = historico_precos.sincronizar()
+            self.stdout.write(f'{gravadas} linha(s) gravada(s) no histórico de preços.')
+        meses = historico_precos.calcular_estatisticas(completo=options['completo'])
+        descricao = ', '.join(f'{mes:%m/%Y}' for mes in meses) or 'nenhum'
+        self.stdout.write(self.style.SUCCESS(
+            f'Estatísticas recalculadas ({descricao}) em {time.perf_counter() - inicio:.1f} s.'
+        ))
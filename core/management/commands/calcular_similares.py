@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import similares
+
+
+class Command(BaseCommand):
+    help = 'Recalcula os imóveis similares (vizinhos mais próximos) de todos os imóveis ativos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=similares.K, help='Vizinhos guardados por imóvel')
+
+    def handle(self, *args, **options):
+        if not similares.disponivel():
+            raise CommandError('O NumPy não está instalado.')
+        inicio = time.perf_counter()
+        total = similares.recalcular_todos(k=options['k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Vizinhos de {total} imóvel(is) calculados em {time.perf_counter() - inicio:.1f} s.'
+        ))
@@ -0,0 +1,178 @@
+import json
+import math
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.utils import load_backend
+
+from core.sqlite import banco_sqlite
+
+LEITURA, ESCRITA = 'estresse_leitura', 'estresse_escrita'
+
+
+def _percentil(valores, percentual):
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(percentual / 100 * len(ordenados)) - 1)]
+
+
+def _resumo(tempos, erros):
+    if not tempos:
+        return {'operacoes': 0, 'erros': erros}
+    return {
+        'operacoes': len(tempos),
+        'erros': erros,
+        'p50_ms': round(_percentil(tempos, 50), 2),
+        'p99_ms': round(_percentil(tempos, 99), 2),
+        'max_ms': round(max(tempos), 2),
+        'media_ms': round(statistics.fmean(tempos), 2),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Leituras e escritas simultâneas em um banco SQLite temporário com o perfil de produção '
+        '(core.sqlite); mostra se alguma leitura esperou por uma escrita'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segundos', type=float, default=5, help='Duração do teste')
+        parser.add_argument('--leitores', type=int, default=8, help='Threads só de leitura')
+        parser.add_argument('--escritores', type=int, default=2, help='Threads de escrita')
+        parser.add_argument('--linhas', type=int, default=200, help='Linhas inseridas por transação')
+        parser.add_argument(
+            '--journal', choices=['wal', 'delete'], default='wal',
+            help='delete: journal tradicional, para comparar com o WAL do perfil',
+        )
+        parser.add_argument(
+            '--transacao', choices=['IMMEDIATE', 'DEFERRED'], default='IMMEDIATE',
+            help='DEFERRED: transações como no padrão do Django, para comparar',
+        )
+        parser.add_argument('--json', action='store_true', help='Escreve só o resultado em JSON')
+
+    def handle(self, *args, **options):
+        if options['leitores'] < 1 or options['escritores'] < 1:
+            raise CommandError('Use pelo menos um leitor e um escritor.')
+        pasta = tempfile.mkdtemp(prefix='estresse-sqlite-')
+        caminho = os.path.join(pasta, 'estresse.sqlite3')
+        escrita = banco_sqlite(caminho, pragmas={'journal_mode': options['journal']}, transacao=options['transacao'])
+        # Leitores sem espera pela trava: uma leitura que precisasse esperar uma escrita falha em vez de demorar
+        leitura = banco_sqlite(caminho, espera=0, pragmas={'journal_mode': options['journal']})
+        self.bancos = {
+            alias: connections.configure_settings({DEFAULT_DB_ALIAS: banco})[DEFAULT_DB_ALIAS]
+            for alias, banco in [(ESCRITA, escrita), (LEITURA, leitura)]
+        }
+        try:
+            resultado = self._executar(options)
+        finally:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(resultado, ensure_ascii=False, indent=2))
+            return
+        self.stdout.write(
+            f"journal {resultado['journal']}, transações {resultado['transacao']}, "
+            f"{options['leitores']} leitores e {options['escritores']} escritores por {options['segundos']:g} s"
+        )
+        for papel in ['leituras', 'escritas']:
+            medicao = resultado[papel]
+            linha = f"{papel:<9} {medicao['operacoes']:>7} operações  {medicao['erros']:>4} erros"
+            if medicao['operacoes']:
+                linha += (
+                    f"  p50 {medicao['p50_ms']:>7.2f} ms  p99 {medicao['p99_ms']:>7.2f} ms  "
+                    f"max {medicao['max_ms']:>7.2f} ms"
+                )
+            self.stdout.write(linha)
+        if resultado['leituras']['erros']:
+            self.stdout.write(self.style.WARNING('Leituras esperaram por escritas ("database is locked").'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Nenhuma leitura esperou por uma escrita.'))
+
+    def _abrir(self, alias):
+        # Conexão só desta thread, fora de DATABASES; transaction.atomic(using=alias) a encontra
+        banco = self.bancos[alias]
+        connections[alias] = load_backend(banco['ENGINE']).DatabaseWrapper(banco, alias)
+        return connections[alias]
+
+    def _fechar(self, alias):
+        connections[alias].close()
+        del connections[alias]
+
+    def _executar(self, options):
+        try:
+            with self._abrir(ESCRITA).cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                journal = cursor.fetchone()[0]
+                cursor.execute(
+                    'CREATE TABLE estresse (id INTEGER PRIMARY KEY, grupo INTEGER NOT NULL, texto TEXT NOT NULL)'
+                )
+                cursor.execute('CREATE INDEX estresse_grupo ON estresse (grupo)')
+        finally:
+            self._fechar(ESCRITA)
+
+        parar = threading.Event()
+        medicoes = {'leituras': [], 'escritas': []}
+
+        def leitor(numero):
+            tempos, erros = [], 0
+            grupo = numero
+            banco = self._abrir(LEITURA)
+            try:
+                while not parar.is_set():
+                    grupo = (grupo + 7) % 100
+                    inicio = time.perf_counter()
+                    try:
+                        with banco.cursor() as cursor:
+                            cursor.execute('SELECT COUNT(*), MAX(id) FROM estresse WHERE grupo = %s', [grupo])
+                            cursor.fetchone()
+                    except OperationalError:
+                        erros += 1
+                        continue
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+            finally:
+                self._fechar(LEITURA)
+            medicoes['leituras'].append((tempos, erros))
+
+        def escritor(numero):
+            tempos, erros = [], 0
+            texto = 'x' * 200
+            banco = self._abrir(ESCRITA)
+            try:
+                while not parar.is_set():
+                    inicio = time.perf_counter()
+                    try:
+                        # Lê e depois escreve na mesma transação, como o importador e a gravação de leads
+                        with transaction.atomic(using=ESCRITA), banco.cursor() as cursor:
+                            cursor.execute('SELECT COALESCE(MAX(id), 0) FROM estresse')
+                            base = cursor.fetchone()[0]
+                            cursor.executemany(
+                                'INSERT INTO estresse (grupo, texto) VALUES (%s, %s)',
+                                [((base + linha) % 100, texto) for linha in range(options['linhas'])],
+                            )
+                    except OperationalError:
+                        erros += 1
+                        continue
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+            finally:
+                self._fechar(ESCRITA)
+            medicoes['escritas'].append((tempos, erros))
+
+        threads = [threading.Thread(target=leitor, args=(numero,)) for numero in range(options['leitores'])]
+        threads += [threading.Thread(target=escritor, args=(numero,)) for numero in range(options['escritores'])]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['segundos'])
+        parar.set()
+        for thread in threads:
+            thread.join()
+
+        resultado = {'journal': journal, 'transacao': options['transacao']}
+        for papel, partes in medicoes.items():
+            tempos = [tempo for parte, _ in partes for tempo in parte]
+            resultado[papel] = _resumo(tempos, sum(erros for _, erros in partes))
+        return resultado
@@ -0,0 +1,50 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import exportacao
+
+
+class Command(BaseCommand):
+    help = 'Grava o feed dos imóveis para os portais (XML ou JSON, com gzip se o arquivo termina em .gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do feed, por exemplo feeds/imoveis.xml.gz')
+        parser.add_argument('--formato', choices=list(exportacao.FORMATOS), help='Padrão: pela extensão do arquivo')
+        parser.add_argument('--desde', help='Só os imóveis alterados a partir desta data (ISO 8601)')
+        parser.add_argument(
+            '--url-base', default=getattr(settings, 'EXPORTACAO_URL_BASE', ''),
+            help='Início das URLs dos imóveis e das fotos, por exemplo https://www.exemplo.com.br'
+        )
+        parser.add_argument('--bloco', type=int, default=exportacao.tamanho_bloco(), help='Imóveis lidos por consulta')
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        formato = options['formato'] or os.path.splitext(caminho.removesuffix('.gz'))[1].lstrip('.').lower()
+        if formato not in exportacao.FORMATOS:
+            raise CommandError('Informe --formato xml ou json.')
+        if not os.path.isdir(os.path.dirname(os.path.abspath(caminho))):
+            raise CommandError(f'Diretório não encontrado: {os.path.dirname(caminho)}')
+
+        desde = None
+        if options['desde']:
+            try:
+                desde = parse_datetime(options['desde'])
+            except ValueError:
+                desde = None
+            if desde is None:
+                raise CommandError('--desde deve ser uma data ISO 8601, como 2024-01-31T12:00:00.')
+            if timezone.is_naive(desde):
+                desde = timezone.make_aware(desde)
+
+        inicio = time.perf_counter()
+        total = exportacao.exportar_arquivo(
+            caminho, formato, desde, url_base=options['url_base'].rstrip('/'), tamanho=options['bloco']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} imóvel(is) exportado(s) para {caminho} em {time.perf_counter() - inicio:.1f} s.'
+        ))
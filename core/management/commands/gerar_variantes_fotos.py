@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core import imagens
+from core.models import FotoImovel
+
+
+class Command(BaseCommand):
+    help = 'Gera as variantes (miniatura, card e galeria) das fotos existentes em paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='Processos do pool (padrão: núcleos da CPU)')
+        parser.add_argument('--lote', type=int, default=200, help='Fotos lidas para memória por vez')
+        parser.add_argument('--todas', action='store_true', help='Reprocessa também as fotos que já têm variantes')
+
+    def handle(self, *args, **options):
+        # Por padrão, só fotos sem variantes ou com variantes de uma imagem anterior
+        fotos = [
+            foto for foto in FotoImovel.objects.only('pk', 'imagem', 'variantes').order_by('pk').iterator()
+            if foto.imagem and (options['todas'] or imagens.precisa_processar(foto))
+        ]
+
+        total = len(fotos)
+        self.stdout.write(f'{total} foto(s) para processar.')
+        processadas = falhas = 0
+        for inicio in range(0, total, options['lote']):
+            ok, erro = imagens.processar_em_lote(fotos[inicio:inicio + options['lote']], workers=options['workers'])
+            processadas += ok
+            falhas += erro
+            self.stdout.write(f'  {processadas + falhas}/{total}')
+
+        self.stdout.write(self.style.SUCCESS(f'{processadas} foto(s) processada(s), {falhas} falha(s).'))
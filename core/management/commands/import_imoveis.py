@@ -0,0 +1,47 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import importacao
+
+
+class Command(BaseCommand):
+    help = 'Importa imóveis de um feed de portal (CSV ou XML), criando ou atualizando pelo código do imóvel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do feed')
+        parser.add_argument('--formato', choices=['csv', 'xml'], help='Padrão: pela extensão do arquivo')
+        parser.add_argument('--delimitador', default=',', help='Separador de colunas do CSV')
+        parser.add_argument('--lote', type=int, default=importacao.TAMANHO_LOTE, help='Registros gravados por transação')
+        parser.add_argument('--fotos-dir', help='Diretório base das fotos com caminho relativo')
+        parser.add_argument('--workers', type=int, default=8, help='Threads que leem ou baixam as fotos')
+        parser.add_argument('--sem-fotos', action='store_true', help='Não importa as fotos')
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        if not os.path.exists(caminho):
+            raise CommandError(f'Arquivo não encontrado: {caminho}')
+        formato = options['formato'] or os.path.splitext(caminho)[1].lstrip('.').lower()
+        if formato == 'csv':
+            registros = importacao.ler_csv(caminho, options['delimitador'])
+        elif formato == 'xml':
+            registros = importacao.ler_xml(caminho)
+        else:
+            raise CommandError('Informe --formato csv ou xml.')
+
+        def progresso(dados):
+            self.stdout.write(
+                f"  {dados['lidos']} lidos ({dados['por_segundo']:.0f}/s): {dados['criados']} criados, "
+                f"{dados['atualizados']} atualizados, {dados['invalidos']} inválidos, {dados['fotos']} fotos"
+            )
+
+        importador = importacao.Importador(
+            tamanho_lote=options['lote'], diretorio_fotos=options['fotos_dir'], workers=options['workers'],
+            baixar_fotos=not options['sem_fotos'], progresso=progresso,
+        )
+        estatisticas = importador.importar(registros)
+        self.stdout.write(self.style.SUCCESS(
+            f"Importação concluída em {estatisticas['segundos']:.1f} s: {estatisticas['criados']} criado(s), "
+            f"{estatisticas['atualizados']} atualizado(s), {estatisticas['invalidos']} inválido(s), "
+            f"{estatisticas['fotos']} foto(s), {estatisticas['falhas_fotos']} falha(s) de foto."
+        ))
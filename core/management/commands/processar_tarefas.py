@@ -0,0 +1,39 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import tarefas
+
+
+class Command(BaseCommand):
+    help = 'Worker das tarefas em lote do admin: processa a fila até ser interrompido (ou uma vez, com --uma-vez)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true', help='Processa as tarefas pendentes e termina')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre consultas à fila vazia')
+
+    def handle(self, *args, **options):
+        self.parar = False
+        # SIGTERM termina a tarefa atual antes de sair; a próxima fica pendente
+        signal.signal(signal.SIGTERM, self._interromper)
+
+        while not self.parar:
+            close_old_connections()
+            tarefa = tarefas.reservar()
+            if tarefa is None:
+                if options['uma_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+            inicio = time.perf_counter()
+            tarefas.executar(tarefa)
+            estilo = self.style.SUCCESS if tarefa.status == tarefa.Status.CONCLUIDA else self.style.ERROR
+            self.stdout.write(estilo(
+                f'{tarefa}: {tarefa.get_status_display().lower()}, {tarefa.processados} de {tarefa.total} '
+                f'em {time.perf_counter() - inicio:.1f} s'
+            ))
+
+    def _interromper(self, *args):
+        self.parar = True
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core import busca
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca textual dos imóveis'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Imóveis processados por lote')
+
+    def handle(self, *args, **options):
+        backend = 'FTS5' if busca.usa_fts() else 'índice invertido'
+        total = busca.reconstruir_indice(tamanho_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'{total} imóvel(is) indexado(s) ({backend}).'))
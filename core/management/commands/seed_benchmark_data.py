@@ -0,0 +1,364 @@
+"""
+Base sintética para medir as páginas em escala (10 mil, 100 mil, 1 milhão de imóveis).
+
+Os dados saem de um ``random.Random(semente)``: a mesma semente e o mesmo
+tamanho geram sempre a mesma base (as datas são sorteadas nos dois anos
+anteriores à geração, então andam junto com ela). Tudo é gravado com ``bulk_create`` em
+lotes, e cada lote também atualiza, na mesma transação, o que os signals
+manteriam (resumos, índice de busca e histórico de preços), como na
+importação. Os imóveis gerados têm ``codigo_externo`` "bench-..." e os
+clientes e proprietários e-mails em DOMINIO, para que ``--limpar`` apague só
+eles.
+
+As fotos apontam para arquivos que não existem (``benchmark/...jpg``): as
+páginas montam as URLs, mas o navegador não acha as imagens.
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import busca, cache_paginas, facetas, historico_precos, resumos, similares
+from core.geo import codificar_geohash
+from core.motor_colunar import motor
+from core.models import (
+    Cliente, FotoImovel, Imovel, InfraCondominio, PrecoPorFinalidade, Proprietario,
+)
+from core.telefones import normalizar_telefone
+
+PREFIXO = 'bench-'
+
+DOMINIO = 'benchmark.exemplo.com'
+
+TAMANHOS = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+# cidade -> (peso, latitude, longitude, preço médio do m², bairros)
+CIDADES = {
+    'São Paulo': (40, -23.5505, -46.6333, 11000, [
+        'Moema', 'Pinheiros', 'Vila Mariana', 'Tatuapé', 'Santana', 'Itaim Bibi', 'Perdizes', 'Butantã',
+        'Mooca', 'Campo Belo', 'Lapa', 'Saúde',
+    ]),
+    'Rio de Janeiro': (20, -22.9068, -43.1729, 10000, [
+        'Copacabana', 'Botafogo', 'Tijuca', 'Barra da Tijuca', 'Leblon', 'Flamengo', 'Méier', 'Recreio',
+    ]),
+    'Campinas': (10, -22.9056, -47.0608, 7000, ['Cambuí', 'Taquaral', 'Barão Geraldo', 'Centro', 'Guanabara']),
+    'Belo Horizonte': (10, -19.9167, -43.9345, 8000, ['Savassi', 'Lourdes', 'Buritis', 'Pampulha', 'Funcionários']),
+    'Curitiba': (8, -25.4284, -49.2733, 8500, ['Batel', 'Água Verde', 'Bigorrilho', 'Portão', 'Centro']),
+    'Porto Alegre': (6, -30.0346, -51.2177, 7500, ['Moinhos de Vento', 'Menino Deus', 'Petrópolis', 'Bela Vista']),
+    'Santos': (4, -23.9608, -46.3336, 7000, ['Gonzaga', 'Boqueirão', 'Ponta da Praia', 'Aparecida']),
+    'Ribeirão Preto': (2, -21.1704, -47.8103, 5500, ['Jardim Botânico', 'Centro', 'Ribeirânia']),
+}
+
+ESTADOS = {
+    'São Paulo': 'SP', 'Rio de Janeiro': 'RJ', 'Campinas': 'SP', 'Belo Horizonte': 'MG', 'Curitiba': 'PR',
+    'Porto Alegre': 'RS', 'Santos': 'SP', 'Ribeirão Preto': 'SP',
+}
+
+# tipo -> (peso, área mínima, área máxima, quartos mínimos, quartos máximos)
+TIPOS = {
+    Imovel.TipoImovel.APARTAMENTO: (50, 35, 220, 1, 4),
+    Imovel.TipoImovel.CASA: (20, 70, 400, 2, 5),
+    Imovel.TipoImovel.SOBRADO: (7, 90, 350, 2, 5),
+    Imovel.TipoImovel.KITNET: (6, 18, 40, 0, 1),
+    Imovel.TipoImovel.LOFT: (3, 40, 120, 1, 2),
+    Imovel.TipoImovel.SALA_COMERCIAL: (6, 25, 300, 0, 0),
+    Imovel.TipoImovel.TERRENO: (4, 200, 2000, 0, 0),
+    Imovel.TipoImovel.CHACARA: (2, 1000, 20000, 2, 6),
+    Imovel.TipoImovel.GALPAO: (2, 300, 5000, 0, 0),
+}
+
+STATUS = {
+    Imovel.StatusImovel.ATIVO: 85,
+    Imovel.StatusImovel.VENDIDO: 6,
+    Imovel.StatusImovel.ALUGADO: 4,
+    Imovel.StatusImovel.RESERVADO: 2,
+    Imovel.StatusImovel.INATIVO: 3,
+}
+
+INFRAESTRUTURAS = [
+    ('Piscina', 'fas fa-swimming-pool'), ('Academia', 'fas fa-dumbbell'), ('Churrasqueira', 'fas fa-fire'),
+    ('Salão de Festas', 'fas fa-glass-cheers'), ('Playground', 'fas fa-child'),
+    ('Portaria 24h', 'fas fa-user-shield'), ('Quadra Poliesportiva', 'fas fa-basketball-ball'),
+    ('Sauna', 'fas fa-hot-tub'), ('Espaço Gourmet', 'fas fa-utensils'), ('Elevador', 'fas fa-building'),
+    ('Bicicletário', 'fas fa-bicycle'), ('Coworking', 'fas fa-laptop'),
+]
+
+RUAS = ['Rua das Flores', 'Avenida Brasil', 'Rua XV de Novembro', 'Alameda Santos', 'Rua da Paz', 'Avenida Central',
+        'Rua dos Ipês', 'Rua Sete de Setembro', 'Avenida Paulista', 'Rua Tiradentes']
+
+ADJETIVOS = ['amplo', 'reformado', 'iluminado', 'novo', 'aconchegante', 'com vista', 'bem localizado', 'espaçoso']
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Daniel', 'Eduarda', 'Felipe', 'Gabriela', 'Henrique', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Patrícia', 'Rafael', 'Sofia', 'Thiago', 'Vanessa', 'William']
+
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Rodrigues', 'Almeida',
+              'Nascimento', 'Carvalho', 'Ribeiro', 'Gomes', 'Martins', 'Araújo']
+
+DIAS_DE_HISTORIA = 730
+
+
+def _decimal(valor):
+    return Decimal(str(round(valor, 2)))
+
+
+def _restaurar_datas(modelo, objetos):
+    """Grava ``criado_em``/``atualizado_em`` dos objetos (um UPDATE por linha, sem o CASE do bulk_update)"""
+    tabela = connection.ops.quote_name(modelo._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(f'UPDATE {tabela} SET criado_em = %s, atualizado_em = %s WHERE id = %s', [
+            (
+                connection.ops.adapt_datetimefield_value(objeto.criado_em),
+                connection.ops.adapt_datetimefield_value(objeto.atualizado_em),
+                objeto.pk,
+            )
+            for objeto in objetos
+        ])
+
+
+def _sortear(aleatorio, pesos):
+    return aleatorio.choices(list(pesos), weights=list(pesos.values()))[0]
+
+
+class Gerador:
+    """Gera e grava a base; cada instância é uma sequência reproduzível"""
+
+    def __init__(self, semente, agora):
+        self.aleatorio = random.Random(semente)
+        self.agora = agora
+        self.pesos_cidades = {cidade: dados[0] for cidade, dados in CIDADES.items()}
+        self.pesos_tipos = {tipo: dados[0] for tipo, dados in TIPOS.items()}
+
+    def nome(self):
+        return f'{self.aleatorio.choice(NOMES)} {self.aleatorio.choice(SOBRENOMES)} {self.aleatorio.choice(SOBRENOMES)}'
+
+    def proprietarios(self, quantidade):
+        return [
+            Proprietario(
+                nome_completo=self.nome(), email=f'proprietario{numero}@{DOMINIO}',
+                telefone=f'(11) 9{self.aleatorio.randrange(10**7, 10**8)}',
+            )
+            for numero in range(quantidade)
+        ]
+
+    def imovel(self, numero, proprietario_id):
+        aleatorio = self.aleatorio
+        cidade = _sortear(aleatorio, self.pesos_cidades)
+        _, latitude, longitude, preco_m2, bairros = CIDADES[cidade]
+        tipo = _sortear(aleatorio, self.pesos_tipos)
+        _, area_min, area_max, quartos_min, quartos_max = TIPOS[tipo]
+        area = aleatorio.uniform(area_min, area_max)
+        quartos = aleatorio.randint(quartos_min, quartos_max)
+        status = _sortear(aleatorio, STATUS)
+        criado_em = self.agora - timedelta(seconds=aleatorio.uniform(0, DIAS_DE_HISTORIA * 86400))
+        bairro = aleatorio.choice(bairros)
+
+        imovel = Imovel(
+            codigo_externo=f'{PREFIXO}{numero:07d}', proprietario_id=proprietario_id, tipo=tipo, status=status,
+            titulo=f'{Imovel.TipoImovel(tipo).label} {aleatorio.choice(ADJETIVOS)} em {bairro}',
+            descricao=(
+                f'{Imovel.TipoImovel(tipo).label} com {quartos} quarto(s) e {area:.0f} m² em {bairro}, {cidade}. '
+                f'Próximo a comércio, escolas e transporte.'
+            ),
+            endereco=f'{aleatorio.choice(RUAS)}, {aleatorio.randint(1, 3000)}', bairro=bairro, cidade=cidade,
+            estado=ESTADOS[cidade], cep=f'{aleatorio.randrange(10000, 99999)}-{aleatorio.randrange(0, 999):03d}',
+            area_util=_decimal(area), area_total=_decimal(area * aleatorio.uniform(1.0, 1.4)),
+            quartos=quartos, suites=aleatorio.randint(0, quartos),
+            banheiros=max(1, aleatorio.randint(quartos // 2, quartos + 1)), vagas_garagem=aleatorio.randint(0, 4),
+            andar=str(aleatorio.randint(1, 25)) if tipo == Imovel.TipoImovel.APARTAMENTO else '',
+            ano_construcao=aleatorio.randint(1970, self.agora.year),
+            mobilia=aleatorio.choices(list(Imovel.Mobilia.values), weights=[15, 20, 65])[0],
+            pet_friendly=aleatorio.random() < 0.4, aceita_financiamento=aleatorio.random() < 0.7,
+            valor_condominio=(
+                _decimal(area * aleatorio.uniform(5, 15)) if tipo == Imovel.TipoImovel.APARTAMENTO else None
+            ),
+            valor_iptu=_decimal(area * aleatorio.uniform(1, 4)),
+        )
+        if aleatorio.random() < 0.9:
+            imovel.latitude = _decimal(latitude + aleatorio.gauss(0, 0.05)).quantize(Decimal('0.0000001'))
+            imovel.longitude = _decimal(longitude + aleatorio.gauss(0, 0.05)).quantize(Decimal('0.0000001'))
+            imovel.geohash = codificar_geohash(imovel.latitude, imovel.longitude)
+        imovel.criado_em = criado_em
+        imovel.atualizado_em = criado_em + (self.agora - criado_em) * aleatorio.random()
+        if status in Imovel.STATUS_NEGOCIADOS:
+            imovel.negociado_em = imovel.atualizado_em
+        imovel._preco_base = area * preco_m2 * aleatorio.uniform(0.7, 1.4)
+        return imovel
+
+    def precos(self, imovel):
+        aleatorio = self.aleatorio
+        venda = imovel._preco_base
+        sorteio = aleatorio.random()
+        finalidades = (
+            ['venda'] if sorteio < 0.55 else ['aluguel'] if sorteio < 0.85 else ['venda', 'aluguel'] if sorteio < 0.97
+            else ['temporada']
+        )
+        precos = []
+        for finalidade in finalidades:
+            if finalidade == 'venda':
+                precos.append(PrecoPorFinalidade(imovel=imovel, finalidade=finalidade, valor=_decimal(venda)))
+            elif finalidade == 'aluguel':
+                precos.append(PrecoPorFinalidade(
+                    imovel=imovel, finalidade=finalidade, valor=_decimal(venda * aleatorio.uniform(0.004, 0.006))
+                ))
+            else:
+                precos.append(PrecoPorFinalidade(
+                    imovel=imovel, finalidade=finalidade, valor=_decimal(venda * aleatorio.uniform(0.0003, 0.0006)),
+                    diaria_minima=aleatorio.randint(1, 5), taxa_limpeza=_decimal(aleatorio.uniform(80, 300)),
+                    capacidade_hospedes=aleatorio.randint(2, 12),
+                ))
+        return precos
+
+    def fotos(self, imovel):
+        if self.aleatorio.random() < 0.08:
+            return []
+        return [
+            FotoImovel(
+                imovel=imovel, imagem=f'benchmark/{imovel.codigo_externo}-{ordem}.jpg', ordem=ordem,
+                eh_capa=ordem == 0, largura=1600, altura=1200,
+            )
+            for ordem in range(self.aleatorio.randint(3, 10))
+        ]
+
+    def infraestrutura(self, imovel, infra_ids):
+        if imovel.tipo not in (Imovel.TipoImovel.APARTAMENTO, Imovel.TipoImovel.CASA, Imovel.TipoImovel.SOBRADO):
+            return []
+        return self.aleatorio.sample(infra_ids, self.aleatorio.randint(0, min(6, len(infra_ids))))
+
+    def cliente(self, numero):
+        aleatorio = self.aleatorio
+        telefone = f'({aleatorio.randint(11, 99)}) 9{aleatorio.randrange(1000, 9999)}-{aleatorio.randrange(1000, 9999)}'
+        cliente = Cliente(
+            nome_completo=self.nome(), email=f'cliente{numero}@{DOMINIO}', telefone=telefone,
+            telefone_normalizado=normalizar_telefone(telefone),
+            status=aleatorio.choice(Cliente.StatusCliente.values),
+            origem=aleatorio.choice(Cliente.OrigemContato.values),
+            finalidade_interesse=aleatorio.choice(['venda', 'aluguel', 'temporada', 'venda_aluguel', '']),
+            orcamento_max=_decimal(aleatorio.uniform(2000, 3_000_000)),
+        )
+        cliente.criado_em = self.agora - timedelta(seconds=aleatorio.uniform(0, DIAS_DE_HISTORIA * 86400))
+        cliente.atualizado_em = cliente.criado_em + (self.agora - cliente.criado_em) * aleatorio.random()
+        return cliente
+
+
+class Command(BaseCommand):
+    help = 'Gera uma base sintética e reproduzível de imóveis, preços, fotos, proprietários e clientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'tamanho', nargs='?', default='10k',
+            help=f"Imóveis a gerar: {', '.join(TAMANHOS)} ou um número (padrão: 10k)"
+        )
+        parser.add_argument('--semente', type=int, default=42, help='Semente do gerador (mesma semente, mesma base)')
+        parser.add_argument('--lote', type=int, default=2000, help='Imóveis gravados por transação')
+        parser.add_argument('--clientes', type=int, help='Clientes a gerar (padrão: 1 para cada 5 imóveis)')
+        parser.add_argument('--limpar', action='store_true', help='Apaga antes a base sintética anterior')
+        parser.add_argument(
+            '--sem-similares', action='store_true', help='Não recalcula os imóveis similares no final'
+        )
+
+    def handle(self, *args, **options):
+        tamanho = options['tamanho'].lower()
+        if tamanho in TAMANHOS:
+            quantidade = TAMANHOS[tamanho]
+        elif tamanho.isdigit() and int(tamanho) > 0:
+            quantidade = int(tamanho)
+        else:
+            raise CommandError(f"Tamanho inválido: {options['tamanho']}")
+        clientes = options['clientes'] if options['clientes'] is not None else quantidade // 5
+
+        if options['limpar']:
+            self._limpar()
+        elif Imovel.objects.filter(codigo_externo__startswith=PREFIXO).exists():
+            raise CommandError('Já existe uma base sintética; use --limpar para gerá-la de novo.')
+
+        inicio = time.perf_counter()
+        gerador = Gerador(options['semente'], timezone.now())
+        infra_ids = self._infraestruturas()
+        proprietario_ids = [
+            proprietario.pk for proprietario in Proprietario.objects.bulk_create(
+                gerador.proprietarios(max(1, quantidade // 8)), batch_size=1000
+            )
+        ]
+
+        imovel_ids = []
+        for comeco in range(0, quantidade, options['lote']):
+            numeros = range(comeco, min(comeco + options['lote'], quantidade))
+            imovel_ids += self._gravar_lote(gerador, numeros, proprietario_ids, infra_ids)
+            decorrido = time.perf_counter() - inicio
+            self.stdout.write(f'  {len(imovel_ids)} imóveis ({len(imovel_ids) / decorrido:.0f}/s)')
+
+        self._gravar_clientes(gerador, clientes, imovel_ids, options['lote'])
+
+        facetas.invalidar_cidades()
+        facetas.invalidar_infraestruturas()
+        cache_paginas.invalidar_catalogo()
+        motor.marcar_tudo()
+        if not options['sem_similares'] and similares.disponivel():
+            self.stdout.write('Calculando imóveis similares...')
+            similares.recalcular_todos()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Base sintética gerada em {time.perf_counter() - inicio:.1f} s: {quantidade} imóveis, '
+            f'{len(proprietario_ids)} proprietários, {clientes} clientes (semente {options["semente"]}).'
+        ))
+
+    def _limpar(self):
+        self.stdout.write('Apagando a base sintética anterior...')
+        with transaction.atomic():
+            Cliente.objects.filter(email__endswith=f'@{DOMINIO}').delete()
+            Imovel.objects.filter(codigo_externo__startswith=PREFIXO).delete()
+            Proprietario.objects.filter(email__endswith=f'@{DOMINIO}').delete()
+
+    def _infraestruturas(self):
+        for nome, icone in INFRAESTRUTURAS:
+            InfraCondominio.objects.get_or_create(nome=nome, defaults={'icone': icone})
+        return sorted(InfraCondominio.objects.filter(
+            nome__in=[nome for nome, _ in INFRAESTRUTURAS]
+        ).values_list('pk', flat=True))
+
+    def _gravar_lote(self, gerador, numeros, proprietario_ids, infra_ids):
+        imoveis = [gerador.imovel(numero, gerador.aleatorio.choice(proprietario_ids)) for numero in numeros]
+        datas = [(imovel.criado_em, imovel.atualizado_em) for imovel in imoveis]
+        Relacao = Imovel.infraestrutura.through
+        with transaction.atomic():
+            Imovel.objects.bulk_create(imoveis)
+            # bulk_create aplica auto_now_add/auto_now; as datas sorteadas voltam depois
+            for imovel, (criado_em, atualizado_em) in zip(imoveis, datas):
+                imovel.criado_em, imovel.atualizado_em = criado_em, atualizado_em
+            _restaurar_datas(Imovel, imoveis)
+
+            PrecoPorFinalidade.objects.bulk_create([preco for imovel in imoveis for preco in gerador.precos(imovel)])
+            FotoImovel.objects.bulk_create([foto for imovel in imoveis for foto in gerador.fotos(imovel)])
+            Relacao.objects.bulk_create([
+                Relacao(imovel_id=imovel.pk, infracondominio_id=infra_id)
+                for imovel in imoveis for infra_id in gerador.infraestrutura(imovel, infra_ids)
+            ])
+
+            # O que os signals manteriam, uma vez por lote
+            ids = [imovel.pk for imovel in imoveis]
+            resumos.reconstruir_resumos(ids)
+            busca.indexar_lote(imoveis)
+            historico_precos.sincronizar(ids)
+        return ids
+
+    def _gravar_clientes(self, gerador, quantidade, imovel_ids, tamanho_lote):
+        Interesse = Cliente.imoveis_interesse.through
+        for comeco in range(0, quantidade, tamanho_lote):
+            clientes = [gerador.cliente(numero) for numero in range(comeco, min(comeco + tamanho_lote, quantidade))]
+            datas = [(cliente.criado_em, cliente.atualizado_em) for cliente in clientes]
+            with transaction.atomic():
+                Cliente.objects.bulk_create(clientes)
+                for cliente, (criado_em, atualizado_em) in zip(clientes, datas):
+                    cliente.criado_em, cliente.atualizado_em = criado_em, atualizado_em
+                _restaurar_datas(Cliente, clientes)
+                Interesse.objects.bulk_create([
+                    Interesse(cliente_id=cliente.pk, imovel_id=imovel_id)
+                    for cliente in clientes
+                    for imovel_id in gerador.aleatorio.sample(
+                        imovel_ids, min(len(imovel_ids), gerador.aleatorio.randint(0, 3))
+                    )
+                ])
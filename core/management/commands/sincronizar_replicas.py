@@ -0,0 +1,59 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import replicas
+
+
+def _arquivo(alias):
+    """Caminho do arquivo SQLite de ``alias``, sem o ``file:`` e a querystring de um NAME em URI"""
+    banco = connections[alias]
+    if banco.vendor != 'sqlite':
+        raise CommandError(f'{alias} não é SQLite; use a replicação do próprio banco.')
+    nome = str(banco.settings_dict['NAME'])
+    if nome.startswith('file:'):
+        nome = nome.removeprefix('file:').split('?')[0]
+    return nome
+
+
+class Command(BaseCommand):
+    help = (
+        'Copia o banco default para as réplicas SQLite de REPLICAS_LEITURA (substituto da replicação '
+        'para testes locais)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--intervalo', type=float, help='Repete a cópia a cada N segundos até ser interrompido')
+
+    def handle(self, *args, **options):
+        if not replicas.aliases():
+            raise CommandError('Nenhuma réplica em REPLICAS_LEITURA.')
+        destinos = {alias: _arquivo(alias) for alias in replicas.aliases()}
+        _arquivo(DEFAULT_DB_ALIAS)
+
+        while True:
+            for alias, caminho in destinos.items():
+                inicio = time.perf_counter()
+                self._copiar(caminho)
+                self.stdout.write(f'{alias}: {caminho} atualizado em {time.perf_counter() - inicio:.2f} s')
+            if not options['intervalo']:
+                return
+            try:
+                time.sleep(options['intervalo'])
+            except KeyboardInterrupt:
+                return
+
+    def _copiar(self, caminho):
+        # API de backup do SQLite: cópia consistente mesmo com escritas no primário, e os leitores
+        # da réplica esperam a troca das páginas em vez de ver um arquivo pela metade
+        origem = connections[DEFAULT_DB_ALIAS]
+        origem.ensure_connection()
+        destino = sqlite3.connect(caminho, timeout=30)
+        try:
+            origem.connection.backup(destino)
+            # Journal tradicional: aberta só para leitura, a réplica não precisa criar os arquivos -wal e -shm
+            destino.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            destino.close()
@@ -0,0 +1,282 @@
+"""
+Medição de cada requisição: consultas, tempo no banco, na renderização dos
+templates e total.
+
+``MetricasMiddleware`` (primeiro da lista de MIDDLEWARE, para medir tudo)
+mede a requisição e:
+
+- devolve os tempos no cabeçalho ``Server-Timing`` (db, tpl, app e total, em
+  ms; ``app`` é o Python fora do banco e dos templates), que o navegador
+  mostra na aba de rede; METRICAS_SERVER_TIMING = False desliga o cabeçalho;
+- acumula histogramas por view (nome da rota, como ``core:home``) no
+  processo, expostos em formato texto do Prometheus por ``exportar``
+  (``/metricas/``);
+- registra um aviso quando a requisição passa do orçamento da view em
+  METRICAS_ORCAMENTOS (padrão ``ORCAMENTOS_PADRAO``), um dicionário
+  ``{view: {'consultas': n, 'db_ms': n, 'template_ms': n, 'total_ms': n}}``
+  com qualquer subconjunto das chaves.
+
+Os histogramas são de cada processo: com vários workers, cada coleta do
+Prometheus lê um deles, e o rótulo ``pid`` separa as séries. Respostas em
+streaming (o feed) são medidas até a view devolver a resposta, sem o envio.
+
+O tempo dos templates vem do backend ``TemplatesMedidos`` (TEMPLATES em
+settings): os templates que ele devolve só medem quando há uma requisição
+sendo medida. O sinal ``template_rendered`` do Django só é enviado pelo
+executor de testes, por isso não serve aqui.
+
+O endpoint de métricas exige o token de METRICAS_TOKEN (``Authorization:
+Bearer <token>``). Só em DEBUG, sem token configurado, aceita acessos de
+INTERNAL_IPS e do próprio servidor; atrás de um proxy reverso todo acesso
+chega de 127.0.0.1.
+"""
+import contextvars
+import logging
+import os
+import threading
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+ORCAMENTOS_PADRAO = {
+    'core:home': {'consultas': 10, 'total_ms': 300},
+    'core:lista_imoveis': {'consultas': 15, 'total_ms': 500},
+    'core:detalhe_imovel': {'consultas': 12, 'total_ms': 300},
+}
+
+LIMITES_SEGUNDOS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+LIMITES_CONSULTAS = [1, 2, 5, 10, 20, 50, 100, 200]
+
+# nome -> (descrição, limites dos buckets, chave da medição)
+HISTOGRAMAS = {
+    'imobiliaria_requisicao_segundos': ('Tempo total da requisição por view', LIMITES_SEGUNDOS, 'total'),
+    'imobiliaria_requisicao_db_segundos': ('Tempo no banco por requisição e view', LIMITES_SEGUNDOS, 'db'),
+    'imobiliaria_requisicao_template_segundos': (
+        'Tempo de renderização dos templates (sem o banco) por requisição e view', LIMITES_SEGUNDOS, 'template'
+    ),
+    'imobiliaria_requisicao_consultas': ('Consultas ao banco por requisição e view', LIMITES_CONSULTAS, 'consultas'),
+}
+
+_atual = contextvars.ContextVar('medicao', default=None)
+
+
+class Medicao:
+    def __init__(self):
+        self.inicio = perf_counter()
+        self.consultas = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.db_no_template = 0.0
+        self.renderizando = False
+
+    def valores(self, total):
+        # Consultas feitas durante a renderização (querysets preguiçosos) contam só no banco
+        template = max(self.template - self.db_no_template, 0.0)
+        return {
+            'consultas': self.consultas,
+            'db': self.db,
+            'template': template,
+            'app': max(total - self.db - template, 0.0),
+            'total': total,
+        }
+
+
+def _medir_consulta(execute, sql, params, many, context):
+    medicao = _atual.get()
+    inicio = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if medicao is not None:
+            duracao = perf_counter() - inicio
+            medicao.consultas += 1
+            medicao.db += duracao
+            if medicao.renderizando:
+                medicao.db_no_template += duracao
+
+
+class TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        medicao = _atual.get()
+        # Só a renderização de fora: render_to_string dentro de um template já está sendo medido
+        if medicao is None or medicao.renderizando:
+            return super().render(context, request)
+        medicao.renderizando = True
+        inicio = perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicao.template += perf_counter() - inicio
+            medicao.renderizando = False
+
+
+class TemplatesMedidos(DjangoTemplates):
+    """Backend de templates do Django cujos templates medem a renderização (uma vez por render())"""
+
+    def from_string(self, template_code):
+        return TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TemplateMedido(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.contagens = [0] * len(limites)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for posicao, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.contagens[posicao] += 1
+                break
+        self.soma += valor
+        self.total += 1
+
+
+class Registro:
+    """Histogramas e contagem de respostas do processo, por view"""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._histogramas = {}
+        self._respostas = {}
+
+    def observar(self, view, status, valores):
+        with self._trava:
+            for nome, (_, limites, chave) in HISTOGRAMAS.items():
+                histograma = self._histogramas.get((nome, view))
+                if histograma is None:
+                    histograma = self._histogramas[nome, view] = Histograma(limites)
+                histograma.observar(valores[chave])
+            classe = f'{status // 100}xx'
+            self._respostas[view, classe] = self._respostas.get((view, classe), 0) + 1
+
+    def limpar(self):
+        with self._trava:
+            self._histogramas.clear()
+            self._respostas.clear()
+
+    def texto(self):
+        """Formato de exposição em texto do Prometheus"""
+        pid = os.getpid()
+        linhas = []
+        with self._trava:
+            for nome, (descricao, _, _) in HISTOGRAMAS.items():
+                linhas += [f'# HELP {nome} {descricao}', f'# TYPE {nome} histogram']
+                for (metrica, view), histograma in sorted(self._histogramas.items()):
+                    if metrica != nome:
+                        continue
+                    rotulos = f'view="{_escapar(view)}",pid="{pid}"'
+                    acumulado = 0
+                    for limite, contagem in zip(histograma.limites, histograma.contagens):
+                        acumulado += contagem
+                        linhas.append(f'{nome}_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+                    linhas.append(f'{nome}_bucket{{{rotulos},le="+Inf"}} {histograma.total}')
+                    linhas.append(f'{nome}_sum{{{rotulos}}} {histograma.soma}')
+                    linhas.append(f'{nome}_count{{{rotulos}}} {histograma.total}')
+            nome = 'imobiliaria_respostas_total'
+            linhas += [f'# HELP {nome} Respostas por view e classe de status', f'# TYPE {nome} counter']
+            for (view, classe), total in sorted(self._respostas.items()):
+                linhas.append(f'{nome}{{view="{_escapar(view)}",status="{classe}",pid="{pid}"}} {total}')
+        return '\n'.join(linhas) + '\n'
+
+
+def _escapar(valor):
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registro = Registro()
+
+
+def nome_da_view(request):
+    rota = getattr(request, 'resolver_match', None)
+    if rota is None:
+        return 'sem_rota'
+    return rota.view_name or rota._func_path
+
+
+def orcamentos():
+    return getattr(settings, 'METRICAS_ORCAMENTOS', ORCAMENTOS_PADRAO)
+
+
+def _verificar_orcamento(request, view, valores):
+    orcamento = orcamentos().get(view)
+    if not orcamento:
+        return
+    medidos = {
+        'consultas': valores['consultas'],
+        'db_ms': valores['db'] * 1000,
+        'template_ms': valores['template'] * 1000,
+        'total_ms': valores['total'] * 1000,
+    }
+    excedidos = [
+        f'{chave} {medidos[chave]:.0f} > {limite}'
+        for chave, limite in orcamento.items() if medidos.get(chave, 0) > limite
+    ]
+    if excedidos:
+        logger.warning('%s acima do orçamento (%s): %s', view, request.get_full_path(), ', '.join(excedidos))
+
+
+def _server_timing(valores):
+    return ', '.join([
+        f'db;dur={valores["db"] * 1000:.1f};desc="{valores["consultas"]} consultas"',
+        f'tpl;dur={valores["template"] * 1000:.1f}',
+        f'app;dur={valores["app"] * 1000:.1f}',
+        f'total;dur={valores["total"] * 1000:.1f}',
+    ])
+
+
+class MetricasMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        medicao = Medicao()
+        token = _atual.set(medicao)
+        try:
+            with ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(_medir_consulta))
+                response = self.get_response(request)
+        finally:
+            _atual.reset(token)
+
+        valores = medicao.valores(perf_counter() - medicao.inicio)
+        view = nome_da_view(request)
+        registro.observar(view, response.status_code, valores)
+        _verificar_orcamento(request, view, valores)
+        if getattr(settings, 'METRICAS_SERVER_TIMING', True):
+            response['Server-Timing'] = _server_timing(valores)
+        return response
+
+
+def _autorizado(request):
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    if token:
+        return constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not settings.DEBUG:
+        return False
+    internos = set(getattr(settings, 'INTERNAL_IPS', [])) | {'127.0.0.1', '::1'}
+    return request.META.get('REMOTE_ADDR') in internos
+
+
+def exportar(request):
+    """Histogramas do processo no formato texto do Prometheus"""
+    if not _autorizado(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registro.texto(), content_type='text/plain; version=0.0.4; charset=utf-8')
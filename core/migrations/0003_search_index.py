@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:06
+
+import django.db.models.deletion
+from django.db import OperationalError, migrations, models
+
+
+def criar_search_index(apps, schema_editor):
+    # A tabela FTS5 só existe no SQLite; nos demais bancos a busca usa o
+    # índice invertido de TermoBusca.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+                "titulo, endereco, bairro, cidade, descricao, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite compilado sem FTS5
+            return
+        cursor.execute(
+            "INSERT INTO search_index (rowid, titulo, endereco, bairro, cidade, descricao) "
+            "SELECT id, titulo, endereco, bairro, cidade, descricao FROM core_imovel"
+        )
+
+
+def remover_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_cliente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermoBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termo', models.CharField(max_length=64)),
+                ('peso', models.FloatField(default=0)),
+                ('imovel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='termos_busca', to='core.imovel')),
+            ],
+            options={
+                'verbose_name': 'Termo de Busca',
+                'verbose_name_plural': 'Termos de Busca',
+                'unique_together': {('termo', 'imovel')},
+            },
+        ),
+        migrations.RunPython(criar_search_index, remover_search_index),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def preencher_resumos(apps, schema_editor):
+    Imovel = apps.get_model('core', 'Imovel')
+    ResumoImovel = apps.get_model('core', 'ResumoImovel')
+    campos = [
+        'titulo', 'tipo', 'status', 'endereco', 'bairro', 'cidade', 'area_util', 'quartos',
+        'banheiros', 'vagas_garagem', 'mobilia', 'pet_friendly', 'criado_em',
+    ]
+    resumos = []
+    for imovel in Imovel.objects.prefetch_related('fotos', 'precos').iterator(chunk_size=500):
+        fotos = sorted(imovel.fotos.all(), key=lambda f: (not f.eh_capa, f.ordem, f.criado_em))
+        resumo = ResumoImovel(
+            imovel_id=imovel.pk,
+            foto_capa=fotos[0].imagem.name if fotos else '',
+            total_fotos=len(fotos),
+            **{campo: getattr(imovel, campo) for campo in campos}
+        )
+        for preco in imovel.precos.all():
+            setattr(resumo, f'preco_{preco.finalidade}', preco.valor)
+        resumos.append(resumo)
+    ResumoImovel.objects.bulk_create(resumos, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoImovel',
+            fields=[
+                ('imovel', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumo', serialize=False, to='core.imovel')),
+                ('titulo', models.CharField(max_length=200)),
+                ('tipo', models.CharField(choices=[('apartamento', 'Apartamento'), ('casa', 'Casa'), ('sobrado', 'Sobrado'), ('kitnet', 'Kitnet'), ('loft', 'Loft'), ('sala_comercial', 'Sala Comercial'), ('terreno', 'Terreno'), ('chacara', 'Chácara'), ('galpao', 'Galpão')], max_length=20)),
+                ('status', models.CharField(choices=[('ativo', 'Ativo'), ('vendido', 'Vendido'), ('alugado', 'Alugado'), ('reservado', 'Reservado'), ('inativo', 'Inativo')], max_length=20)),
+                ('endereco', models.CharField(max_length=255)),
+                ('bairro', models.CharField(max_length=100)),
+                ('cidade', models.CharField(max_length=100)),
+                ('area_util', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('quartos', models.PositiveIntegerField(default=0)),
+                ('banheiros', models.PositiveIntegerField(default=0)),
+                ('vagas_garagem', models.PositiveIntegerField(default=0)),
+                ('mobilia', models.CharField(choices=[('mobiliado', 'Mobiliado'), ('semimobiliado', 'Semimobiliado'), ('vazio', 'Vazio')], max_length=20)),
+                ('pet_friendly', models.BooleanField(default=False)),
+                ('criado_em', models.DateTimeField()),
+                ('foto_capa', models.CharField(blank=True, help_text='Caminho da imagem de capa', max_length=255)),
+                ('total_fotos', models.PositiveIntegerField(default=0)),
+                ('preco_venda', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('preco_aluguel', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('preco_temporada', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+            ],
+            options={
+                'verbose_name': 'Resumo do Imóvel',
+                'verbose_name_plural': 'Resumos dos Imóveis',
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='core_resumo_status_5f7ff7_idx'), models.Index(fields=['status', 'tipo', 'cidade'], name='core_resumo_status_8bb524_idx')],
+            },
+        ),
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_resumo_imovel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fotoimovel',
+            name='altura',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='fotoimovel',
+            name='largura',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='fotoimovel',
+            name='variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Miniatura, card e galeria em WebP e JPEG'),
+        ),
+        migrations.AddField(
+            model_name='resumoimovel',
+            name='foto_capa_variantes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
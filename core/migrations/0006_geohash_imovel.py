@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def codificar_geohash(latitude, longitude, precisao=9):
+    # Cópia de core.geo.codificar_geohash: a migração não acompanha mudanças no código do app
+    latitude, longitude = float(latitude), float(longitude)
+    lat_min, lat_max, lng_min, lng_max = -90.0, 90.0, -180.0, 180.0
+    geohash, bits, valor, longitude_par = [], 0, 0, True
+    while len(geohash) < precisao:
+        if longitude_par:
+            meio = (lng_min + lng_max) / 2
+            valor = valor * 2 + (longitude >= meio)
+            lng_min, lng_max = (meio, lng_max) if longitude >= meio else (lng_min, meio)
+        else:
+            meio = (lat_min + lat_max) / 2
+            valor = valor * 2 + (latitude >= meio)
+            lat_min, lat_max = (meio, lat_max) if latitude >= meio else (lat_min, meio)
+        longitude_par = not longitude_par
+        bits += 1
+        if bits == 5:
+            geohash.append(BASE32[valor])
+            bits, valor = 0, 0
+    return ''.join(geohash)
+
+
+def preencher_geohash(apps, schema_editor):
+    Imovel = apps.get_model('core', 'Imovel')
+    geocodificados = Imovel.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    lote = []
+    for imovel in geocodificados.only('pk', 'latitude', 'longitude').iterator(chunk_size=500):
+        imovel.geohash = codificar_geohash(imovel.latitude, imovel.longitude)
+        lote.append(imovel)
+        if len(lote) >= 500:
+            Imovel.objects.bulk_update(lote, ['geohash'])
+            lote = []
+    Imovel.objects.bulk_update(lote, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_variantes_fotos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imovel',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, help_text='Calculado a partir da latitude e longitude', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(fields=['status', 'geohash'], name='core_imovel_status_fe04d2_idx'),
+        ),
+        migrations.RunPython(preencher_geohash, migrations.RunPython.noop),
+    ]
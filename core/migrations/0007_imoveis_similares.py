@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_geohash_imovel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImovelSimilar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posicao', models.PositiveSmallIntegerField()),
+                ('distancia', models.FloatField()),
+                ('imovel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similares', to='core.imovel')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_de', to='core.imovel')),
+            ],
+            options={
+                'verbose_name': 'Imóvel Similar',
+                'verbose_name_plural': 'Imóveis Similares',
+                'ordering': ['imovel', 'posicao'],
+                'unique_together': {('imovel', 'posicao')},
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_imoveis_similares'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecucaoCompatibilidade',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modo', models.CharField(choices=[('completa', 'Completa'), ('incremental', 'Incremental')], max_length=20)),
+                ('iniciado_em', models.DateTimeField()),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('clientes', models.PositiveIntegerField(default=0, help_text='Clientes com sugestões regravadas')),
+                ('imoveis', models.PositiveIntegerField(default=0, help_text='Imóveis avaliados')),
+            ],
+            options={
+                'verbose_name': 'Execução de Compatibilidade',
+                'verbose_name_plural': 'Execuções de Compatibilidade',
+                'ordering': ['-iniciado_em'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CompatibilidadeCliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontuacao', models.FloatField(help_text='De 0 a 100')),
+                ('finalidade', models.CharField(choices=[('venda', 'Venda'), ('aluguel', 'Aluguel'), ('temporada', 'Temporada')], max_length=20)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('calculado_em', models.DateTimeField(auto_now=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compatibilidades', to='core.cliente')),
+                ('imovel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compatibilidades', to='core.imovel')),
+            ],
+            options={
+                'verbose_name': 'Compatibilidade',
+                'verbose_name_plural': 'Compatibilidades',
+                'ordering': ['cliente', '-pontuacao'],
+                'indexes': [models.Index(fields=['cliente', '-pontuacao'], name='core_compat_cliente_a9975f_idx')],
+                'unique_together': {('cliente', 'imovel')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_compatibilidade_clientes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumoimovel',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
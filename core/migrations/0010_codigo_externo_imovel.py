@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_versao_resumo_imovel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imovel',
+            name='codigo_externo',
+            field=models.CharField(blank=True, help_text='Código do imóvel no feed do portal (importação)', max_length=60),
+        ),
+        migrations.AddConstraint(
+            model_name='imovel',
+            constraint=models.UniqueConstraint(condition=models.Q(('codigo_externo', ''), _negated=True), fields=('codigo_externo',), name='imovel_codigo_externo_unico'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_codigo_externo_imovel'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(fields=['atualizado_em'], name='core_imovel_atualiz_c5d67c_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_indice_atualizado_em_imovel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaLote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operacao', models.CharField(max_length=50)),
+                ('descricao', models.CharField(max_length=200)),
+                ('parametros', models.JSONField(blank=True, default=dict)),
+                ('ids', models.JSONField(default=list, help_text='Chaves dos registros selecionados')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('falhou', 'Falhou')], default='pendente', max_length=20)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processados', models.PositiveIntegerField(default=0)),
+                ('erro', models.TextField(blank=True)),
+                ('solicitante', models.CharField(blank=True, max_length=150)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True, help_text='Avançado a cada lote; parado indica worker interrompido')),
+            ],
+            options={
+                'verbose_name': 'Tarefa em Lote',
+                'verbose_name_plural': 'Tarefas em Lote',
+                'ordering': ['-criado_em'],
+                'indexes': [models.Index(fields=['status', 'criado_em'], name='core_tarefa_status_20d116_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_tarefas_lote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticaPreco',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês')),
+                ('cidade', models.CharField(max_length=100)),
+                ('bairro', models.CharField(blank=True, max_length=100)),
+                ('tipo', models.CharField(blank=True, choices=[('apartamento', 'Apartamento'), ('casa', 'Casa'), ('sobrado', 'Sobrado'), ('kitnet', 'Kitnet'), ('loft', 'Loft'), ('sala_comercial', 'Sala Comercial'), ('terreno', 'Terreno'), ('chacara', 'Chácara'), ('galpao', 'Galpão')], max_length=20)),
+                ('finalidade', models.CharField(choices=[('venda', 'Venda'), ('aluguel', 'Aluguel'), ('temporada', 'Temporada')], max_length=20)),
+                ('quantidade', models.PositiveIntegerField(help_text='Imóveis com preço em vigor no fim do mês')),
+                ('preco_mediano', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('preco_m2_mediano', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('calculado_em', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Estatística de Preço',
+                'verbose_name_plural': 'Estatísticas de Preço',
+                'ordering': ['finalidade', 'cidade', 'bairro', 'tipo', 'mes'],
+                'indexes': [models.Index(fields=['mes'], name='core_estati_mes_0451df_idx')],
+                'constraints': [models.UniqueConstraint(fields=('finalidade', 'cidade', 'bairro', 'tipo', 'mes'), name='estatistica_preco_unica')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HistoricoPreco',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('finalidade', models.CharField(choices=[('venda', 'Venda'), ('aluguel', 'Aluguel'), ('temporada', 'Temporada')], max_length=20)),
+                ('valor', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('registrado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('imovel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_precos', to='core.imovel')),
+            ],
+            options={
+                'verbose_name': 'Histórico de Preço',
+                'verbose_name_plural': 'Histórico de Preços',
+                'ordering': ['imovel', 'finalidade', 'registrado_em'],
+                'indexes': [models.Index(fields=['imovel', 'finalidade', 'registrado_em'], name='core_histor_imovel__7da43f_idx'), models.Index(fields=['registrado_em'], name='core_histor_registr_504990_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_historico_e_estatisticas_precos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstoqueRelatorio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cidade', models.CharField(max_length=100)),
+                ('tipo', models.CharField(choices=[('apartamento', 'Apartamento'), ('casa', 'Casa'), ('sobrado', 'Sobrado'), ('kitnet', 'Kitnet'), ('loft', 'Loft'), ('sala_comercial', 'Sala Comercial'), ('terreno', 'Terreno'), ('chacara', 'Chácara'), ('galpao', 'Galpão')], max_length=20)),
+                ('ativos', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Estoque (relatório)',
+                'verbose_name_plural': 'Estoque (relatório)',
+                'ordering': ['cidade', 'tipo'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExecucaoRelatorios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iniciado_em', models.DateTimeField()),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+                ('completa', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Execução dos Relatórios',
+                'verbose_name_plural': 'Execuções dos Relatórios',
+                'ordering': ['-iniciado_em'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LeadsRelatorio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês de cadastro')),
+                ('origem', models.CharField(choices=[('site', 'Site'), ('whatsapp', 'WhatsApp'), ('telefone', 'Telefone'), ('email', 'E-mail'), ('indicacao', 'Indicação'), ('facebook', 'Facebook'), ('instagram', 'Instagram'), ('placa', 'Placa'), ('outro', 'Outro')], max_length=20)),
+                ('status', models.CharField(choices=[('lead_frio', 'Lead Frio'), ('lead_morno', 'Lead Morno'), ('lead_quente', 'Lead Quente'), ('cliente_ativo', 'Cliente Ativo'), ('cliente_perdido', 'Cliente Perdido'), ('cliente_finalizado', 'Negócio Finalizado')], max_length=20)),
+                ('quantidade', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Leads (relatório)',
+                'verbose_name_plural': 'Leads (relatório)',
+                'ordering': ['mes', 'origem', 'status'],
+            },
+        ),
+        migrations.CreateModel(
+            name='NegociacoesRelatorio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mês da negociação')),
+                ('status', models.CharField(choices=[('ativo', 'Ativo'), ('vendido', 'Vendido'), ('alugado', 'Alugado'), ('reservado', 'Reservado'), ('inativo', 'Inativo')], max_length=20)),
+                ('quantidade', models.PositiveIntegerField()),
+                ('dias_medio', models.FloatField()),
+                ('dias_mediano', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'Negociações (relatório)',
+                'verbose_name_plural': 'Negociações (relatório)',
+                'ordering': ['mes', 'status'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProprietarioRelatorio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ativos', models.PositiveIntegerField()),
+                ('total', models.PositiveIntegerField()),
+            ],
+            options={
+                'verbose_name': 'Proprietários (relatório)',
+                'verbose_name_plural': 'Proprietários (relatório)',
+                'ordering': ['-ativos', '-total'],
+            },
+        ),
+        migrations.AddField(
+            model_name='imovel',
+            name='negociado_em',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Quando passou a vendido ou alugado', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='imovel',
+            index=models.Index(fields=['negociado_em'], name='core_imovel_negocia_428d5d_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='estoquerelatorio',
+            unique_together={('cidade', 'tipo')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='leadsrelatorio',
+            unique_together={('mes', 'origem', 'status')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='negociacoesrelatorio',
+            unique_together={('mes', 'status')},
+        ),
+        migrations.AddField(
+            model_name='proprietariorelatorio',
+            name='proprietario',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.proprietario'),
+        ),
+    ]
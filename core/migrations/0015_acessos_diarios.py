@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_relatorios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcessoImovelDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('visualizacoes', models.PositiveIntegerField(default=0)),
+                ('impressoes', models.PositiveIntegerField(default=0)),
+                ('imovel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='acessos', to='core.imovel')),
+            ],
+            options={
+                'verbose_name': 'Acesso Diário',
+                'verbose_name_plural': 'Acessos Diários',
+                'ordering': ['-dia'],
+                'indexes': [models.Index(fields=['dia'], name='core_acesso_dia_cc0326_idx')],
+                'constraints': [models.UniqueConstraint(fields=('imovel', 'dia'), name='acesso_imovel_dia_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:57
+
+from django.db import migrations, models
+
+from core.telefones import normalizar_telefone
+
+
+def preencher_telefone_normalizado(apps, schema_editor):
+    Cliente = apps.get_model('core', 'Cliente')
+    lote = []
+    for cliente in Cliente.objects.only('pk', 'telefone').iterator(chunk_size=500):
+        cliente.telefone_normalizado = normalizar_telefone(cliente.telefone)
+        lote.append(cliente)
+        if len(lote) >= 500:
+            Cliente.objects.bulk_update(lote, ['telefone_normalizado'])
+            lote = []
+    Cliente.objects.bulk_update(lote, ['telefone_normalizado'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_acessos_diarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='telefone_normalizado',
+            field=models.CharField(blank=True, editable=False, help_text='Só os dígitos com DDD, para achar clientes repetidos', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['telefone_normalizado'], name='core_client_telefon_01c2de_idx'),
+        ),
+        migrations.RunPython(preencher_telefone_normalizado, migrations.RunPython.noop),
+    ]
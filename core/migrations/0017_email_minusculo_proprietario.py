@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:49
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_telefone_normalizado_cliente'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='proprietario',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='core_propri_email_lower_idx'),
+        ),
+    ]
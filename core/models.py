@@ -1,8 +1,16 @@
 import uuid
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
 from django.db import models
+from django.db.models.functions import Lower
 from django.core.validators import MinLengthValidator, EmailValidator
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .geo import codificar_geohash
+from .telefones import normalizar_telefone
+
 
 class Proprietario(models.Model):
     owner_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -15,6 +23,10 @@ class Proprietario(models.Model):
         verbose_name = 'Proprietário'
         verbose_name_plural = 'Proprietários'
         ordering = ['nome_completo']
+        indexes = [
+            # Busca pelo e-mail sem diferenciar maiúsculas (importação dos feeds)
+            models.Index(Lower('email'), name='core_propri_email_lower_idx'),
+        ]
     
     def __str__(self):
         return self.nome_completo
@@ -44,6 +56,9 @@ class Cliente(models.Model):
     nome_completo = models.CharField(max_length=150, validators=[MinLengthValidator(3)])
     email = models.EmailField(blank=True)
     telefone = models.CharField(max_length=20)
+    telefone_normalizado = models.CharField(
+        max_length=20, blank=True, editable=False, help_text="Só os dígitos com DDD, para achar clientes repetidos"
+    )
     
     # Gestão comercial
     status = models.CharField(max_length=20, choices=StatusCliente.choices, default=StatusCliente.LEAD_FRIO)
@@ -80,11 +95,19 @@ class Cliente(models.Model):
             models.Index(fields=['origem']),
             models.Index(fields=['criado_em']),
             models.Index(fields=['ultimo_contato']),
+            models.Index(fields=['telefone_normalizado']),
         ]
     
     def __str__(self):
         return f"{self.nome_completo} ({self.get_status_display()})"
     
+    def save(self, *args, **kwargs):
+        self.telefone_normalizado = normalizar_telefone(self.telefone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'telefone' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'telefone_normalizado'}
+        super().save(*args, **kwargs)
+    
     @property
     def total_imoveis_interesse(self):
         return self.imoveis_interesse.count()
@@ -122,6 +145,9 @@ class Imovel(models.Model):
         RESERVADO = 'reservado', 'Reservado'
         INATIVO = 'inativo', 'Inativo'
     
+    # Status que encerram a negociação (tempo até a venda nos relatórios)
+    STATUS_NEGOCIADOS = [StatusImovel.VENDIDO, StatusImovel.ALUGADO]
+    
     class Mobilia(models.TextChoices):
         MOBILIADO = 'mobiliado', 'Mobiliado'
         SEMIMOBILIADO = 'semimobiliado', 'Semimobiliado'
@@ -129,6 +155,7 @@ class Imovel(models.Model):
     
     # Identificação
     proprietario = models.ForeignKey(Proprietario, on_delete=models.CASCADE, related_name='imoveis')
+    codigo_externo = models.CharField(max_length=60, blank=True, help_text="Código do imóvel no feed do portal (importação)")
     titulo = models.CharField(max_length=200)
     descricao = models.TextField(blank=True)
     tipo = models.CharField(max_length=20, choices=TipoImovel.choices)
@@ -142,6 +169,7 @@ class Imovel(models.Model):
     cep = models.CharField(max_length=9)
     latitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
     longitude = models.DecimalField(max_digits=10, decimal_places=7, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, editable=False, help_text="Calculado a partir da latitude e longitude")
     
     # Características físicas
     area_util = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
@@ -168,6 +196,7 @@ class Imovel(models.Model):
     # Controle
     criado_em = models.DateTimeField(auto_now_add=True)
     atualizado_em = models.DateTimeField(auto_now=True)
+    negociado_em = models.DateTimeField(null=True, blank=True, editable=False, help_text="Quando passou a vendido ou alugado")
     
     class Meta:
         verbose_name = 'Imóvel'
@@ -178,11 +207,51 @@ class Imovel(models.Model):
             models.Index(fields=['cidade', 'bairro']),
             models.Index(fields=['quartos', 'banheiros']),
             models.Index(fields=['criado_em']),
+            models.Index(fields=['status', 'geohash']),
+            models.Index(fields=['atualizado_em']),
+            models.Index(fields=['negociado_em']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['codigo_externo'], condition=~models.Q(codigo_externo=''),
+                name='imovel_codigo_externo_unico'
+            ),
         ]
     
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.bairro}, {self.cidade}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Guarda os valores lidos do banco para os signals detectarem alterações
+        instance = super().from_db(db, field_names, values)
+        instance._valores_carregados = dict(zip(field_names, values))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = codificar_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        if self.campo_alterado('status'):
+            self.negociado_em = timezone.now() if self.status in self.STATUS_NEGOCIADOS else None
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        if update_fields is not None and 'status' in update_fields:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'negociado_em'}
+        super().save(*args, **kwargs)
+        self._valores_carregados = {
+            field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+        }
+    
+    def campo_alterado(self, campo):
+        """Indica se o campo mudou desde a leitura (ou se não há como saber)"""
+        carregados = getattr(self, '_valores_carregados', None)
+        if carregados is None or campo not in carregados:
+            return True
+        return carregados[campo] != getattr(self, campo)
+    
     @property
     def tem_fotos(self):
         return self.fotos.exists()
@@ -193,8 +262,6 @@ class Imovel(models.Model):
     
     @property
     def recem_publicado(self):
-        from django.utils import timezone
-        from datetime import timedelta
         return self.criado_em >= timezone.now() - timedelta(days=7)
 
 
@@ -227,6 +294,236 @@ class PrecoPorFinalidade(models.Model):
         return f"{self.imovel} - {self.get_finalidade_display()}: R$ {self.valor}"
 
 
+class HistoricoPreco(models.Model):
+    """
+    Histórico dos preços, só com inserções (core.historico_precos). Uma linha
+    por mudança; valor vazio indica que o imóvel saiu do mercado na finalidade
+    (preço removido ou imóvel deixou de estar ativo).
+    """
+    imovel = models.ForeignKey(Imovel, on_delete=models.CASCADE, related_name='historico_precos')
+    finalidade = models.CharField(max_length=20, choices=PrecoPorFinalidade.Finalidade.choices)
+    valor = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    registrado_em = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Histórico de Preço'
+        verbose_name_plural = 'Histórico de Preços'
+        ordering = ['imovel', 'finalidade', 'registrado_em']
+        indexes = [
+            models.Index(fields=['imovel', 'finalidade', 'registrado_em']),
+            models.Index(fields=['registrado_em']),
+        ]
+    
+    def __str__(self):
+        valor = f"R$ {self.valor}" if self.valor is not None else "fora do mercado"
+        return f"{self.imovel_id} - {self.get_finalidade_display()}: {valor} em {self.registrado_em:%d/%m/%Y}"
+
+
+class EstatisticaPreco(models.Model):
+    """
+    Medianas mensais do preço e do preço por m² (core.historico_precos).
+    Bairro vazio agrega a cidade inteira e tipo vazio agrega todos os tipos.
+    """
+    mes = models.DateField(help_text="Primeiro dia do mês")
+    cidade = models.CharField(max_length=100)
+    bairro = models.CharField(max_length=100, blank=True)
+    tipo = models.CharField(max_length=20, choices=Imovel.TipoImovel.choices, blank=True)
+    finalidade = models.CharField(max_length=20, choices=PrecoPorFinalidade.Finalidade.choices)
+    quantidade = models.PositiveIntegerField(help_text="Imóveis com preço em vigor no fim do mês")
+    preco_mediano = models.DecimalField(max_digits=12, decimal_places=2)
+    preco_m2_mediano = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    calculado_em = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Estatística de Preço'
+        verbose_name_plural = 'Estatísticas de Preço'
+        ordering = ['finalidade', 'cidade', 'bairro', 'tipo', 'mes']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['finalidade', 'cidade', 'bairro', 'tipo', 'mes'], name='estatistica_preco_unica'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['mes']),
+        ]
+    
+    def __str__(self):
+        local = f"{self.bairro}, {self.cidade}" if self.bairro else self.cidade
+        return f"{local} - {self.get_finalidade_display()} {self.mes:%m/%Y}"
+
+
+class AcessoImovelDiario(models.Model):
+    """Visualizações da página de detalhe e impressões nos cards, por imóvel e dia (core.contadores)"""
+    imovel = models.ForeignKey(Imovel, on_delete=models.CASCADE, related_name='acessos')
+    dia = models.DateField()
+    visualizacoes = models.PositiveIntegerField(default=0)
+    impressoes = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Acesso Diário'
+        verbose_name_plural = 'Acessos Diários'
+        ordering = ['-dia']
+        constraints = [
+            models.UniqueConstraint(fields=['imovel', 'dia'], name='acesso_imovel_dia_unico'),
+        ]
+        indexes = [
+            models.Index(fields=['dia']),
+        ]
+    
+    def __str__(self):
+        return f"{self.imovel_id} em {self.dia:%d/%m/%Y}: {self.visualizacoes} visualizações"
+
+
+class EstoqueRelatorio(models.Model):
+    """Imóveis ativos por cidade e tipo, para o painel de relatórios (core.relatorios)"""
+    cidade = models.CharField(max_length=100)
+    tipo = models.CharField(max_length=20, choices=Imovel.TipoImovel.choices)
+    ativos = models.PositiveIntegerField()
+    
+    class Meta:
+        verbose_name = 'Estoque (relatório)'
+        verbose_name_plural = 'Estoque (relatório)'
+        ordering = ['cidade', 'tipo']
+        unique_together = ['cidade', 'tipo']
+
+
+class LeadsRelatorio(models.Model):
+    """Clientes cadastrados por mês, origem e status atual"""
+    mes = models.DateField(help_text="Primeiro dia do mês de cadastro")
+    origem = models.CharField(max_length=20, choices=Cliente.OrigemContato.choices)
+    status = models.CharField(max_length=20, choices=Cliente.StatusCliente.choices)
+    quantidade = models.PositiveIntegerField()
+    
+    class Meta:
+        verbose_name = 'Leads (relatório)'
+        verbose_name_plural = 'Leads (relatório)'
+        ordering = ['mes', 'origem', 'status']
+        unique_together = ['mes', 'origem', 'status']
+
+
+class NegociacoesRelatorio(models.Model):
+    """Imóveis vendidos ou alugados por mês, com o tempo desde o cadastro"""
+    mes = models.DateField(help_text="Primeiro dia do mês da negociação")
+    status = models.CharField(max_length=20, choices=Imovel.StatusImovel.choices)
+    quantidade = models.PositiveIntegerField()
+    dias_medio = models.FloatField()
+    dias_mediano = models.FloatField()
+    
+    class Meta:
+        verbose_name = 'Negociações (relatório)'
+        verbose_name_plural = 'Negociações (relatório)'
+        ordering = ['mes', 'status']
+        unique_together = ['mes', 'status']
+
+
+class ProprietarioRelatorio(models.Model):
+    """Proprietários com mais imóveis ativos"""
+    proprietario = models.OneToOneField(Proprietario, on_delete=models.CASCADE, related_name='+')
+    ativos = models.PositiveIntegerField()
+    total = models.PositiveIntegerField()
+    
+    class Meta:
+        verbose_name = 'Proprietários (relatório)'
+        verbose_name_plural = 'Proprietários (relatório)'
+        ordering = ['-ativos', '-total']
+
+
+class ExecucaoRelatorios(models.Model):
+    """Execução do comando atualizar_relatorios; a incremental parte da última concluída"""
+    iniciado_em = models.DateTimeField()
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    completa = models.BooleanField(default=False)
+    
+    class Meta:
+        verbose_name = 'Execução dos Relatórios'
+        verbose_name_plural = 'Execuções dos Relatórios'
+        ordering = ['-iniciado_em']
+    
+    def __str__(self):
+        return f"{'Completa' if self.completa else 'Incremental'} - {self.iniciado_em:%d/%m/%Y %H:%M}"
+
+
+class CompatibilidadeCliente(models.Model):
+    """Imóvel sugerido a um cliente pelo motor de compatibilidade (core.compatibilidade)"""
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='compatibilidades')
+    imovel = models.ForeignKey(Imovel, on_delete=models.CASCADE, related_name='compatibilidades')
+    pontuacao = models.FloatField(help_text="De 0 a 100")
+    finalidade = models.CharField(max_length=20, choices=PrecoPorFinalidade.Finalidade.choices)
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    calculado_em = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Compatibilidade'
+        verbose_name_plural = 'Compatibilidades'
+        ordering = ['cliente', '-pontuacao']
+        unique_together = ['cliente', 'imovel']
+        indexes = [
+            models.Index(fields=['cliente', '-pontuacao']),
+        ]
+    
+    def __str__(self):
+        return f"{self.cliente} ↔ {self.imovel} ({self.pontuacao:.0f})"
+
+
+class ExecucaoCompatibilidade(models.Model):
+    """Registro de cada execução do motor de compatibilidade; a incremental parte da última"""
+    class Modo(models.TextChoices):
+        COMPLETA = 'completa', 'Completa'
+        INCREMENTAL = 'incremental', 'Incremental'
+    
+    modo = models.CharField(max_length=20, choices=Modo.choices)
+    iniciado_em = models.DateTimeField()
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    clientes = models.PositiveIntegerField(default=0, help_text="Clientes com sugestões regravadas")
+    imoveis = models.PositiveIntegerField(default=0, help_text="Imóveis avaliados")
+    
+    class Meta:
+        verbose_name = 'Execução de Compatibilidade'
+        verbose_name_plural = 'Execuções de Compatibilidade'
+        ordering = ['-iniciado_em']
+    
+    def __str__(self):
+        return f"{self.get_modo_display()} - {self.iniciado_em:%d/%m/%Y %H:%M}"
+
+
+class TarefaLote(models.Model):
+    """Ação em lote do admin, executada pelo comando processar_tarefas (core.tarefas)"""
+    class Status(models.TextChoices):
+        PENDENTE = 'pendente', 'Pendente'
+        EXECUTANDO = 'executando', 'Executando'
+        CONCLUIDA = 'concluida', 'Concluída'
+        FALHOU = 'falhou', 'Falhou'
+    
+    operacao = models.CharField(max_length=50)
+    descricao = models.CharField(max_length=200)
+    parametros = models.JSONField(default=dict, blank=True)
+    ids = models.JSONField(default=list, help_text="Chaves dos registros selecionados")
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDENTE)
+    total = models.PositiveIntegerField(default=0)
+    processados = models.PositiveIntegerField(default=0)
+    erro = models.TextField(blank=True)
+    solicitante = models.CharField(max_length=150, blank=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True, help_text="Avançado a cada lote; parado indica worker interrompido")
+    
+    class Meta:
+        verbose_name = 'Tarefa em Lote'
+        verbose_name_plural = 'Tarefas em Lote'
+        ordering = ['-criado_em']
+        indexes = [
+            models.Index(fields=['status', 'criado_em']),
+        ]
+    
+    def __str__(self):
+        return f"#{self.pk} {self.descricao}"
+    
+    @property
+    def percentual(self):
+        return 100 if not self.total else int(100 * self.processados / self.total)
+
+
 class FotoImovel(models.Model):
     imovel = models.ForeignKey(Imovel, on_delete=models.CASCADE, related_name='fotos')
     imagem = models.ImageField(upload_to='imoveis/')
@@ -235,6 +532,11 @@ class FotoImovel(models.Model):
     ordem = models.PositiveIntegerField(default=0)
     criado_em = models.DateTimeField(auto_now_add=True)
     
+    # Preenchidos por core.imagens depois do upload
+    largura = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    altura = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    variantes = models.JSONField(default=dict, blank=True, editable=False, help_text="Miniatura, card e galeria em WebP e JPEG")
+    
     class Meta:
         verbose_name = 'Foto do Imóvel'
         verbose_name_plural = 'Fotos do Imóvel'
@@ -250,4 +552,124 @@ class FotoImovel(models.Model):
         # Garantir que apenas uma foto seja capa por imóvel
         if self.eh_capa:
             FotoImovel.objects.filter(imovel=self.imovel).update(eh_capa=False)
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+    
+    @property
+    def url_miniatura(self):
+        miniatura = self.variantes.get('thumb')
+        if miniatura:
+            return default_storage.url(miniatura['jpeg'])
+        return self.imagem.url if self.imagem else ''
+
+
+class TermoBusca(models.Model):
+    """Entrada do índice invertido usado quando o FTS5 não está disponível"""
+    termo = models.CharField(max_length=64)
+    imovel = models.ForeignKey(Imovel, on_delete=models.CASCADE, related_name='termos_busca')
+    peso = models.FloatField(default=0)
+    
+    class Meta:
+        verbose_name = 'Termo de Busca'
+        verbose_name_plural = 'Termos de Busca'
+        unique_together = ['termo', 'imovel']
+    
+    def __str__(self):
+        return f"{self.termo} → {self.imovel_id}"
+
+
+class ImovelSimilar(models.Model):
+    """Vizinho mais próximo de um imóvel, calculado em lote por core.similares"""
+    imovel = models.ForeignKey(Imovel, on_delete=models.CASCADE, related_name='similares')
+    similar = models.ForeignKey(Imovel, on_delete=models.CASCADE, related_name='similar_de')
+    posicao = models.PositiveSmallIntegerField()
+    distancia = models.FloatField()
+    
+    class Meta:
+        verbose_name = 'Imóvel Similar'
+        verbose_name_plural = 'Imóveis Similares'
+        ordering = ['imovel', 'posicao']
+        unique_together = ['imovel', 'posicao']
+    
+    def __str__(self):
+        return f"{self.imovel_id} → {self.similar_id} ({self.distancia:.2f})"
+
+
+class PrecoResumo:
+    """Preço lido do resumo do card, com a mesma interface usada nos templates"""
+    
+    def __init__(self, finalidade, valor):
+        self.finalidade = finalidade
+        self.valor = valor
+    
+    def get_finalidade_display(self):
+        return PrecoPorFinalidade.Finalidade(self.finalidade).label
+
+
+class ResumoImovel(models.Model):
+    """Dados do card do imóvel, desnormalizados e mantidos pelos signals de core.signals"""
+    imovel = models.OneToOneField(Imovel, on_delete=models.CASCADE, primary_key=True, related_name='resumo')
+    
+    # Campos do card (cópia de Imovel)
+    titulo = models.CharField(max_length=200)
+    tipo = models.CharField(max_length=20, choices=Imovel.TipoImovel.choices)
+    status = models.CharField(max_length=20, choices=Imovel.StatusImovel.choices)
+    endereco = models.CharField(max_length=255)
+    bairro = models.CharField(max_length=100)
+    cidade = models.CharField(max_length=100)
+    area_util = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    quartos = models.PositiveIntegerField(default=0)
+    banheiros = models.PositiveIntegerField(default=0)
+    vagas_garagem = models.PositiveIntegerField(default=0)
+    mobilia = models.CharField(max_length=20, choices=Imovel.Mobilia.choices)
+    pet_friendly = models.BooleanField(default=False)
+    criado_em = models.DateTimeField()
+    
+    # Agregados de fotos e preços
+    foto_capa = models.CharField(max_length=255, blank=True, help_text="Caminho da imagem de capa")
+    foto_capa_variantes = models.JSONField(default=dict, blank=True)
+    total_fotos = models.PositiveIntegerField(default=0)
+    preco_venda = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    preco_aluguel = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    preco_temporada = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    
+    # Versão do card, usada na chave do fragmento em cache
+    atualizado_em = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Resumo do Imóvel'
+        verbose_name_plural = 'Resumos dos Imóveis'
+        indexes = [
+            models.Index(fields=['status', 'criado_em']),
+            models.Index(fields=['status', 'tipo', 'cidade']),
+        ]
+    
+    # Campos copiados de Imovel sem alteração
+    CAMPOS_IMOVEL = [
+        'titulo', 'tipo', 'status', 'endereco', 'bairro', 'cidade', 'area_util', 'quartos',
+        'banheiros', 'vagas_garagem', 'mobilia', 'pet_friendly', 'criado_em',
+    ]
+    
+    def __str__(self):
+        return f"Resumo - {self.titulo}"
+    
+    @property
+    def foto_capa_url(self):
+        return default_storage.url(self.foto_capa) if self.foto_capa else ''
+    
+    @property
+    def lista_precos(self):
+        precos = []
+        for finalidade in PrecoPorFinalidade.Finalidade.values:
+            valor = getattr(self, f'preco_{finalidade}')
+            if valor is not None:
+                precos.append(PrecoResumo(finalidade, valor))
+        return precos
+    
+    @property
+    def preco_principal(self):
+        precos = self.lista_precos
+        return precos[0] if precos else None
+    
+    @property
+    def recem_publicado(self):
+        return self.criado_em >= timezone.now() - timedelta(days=7)
@@ -0,0 +1,552 @@
+"""
+Motor colunar (opcional) para os filtros da listagem de imóveis.
+
+Mantém em memória, em arrays do NumPy, as colunas filtráveis dos imóveis
+ativos; as infraestruturas do condomínio ficam em bitsets ``uint64``. Filtro,
+ordenação, paginação por cursor e contagens por faceta são feitos com máscaras
+vetorizadas, e o banco só é consultado para ler os 12 cards da página.
+
+Os signals de core.signals marcam os imóveis alterados e a consulta seguinte
+relê apenas essas linhas. Cada processo tem a sua cópia das colunas; as
+gravações de outros processos (admin, ``processar_tarefas``, importação)
+chegam pela versão do catálogo no cache compartilhado (core.cache_paginas):
+quando ela muda, a consulta relê os imóveis com ``atualizado_em`` desde a
+leitura anterior, e reconstrói tudo se algum imóvel ativo sumiu do banco.
+Por segurança a cópia também é reconstruída por completo a cada
+``IMOVEIS_MOTOR_COLUNAR_TTL`` segundos.
+
+Cidade e bairro são comparados sem diferenciar maiúsculas em todo o Unicode
+(o LIKE do SQLite só faz isso com letras ASCII).
+
+Ativado com ``IMOVEIS_MOTOR_COLUNAR = True``; sem o NumPy instalado a
+listagem continua usando o ORM.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import busca, cache_paginas
+from .facetas import QUARTOS_MINIMOS
+from .geo import RAIO_TERRA_KM
+from .models import Imovel, PrecoPorFinalidade, ResumoImovel
+from .paginacao import POR_PAGINA, PaginaCursor, codificar_cursor, decodificar_cursor
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependência opcional
+    np = None
+
+logger = logging.getLogger(__name__)
+
+FINALIDADES = list(PrecoPorFinalidade.Finalidade.values)
+
+EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Ao reler as alterações de outros processos, volta este tanto antes da leitura anterior:
+# cobre transações que gravaram atualizado_em antes dela mas só terminaram depois
+MARGEM_RELEITURA = timedelta(seconds=60)
+
+# Colunas escalares: nome -> dtype
+COLUNAS = {
+    'pk': 'int64',
+    'ativo': 'bool',
+    'criado_em': 'int64',  # microssegundos desde a época, em UTC
+    'tipo': 'int32',
+    'cidade': 'int32',
+    'cidade_iexact': 'int32',
+    'bairro': 'U100',  # em minúsculas, para o icontains
+    'quartos': 'int32',
+    'banheiros': 'int32',
+    'vagas_garagem': 'int32',
+    'area_util': 'float64',  # NaN quando não informada
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'mobilia': 'int32',
+    'pet_friendly': 'bool',
+    'aceita_financiamento': 'bool',
+    'tem_fotos': 'bool',
+}
+
+# Colunas categóricas guardadas como códigos inteiros
+CATEGORICAS = ['tipo', 'cidade', 'cidade_iexact', 'mobilia']
+
+
+def disponivel():
+    return np is not None
+
+
+def ativo():
+    return disponivel() and getattr(settings, 'IMOVEIS_MOTOR_COLUNAR', False)
+
+
+def _microssegundos(data):
+    return (data - EPOCA) // timedelta(microseconds=1)
+
+
+class _Colunas:
+    """
+    Cópia das colunas usada pelas consultas.
+
+    Uma instância nunca é alterada depois de publicada: as atualizações
+    trabalham sobre uma cópia, que então substitui a anterior.
+    """
+
+    def __init__(self):
+        self.arrays = {}
+        self.precos = None  # (n, finalidades), NaN quando não há preço
+        self.infraestrutura = None  # (n, palavras) de bits
+        self.linha_do_imovel = {}
+        # Vocabulários só crescem, então podem ser compartilhados entre cópias
+        self.codigos = {nome: {} for nome in CATEGORICAS}
+        self.bits_infraestrutura = {}
+
+    def copia(self):
+        nova = _Colunas()
+        nova.arrays = {nome: array.copy() for nome, array in self.arrays.items()}
+        nova.precos = self.precos.copy()
+        nova.infraestrutura = self.infraestrutura.copy()
+        nova.linha_do_imovel = dict(self.linha_do_imovel)
+        nova.codigos = self.codigos
+        nova.bits_infraestrutura = self.bits_infraestrutura
+        return nova
+
+    def __len__(self):
+        return len(self.arrays['pk'])
+
+    def codigo(self, coluna, valor):
+        codigos = self.codigos[coluna]
+        if valor not in codigos:
+            codigos[valor] = len(codigos)
+        return codigos[valor]
+
+    def rotulos(self, coluna):
+        return {codigo: valor for valor, codigo in self.codigos[coluna].items()}
+
+    def bit(self, infra_id):
+        if infra_id not in self.bits_infraestrutura:
+            self.bits_infraestrutura[infra_id] = len(self.bits_infraestrutura)
+        return self.bits_infraestrutura[infra_id]
+
+    def valores_da_linha(self, linha):
+        return {
+            'pk': linha['imovel_id'],
+            'ativo': True,
+            'criado_em': _microssegundos(linha['criado_em']),
+            'tipo': self.codigo('tipo', linha['tipo']),
+            'cidade': self.codigo('cidade', linha['cidade']),
+            'cidade_iexact': self.codigo('cidade_iexact', linha['cidade'].lower()),
+            'bairro': linha['bairro'].lower(),
+            'quartos': linha['quartos'],
+            'banheiros': linha['banheiros'],
+            'vagas_garagem': linha['vagas_garagem'],
+            'area_util': np.nan if linha['area_util'] is None else float(linha['area_util']),
+            'latitude': np.nan if linha['imovel__latitude'] is None else float(linha['imovel__latitude']),
+            'longitude': np.nan if linha['imovel__longitude'] is None else float(linha['imovel__longitude']),
+            'mobilia': self.codigo('mobilia', linha['mobilia']),
+            'pet_friendly': linha['pet_friendly'],
+            'aceita_financiamento': linha['imovel__aceita_financiamento'],
+            'tem_fotos': linha['total_fotos'] > 0,
+        }
+
+    def precos_da_linha(self, linha):
+        return [
+            np.nan if linha[f'preco_{finalidade}'] is None else float(linha[f'preco_{finalidade}'])
+            for finalidade in FINALIDADES
+        ]
+
+    def garantir_bits(self):
+        """Alarga o bitset quando surgem infraestruturas novas"""
+        palavras = max(1, (len(self.bits_infraestrutura) + 63) // 64)
+        if self.infraestrutura.shape[1] < palavras:
+            extra = np.zeros((len(self), palavras - self.infraestrutura.shape[1]), dtype=np.uint64)
+            self.infraestrutura = np.hstack([self.infraestrutura, extra])
+
+    def marcar_infraestrutura(self, linha, infra_ids):
+        self.infraestrutura[linha] = 0
+        for infra_id in infra_ids:
+            bit = self.bit(infra_id)
+            self.garantir_bits()
+            self.infraestrutura[linha, bit // 64] |= np.uint64(1 << (bit % 64))
+
+    def mascara_infraestrutura(self, infra_ids):
+        """Linhas que têm todas as infraestruturas pedidas"""
+        mascara = np.ones(len(self), dtype=bool)
+        for infra_id in infra_ids:
+            bit = self.bits_infraestrutura.get(infra_id)
+            # Infraestrutura desconhecida ou criada depois desta cópia
+            if bit is None or bit // 64 >= self.infraestrutura.shape[1]:
+                return np.zeros(len(self), dtype=bool)
+            palavra = self.infraestrutura[:, bit // 64]
+            mascara &= (palavra & np.uint64(1 << (bit % 64))) != 0
+        return mascara
+
+
+def _ler_linhas(imovel_ids=None):
+    """Lê do resumo dos cards os imóveis ativos (todos ou só ``imovel_ids``)"""
+    resumos = ResumoImovel.objects.filter(status=Imovel.StatusImovel.ATIVO)
+    infraestrutura = Imovel.infraestrutura.through.objects.filter(
+        imovel__status=Imovel.StatusImovel.ATIVO
+    )
+    if imovel_ids is not None:
+        resumos = resumos.filter(imovel_id__in=imovel_ids)
+        infraestrutura = infraestrutura.filter(imovel_id__in=imovel_ids)
+
+    linhas = {
+        linha['imovel_id']: linha
+        for linha in resumos.values(
+            'imovel_id', 'criado_em', 'tipo', 'cidade', 'bairro', 'quartos', 'banheiros',
+            'vagas_garagem', 'area_util', 'mobilia', 'pet_friendly', 'total_fotos',
+            'imovel__aceita_financiamento', 'imovel__latitude', 'imovel__longitude',
+            *[f'preco_{finalidade}' for finalidade in FINALIDADES]
+        )
+    }
+    infra_por_imovel = {}
+    for imovel_id, infra_id in infraestrutura.values_list('imovel_id', 'infracondominio_id'):
+        infra_por_imovel.setdefault(imovel_id, []).append(infra_id)
+    return linhas, infra_por_imovel
+
+
+def _construir():
+    linhas, infra_por_imovel = _ler_linhas()
+    colunas = _Colunas()
+    valores = [colunas.valores_da_linha(linha) for linha in linhas.values()]
+    for nome, dtype in COLUNAS.items():
+        colunas.arrays[nome] = np.array([v[nome] for v in valores], dtype=dtype).reshape(len(valores))
+    colunas.precos = np.array(
+        [colunas.precos_da_linha(linha) for linha in linhas.values()], dtype=np.float64
+    ).reshape(len(valores), len(FINALIDADES))
+    colunas.infraestrutura = np.zeros((len(valores), 1), dtype=np.uint64)
+    for posicao, imovel_id in enumerate(linhas):
+        colunas.linha_do_imovel[imovel_id] = posicao
+        colunas.marcar_infraestrutura(posicao, infra_por_imovel.get(imovel_id, []))
+    return colunas
+
+
+def _atualizar(anteriores, imovel_ids):
+    """Relê só ``imovel_ids``: atualiza as linhas, desativa as que saíram e acrescenta as novas"""
+    linhas, infra_por_imovel = _ler_linhas(imovel_ids)
+    colunas = anteriores.copia()
+
+    novos = [imovel_id for imovel_id in linhas if imovel_id not in colunas.linha_do_imovel]
+    if novos:
+        total = len(colunas) + len(novos)
+        for nome, dtype in COLUNAS.items():
+            extra = np.zeros(len(novos), dtype=dtype)
+            colunas.arrays[nome] = np.concatenate([colunas.arrays[nome], extra])
+        colunas.precos = np.vstack([colunas.precos, np.full((len(novos), len(FINALIDADES)), np.nan)])
+        colunas.infraestrutura = np.vstack([
+            colunas.infraestrutura,
+            np.zeros((len(novos), colunas.infraestrutura.shape[1]), dtype=np.uint64)
+        ])
+        for posicao, imovel_id in enumerate(novos, start=total - len(novos)):
+            colunas.linha_do_imovel[imovel_id] = posicao
+
+    for imovel_id in imovel_ids:
+        posicao = colunas.linha_do_imovel.get(imovel_id)
+        if posicao is None:
+            continue
+        linha = linhas.get(imovel_id)
+        if linha is None:
+            # Excluído ou deixou de estar ativo; a linha some na próxima reconstrução
+            colunas.arrays['ativo'][posicao] = False
+            continue
+        for nome, valor in colunas.valores_da_linha(linha).items():
+            colunas.arrays[nome][posicao] = valor
+        colunas.precos[posicao] = colunas.precos_da_linha(linha)
+        colunas.marcar_infraestrutura(posicao, infra_por_imovel.get(imovel_id, []))
+    return colunas
+
+
+def _distancias(colunas, linhas, centro):
+    """Haversine em km das ``linhas`` até o centro"""
+    lat0, lng0 = np.radians(centro[0]), np.radians(centro[1])
+    latitude = np.radians(colunas.arrays['latitude'][linhas])
+    longitude = np.radians(colunas.arrays['longitude'][linhas])
+    a = (
+        np.sin((latitude - lat0) / 2) ** 2
+        + np.cos(lat0) * np.cos(latitude) * np.sin((longitude - lng0) / 2) ** 2
+    )
+    return 2 * RAIO_TERRA_KM * np.arcsin(np.sqrt(a))
+
+
+def _serializar_data(microssegundos):
+    return (EPOCA + timedelta(microseconds=int(microssegundos))).isoformat()
+
+
+def _ler_data(valor):
+    return _microssegundos(datetime.fromisoformat(valor))
+
+
+def _serializar_decimal(valor):
+    return f'{valor:.2f}'
+
+
+# Formato das chaves no cursor, o mesmo da paginação pelo ORM
+FORMATOS_CHAVE = {
+    'data': (_serializar_data, _ler_data),
+    'decimal': (_serializar_decimal, float),
+    'inteiro': (int, int),
+    'real': (float, float),
+}
+
+
+class MotorColunar:
+    """Colunas dos imóveis ativos de um processo, atualizadas pelos signals"""
+
+    def __init__(self):
+        self._colunas = None
+        self._construido_em = 0
+        # Versão do catálogo refletida nas colunas e instante da leitura correspondente
+        self._versao = None
+        self._lido_em = None
+        self._sujos = set()
+        self._reconstruir = False
+        self._trava = threading.Lock()
+
+    def marcar(self, imovel_ids):
+        """Agenda a releitura dos imóveis depois do commit"""
+        if self._colunas is None:
+            return
+        imovel_ids = set(imovel_ids)
+
+        def marcar():
+            with self._trava:
+                self._sujos |= imovel_ids
+
+        transaction.on_commit(marcar)
+
+    def marcar_tudo(self):
+        if self._colunas is None:
+            return
+
+        def marcar():
+            self._reconstruir = True
+
+        transaction.on_commit(marcar)
+
+    def colunas(self):
+        """Colunas atualizadas; reconstrói tudo quando vencem e relê só as linhas marcadas"""
+        ttl = getattr(settings, 'IMOVEIS_MOTOR_COLUNAR_TTL', 600)
+        # Lida antes das linhas: uma alteração no meio da leitura deixa a versão nova para a próxima consulta
+        versao = cache_paginas.versao_catalogo()
+        with self._trava:
+            if self._colunas is None or self._reconstruir or time.time() - self._construido_em > ttl:
+                self._reconstruir_tudo(versao)
+            elif versao != self._versao or self._sujos:
+                sujos, self._sujos = self._sujos, set()
+                try:
+                    self._sincronizar(versao, sujos)
+                except Exception:
+                    self._sujos |= sujos
+                    raise
+            return self._colunas
+
+    def _reconstruir_tudo(self, versao):
+        self._reconstruir = False
+        self._sujos = set()
+        lido_em = timezone.now()
+        inicio = time.perf_counter()
+        self._colunas = _construir()
+        self._construido_em = time.time()
+        self._versao, self._lido_em = versao, lido_em
+        logger.info(
+            'Motor colunar construído: %s imóveis em %.1f ms',
+            len(self._colunas), (time.perf_counter() - inicio) * 1000
+        )
+
+    def _sincronizar(self, versao, sujos):
+        """Relê ``sujos`` e, se a versão do catálogo mudou, os imóveis alterados por qualquer processo"""
+        if versao == self._versao:
+            self._colunas = _atualizar(self._colunas, sujos)
+            return
+        lido_em = timezone.now()
+        alterados = Imovel.objects.filter(
+            atualizado_em__gte=self._lido_em - MARGEM_RELEITURA
+        ).values_list('pk', flat=True)
+        colunas = _atualizar(self._colunas, sujos | set(alterados))
+        # Um imóvel excluído não deixa atualizado_em para trás: o total de ativos denuncia
+        ativos = ResumoImovel.objects.filter(status=Imovel.StatusImovel.ATIVO).count()
+        if int(colunas.arrays['ativo'].sum()) != ativos:
+            self._reconstruir_tudo(versao)
+            return
+        self._colunas = colunas
+        self._versao, self._lido_em = versao, lido_em
+
+    def filtrar(self, colunas, filtros, ids_busca=None):
+        """Máscara das linhas que passam nos filtros (mesma semântica de filtros.aplicar_filtros)"""
+        arrays = colunas.arrays
+        nenhum = np.zeros(len(colunas), dtype=bool)
+        mascara = arrays['ativo'].copy()
+
+        if filtros['busca']:
+            if ids_busca is None:
+                ids_busca = busca.buscar_imoveis(filtros['busca'])
+            mascara &= np.isin(arrays['pk'], np.asarray(ids_busca, dtype=np.int64))
+
+        if filtros['finalidade']:
+            if filtros['finalidade'] not in FINALIDADES:
+                return nenhum
+            mascara &= ~np.isnan(colunas.precos[:, FINALIDADES.index(filtros['finalidade'])])
+
+        for coluna, chave in (('tipo', 'tipo'), ('cidade_iexact', 'cidade'), ('mobilia', 'mobilia')):
+            valor = filtros[chave]
+            if valor:
+                codigo = colunas.codigos[coluna].get(valor.lower() if chave == 'cidade' else valor)
+                if codigo is None:
+                    return nenhum
+                mascara &= arrays[coluna] == codigo
+
+        if filtros['bairro']:
+            mascara &= np.char.find(arrays['bairro'], filtros['bairro'].lower()) >= 0
+
+        for coluna, chave in (('quartos', 'quartos'), ('banheiros', 'banheiros'),
+                              ('vagas_garagem', 'vagas'), ('area_util', 'area_min')):
+            if filtros[chave]:
+                mascara &= arrays[coluna] >= filtros[chave]
+
+        # Como no ORM, cada limite de preço pode ser atendido por uma finalidade diferente
+        if filtros['preco_min']:
+            mascara &= (colunas.precos >= filtros['preco_min']).any(axis=1)
+        if filtros['preco_max']:
+            mascara &= (colunas.precos <= filtros['preco_max']).any(axis=1)
+
+        for coluna, chave in (('pet_friendly', 'pet_friendly'),
+                              ('aceita_financiamento', 'financiamento'), ('tem_fotos', 'com_fotos')):
+            if filtros[chave]:
+                mascara &= arrays[coluna]
+
+        if filtros['infraestrutura']:
+            mascara &= colunas.mascara_infraestrutura(filtros['infraestrutura'])
+
+        geo = filtros['geo']
+        if geo:
+            # Caixa primeiro; a distância só é calculada para as linhas que sobraram
+            sul, oeste, norte, leste = geo['caixa']
+            latitude, longitude = arrays['latitude'], arrays['longitude']
+            mascara &= (latitude >= sul) & (latitude <= norte) & (longitude >= oeste) & (longitude <= leste)
+            if geo['raio_km'] is not None:
+                candidatas = np.flatnonzero(mascara)
+                fora = _distancias(colunas, candidatas, geo['centro']) > geo['raio_km']
+                mascara[candidatas[fora]] = False
+        return mascara
+
+    def _chave_ordenacao(self, colunas, filtros, ids_busca, linhas):
+        """Retorna (valores nas ``linhas``, decrescente, formato) da chave de ordenação; a pk desempata"""
+        ordenacao = filtros['ordenacao']
+        if ordenacao == 'distancia':
+            return _distancias(colunas, linhas, filtros['geo']['centro']), False, 'real'
+        if ordenacao in ('preco_menor', 'preco_maior'):
+            # O Min do ORM considera só os preços do último filtro de preço aplicado
+            precos = colunas.precos[linhas]
+            validos = ~np.isnan(precos)
+            if filtros['preco_max']:
+                validos &= precos <= filtros['preco_max']
+            elif filtros['preco_min']:
+                validos &= precos >= filtros['preco_min']
+            elif filtros['finalidade'] in FINALIDADES:
+                validos[:, [f != filtros['finalidade'] for f in FINALIDADES]] = False
+            minimo = np.where(validos, precos, np.inf).min(axis=1, initial=np.inf)
+            return np.where(np.isinf(minimo), 0.0, minimo), ordenacao == 'preco_maior', 'decimal'
+        if ordenacao == 'maior_area':
+            return np.nan_to_num(colunas.arrays['area_util'][linhas], nan=0.0), True, 'decimal'
+        if ordenacao != 'mais_recentes' and ids_busca:
+            # Posição de cada pk no ranking da busca (as linhas filtradas estão todas nele)
+            ids = np.asarray(ids_busca, dtype=np.int64)
+            ordem = np.argsort(ids, kind='stable')
+            pks = colunas.arrays['pk'][linhas]
+            posicoes = np.searchsorted(ids[ordem], pks).clip(0, len(ids) - 1)
+            na_lista = ids[ordem][posicoes] == pks
+            return np.where(na_lista, ordem[posicoes], len(ids)).astype(np.int64), False, 'inteiro'
+        return colunas.arrays['criado_em'][linhas], True, 'data'
+
+    def consultar(self, filtros, ids_busca=None, cursor=None, por_pagina=POR_PAGINA):
+        """
+        Filtra, ordena e pagina os imóveis ativos.
+
+        Retorna (pagina, total, contagens): ``pagina`` é um PaginaCursor com as
+        pks da página e ``contagens`` tem o formato de facetas.contagens_por_faceta.
+        """
+        colunas = self.colunas()
+        if filtros['busca'] and ids_busca is None:
+            ids_busca = busca.buscar_imoveis(filtros['busca'])
+        mascara = self.filtrar(colunas, filtros, ids_busca)
+        linhas = np.flatnonzero(mascara)
+        contagens = self._contagens(colunas, linhas)
+
+        chave, decrescente, formato = self._chave_ordenacao(colunas, filtros, ids_busca, linhas)
+        serializar, ler = FORMATOS_CHAVE[formato]
+        pks = colunas.arrays['pk'][linhas]
+
+        valores, direcao = decodificar_cursor(cursor) if cursor else (None, None)
+        if valores is not None:
+            try:
+                valores = [ler(valores[0]), int(valores[1])] if len(valores) == 2 else None
+            except (ValueError, TypeError):
+                valores = None
+            if valores is None:
+                direcao = None
+
+        # Mesma lógica de paginacao.paginar_por_cursor, sobre os arrays
+        voltando = direcao == 'anterior'
+        sentido_desc = decrescente != voltando
+        if valores is not None:
+            if sentido_desc:
+                depois = (chave < valores[0]) | ((chave == valores[0]) & (pks < valores[1]))
+            else:
+                depois = (chave > valores[0]) | ((chave == valores[0]) & (pks > valores[1]))
+            chave, pks = chave[depois], pks[depois]
+
+        ordem = np.lexsort((pks, chave))
+        if sentido_desc:
+            ordem = ordem[::-1]
+        ordem = ordem[:por_pagina + 1]
+
+        tem_mais = len(ordem) > por_pagina
+        ordem = ordem[:por_pagina]
+        if voltando:
+            ordem = ordem[::-1]
+        if not len(ordem):
+            return PaginaCursor([]), len(linhas), contagens
+
+        def chave_de(posicao):
+            return [serializar(chave[posicao].item()), int(pks[posicao])]
+
+        tem_proxima = tem_mais if not voltando else True
+        tem_anterior = valores is not None if not voltando else tem_mais
+        pagina = PaginaCursor(
+            pks[ordem].tolist(),
+            cursor_proximo=codificar_cursor(chave_de(ordem[-1]), 'proxima') if tem_proxima else None,
+            cursor_anterior=codificar_cursor(chave_de(ordem[0]), 'anterior') if tem_anterior else None,
+        )
+        return pagina, len(linhas), contagens
+
+    def _contagens(self, colunas, linhas):
+        arrays = colunas.arrays
+
+        def por_codigo(coluna):
+            rotulos = colunas.rotulos(coluna)
+            codigos, totais = np.unique(arrays[coluna][linhas], return_counts=True)
+            return {rotulos[codigo]: total for codigo, total in zip(codigos.tolist(), totais.tolist())}
+
+        quartos = arrays['quartos'][linhas]
+        return {
+            'cidades': por_codigo('cidade'),
+            'tipos': por_codigo('tipo'),
+            'quartos': {minimo: int((quartos >= minimo).sum()) for minimo in QUARTOS_MINIMOS},
+        }
+
+
+motor = MotorColunar()
+
+
+def consultar(filtros, ids_busca=None, cursor=None, por_pagina=POR_PAGINA):
+    """Consulta o motor do processo e lê do banco os resumos da página, na ordem"""
+    pagina, total, contagens = motor.consultar(filtros, ids_busca, cursor, por_pagina)
+    resumos = ResumoImovel.objects.in_bulk(pagina.object_list)
+    pagina.object_list = [resumos[pk] for pk in pagina.object_list if pk in resumos]
+    return pagina, total, contagens
@@ -0,0 +1,243 @@
+"""
+Paginação por cursor (keyset) da listagem de imóveis.
+
+Em vez de OFFSET + COUNT(DISTINCT ...) a cada página, cada página guarda no
+cursor os valores da chave de ordenação do último (ou primeiro) item e a
+próxima consulta continua a partir deles com um WHERE que usa o índice. A
+ordenação por data usa ('criado_em', 'pk'), coberta pelo índice de
+``criado_em`` (no SQLite todo índice termina implicitamente no rowid).
+
+Na ordem por relevância da busca textual a chave é a posição no ranking
+(``paginar_por_posicao``): a lista de ids já vem ordenada do índice de busca,
+então a página é montada lendo os ids seguintes à posição do cursor, sem
+levar o ranking para o ORDER BY.
+
+O total de resultados vem do cache e é recalculado em segundo plano quando
+fica velho, para que nenhuma requisição pague o COUNT completo duas vezes.
+A versão do catálogo (``cache_paginas.versao_catalogo``) entra na chave: uma
+alteração em qualquer imóvel dá um total novo já na requisição seguinte.
+"""
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+
+from . import cache_paginas
+
+logger = logging.getLogger(__name__)
+
+POR_PAGINA = 12
+
+# Ids por consulta ao percorrer o ranking da busca (abaixo do limite de parâmetros do SQLite)
+TAMANHO_MAXIMO_BLOCO = 5000
+
+# Validade das contagens no cache: as de versões antigas do catálogo não são mais lidas e só expiram
+VALIDADE_CONTAGEM = 24 * 3600
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def codificar_cursor(valores, direcao):
+    dados = json.dumps({'v': [_serializar(v) for v in valores], 'd': direcao}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (valores, direcao) ou (None, None) para cursores inválidos"""
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        valores, direcao = dados['v'], dados['d']
+    except (ValueError, TypeError, KeyError):
+        return None, None
+    if direcao not in ('proxima', 'anterior') or not isinstance(valores, list):
+        return None, None
+    return valores, direcao
+
+
+def _filtro_keyset(chaves, valores, decrescente):
+    """Monta (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... respeitando a direção"""
+    operador = 'lt' if decrescente else 'gt'
+    condicao = Q()
+    for posicao, chave in enumerate(chaves):
+        parte = Q(**{f'{chave}__{operador}': valores[posicao]})
+        for anterior in range(posicao):
+            parte &= Q(**{chaves[anterior]: valores[anterior]})
+        condicao |= parte
+    return condicao
+
+
+class PaginaCursor:
+    """Página de resultados com links para a próxima e a anterior"""
+
+    def __init__(self, object_list, cursor_proximo=None, cursor_anterior=None):
+        self.object_list = object_list
+        self.cursor_proximo = cursor_proximo
+        self.cursor_anterior = cursor_anterior
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.cursor_proximo is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginar_por_cursor(queryset, chaves, decrescente, cursor=None, por_pagina=POR_PAGINA):
+    """
+    Pagina ``queryset`` pela tupla ``chaves`` (a última deve ser única, ex.: 'pk').
+
+    As chaves precisam ser campos ou anotações do queryset, todas na mesma direção.
+    """
+    valores, direcao = decodificar_cursor(cursor) if cursor else (None, None)
+    if valores is not None and len(valores) != len(chaves):
+        valores, direcao = None, None
+
+    # Para voltar uma página a consulta anda no sentido inverso e depois é revertida
+    voltando = direcao == 'anterior'
+    sentido_desc = decrescente != voltando
+    ordem = [f'-{chave}' if sentido_desc else chave for chave in chaves]
+
+    if valores is not None:
+        queryset = queryset.filter(_filtro_keyset(chaves, valores, sentido_desc))
+    itens = list(queryset.order_by(*ordem)[:por_pagina + 1])
+
+    tem_mais = len(itens) > por_pagina
+    itens = itens[:por_pagina]
+    if voltando:
+        itens.reverse()
+    if not itens:
+        return PaginaCursor([])
+
+    def chave_de(item):
+        return [getattr(item, chave) for chave in chaves]
+
+    # Indo em frente, sempre há anterior se veio de um cursor; voltando, sempre há próxima
+    tem_proxima = tem_mais if not voltando else True
+    tem_anterior = valores is not None if not voltando else tem_mais
+    return PaginaCursor(
+        itens,
+        cursor_proximo=codificar_cursor(chave_de(itens[-1]), 'proxima') if tem_proxima else None,
+        cursor_anterior=codificar_cursor(chave_de(itens[0]), 'anterior') if tem_anterior else None,
+    )
+
+
+def paginar_por_posicao(queryset, ids, cursor=None, por_pagina=POR_PAGINA):
+    """
+    Pagina ``queryset`` na ordem da lista ``ids`` (o ranking da busca); o
+    cursor guarda a posição na lista do último (ou primeiro) item da página.
+    """
+    valores, direcao = decodificar_cursor(cursor) if cursor else (None, None)
+    if valores is not None and not (len(valores) == 1 and isinstance(valores[0], int) and valores[0] >= 0):
+        valores, direcao = None, None
+
+    voltando = direcao == 'anterior'
+    if voltando:
+        posicoes = range(min(valores[0], len(ids)) - 1, -1, -1)
+    else:
+        posicoes = range(valores[0] + 1 if valores is not None else 0, len(ids))
+
+    # Os próximos do ranking são lidos em blocos com os demais filtros no SQL; sem filtros que
+    # descartem muitos, o primeiro bloco já completa a página
+    encontrados = []
+    tamanho = por_pagina + 1
+    while posicoes and len(encontrados) <= por_pagina:
+        bloco, posicoes = posicoes[:tamanho], posicoes[tamanho:]
+        carregados = {item.pk: item for item in queryset.filter(pk__in=[ids[posicao] for posicao in bloco])}
+        encontrados += [(posicao, carregados[ids[posicao]]) for posicao in bloco if ids[posicao] in carregados]
+        tamanho = min(tamanho * 4, TAMANHO_MAXIMO_BLOCO)
+
+    tem_mais = len(encontrados) > por_pagina
+    encontrados = encontrados[:por_pagina]
+    if voltando:
+        encontrados.reverse()
+    if not encontrados:
+        return PaginaCursor([])
+
+    tem_proxima = tem_mais if not voltando else True
+    tem_anterior = valores is not None if not voltando else tem_mais
+    return PaginaCursor(
+        [item for _, item in encontrados],
+        cursor_proximo=codificar_cursor([encontrados[-1][0]], 'proxima') if tem_proxima else None,
+        cursor_anterior=codificar_cursor([encontrados[0][0]], 'anterior') if tem_anterior else None,
+    )
+
+
+def iterar_por_posicao(queryset, ids, tamanho=2000):
+    """Todos os itens de ``queryset`` na ordem de ``ids``, lidos ``tamanho`` por vez"""
+    tamanho = min(tamanho, TAMANHO_MAXIMO_BLOCO)
+    for inicio in range(0, len(ids), tamanho):
+        parte = ids[inicio:inicio + tamanho]
+        carregados = {item.pk: item for item in queryset.filter(pk__in=parte)}
+        for pk in parte:
+            if pk in carregados:
+                yield carregados[pk]
+
+
+def chave_por_filtros(prefixo, filtros):
+    bruto = json.dumps(sorted(filtros.items()), default=str)
+    return f'{prefixo}:{hashlib.md5(bruto.encode()).hexdigest()}'
+
+
+def _recalcular_contagem(queryset, chave, trava):
+    try:
+        total = queryset.count()
+        cache.set(chave, {'total': total, 'calculado_em': time.time()}, VALIDADE_CONTAGEM)
+    except Exception:
+        logger.exception('Falha ao recalcular contagem %s', chave)
+    finally:
+        cache.delete(trava)
+        connections.close_all()
+
+
+def contagem_em_cache(queryset, filtros, prefixo='contagem_imoveis'):
+    """
+    Total de ``queryset`` guardado no cache por conjunto de ``filtros``.
+
+    A chave inclui a versão do catálogo. Na primeira vez a contagem é feita
+    na requisição; depois de
+    ``IMOVEIS_CONTAGEM_TTL`` segundos o valor antigo continua sendo servido
+    enquanto uma thread recalcula o novo.
+    """
+    chave = f'{chave_por_filtros(prefixo, filtros)}:{cache_paginas.versao_catalogo().timestamp()}'
+    ttl = getattr(settings, 'IMOVEIS_CONTAGEM_TTL', 300)
+    entrada = cache.get(chave)
+
+    if entrada is None:
+        total = queryset.count()
+        cache.set(chave, {'total': total, 'calculado_em': time.time()}, VALIDADE_CONTAGEM)
+        return total
+
+    if time.time() - entrada['calculado_em'] > ttl:
+        trava = f'{chave}:recalculando'
+        # A trava evita recálculos repetidos, não os impede: o add é atômico dentro do processo e em
+        # caches de rede (Redis), mas no cache em arquivo das settings dois processos podem passar juntos
+        # por ele. O pior caso é a mesma contagem feita duas vezes, com o mesmo resultado.
+        if cache.add(trava, True, ttl):
+            # A thread não herda o banco de leitura da requisição: vai fixado no queryset
+            threading.Thread(
+                target=_recalcular_contagem, args=(queryset.using(queryset.db), chave, trava), daemon=True
+            ).start()
+    return entrada['total']
@@ -0,0 +1,181 @@
+"""
+Painel de relatórios do admin ("Relatórios" no menu do Jazzmin).
+
+O painel só lê as tabelas de resumo (``EstoqueRelatorio``,
+``LeadsRelatorio``, ``NegociacoesRelatorio`` e ``ProprietarioRelatorio``);
+nenhum GROUP BY roda nas tabelas vivas quando ele é aberto. As tabelas são
+atualizadas pelo comando ``atualizar_relatorios``, agendado no cron:
+
+- estoque e proprietários são refeitos só se algum imóvel mudou desde a
+  última execução;
+- leads e negociações são refeitos só nos meses dos clientes e imóveis
+  alterados desde a última execução (mês de cadastro do cliente, mês da
+  negociação do imóvel).
+
+Exclusões e imóveis que voltam a ficar ativos não deixam rastro do mês
+afetado; ``atualizar(completo=True)`` (``--completo``) refaz tudo.
+"""
+from collections import defaultdict
+from statistics import median
+
+from django.contrib import admin
+from django.db import transaction
+from django.db.models import Count, Q
+from django.shortcuts import render
+from django.utils import timezone
+
+from .historico_precos import inicio_do_mes, limites_do_mes
+from .models import (
+    Cliente, EstoqueRelatorio, ExecucaoRelatorios, Imovel, LeadsRelatorio, NegociacoesRelatorio, Proprietario,
+    ProprietarioRelatorio,
+)
+
+TOP_PROPRIETARIOS = 20
+
+MESES_NO_PAINEL = 12
+
+
+def _estoque():
+    EstoqueRelatorio.objects.all().delete()
+    EstoqueRelatorio.objects.bulk_create([
+        EstoqueRelatorio(**linha)
+        for linha in Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO).order_by().values(
+            'cidade', 'tipo'
+        ).annotate(ativos=Count('pk'))
+    ])
+
+
+def _proprietarios():
+    ProprietarioRelatorio.objects.all().delete()
+    ProprietarioRelatorio.objects.bulk_create([
+        ProprietarioRelatorio(proprietario_id=linha['pk'], ativos=linha['ativos'], total=linha['total'])
+        for linha in Proprietario.objects.order_by().values('pk').annotate(
+            ativos=Count('imoveis', filter=Q(imoveis__status=Imovel.StatusImovel.ATIVO)),
+            total=Count('imoveis'),
+        ).filter(ativos__gt=0).order_by('-ativos', '-total')[:TOP_PROPRIETARIOS]
+    ])
+
+
+def _leads(mes):
+    inicio, fim = limites_do_mes(mes)
+    LeadsRelatorio.objects.filter(mes=mes).delete()
+    LeadsRelatorio.objects.bulk_create([
+        LeadsRelatorio(mes=mes, **linha)
+        for linha in Cliente.objects.filter(criado_em__gte=inicio, criado_em__lt=fim).order_by().values(
+            'origem', 'status'
+        ).annotate(quantidade=Count('pk'))
+    ])
+
+
+def _negociacoes(mes):
+    inicio, fim = limites_do_mes(mes)
+    dias = defaultdict(list)
+    for status, criado_em, negociado_em in Imovel.objects.filter(
+        negociado_em__gte=inicio, negociado_em__lt=fim, status__in=Imovel.STATUS_NEGOCIADOS
+    ).values_list('status', 'criado_em', 'negociado_em'):
+        dias[status].append((negociado_em - criado_em).total_seconds() / 86400)
+    NegociacoesRelatorio.objects.filter(mes=mes).delete()
+    NegociacoesRelatorio.objects.bulk_create([
+        NegociacoesRelatorio(
+            mes=mes, status=status, quantidade=len(valores),
+            dias_medio=sum(valores) / len(valores), dias_mediano=median(valores),
+        )
+        for status, valores in dias.items()
+    ])
+
+
+def _meses(datas):
+    return {inicio_do_mes(data) for data in datas if data is not None}
+
+
+def atualizar(completo=False):
+    """Atualiza as tabelas do painel; só o que mudou desde a última execução, salvo com ``completo``"""
+    anterior = ExecucaoRelatorios.objects.filter(concluido_em__isnull=False).order_by('-iniciado_em').first()
+    completo = completo or anterior is None
+    execucao = ExecucaoRelatorios.objects.create(iniciado_em=timezone.now(), completa=completo)
+
+    with transaction.atomic():
+        if completo:
+            imoveis = Imovel.objects.all()
+            clientes = Cliente.objects.all()
+        else:
+            # O início da execução anterior: o que mudou enquanto ela rodava entra de novo
+            imoveis = Imovel.objects.filter(atualizado_em__gte=anterior.iniciado_em)
+            clientes = Cliente.objects.filter(atualizado_em__gte=anterior.iniciado_em)
+
+        if completo or imoveis.exists():
+            _estoque()
+            _proprietarios()
+
+        meses_leads = _meses(clientes.values_list('criado_em', flat=True).distinct())
+        meses_negociacoes = _meses(imoveis.values_list('negociado_em', flat=True).distinct())
+        if completo:
+            LeadsRelatorio.objects.exclude(mes__in=meses_leads).delete()
+            NegociacoesRelatorio.objects.exclude(mes__in=meses_negociacoes).delete()
+        for mes in sorted(meses_leads):
+            _leads(mes)
+        for mes in sorted(meses_negociacoes):
+            _negociacoes(mes)
+
+    execucao.concluido_em = timezone.now()
+    execucao.save(update_fields=['concluido_em'])
+    return execucao
+
+
+def dados_painel(meses=MESES_NO_PAINEL):
+    """Tudo o que o painel mostra, lido das tabelas de resumo"""
+    por_cidade = defaultdict(dict)
+    for linha in EstoqueRelatorio.objects.all():
+        por_cidade[linha.cidade][linha.tipo] = linha.ativos
+    tipos = [
+        (codigo, rotulo) for codigo, rotulo in Imovel.TipoImovel.choices
+        if any(codigo in contagens for contagens in por_cidade.values())
+    ]
+
+    ultimos_meses = list(LeadsRelatorio.objects.order_by('-mes').values_list('mes', flat=True).distinct()[:meses])
+    leads = LeadsRelatorio.objects.filter(mes__in=ultimos_meses)
+    leads_por_origem, leads_por_status = defaultdict(lambda: defaultdict(int)), defaultdict(lambda: defaultdict(int))
+    for linha in leads:
+        leads_por_origem[linha.mes][linha.origem] += linha.quantidade
+        leads_por_status[linha.mes][linha.status] += linha.quantidade
+
+    def serie(por_mes, escolhas):
+        return {
+            'colunas': [rotulo for _, rotulo in escolhas],
+            'linhas': [
+                {'mes': mes, 'valores': [por_mes[mes].get(codigo, 0) for codigo, _ in escolhas],
+                 'total': sum(por_mes[mes].values())}
+                for mes in sorted(por_mes)
+            ],
+        }
+
+    totais = {cidade: sum(contagens.values()) for cidade, contagens in por_cidade.items()}
+    ativos_total = sum(totais.values())
+    return {
+        'execucao': ExecucaoRelatorios.objects.filter(concluido_em__isnull=False).order_by('-iniciado_em').first(),
+        'ativos_total': ativos_total,
+        'tipos_estoque': [rotulo for _, rotulo in tipos],
+        'estoque_por_cidade': [
+            {
+                'cidade': cidade, 'ativos': totais[cidade],
+                'percentual': 100 * totais[cidade] / ativos_total if ativos_total else 0,
+                'por_tipo': [por_cidade[cidade].get(codigo, 0) for codigo, _ in tipos],
+            }
+            for cidade in sorted(totais, key=lambda cidade: -totais[cidade])
+        ],
+        'series_leads': [
+            ('Leads por origem (mês de cadastro)', serie(leads_por_origem, Cliente.OrigemContato.choices)),
+            ('Leads por status atual (mês de cadastro)', serie(leads_por_status, Cliente.StatusCliente.choices)),
+        ],
+        'negociacoes': NegociacoesRelatorio.objects.order_by('-mes', 'status')[:meses * 2],
+        'proprietarios': ProprietarioRelatorio.objects.select_related('proprietario'),
+    }
+
+
+def painel(request):
+    contexto = dict(
+        admin.site.each_context(request),
+        title='Relatórios',
+        **dados_painel(),
+    )
+    return render(request, 'admin/relatorios.html', contexto)
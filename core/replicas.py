@@ -0,0 +1,184 @@
+"""
+Réplicas de leitura para o site público.
+
+As views públicas e a API marcadas com ``@leitura`` leem de uma das réplicas
+de REPLICAS_LEITURA (aliases de DATABASES, padrão nenhum); o admin, o CRM e
+qualquer escrita continuam no ``default``. Sem réplicas configuradas tudo
+funciona como antes.
+
+- ``RoteadorReplicas`` (DATABASE_ROUTERS) manda as leituras para a réplica
+  escolhida pela requisição e todas as escritas para o ``default``, mesmo as
+  de objetos lidos da réplica. As réplicas não recebem migrações.
+- Ler o que acabou de escrever: depois de um POST (admin, formulário de
+  interesse) a resposta leva o cookie ``COOKIE``, e as leituras daquele
+  navegador vão para o primário por REPLICAS_JANELA_ESCRITA segundos
+  (padrão 10), o suficiente para a réplica alcançar a escrita.
+- Saúde: cada processo testa a réplica antes de usá-la e guarda o resultado
+  por REPLICAS_INTERVALO_VERIFICACAO segundos (padrão 30). Uma réplica que
+  não responde, ou que falha no meio de uma página, fica fora por esse
+  tempo e a página é montada pelo primário.
+
+Para testar localmente com dois arquivos SQLite, acrescente nas settings::
+
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{BASE_DIR / 'replica.sqlite3'}?mode=ro",
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICAS_LEITURA = ['replica']
+
+e mantenha a cópia com ``python manage.py sincronizar_replicas --intervalo 5``,
+que faz o papel da replicação.
+
+A versão do catálogo usada nos ETags fica no cache e é avançada na escrita;
+uma listagem montada pela réplica atrasada nesse meio-tempo fica com o ETag
+novo até a próxima alteração, então o atraso da réplica deve ficar bem
+abaixo de REPLICAS_JANELA_ESCRITA.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+COOKIE = 'ler_primario'
+
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_banco = contextvars.ContextVar('banco_leitura', default=None)
+
+
+def aliases():
+    return getattr(settings, 'REPLICAS_LEITURA', [])
+
+
+def janela_escrita():
+    return getattr(settings, 'REPLICAS_JANELA_ESCRITA', 10)
+
+
+def intervalo_verificacao():
+    return getattr(settings, 'REPLICAS_INTERVALO_VERIFICACAO', 30)
+
+
+class Saude:
+    """Última verificação de cada réplica no processo: alias -> (responde, instante)"""
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self._estados = {}
+
+    def disponivel(self, alias):
+        agora = time.monotonic()
+        with self._trava:
+            estado = self._estados.get(alias)
+        if estado is not None and agora - estado[1] < intervalo_verificacao():
+            return estado[0]
+        responde = _responde(alias)
+        with self._trava:
+            self._estados[alias] = (responde, agora)
+        return responde
+
+    def registrar_falha(self, alias):
+        with self._trava:
+            self._estados[alias] = (False, time.monotonic())
+
+    def limpar(self):
+        with self._trava:
+            self._estados.clear()
+
+
+def _responde(alias):
+    # Uma tabela do Django, e não só SELECT 1: um arquivo SQLite ausente abre vazio
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1 FROM django_migrations LIMIT 1')
+    except DatabaseError:
+        logger.warning('Réplica %s indisponível; leituras vão para o primário', alias, exc_info=True)
+        return False
+    return True
+
+
+saude = Saude()
+
+
+def escolher(request):
+    """Réplica para as leituras da requisição, ou None para ler do primário"""
+    if request.method not in METODOS_SEGUROS or COOKIE in request.COOKIES:
+        return None
+    disponiveis = [alias for alias in aliases() if saude.disponivel(alias)]
+    return random.choice(disponiveis) if disponiveis else None
+
+
+def _iterar_em(alias, partes):
+    # Respostas em streaming leem o banco depois da view: cada pedaço é gerado no banco da requisição
+    partes = iter(partes)
+    while True:
+        token = _banco.set(alias)
+        try:
+            parte = next(partes)
+        except StopIteration:
+            return
+        finally:
+            _banco.reset(token)
+        yield parte
+
+
+def leitura(view):
+    """Decorador das views somente leitura: lê de uma réplica, com o primário como reserva"""
+    @wraps(view)
+    def _view(request, *args, **kwargs):
+        alias = escolher(request)
+        if alias is None:
+            return view(request, *args, **kwargs)
+        token = _banco.set(alias)
+        try:
+            response = view(request, *args, **kwargs)
+            if response.streaming:
+                response.streaming_content = _iterar_em(alias, response.streaming_content)
+            return response
+        except DatabaseError:
+            logger.warning('Réplica %s falhou em %s; respondendo pelo primário', alias, request.path, exc_info=True)
+            saude.registrar_falha(alias)
+        finally:
+            _banco.reset(token)
+        return view(request, *args, **kwargs)
+    return _view
+
+
+class ReplicasMiddleware:
+    """Marca o navegador que acabou de escrever para ler do primário durante a janela de escrita"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in METODOS_SEGUROS and aliases():
+            response.set_cookie(COOKIE, '1', max_age=janela_escrita(), httponly=True, samesite='Lax')
+        return response
+
+
+class RoteadorReplicas:
+    def db_for_read(self, model, **hints):
+        return _banco.get()
+
+    def db_for_write(self, model, **hints):
+        # Explícito: sem isso um objeto lido da réplica seria salvo nela
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        bancos = {DEFAULT_DB_ALIAS, *aliases()}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in aliases():
+            return False
+        return None
@@ -0,0 +1,106 @@
+"""
+Manutenção de ResumoImovel, a linha desnormalizada lida pelos cards.
+
+As funções recalculam só a parte do resumo afetada pela alteração (dados do
+imóvel, fotos ou preços), sempre a partir do banco.
+"""
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import FotoImovel, Imovel, PrecoPorFinalidade, ResumoImovel
+
+
+def _campos_fotos(imovel_id):
+    fotos = FotoImovel.objects.filter(imovel_id=imovel_id)
+    capa = fotos.order_by('-eh_capa', 'ordem', 'criado_em').values_list('imagem', 'variantes').first()
+    imagem, variantes = capa or ('', {})
+    return {'foto_capa': imagem, 'foto_capa_variantes': variantes, 'total_fotos': fotos.count()}
+
+
+def _campos_precos(imovel_id):
+    valores = dict(
+        PrecoPorFinalidade.objects.filter(imovel_id=imovel_id)
+        .values('finalidade').annotate(minimo=Min('valor')).values_list('finalidade', 'minimo')
+    )
+    return {
+        f'preco_{finalidade}': valores.get(finalidade)
+        for finalidade in PrecoPorFinalidade.Finalidade.values
+    }
+
+
+def atualizar_resumo(imovel):
+    """Recria o resumo completo de um imóvel"""
+    campos = {campo: getattr(imovel, campo) for campo in ResumoImovel.CAMPOS_IMOVEL}
+    campos.update(_campos_fotos(imovel.pk))
+    campos.update(_campos_precos(imovel.pk))
+    ResumoImovel.objects.update_or_create(imovel_id=imovel.pk, defaults=campos)
+
+
+def atualizar_fotos_resumo(imovel_id):
+    # update() não recria o resumo de um imóvel que está sendo excluído
+    ResumoImovel.objects.filter(imovel_id=imovel_id).update(atualizado_em=timezone.now(), **_campos_fotos(imovel_id))
+
+
+def atualizar_precos_resumo(imovel_id):
+    ResumoImovel.objects.filter(imovel_id=imovel_id).update(atualizado_em=timezone.now(), **_campos_precos(imovel_id))
+
+
+def reconstruir_resumos(imovel_ids=None, tamanho_lote=500):
+    """Recria os resumos em lote (todos ou só ``imovel_ids``). Retorna o total gravado."""
+    imoveis = Imovel.objects.only('pk', *ResumoImovel.CAMPOS_IMOVEL).order_by('pk')
+    if imovel_ids is not None:
+        imoveis = imoveis.filter(pk__in=imovel_ids)
+
+    total = 0
+    lote = []
+    for imovel in imoveis.iterator(chunk_size=tamanho_lote):
+        lote.append(imovel)
+        if len(lote) >= tamanho_lote:
+            total += _gravar_lote(lote)
+            lote = []
+    if lote:
+        total += _gravar_lote(lote)
+    return total
+
+
+def _gravar_lote(imoveis):
+    ids = [imovel.pk for imovel in imoveis]
+
+    capas = {}
+    for imovel_id, imagem, variantes in (
+        FotoImovel.objects.filter(imovel_id__in=ids)
+        .order_by('imovel_id', '-eh_capa', 'ordem', 'criado_em')
+        .values_list('imovel_id', 'imagem', 'variantes')
+    ):
+        capas.setdefault(imovel_id, (imagem, variantes))
+    contagens = dict(
+        FotoImovel.objects.filter(imovel_id__in=ids)
+        .values('imovel_id').annotate(total=Count('pk')).values_list('imovel_id', 'total')
+    )
+    precos = {}
+    for imovel_id, finalidade, valor in PrecoPorFinalidade.objects.filter(
+        imovel_id__in=ids
+    ).values_list('imovel_id', 'finalidade', 'valor'):
+        precos.setdefault(imovel_id, {})[finalidade] = valor
+
+    resumos = []
+    for imovel in imoveis:
+        foto_capa, foto_capa_variantes = capas.get(imovel.pk, ('', {}))
+        resumo = ResumoImovel(
+            imovel_id=imovel.pk,
+            foto_capa=foto_capa,
+            foto_capa_variantes=foto_capa_variantes,
+            total_fotos=contagens.get(imovel.pk, 0),
+            **{campo: getattr(imovel, campo) for campo in ResumoImovel.CAMPOS_IMOVEL}
+        )
+        for finalidade in PrecoPorFinalidade.Finalidade.values:
+            setattr(resumo, f'preco_{finalidade}', precos.get(imovel.pk, {}).get(finalidade))
+        resumos.append(resumo)
+
+    campos_atualizados = [
+        field.name for field in ResumoImovel._meta.concrete_fields if not field.primary_key
+    ]
+    ResumoImovel.objects.bulk_create(
+        resumos, update_conflicts=True, unique_fields=['imovel'], update_fields=campos_atualizados
+    )
+    return len(resumos)
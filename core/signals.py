@@ -0,0 +1,206 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import busca, cache_paginas, facetas, historico_precos, imagens, resumos, similares, tarefas
+from .motor_colunar import motor
+from .models import Cliente, FotoImovel, Imovel, InfraCondominio, PrecoPorFinalidade
+
+
+@receiver(post_save, sender=Imovel)
+def indexar_imovel_busca(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Mantém o índice de busca atualizado a cada gravação do imóvel"""
+    if raw:
+        return
+    if update_fields is not None and not set(update_fields) & set(busca.PESOS_CAMPOS):
+        return
+    busca.indexar_imovel(instance)
+
+
+@receiver(post_delete, sender=Imovel)
+def remover_imovel_busca(sender, instance, **kwargs):
+    busca.remover_imovel(instance.pk)
+
+
+@receiver(post_save, sender=Imovel)
+def atualizar_resumo_imovel(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    resumos.atualizar_resumo(instance)
+
+
+@receiver(post_save, sender=FotoImovel)
+@receiver(post_delete, sender=FotoImovel)
+def atualizar_resumo_fotos(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    resumos.atualizar_fotos_resumo(instance.imovel_id)
+
+
+@receiver(post_save, sender=PrecoPorFinalidade)
+@receiver(post_delete, sender=PrecoPorFinalidade)
+def atualizar_resumo_precos(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    resumos.atualizar_precos_resumo(instance.imovel_id)
+
+
+@receiver(post_save, sender=FotoImovel)
+def gerar_variantes_foto(sender, instance, raw=False, **kwargs):
+    """Gera miniatura, card e galeria quando a imagem da foto é nova ou foi trocada"""
+    if raw or not imagens.precisa_processar(instance):
+        return
+    imagens.agendar_processamento(instance)
+
+
+@receiver(post_save, sender=Imovel)
+def invalidar_facetas_imovel(sender, instance, created=False, raw=False, **kwargs):
+    """A lista de cidades só muda quando muda o status ou a cidade de um imóvel"""
+    if created or instance.campo_alterado('status') or instance.campo_alterado('cidade'):
+        facetas.invalidar_cidades()
+
+
+@receiver(post_delete, sender=Imovel)
+def invalidar_facetas_imovel_excluido(sender, instance, **kwargs):
+    facetas.invalidar_cidades()
+
+
+@receiver(post_save, sender=InfraCondominio)
+@receiver(post_delete, sender=InfraCondominio)
+def invalidar_facetas_infraestrutura(sender, instance, **kwargs):
+    facetas.invalidar_infraestruturas()
+
+
+@receiver(post_save, sender=Imovel)
+@receiver(post_delete, sender=Imovel)
+def atualizar_motor_imovel(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    motor.marcar([instance.pk])
+
+
+@receiver(post_save, sender=FotoImovel)
+@receiver(post_delete, sender=FotoImovel)
+@receiver(post_save, sender=PrecoPorFinalidade)
+@receiver(post_delete, sender=PrecoPorFinalidade)
+def atualizar_motor_relacionados(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    motor.marcar([instance.imovel_id])
+
+
+@receiver(m2m_changed, sender=Imovel.infraestrutura.through)
+def atualizar_motor_infraestrutura(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        motor.marcar([instance.pk])
+    elif pk_set:
+        motor.marcar(pk_set)
+    else:
+        # clear() a partir da infraestrutura não informa os imóveis afetados
+        motor.marcar_tudo()
+
+
+@receiver(post_delete, sender=InfraCondominio)
+def atualizar_motor_infraestrutura_excluida(sender, instance, **kwargs):
+    motor.marcar_tudo()
+
+
+@receiver(post_save, sender=Imovel)
+def atualizar_similares_imovel(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created or any(instance.campo_alterado(campo) for campo in similares.CAMPOS):
+        tarefas.agendar_similares([instance.pk])
+
+
+@receiver(pre_delete, sender=Imovel)
+def atualizar_similares_imovel_excluido(sender, instance, **kwargs):
+    # Antes da exclusão: as listas que o continham serão refeitas sem ele
+    tarefas.agendar_similares(similares.listas_com(instance.pk))
+
+
+@receiver(post_save, sender=PrecoPorFinalidade)
+@receiver(post_delete, sender=PrecoPorFinalidade)
+def atualizar_similares_precos(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    tarefas.agendar_similares([instance.imovel_id])
+
+
+@receiver(post_save, sender=PrecoPorFinalidade)
+@receiver(post_delete, sender=PrecoPorFinalidade)
+def registrar_historico_preco(sender, instance, raw=False, origin=None, **kwargs):
+    # Na exclusão do imóvel o histórico também é excluído em cascata
+    if raw or isinstance(origin, Imovel):
+        return
+    historico_precos.sincronizar([instance.imovel_id])
+
+
+@receiver(post_save, sender=Imovel)
+def registrar_historico_status(sender, instance, created=False, raw=False, **kwargs):
+    """Imóvel que sai de ativo (ou volta) muda os preços em vigor no histórico"""
+    if raw or created or not instance.campo_alterado('status'):
+        return
+    historico_precos.sincronizar([instance.pk])
+
+
+@receiver(m2m_changed, sender=Imovel.infraestrutura.through)
+def atualizar_similares_infraestrutura(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    tarefas.agendar_similares((pk_set or []) if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=FotoImovel)
+@receiver(post_delete, sender=FotoImovel)
+@receiver(post_save, sender=PrecoPorFinalidade)
+@receiver(post_delete, sender=PrecoPorFinalidade)
+def marcar_imovel_alterado(sender, instance, raw=False, **kwargs):
+    """
+    A compatibilidade incremental e o cache da página de detalhe encontram os
+    imóveis alterados por ``atualizado_em``
+    """
+    if raw:
+        return
+    Imovel.objects.filter(pk=instance.imovel_id).update(atualizado_em=timezone.now())
+
+
+@receiver(m2m_changed, sender=Imovel.infraestrutura.through)
+def marcar_imovel_alterado_infraestrutura(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Imovel.objects.filter(pk=instance.pk).update(atualizado_em=timezone.now())
+    elif action in ('post_add', 'post_remove') and pk_set:
+        Imovel.objects.filter(pk__in=pk_set).update(atualizado_em=timezone.now())
+    elif action == 'pre_clear':
+        # Depois do clear() já não se sabe quais imóveis tinham a infraestrutura
+        Imovel.objects.filter(infraestrutura=instance).update(atualizado_em=timezone.now())
+
+
+@receiver(pre_delete, sender=Imovel)
+def marcar_clientes_imovel_excluido(sender, instance, **kwargs):
+    """As sugestões do imóvel somem em cascata; os clientes afetados voltam à varredura incremental"""
+    Cliente.objects.filter(compatibilidades__imovel=instance).update(atualizado_em=timezone.now())
+
+
+@receiver(post_save, sender=Imovel)
+@receiver(post_delete, sender=Imovel)
+@receiver(post_save, sender=FotoImovel)
+@receiver(post_delete, sender=FotoImovel)
+@receiver(post_save, sender=PrecoPorFinalidade)
+@receiver(post_delete, sender=PrecoPorFinalidade)
+@receiver(post_save, sender=InfraCondominio)
+@receiver(post_delete, sender=InfraCondominio)
+def invalidar_paginas(sender, raw=False, **kwargs):
+    """Nova versão do catálogo: ETag e Last-Modified da home e da listagem mudam"""
+    if raw:
+        return
+    cache_paginas.invalidar_catalogo()
+
+
+@receiver(m2m_changed, sender=Imovel.infraestrutura.through)
+def invalidar_paginas_infraestrutura(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        cache_paginas.invalidar_catalogo()
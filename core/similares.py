@@ -0,0 +1,276 @@
+"""
+Imóveis similares (vizinhos mais próximos) exibidos no detalhe do imóvel.
+
+Cada imóvel ativo vira um vetor de características com escalas fixas:
+log do preço principal e da área (comparados só quando os dois imóveis os
+informam), quartos, banheiros e vagas, finalidades anunciadas e
+infraestruturas do condomínio; tipo, bairro e mobília entram como
+categorias (diferentes somam uma distância fixa). Como nada depende de
+estatísticas da cidade, alterar um imóvel não muda a distância entre dois
+outros, e a atualização incremental dá o mesmo resultado do recálculo total. Os vizinhos são
+procurados só entre os imóveis da mesma cidade, em blocos de matrizes do
+NumPy, e os ``K`` mais próximos ficam em ``ImovelSimilar``.
+
+``manage.py calcular_similares`` recalcula tudo; depois disso os signals
+enfileiram (``tarefas.agendar_similares``) a atualização incremental de um
+imóvel alterado e dos imóveis da mesma cidade cuja lista de vizinhos ele
+entra ou deixa, que o worker ``processar_tarefas`` executa fora da
+requisição do admin.
+"""
+import math
+
+from django.db import transaction
+from django.db.models import Count, Max
+
+from . import cache_paginas
+from .models import Imovel, ImovelSimilar, PrecoPorFinalidade, ResumoImovel
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - dependência opcional
+    np = None
+
+# Campos de Imovel usados nos vetores (além de preços e infraestrutura)
+CAMPOS = [
+    'status', 'tipo', 'cidade', 'bairro', 'area_util', 'quartos', 'banheiros', 'vagas_garagem',
+    'mobilia', 'pet_friendly', 'aceita_financiamento',
+]
+
+# Vizinhos guardados por imóvel (o detalhe mostra 4; os demais cobrem os que saírem do ar)
+K = 8
+
+FINALIDADES = list(PrecoPorFinalidade.Finalidade.values)
+
+# Peso de cada característica numérica, já dividida pela sua escala
+PESOS = {
+    'preco': 1.5,  # log10(preço) / 0.3: o dobro do preço vale ~1
+    'area': 1.0,  # log10(área) / 0.3
+    'quartos': 1.0,
+    'banheiros': 0.5,
+    'vagas': 0.5,
+    'finalidade': 1.5,  # por finalidade anunciada só em um dos dois
+    'infraestrutura': 0.6,  # por infraestrutura presente só em um dos dois
+    'pet': 0.3,
+    'financiamento': 0.3,
+}
+
+# Peso das categorias: valores diferentes somam 2 * peso² à distância ao quadrado
+PESOS_CATEGORIAS = {
+    'tipo': 2.0,
+    'bairro': 1.0,
+    'mobilia': 0.3,
+}
+
+# Linhas por bloco na multiplicação de matrizes (limita a memória usada)
+ELEMENTOS_POR_BLOCO = 4_000_000
+
+def disponivel():
+    return np is not None
+
+
+class Particao:
+    """Vetores dos imóveis ativos de uma cidade"""
+
+    def __init__(self, resumos, infra_por_imovel):
+        self.ids = np.array([resumo['imovel_id'] for resumo in resumos], dtype=np.int64)
+        self.linha_do_imovel = {imovel_id: linha for linha, imovel_id in enumerate(self.ids.tolist())}
+
+        def log_escala(valores):
+            return np.array([0.0 if v is None or v <= 0 else math.log10(v) / 0.3 for v in valores])
+
+        # Preço e área podem faltar: só entram na distância quando os dois imóveis os têm
+        precos = [_preco_principal(resumo) for resumo in resumos]
+        areas = [resumo['area_util'] for resumo in resumos]
+        self.parciais = np.column_stack([
+            PESOS['preco'] * log_escala([float(p) if p is not None else None for p in precos]),
+            PESOS['area'] * log_escala([float(a) if a is not None else None for a in areas]),
+        ]) if len(resumos) else np.zeros((0, 2))
+        self.presentes = (self.parciais != 0).astype(float)
+        self.parciais_quadrado = self.parciais ** 2
+
+        colunas = [
+            PESOS['quartos'] * np.array([r['quartos'] for r in resumos], dtype=float),
+            PESOS['banheiros'] * np.array([r['banheiros'] for r in resumos], dtype=float),
+            PESOS['vagas'] * np.array([r['vagas_garagem'] for r in resumos], dtype=float),
+            PESOS['pet'] * np.array([r['pet_friendly'] for r in resumos], dtype=float),
+            PESOS['financiamento'] * np.array([r['imovel__aceita_financiamento'] for r in resumos], dtype=float),
+        ]
+        for finalidade in FINALIDADES:
+            colunas.append(PESOS['finalidade'] * np.array(
+                [r[f'preco_{finalidade}'] is not None for r in resumos], dtype=float
+            ))
+        infras = sorted({infra for lista in infra_por_imovel.values() for infra in lista})
+        posicao_infra = {infra: posicao for posicao, infra in enumerate(infras)}
+        multi_hot = np.zeros((len(resumos), len(infras)))
+        for linha, imovel_id in enumerate(self.ids.tolist()):
+            for infra in infra_por_imovel.get(imovel_id, []):
+                multi_hot[linha, posicao_infra[infra]] = PESOS['infraestrutura']
+
+        self.vetores = np.column_stack(colunas + [multi_hot]) if len(resumos) else np.zeros((0, 1))
+        self.normas = (self.vetores ** 2).sum(axis=1)
+        self.categorias = {}
+        for campo in PESOS_CATEGORIAS:
+            codigos = {}
+            self.categorias[campo] = np.array(
+                [codigos.setdefault(r[campo].lower() if campo == 'bairro' else r[campo], len(codigos))
+                 for r in resumos],
+                dtype=np.int64
+            )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def distancias(self, linhas):
+        """Distância ao quadrado de cada uma das ``linhas`` para todos os imóveis da partição"""
+        vetores = self.vetores[linhas]
+        resultado = self.normas[linhas][:, None] + self.normas[None, :] - 2 * vetores @ self.vetores.T
+        # (a - b)² só onde os dois têm o valor: a²·[b existe] + [a existe]·b² - 2ab, com ausentes = 0
+        resultado += (
+            self.parciais_quadrado[linhas] @ self.presentes.T
+            + self.presentes[linhas] @ self.parciais_quadrado.T
+            - 2 * self.parciais[linhas] @ self.parciais.T
+        )
+        for campo, peso in PESOS_CATEGORIAS.items():
+            codigos = self.categorias[campo]
+            resultado += (codigos[linhas][:, None] != codigos[None, :]) * (2 * peso ** 2)
+        np.maximum(resultado, 0, out=resultado)
+        return resultado
+
+    def vizinhos(self, linhas, k=K):
+        """Para cada linha, lista de (imovel_id, distância) dos ``k`` mais próximos"""
+        linhas = np.asarray(linhas, dtype=np.int64)
+        resultado = {}
+        tamanho_bloco = max(1, ELEMENTOS_POR_BLOCO // max(1, len(self)))
+        for inicio in range(0, len(linhas), tamanho_bloco):
+            bloco = linhas[inicio:inicio + tamanho_bloco]
+            distancias = self.distancias(bloco)
+            distancias[np.arange(len(bloco)), bloco] = np.inf  # o próprio imóvel
+            quantos = min(k, len(self) - 1)
+            if quantos <= 0:
+                resultado.update({int(self.ids[linha]): [] for linha in bloco})
+                continue
+            candidatos = np.argpartition(distancias, quantos - 1, axis=1)[:, :quantos]
+            for posicao, linha in enumerate(bloco):
+                ordem = candidatos[posicao][np.lexsort((
+                    self.ids[candidatos[posicao]], distancias[posicao, candidatos[posicao]]
+                ))]
+                resultado[int(self.ids[linha])] = [
+                    (int(self.ids[vizinho]), float(math.sqrt(distancias[posicao, vizinho])))
+                    for vizinho in ordem
+                ]
+        return resultado
+
+
+def _preco_principal(resumo):
+    # Mesma ordem de ResumoImovel.preco_principal
+    for finalidade in FINALIDADES:
+        if resumo[f'preco_{finalidade}'] is not None:
+            return resumo[f'preco_{finalidade}']
+    return None
+
+
+def carregar_particao(cidade):
+    """Lê do resumo dos cards os imóveis ativos de uma cidade"""
+    resumos = list(
+        ResumoImovel.objects.filter(status=Imovel.StatusImovel.ATIVO, cidade__iexact=cidade)
+        .order_by('imovel_id')
+        .values(
+            'imovel_id', 'tipo', 'bairro', 'area_util', 'quartos', 'banheiros', 'vagas_garagem',
+            'mobilia', 'pet_friendly', 'imovel__aceita_financiamento',
+            *[f'preco_{finalidade}' for finalidade in FINALIDADES]
+        )
+    )
+    infra_por_imovel = {}
+    relacoes = Imovel.infraestrutura.through.objects.filter(
+        imovel__status=Imovel.StatusImovel.ATIVO, imovel__cidade__iexact=cidade
+    ).values_list('imovel_id', 'infracondominio_id')
+    for imovel_id, infra_id in relacoes:
+        infra_por_imovel.setdefault(imovel_id, []).append(infra_id)
+    return Particao(resumos, infra_por_imovel)
+
+
+def _gravar(vizinhos_por_imovel):
+    # O detalhe de cada imóvel mostra os vizinhos; a versão nova do catálogo troca a chave da página em cache
+    transaction.on_commit(cache_paginas.invalidar_catalogo)
+    ImovelSimilar.objects.filter(imovel_id__in=list(vizinhos_por_imovel)).delete()
+    ImovelSimilar.objects.bulk_create([
+        ImovelSimilar(imovel_id=imovel_id, similar_id=similar_id, posicao=posicao, distancia=distancia)
+        for imovel_id, vizinhos in vizinhos_por_imovel.items()
+        for posicao, (similar_id, distancia) in enumerate(vizinhos)
+    ], batch_size=1000)
+
+
+def recalcular_todos(k=K):
+    """Recalcula os vizinhos de todos os imóveis ativos, cidade por cidade. Retorna o total."""
+    cidades = {
+        cidade.lower(): cidade
+        for cidade in ResumoImovel.objects.filter(status=Imovel.StatusImovel.ATIVO)
+        .values_list('cidade', flat=True).distinct()
+    }
+    total = 0
+    with transaction.atomic():
+        # Imóveis que saíram do ar não têm mais vizinhos
+        ImovelSimilar.objects.exclude(imovel__status=Imovel.StatusImovel.ATIVO).delete()
+        for cidade in cidades.values():
+            particao = carregar_particao(cidade)
+            _gravar(particao.vizinhos(range(len(particao)), k))
+            total += len(particao)
+    return total
+
+
+def atualizar(imovel_ids):
+    """
+    Atualização incremental depois que ``imovel_ids`` mudaram.
+
+    Recalcula os próprios imóveis, os que os tinham como vizinhos e os da
+    mesma cidade para os quais eles ficaram mais perto que o último vizinho.
+    """
+    imovel_ids = set(imovel_ids)
+    afetados = set(
+        ImovelSimilar.objects.filter(similar_id__in=imovel_ids).values_list('imovel_id', flat=True)
+    )
+    cidades = dict(
+        Imovel.objects.filter(pk__in=imovel_ids | afetados).values_list('pk', 'cidade')
+    )
+    # Os que não estão mais ativos perdem a lista; as listas dos demais são refeitas abaixo
+    ImovelSimilar.objects.filter(imovel_id__in=imovel_ids).exclude(
+        imovel__status=Imovel.StatusImovel.ATIVO
+    ).delete()
+
+    for cidade in {cidade.lower(): cidade for cidade in cidades.values()}.values():
+        particao = carregar_particao(cidade)
+        if not len(particao):
+            continue
+        recalcular = {
+            imovel_id for imovel_id in imovel_ids | afetados if imovel_id in particao.linha_do_imovel
+        }
+        alterados = [particao.linha_do_imovel[i] for i in imovel_ids if i in particao.linha_do_imovel]
+        if alterados:
+            # Imóveis da cidade para os quais algum alterado ficou mais perto que o último vizinho
+            listas = {
+                imovel_id: (pior, quantidade)
+                for imovel_id, pior, quantidade in ImovelSimilar.objects.filter(imovel__cidade__iexact=cidade)
+                .values('imovel_id').annotate(pior=Max('distancia'), quantidade=Count('pk'))
+                .values_list('imovel_id', 'pior', 'quantidade')
+            }
+            # Listas incompletas (ou inexistentes) aceitam qualquer vizinho novo
+            limite = np.array([
+                listas[i][0] if i in listas and listas[i][1] >= K else np.inf for i in particao.ids.tolist()
+            ])
+            distancias = np.sqrt(particao.distancias(alterados))
+            mais_perto = (distancias < limite[None, :]).any(axis=0)
+            recalcular |= set(particao.ids[mais_perto].tolist())
+        linhas = [particao.linha_do_imovel[i] for i in recalcular]
+        _gravar(particao.vizinhos(linhas))
+
+
+def listas_com(imovel_id):
+    """Imóveis que têm ``imovel_id`` entre os vizinhos (a refazer quando ele for excluído)"""
+    return list(ImovelSimilar.objects.filter(similar_id=imovel_id).values_list('imovel_id', flat=True))
+
+
+def similares_de(imovel, quantidade=4):
+    """Resumos dos vizinhos ativos, do mais parecido ao menos parecido (uma consulta)"""
+    return ResumoImovel.objects.filter(
+        imovel__similar_de__imovel=imovel, status=Imovel.StatusImovel.ATIVO
+    ).order_by('imovel__similar_de__posicao')[:quantidade]
@@ -0,0 +1,47 @@
+"""
+Perfil de produção do SQLite, aplicado pelo Django a cada conexão nova.
+
+- ``journal_mode=WAL``: leituras não esperam escritas nem o contrário; só as
+  escritas se enfileiram entre si.
+- ``synchronous=NORMAL``: com WAL o banco não corrompe; uma queda de energia
+  pode perder as últimas transações confirmadas, não o arquivo.
+- Espera pela trava de escrita (``timeout`` do sqlite3, o busy timeout) de
+  ESPERA_PADRAO segundos antes de "database is locked".
+- Transações ``IMMEDIATE``: o ``atomic()`` pega a trava de escrita já no
+  BEGIN. Em uma transação comum, que lê e depois escreve, o SQLite recusa a
+  troca da trava de leitura pela de escrita sem esperar o timeout, e essa é
+  a origem dos "database is locked" sob escritas concorrentes.
+- ``mmap_size`` e ``cache_size``: leituras pelo mapeamento do arquivo e 64 MB
+  de cache de páginas por conexão.
+- Conexões persistentes (CONN_MAX_AGE) com verificação de saúde: os pragmas e
+  o cache de páginas não recomeçam a cada requisição.
+
+Este módulo não importa o Django: ``settings.py`` monta DATABASES com
+``banco_sqlite``.
+"""
+ESPERA_PADRAO = 20
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negativo: em KiB
+    'cache_size': -64 * 1024,
+}
+
+
+def banco_sqlite(nome, espera=ESPERA_PADRAO, pragmas=None, transacao='IMMEDIATE', **extras):
+    """Entrada de DATABASES para o arquivo ``nome`` com o perfil de produção"""
+    pragmas = dict(PRAGMAS, **(pragmas or {}))
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': nome,
+        'OPTIONS': {
+            'timeout': espera,
+            'transaction_mode': transacao,
+            'init_command': '; '.join(f'PRAGMA {pragma} = {valor}' for pragma, valor in pragmas.items()),
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        **extras,
+    }
@@ -0,0 +1,201 @@
+"""
+Fila de tarefas em lote guardada no banco (``TarefaLote``).
+
+As ações em massa do admin só gravam a tarefa com as chaves selecionadas e
+voltam na hora; o comando ``processar_tarefas`` pega as tarefas pendentes e
+processa a seleção em lotes. Cada lote roda em uma transação, com uma única
+invalidação de resumo, motor, facetas, páginas e similares para o lote
+inteiro, e avança ``processados``, que o admin mostra como progresso.
+
+Uma tarefa cujo worker morreu fica parada em "executando"; depois de
+TAREFAS_TEMPO_PARADA segundos sem avançar ela volta para a fila e continua do
+último lote concluído.
+
+A atualização dos imóveis similares também passa por aqui: refazer os
+vizinhos relê a cidade inteira, e os signals só a enfileiram
+(``agendar_similares``) em vez de rodá-la na requisição do admin.
+
+Com TAREFAS_SINCRONAS = True as tarefas rodam na própria requisição (útil em
+desenvolvimento, sem worker).
+"""
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import cache_paginas, compatibilidade, facetas, historico_precos, similares
+from .motor_colunar import motor
+from .models import Cliente, Imovel, ResumoImovel, TarefaLote
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_LOTE = 500
+
+# nome -> (função que processa um lote de chaves, tamanho do lote)
+OPERACOES = {}
+
+_similares_pendentes = threading.local()
+
+
+def operacao(nome, tamanho_lote=TAMANHO_LOTE):
+    def registrar(funcao):
+        OPERACOES[nome] = (funcao, tamanho_lote)
+        return funcao
+    return registrar
+
+
+def sincronas():
+    return getattr(settings, 'TAREFAS_SINCRONAS', False)
+
+
+def enfileirar(nome, ids, descricao, solicitante='', **parametros):
+    if nome not in OPERACOES:
+        raise ValueError(f'Operação desconhecida: {nome}')
+    ids = list(ids)
+    tarefa = TarefaLote(
+        operacao=nome, descricao=descricao, parametros=parametros, ids=ids, total=len(ids),
+        solicitante=solicitante,
+    )
+    if sincronas():
+        # Já sai reservada, para nenhum worker pegá-la
+        tarefa.status = TarefaLote.Status.EXECUTANDO
+        tarefa.iniciado_em = timezone.now()
+        tarefa.save()
+        transaction.on_commit(lambda: executar(tarefa))
+    else:
+        tarefa.save()
+    return tarefa
+
+
+def _recuperar_paradas():
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'TAREFAS_TEMPO_PARADA', 600))
+    recuperadas = TarefaLote.objects.filter(
+        status=TarefaLote.Status.EXECUTANDO, atualizado_em__lt=limite
+    ).update(status=TarefaLote.Status.PENDENTE, atualizado_em=timezone.now())
+    if recuperadas:
+        logger.warning('%s tarefa(s) parada(s) voltaram para a fila', recuperadas)
+
+
+def reservar():
+    """
+    Próxima tarefa pendente, já marcada como em execução; None com a fila vazia.
+    O UPDATE condicional garante que dois workers não peguem a mesma tarefa.
+    """
+    _recuperar_paradas()
+    for pk in TarefaLote.objects.filter(status=TarefaLote.Status.PENDENTE).order_by('criado_em').values_list(
+        'pk', flat=True
+    )[:10]:
+        agora = timezone.now()
+        reservada = TarefaLote.objects.filter(pk=pk, status=TarefaLote.Status.PENDENTE).update(
+            status=TarefaLote.Status.EXECUTANDO, atualizado_em=agora
+        )
+        if reservada:
+            TarefaLote.objects.filter(pk=pk, iniciado_em__isnull=True).update(iniciado_em=agora)
+            return TarefaLote.objects.get(pk=pk)
+    return None
+
+
+def executar(tarefa):
+    """Processa os lotes que faltam da tarefa; falhas ficam registradas em ``erro``"""
+    funcao, tamanho_lote = OPERACOES[tarefa.operacao]
+    try:
+        while tarefa.processados < tarefa.total:
+            lote = tarefa.ids[tarefa.processados:tarefa.processados + tamanho_lote]
+            with transaction.atomic():
+                funcao(lote, **tarefa.parametros)
+                tarefa.processados += len(lote)
+                TarefaLote.objects.filter(pk=tarefa.pk).update(
+                    processados=tarefa.processados, atualizado_em=timezone.now()
+                )
+    except Exception:
+        logger.exception('Falha na tarefa %s', tarefa.pk)
+        tarefa.status = TarefaLote.Status.FALHOU
+        tarefa.erro = traceback.format_exc()
+    else:
+        tarefa.status = TarefaLote.Status.CONCLUIDA
+    tarefa.concluido_em = timezone.now()
+    tarefa.save(update_fields=['status', 'erro', 'concluido_em', 'atualizado_em'])
+    return tarefa
+
+
+def processar_pendentes(limite=None):
+    """Executa tarefas até a fila esvaziar (ou ``limite`` tarefas). Retorna quantas rodaram."""
+    executadas = 0
+    while limite is None or executadas < limite:
+        tarefa = reservar()
+        if tarefa is None:
+            break
+        executar(tarefa)
+        executadas += 1
+    return executadas
+
+
+@operacao('imovel_status')
+def alterar_status_imoveis(ids, status):
+    """update() não dispara os sinais; resumo, motor, similares e cache das páginas são avisados aqui"""
+    agora = timezone.now()
+    # Só os que mudam de status: negociado_em guarda quando a negociação aconteceu
+    Imovel.objects.filter(pk__in=ids).exclude(status=status).update(
+        status=status, atualizado_em=agora,
+        negociado_em=agora if status in Imovel.STATUS_NEGOCIADOS else None,
+    )
+    ResumoImovel.objects.filter(imovel_id__in=ids).update(status=status, atualizado_em=agora)
+    historico_precos.sincronizar(ids)
+
+    def invalidar():
+        # Depois do commit, para nenhuma requisição guardar de novo o estado antigo. Roda no processo do
+        # processar_tarefas: as listas e a versão do catálogo chegam aos workers pelo cache compartilhado,
+        # e o motor colunar de cada worker relê os imóveis alterados quando vê a versão nova
+        facetas.invalidar_cidades()
+        cache_paginas.invalidar_catalogo()
+        motor.marcar(ids)
+
+    transaction.on_commit(invalidar)
+    agendar_similares(ids)
+
+
+# Cada lote relê a partição das cidades envolvidas; lotes maiores evitam repetir a leitura
+@operacao('similares', tamanho_lote=5000)
+def atualizar_similares(ids):
+    similares.atualizar(ids)
+
+
+def _enfileirar_similares():
+    ids, _similares_pendentes.ids = getattr(_similares_pendentes, 'ids', set()), set()
+    if ids:
+        enfileirar('similares', sorted(ids), f'Atualizar similares de {len(ids)} imóvel(is)')
+
+
+def agendar_similares(imovel_ids):
+    """
+    Enfileira a atualização dos vizinhos depois do commit. Os imóveis alterados
+    na mesma transação vão juntos na tarefa do primeiro callback; os demais não
+    fazem nada.
+    """
+    if not similares.disponivel():
+        return
+    if not hasattr(_similares_pendentes, 'ids'):
+        _similares_pendentes.ids = set()
+    _similares_pendentes.ids.update(imovel_ids)
+    transaction.on_commit(_enfileirar_similares)
+
+
+# atualizado_em marca o cliente para a compatibilidade incremental
+@operacao('cliente_status')
+def alterar_status_clientes(ids, status):
+    Cliente.objects.filter(pk__in=ids).update(status=status, atualizado_em=timezone.now())
+
+
+@operacao('cliente_ultimo_contato')
+def atualizar_ultimo_contato(ids):
+    Cliente.objects.filter(pk__in=ids).update(ultimo_contato=timezone.now())
+
+
+# Cada chamada varre todos os imóveis; lotes maiores evitam repetir a varredura
+@operacao('cliente_compatibilidade', tamanho_lote=5000)
+def recalcular_compatibilidade(ids):
+    compatibilidade.recalcular(ids)
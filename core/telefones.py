@@ -0,0 +1,26 @@
+"""
+Forma normalizada dos telefones, usada para achar clientes repetidos.
+
+``Cliente.telefone`` guarda o número como foi digitado; ``telefone_normalizado``
+(indexado) guarda só os dígitos do número nacional com DDD, sem o código do
+país e sem o zero de discagem: "+55 (11) 99999-0000", "011 99999 0000" e
+"11999990000" viram todos "11999990000".
+"""
+import re
+
+CODIGO_PAIS = '55'
+
+NAO_DIGITOS = re.compile(r'\D')
+
+
+def normalizar_telefone(telefone):
+    digitos = NAO_DIGITOS.sub('', telefone or '')
+    if digitos.startswith('00'):
+        # Discagem internacional: 00 + código do país
+        digitos = digitos[2:]
+    if digitos.startswith(CODIGO_PAIS) and len(digitos) in (12, 13):
+        digitos = digitos[len(CODIGO_PAIS):]
+    elif digitos.startswith('0') and len(digitos) in (11, 12):
+        # Zero de discagem antes do DDD
+        digitos = digitos[1:]
+    return digitos[-11:]
@@ -0,0 +1,27 @@
+from django import template
+from django.core.files.storage import default_storage
+
+from core.imagens import montar_srcset
+
+register = template.Library()
+
+
+@register.inclusion_tag('core/_imagem_responsiva.html')
+def imagem_responsiva(variantes, url_original, alt='', classe='', tamanhos='thumb card',
+                      padrao='card', sizes='(max-width: 768px) 100vw, 480px', carregamento='lazy'):
+    """<picture> com srcset WebP/JPEG das variantes, ou a imagem original se ainda não houver variantes"""
+    variantes = variantes or {}
+    nomes = tamanhos.split()
+    principal = variantes.get(padrao)
+    return {
+        'url_original': url_original,
+        'src': default_storage.url(principal['jpeg']) if principal else url_original,
+        'srcset_webp': montar_srcset(variantes, 'webp', nomes),
+        'srcset_jpeg': montar_srcset(variantes, 'jpeg', nomes),
+        'largura': principal['largura'] if principal else None,
+        'altura': principal['altura'] if principal else None,
+        'sizes': sizes,
+        'alt': alt,
+        'classe': classe,
+        'carregamento': carregamento,
+    }
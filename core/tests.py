@@ -1,3 +1,1773 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from xml.etree import ElementTree
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
 
-# Create your tests here.
+import django.db
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.http import Http404, HttpResponse, QueryDict
+from django.db import DatabaseError, connection, router
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import (
+    busca, cache_paginas, compatibilidade, contadores, estaticos, exportacao, facetas, geo, historico_precos, imagens,
+    leads, metricas, motor_colunar, relatorios, replicas, resumos, similares, tarefas, views,
+)
+from .busca import buscar_imoveis
+from .filtros import ORDENACOES, aplicar_filtros, em_ordem, ler_filtros, ordenar
+from .models import (
+    AcessoImovelDiario, Cliente, CompatibilidadeCliente, EstatisticaPreco, EstoqueRelatorio, FotoImovel, Imovel,
+    ImovelSimilar, InfraCondominio, LeadsRelatorio, NegociacoesRelatorio, PrecoPorFinalidade, Proprietario,
+    ProprietarioRelatorio, ResumoImovel, TarefaLote,
+)
+from .paginacao import POR_PAGINA
+
+
+# O cache de settings.CACHES é um diretório compartilhado com o servidor de desenvolvimento:
+# os testes começam sem o que ficou dele e não deixam para ele dados do banco de testes
+def setUpModule():
+    cache.clear()
+
+
+def tearDownModule():
+    cache.clear()
+
+
+class ResumoImovelTests(TestCase):
+    """O resumo dos cards acompanha as gravações de fotos e preços, e o recálculo em lote chega ao mesmo resultado"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        cls.imovel = Imovel.objects.create(
+            proprietario=proprietario, titulo='Casa', tipo=Imovel.TipoImovel.CASA,
+            endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+        )
+
+    def resumo(self):
+        return ResumoImovel.objects.values(
+            'titulo', 'foto_capa', 'total_fotos', 'preco_venda', 'preco_aluguel', 'preco_temporada'
+        ).get(pk=self.imovel.pk)
+
+    def test_fotos(self):
+        FotoImovel.objects.create(imovel=self.imovel, imagem='imoveis/sala.jpg', ordem=1)
+        capa = FotoImovel.objects.create(imovel=self.imovel, imagem='imoveis/fachada.jpg', ordem=2, eh_capa=True)
+        self.assertEqual(self.resumo()['foto_capa'], 'imoveis/fachada.jpg')
+        self.assertEqual(self.resumo()['total_fotos'], 2)
+        capa.delete()
+        self.assertEqual(self.resumo()['foto_capa'], 'imoveis/sala.jpg')
+        self.assertEqual(self.resumo()['total_fotos'], 1)
+
+    def test_precos(self):
+        venda = PrecoPorFinalidade.objects.create(imovel=self.imovel, finalidade='venda', valor=500000)
+        aluguel = PrecoPorFinalidade.objects.create(imovel=self.imovel, finalidade='aluguel', valor=2500)
+        venda.valor = 450000
+        venda.save()
+        aluguel.delete()
+        resumo = self.resumo()
+        self.assertEqual(resumo['preco_venda'], Decimal('450000'))
+        self.assertIsNone(resumo['preco_aluguel'])
+
+    def test_reconstrucao_igual_a_manutencao(self):
+        FotoImovel.objects.create(imovel=self.imovel, imagem='imoveis/sala.jpg', ordem=1)
+        PrecoPorFinalidade.objects.create(imovel=self.imovel, finalidade='temporada', valor=300)
+        self.imovel.titulo = 'Casa reformada'
+        self.imovel.save()
+        mantido = self.resumo()
+        self.assertEqual(mantido['titulo'], 'Casa reformada')
+        ResumoImovel.objects.all().delete()
+        self.assertEqual(resumos.reconstruir_resumos(), 1)
+        self.assertEqual(self.resumo(), mantido)
+
+
+class VariantesFotoTests(TestCase):
+    """Miniatura, card e galeria em WebP e JPEG, na orientação do EXIF e sem metadados"""
+
+    def jpeg(self, largura, altura, orientacao=None):
+        saida = BytesIO()
+        exif = Image.Exif()
+        if orientacao:
+            exif[0x0112] = orientacao
+        Image.new('RGB', (largura, altura), (200, 30, 30)).save(saida, 'JPEG', exif=exif)
+        return saida.getvalue()
+
+    def test_orientacao_e_larguras(self):
+        # Orientação 6: a foto tirada de lado é exibida em pé
+        largura, altura, variantes = imagens.gerar_variantes(self.jpeg(2000, 1000, orientacao=6))
+        self.assertEqual((largura, altura), (1000, 2000))
+        for nome, largura_max in imagens.TAMANHOS.items():
+            with self.subTest(nome=nome):
+                self.assertEqual(variantes[nome]['largura'], min(largura_max, 1000))
+                self.assertEqual(variantes[nome]['altura'], 2 * variantes[nome]['largura'])
+                for formato, formato_pil in [('webp', 'WEBP'), ('jpeg', 'JPEG')]:
+                    with Image.open(BytesIO(variantes[nome][formato])) as gerada:
+                        self.assertEqual(gerada.format, formato_pil)
+                        self.assertEqual(gerada.width, variantes[nome]['largura'])
+                        self.assertFalse(gerada.getexif())
+
+    def test_foto_pequena_nao_e_ampliada(self):
+        _, _, variantes = imagens.gerar_variantes(self.jpeg(300, 200))
+        self.assertEqual([variantes[nome]['largura'] for nome in imagens.TAMANHOS], [160, 300, 300])
+
+    def test_upload_grava_variantes_na_foto_e_no_resumo(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        imovel = Imovel.objects.create(
+            proprietario=proprietario, titulo='Casa', tipo=Imovel.TipoImovel.CASA,
+            endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+        )
+        with self.settings(MEDIA_ROOT=diretorio.name, IMAGENS_PROCESSAMENTO_ASSINCRONO=False):
+            with self.captureOnCommitCallbacks(execute=True):
+                foto = FotoImovel.objects.create(
+                    imovel=imovel, imagem=SimpleUploadedFile('fachada.jpg', self.jpeg(1600, 1200)), eh_capa=True,
+                )
+            foto.refresh_from_db()
+            self.assertEqual((foto.largura, foto.altura), (1600, 1200))
+            self.assertEqual(foto.variantes['origem'], foto.imagem.name)
+            for nome in imagens.TAMANHOS:
+                for formato in imagens.FORMATOS:
+                    self.assertTrue(os.path.exists(os.path.join(diretorio.name, foto.variantes[nome][formato])))
+            self.assertFalse(imagens.precisa_processar(foto))
+            self.assertEqual(ResumoImovel.objects.get(pk=imovel.pk).foto_capa_variantes, foto.variantes)
+            self.assertEqual(
+                imagens.montar_srcset(foto.variantes, 'webp'),
+                ', '.join(f'/media/imoveis/variantes/{foto.pk}/{nome}.webp {largura}w'
+                          for nome, largura in [('thumb', 160), ('card', 480), ('galeria', 1280)]),
+            )
+
+
+class ChangelistAdminTests(TestCase):
+    """As listagens do admin fazem o mesmo número de consultas com qualquer número de linhas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def criar_linhas(self, quantidade):
+        for numero in range(quantidade):
+            proprietario = Proprietario.objects.create(
+                nome_completo=f'Proprietário {numero}', email=f'dono{numero}@exemplo.com'
+            )
+            imovel = Imovel.objects.create(
+                proprietario=proprietario, titulo=f'Casa {numero}', tipo=Imovel.TipoImovel.CASA,
+                endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+            )
+            for finalidade, valor in [('venda', 500000), ('aluguel', 2500), ('temporada', 300)]:
+                PrecoPorFinalidade.objects.create(imovel=imovel, finalidade=finalidade, valor=valor)
+            for ordem in range(2):
+                FotoImovel.objects.create(imovel=imovel, imagem=f'imoveis/foto{numero}-{ordem}.jpg', ordem=ordem)
+            cliente = Cliente.objects.create(nome_completo=f'Cliente {numero}', telefone='11999990000')
+            cliente.imoveis_interesse.add(imovel)
+            AcessoImovelDiario.objects.create(imovel=imovel, dia=timezone.localdate(), visualizacoes=3, impressoes=9)
+            TarefaLote.objects.create(operacao='imovel_status', descricao=f'Tarefa {numero}', ids=[imovel.pk], total=1)
+
+    def consultas(self, url):
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(contexto), response
+
+    def assert_consultas_constantes(self, nome_url):
+        url = reverse(nome_url)
+        self.criar_linhas(2)
+        poucas, _ = self.consultas(url)
+        self.criar_linhas(10)
+        muitas, response = self.consultas(url)
+        # Nenhuma consulta por linha: 10 linhas a mais, as mesmas consultas
+        self.assertEqual((muitas - poucas) / 10, 0, f'{poucas} consultas com 2 linhas e {muitas} com 12')
+        return response
+
+    def test_proprietarios(self):
+        response = self.assert_consultas_constantes('admin:core_proprietario_changelist')
+        self.assertContains(response, '>1</span>', count=12)
+
+    def test_imoveis(self):
+        response = self.assert_consultas_constantes('admin:core_imovel_changelist')
+        self.assertContains(response, 'fa-camera"></i> 2</span>', count=12)
+        self.assertContains(response, 'R$ 500,000 | R$ 2,500...', count=12)
+
+    def test_clientes(self):
+        self.assert_consultas_constantes('admin:core_cliente_changelist')
+
+    def test_acessos(self):
+        response = self.assert_consultas_constantes('admin:core_acessoimoveldiario_changelist')
+        self.assertContains(response, 'class="field-visualizacoes">3<', count=12)
+
+    def test_tarefas(self):
+        response = self.assert_consultas_constantes('admin:core_tarefalote_changelist')
+        self.assertContains(response, '<small>0 de 1</small>', count=12)
+
+    def test_ordenacao_pelas_colunas_anotadas(self):
+        self.criar_linhas(3)
+        Imovel.objects.filter(titulo='Casa 0').first().fotos.all().delete()
+        for nome_url in [
+            'admin:core_proprietario_changelist', 'admin:core_imovel_changelist', 'admin:core_cliente_changelist'
+        ]:
+            for coluna in range(1, 10):
+                response = self.client.get(reverse(nome_url), {'o': str(coluna)})
+                self.assertEqual(response.status_code, 200)
+
+
+class RegistroConsultas:
+    """Consultas feitas dentro do bloco, com o ponto do projeto (template ou código) de onde cada uma saiu"""
+
+    def __init__(self):
+        self.consultas = []
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self._registrar)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self._wrapper.__exit__(*exc)
+
+    def __len__(self):
+        return len(self.consultas)
+
+    def _registrar(self, execute, sql, params, many, context):
+        self.consultas.append((local_da_consulta(), sql))
+        return execute(sql, params, many, context)
+
+    def relatorio(self):
+        """SQL agrupado por ponto de chamada, os que mais consultam primeiro"""
+        por_local = defaultdict(list)
+        for local, sql in self.consultas:
+            por_local[local].append(sql)
+        linhas = []
+        for local, consultas in sorted(por_local.items(), key=lambda item: -len(item[1])):
+            linhas.append(f'{local} ({len(consultas)}x)')
+            for sql, vezes in Counter(consultas).most_common():
+                linhas.append(f'    {vezes}x {sql}')
+        return '\n'.join(linhas)
+
+
+def local_da_consulta():
+    """
+    Linha do template ou do app de onde saiu a consulta; sem nenhum dos dois
+    (consultas do próprio admin, por exemplo), o primeiro ponto fora do ORM
+    """
+    quadro, fora_do_orm = sys._getframe(2), None
+    while quadro is not None:
+        codigo = quadro.f_code
+        if codigo.co_name == 'render_annotated':
+            no = quadro.f_locals.get('self')
+            origem, token = getattr(no, 'origin', None), getattr(no, 'token', None)
+            if origem is not None and token is not None:
+                return f'{origem.template_name}:{token.lineno}'
+        arquivo = codigo.co_filename
+        if arquivo not in ARQUIVOS_IGNORADOS:
+            if arquivo.startswith(PASTA_APP):
+                return f'{os.path.relpath(arquivo, settings.BASE_DIR)}:{quadro.f_lineno} ({codigo.co_name})'
+            if fora_do_orm is None and not arquivo.startswith(PASTA_ORM):
+                fora_do_orm = f'{os.path.relpath(arquivo, PASTA_DJANGO)}:{quadro.f_lineno} ({codigo.co_name})'
+        quadro = quadro.f_back
+    return fora_do_orm
+
+
+PASTA_APP = os.path.dirname(os.path.abspath(__file__))
+PASTA_DJANGO = os.path.dirname(os.path.dirname(django.__file__))
+PASTA_ORM = os.path.dirname(django.db.__file__)
+# O wrapper de medição e os próprios testes não são pontos de chamada
+ARQUIVOS_IGNORADOS = {os.path.abspath(__file__), metricas.__file__}
+
+CASOS_LISTAGEM = {
+    'sem filtros': {},
+    'busca': {'busca': 'varanda'},
+    'finalidade': {'finalidade': 'aluguel'},
+    'tipo': {'tipo': 'apartamento'},
+    'cidade': {'cidade': 'Campinas'},
+    'bairro': {'cidade': 'Campinas', 'bairro': 'Cambuí'},
+    'quartos': {'quartos': 2},
+    'banheiros': {'banheiros': 1},
+    'vagas': {'vagas': 1},
+    'área mínima': {'area_min': 50},
+    'preço mínimo': {'preco_min': 1000},
+    'preço máximo': {'preco_max': 900000},
+    'mobília': {'mobilia': 'mobiliado'},
+    'pet friendly': {'pet_friendly': 'true'},
+    'financiamento': {'financiamento': 'true'},
+    'com fotos': {'com_fotos': 'true'},
+    'infraestrutura': {'infraestrutura': None},  # pk da piscina, criada nos dados
+    'raio': {'lat': '-22.9', 'lng': '-47.06', 'raio': 10},
+    'área do mapa': {'bbox': '-23.0,-47.2,-22.8,-47.0'},
+}
+CASOS_LISTAGEM.update({
+    f'ordenação {ordenacao}': {'ordenacao': ordenacao, 'lat': '-22.9', 'lng': '-47.06', 'raio': 10}
+    if ordenacao == 'distancia' else {'ordenacao': ordenacao}
+    for ordenacao in ORDENACOES
+})
+
+# Número exato de consultas de cada página com o cache vazio, igual com poucos ou muitos imóveis.
+# Ao mudar uma página de propósito, ajuste aqui; uma consulta a mais por linha quebra a classe com mais imóveis.
+CONSULTAS_ESPERADAS = {
+    # Versão do catálogo e destaques
+    'home': 2,
+    # Versão do imóvel, imóvel com fotos, preços e infraestrutura, vizinhos e resumos de reserva
+    'detalhe': 7,
+    # Página com os resumos, total, facetas e listas dos filtros; a busca textual consulta o índice antes
+    **{f'lista: {caso}': 5 for caso in CASOS_LISTAGEM},
+    'lista: busca': 6,
+    'admin:index': 5,
+    'admin_relatorios': 9,
+    'admin:auth_group_changelist': 7,
+    'admin:auth_group_change': 8,
+    'admin:auth_user_changelist': 8,
+    'admin:auth_user_change': 10,
+    'admin:core_proprietario_changelist': 7,
+    'admin:core_proprietario_change': 6,
+    'admin:core_cliente_changelist': 9,
+    'admin:core_cliente_change': 9,
+    'admin:core_imovel_changelist': 13,
+    'admin:core_imovel_change': 14,
+    'admin:core_tarefalote_changelist': 8,
+    'admin:core_tarefalote_change': 6,
+    'admin:core_estatisticapreco_changelist': 10,
+    'admin:core_estatisticapreco_change': 6,
+    'admin:core_acessoimoveldiario_changelist': 9,
+    'admin:core_acessoimoveldiario_change': 7,
+}
+
+
+# Cache de páginas ligado, como em produção; sem motor colunar, contagem de acessos ou avisos de orçamento
+AMBIENTE_ORCAMENTO = dict(
+    CACHE_PAGINAS=True, IMOVEIS_MOTOR_COLUNAR=False, CONTADORES_ATIVOS=False, METRICAS_ORCAMENTOS={},
+)
+
+
+class OrcamentoConsultas:
+    """
+    Páginas públicas e do admin contra CONSULTAS_ESPERADAS. As classes de
+    teste só mudam a quantidade de imóveis: menos e mais do que uma página.
+    """
+    quantidade = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        Group.objects.create(name='Corretores')
+        cls.piscina = InfraCondominio.objects.create(nome='Piscina', icone='fas fa-swimmer')
+        churrasqueira = InfraCondominio.objects.create(nome='Churrasqueira', icone='fas fa-fire')
+        bairros = ['Cambuí', 'Centro', 'Taquaral']
+        tipos = [Imovel.TipoImovel.APARTAMENTO, Imovel.TipoImovel.CASA]
+        for numero in range(cls.quantidade):
+            if numero % 5 == 0:
+                proprietario = Proprietario.objects.create(
+                    nome_completo=f'Proprietário {numero}', email=f'dono{numero}@exemplo.com'
+                )
+            imovel = Imovel.objects.create(
+                proprietario=proprietario, titulo=f'Imóvel {numero} com varanda', tipo=tipos[numero % 2],
+                descricao='Reformado, com varanda gourmet.', endereco=f'Rua A, {numero}',
+                bairro=bairros[numero % 3], cidade='Campinas', cep='13000-000',
+                latitude=Decimal('-22.9') + Decimal(numero) / 1000, longitude=Decimal('-47.06'),
+                area_util=60 + numero, quartos=1 + numero % 3, banheiros=1 + numero % 2, vagas_garagem=1,
+                mobilia=Imovel.Mobilia.MOBILIADO if numero % 2 else Imovel.Mobilia.VAZIO,
+                pet_friendly=bool(numero % 2),
+            )
+            imovel.infraestrutura.set([cls.piscina, churrasqueira])
+            for finalidade, valor in [('venda', 500000 + numero), ('aluguel', 2500 + numero), ('temporada', 300)]:
+                PrecoPorFinalidade.objects.create(imovel=imovel, finalidade=finalidade, valor=valor)
+            for ordem in range(2):
+                FotoImovel.objects.create(imovel=imovel, imagem=f'imoveis/foto{numero}-{ordem}.jpg', ordem=ordem)
+            AcessoImovelDiario.objects.create(imovel=imovel, dia=timezone.localdate(), visualizacoes=3, impressoes=10)
+            cliente = Cliente.objects.create(nome_completo=f'Cliente {numero}', telefone='11999990000')
+            cliente.imoveis_interesse.add(imovel)
+            CompatibilidadeCliente.objects.create(
+                cliente=cliente, imovel=imovel, pontuacao=80, finalidade='venda', valor=500000
+            )
+        cls.imovel = Imovel.objects.order_by('pk').first()
+        EstatisticaPreco.objects.create(
+            mes=timezone.localdate().replace(day=1), cidade='Campinas', finalidade='venda', quantidade=cls.quantidade,
+            preco_mediano=500000, calculado_em=timezone.now(),
+        )
+        TarefaLote.objects.create(operacao='imovel_status', descricao='Marcar imóveis como vendidos', ids=[1])
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def assert_consultas(self, chave, url):
+        # Caches vazios: conta também as listas e contagens que a página guarda
+        cache.clear()
+        ContentType.objects.clear_cache()
+        with RegistroConsultas() as registro:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        esperadas = CONSULTAS_ESPERADAS.get(chave)
+        if len(registro) != esperadas:
+            self.fail(
+                f'{chave} ({url}): {len(registro)} consultas, esperadas {esperadas}\n{registro.relatorio()}'
+            )
+
+    def test_paginas_publicas(self):
+        for chave, url in [
+            ('home', reverse('core:home')),
+            ('detalhe', reverse('core:detalhe_imovel', args=[self.imovel.pk])),
+        ]:
+            with self.subTest(chave):
+                self.assert_consultas(chave, url)
+
+    def test_listagem(self):
+        for caso, parametros in CASOS_LISTAGEM.items():
+            if 'infraestrutura' in parametros:
+                parametros = dict(parametros, infraestrutura=self.piscina.pk)
+            with self.subTest(caso):
+                self.assert_consultas(f'lista: {caso}', f"{reverse('core:lista_imoveis')}?{urlencode(parametros)}")
+
+    def test_admin(self):
+        for chave in ['admin:index', 'admin_relatorios']:
+            with self.subTest(chave):
+                self.assert_consultas(chave, reverse(chave))
+        for modelo in admin.site._registry:
+            prefixo = f'admin:{modelo._meta.app_label}_{modelo._meta.model_name}'
+            objeto = modelo._default_manager.order_by('pk').first()
+            for chave, url in [
+                (f'{prefixo}_changelist', reverse(f'{prefixo}_changelist')),
+                (f'{prefixo}_change', reverse(f'{prefixo}_change', args=[objeto.pk])),
+            ]:
+                with self.subTest(chave):
+                    self.assert_consultas(chave, url)
+
+
+@override_settings(**AMBIENTE_ORCAMENTO)
+class OrcamentoConsultasPoucosImoveisTests(OrcamentoConsultas, TestCase):
+    quantidade = 3
+
+
+@override_settings(**AMBIENTE_ORCAMENTO)
+class OrcamentoConsultasMuitosImoveisTests(OrcamentoConsultas, TestCase):
+    # Mais de uma página da listagem e do admin
+    quantidade = POR_PAGINA * 2 + 3
+
+
+class PerfilSqliteTests(SimpleTestCase):
+    """Com o perfil de produção, escritas concorrentes não bloqueiam leituras nem falham por trava"""
+
+    def test_leituras_nao_esperam_escritas(self):
+        saida = StringIO()
+        call_command('estresse_sqlite', segundos=1, leitores=4, escritores=2, json=True, stdout=saida)
+        resultado = json.loads(saida.getvalue())
+        self.assertEqual(resultado['journal'], 'wal')
+        self.assertGreater(resultado['escritas']['operacoes'], 0)
+        self.assertGreater(resultado['leituras']['operacoes'], 0)
+        # Os leitores não esperam pela trava: qualquer leitura bloqueada contaria como erro
+        self.assertEqual(resultado['leituras']['erros'], 0)
+        self.assertEqual(resultado['escritas']['erros'], 0)
+
+
+def em_outro_processo(codigo):
+    """Executa ``codigo`` em um processo Python novo com as mesmas settings, como um worker ou comando"""
+    subprocess.run(
+        [sys.executable, '-c', f'import django; django.setup(); {codigo}'],
+        cwd=settings.BASE_DIR, env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'imobiliaria.settings'}, check=True,
+    )
+
+
+@override_settings(CACHE_PAGINAS=True)
+class CacheCompartilhadoTests(TestCase):
+    """Invalidações feitas em outro processo (admin, processar_tarefas, comandos) chegam a este"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        Imovel.objects.create(
+            proprietario=proprietario, titulo='Casa', tipo=Imovel.TipoImovel.CASA,
+            endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_etag_muda_com_invalidacao_em_outro_processo(self):
+        url = reverse('core:home')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        em_outro_processo('from core import cache_paginas; cache_paginas.invalidar_catalogo()')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_lista_de_cidades_invalidada_em_outro_processo(self):
+        self.assertEqual(facetas.cidades_ativas(), ['Campinas'])
+        # update() não dispara os signals: só a invalidação do outro processo atualiza a lista
+        Imovel.objects.update(cidade='Valinhos')
+        self.assertEqual(facetas.cidades_ativas(), ['Campinas'])
+        em_outro_processo('from core import facetas; facetas.invalidar_cidades()')
+        self.assertEqual(facetas.cidades_ativas(), ['Valinhos'])
+
+    @skipUnless(motor_colunar.disponivel(), 'NumPy não instalado')
+    def test_motor_rele_imoveis_alterados_em_outro_processo(self):
+        # Outra instância faz o papel da cópia de um worker web, que não recebe as marcações deste processo
+        motor = motor_colunar.MotorColunar()
+        self.assertEqual(motor.colunas().arrays['ativo'].sum(), 1)
+        # Como alterar_status_imoveis no processar_tarefas: update() sem signals e a versão avançada lá
+        for modelo in [Imovel, ResumoImovel]:
+            modelo.objects.update(status=Imovel.StatusImovel.VENDIDO, atualizado_em=timezone.now())
+        self.assertEqual(motor.colunas().arrays['ativo'].sum(), 1)
+        em_outro_processo('from core import cache_paginas; cache_paginas.invalidar_catalogo()')
+        self.assertEqual(motor.colunas().arrays['ativo'].sum(), 0)
+
+
+class GeoTests(TestCase):
+    """As células de geohash só cortam caminho: o resultado é o mesmo do haversine sobre todos os imóveis"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        sorteio = random.Random(7)
+        for numero in range(150):
+            Imovel.objects.create(
+                proprietario=proprietario, titulo=f'Casa {numero}', tipo=Imovel.TipoImovel.CASA,
+                endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+                latitude=Decimal(f'{sorteio.uniform(-23.4, -22.4):.7f}'),
+                longitude=Decimal(f'{sorteio.uniform(-47.6, -46.6):.7f}'),
+            )
+        cls.coordenadas = {
+            pk: (float(latitude), float(longitude))
+            for pk, latitude, longitude in Imovel.objects.values_list('pk', 'latitude', 'longitude')
+        }
+
+    def area(self, **parametros):
+        return geo.filtrar_area(Imovel.objects.all(), geo.ler_geo(parametros))
+
+    def test_raio(self):
+        for latitude, longitude, raio in [(-22.9, -47.06, 5), (-22.9, -47.06, 25), (-23.0, -46.9, 60)]:
+            with self.subTest(latitude=latitude, longitude=longitude, raio=raio):
+                distancias = dict(self.area(lat=latitude, lng=longitude, raio=raio).values_list('pk', 'distancia_km'))
+                esperados = {
+                    pk: geo.haversine_km(latitude, longitude, *coordenadas)
+                    for pk, coordenadas in self.coordenadas.items()
+                }
+                self.assertEqual(set(distancias), {pk for pk, km in esperados.items() if km <= raio})
+                for pk, km in distancias.items():
+                    self.assertAlmostEqual(km, esperados[pk], places=6)
+
+    def test_caixa(self):
+        sul, oeste, norte, leste = -23.1, -47.3, -22.8, -46.95
+        encontrados = set(self.area(bbox=f'{sul},{oeste},{norte},{leste}').values_list('pk', flat=True))
+        self.assertEqual(encontrados, {
+            pk for pk, (latitude, longitude) in self.coordenadas.items()
+            if sul <= latitude <= norte and oeste <= longitude <= leste
+        })
+        self.assertTrue(encontrados)
+
+
+@override_settings(CACHE_PAGINAS=True)
+class CacheDetalheTests(TestCase):
+    """Chave do HTML do detalhe: só os parâmetros que a página lê, e nova a cada alteração dos similares"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        cls.imovel, cls.vizinho = [
+            Imovel.objects.create(
+                proprietario=proprietario, titulo=titulo, tipo=Imovel.TipoImovel.CASA,
+                endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+            )
+            for titulo in ['Casa', 'Sobrado']
+        ]
+        ImovelSimilar.objects.create(imovel=cls.imovel, similar=cls.vizinho, posicao=0, distancia=1.0)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('core:detalhe_imovel', args=[self.imovel.pk])
+
+    def test_querystring_ignorada_na_chave(self):
+        with mock.patch('core.views.render', wraps=views.render) as render:
+            for parametros in ['?utm_source=a', '?utm_source=b&x=1', '']:
+                self.assertEqual(self.client.get(self.url + parametros).status_code, 200)
+            self.assertEqual(render.call_count, 1)
+            response = self.client.get(self.url + '?contato=enviado&utm_source=a')
+            self.assertEqual(render.call_count, 2)
+        self.assertContains(response, 'Recebemos seu contato')
+        # Os links de compartilhar não levam a querystring de quem montou a página
+        self.assertNotContains(response, 'utm_source')
+
+    def test_alteracao_do_vizinho_troca_a_pagina(self):
+        self.assertContains(self.client.get(self.url), 'Sobrado')
+        self.vizinho.titulo = 'Sobrado reformado'
+        self.vizinho.save()
+        self.assertContains(self.client.get(self.url), 'Sobrado reformado')
+
+
+@override_settings(CACHE_PAGINAS=False)
+class BuscaTests(TestCase):
+    """A busca traz todos os ativos encontrados, os mais relevantes primeiro, consultando o índice uma vez"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        cls.imoveis = [
+            Imovel.objects.create(
+                proprietario=proprietario, titulo=titulo, tipo=Imovel.TipoImovel.CASA,
+                endereco='Rua A, 1', bairro='Centro', cidade='São Paulo', cep='01000-000',
+            )
+            for titulo in ['Casa', 'Casa térrea', 'Sobrado em São Paulo', 'Casa com quintal', 'Casa ampla']
+        ]
+        vendido = cls.imoveis[3]
+        vendido.status = Imovel.StatusImovel.VENDIDO
+        vendido.save()
+
+    def todos(self, parametros):
+        ids, cursor = [], None
+        while True:
+            response = self.client.get(reverse('core:api_imoveis'), dict(parametros, limite=2, **(
+                {'cursor': cursor} if cursor else {}
+            )))
+            self.assertEqual(response.status_code, 200)
+            dados = response.json()
+            ids += [imovel['id'] for imovel in dados['imoveis']]
+            cursor = dados['cursor_proximo']
+            if cursor is None:
+                return dados['total'], ids
+
+    def test_todos_os_encontrados_ativos(self):
+        for motor in [False, True] if motor_colunar.disponivel() else [False]:
+            with self.subTest(motor=motor), self.settings(IMOVEIS_MOTOR_COLUNAR=motor):
+                total, ids = self.todos({'busca': 'sao paulo'})
+                esperados = {imovel.pk for imovel in self.imoveis} - {self.imoveis[3].pk}
+                self.assertEqual(total, 4)
+                self.assertEqual(sorted(ids), sorted(esperados))
+                # O título com os termos pesa mais que a cidade
+                self.assertEqual(ids[0], self.imoveis[2].pk)
+
+    def test_indice_consultado_uma_vez(self):
+        for motor in [False, True] if motor_colunar.disponivel() else [False]:
+            with self.subTest(motor=motor), self.settings(IMOVEIS_MOTOR_COLUNAR=motor):
+                primeira = self.client.get(reverse('core:api_imoveis'), {'busca': 'sao paulo', 'limite': 2})
+                with CaptureQueriesContext(connection) as consultas:
+                    response = self.client.get(reverse('core:api_imoveis'), {
+                        'busca': 'sao paulo', 'limite': 2, 'cursor': primeira.json()['cursor_proximo'],
+                    })
+                self.assertEqual(len(response.json()['imoveis']), 2)
+                sqls = [consulta['sql'] for consulta in consultas.captured_queries]
+                self.assertEqual(sum('MATCH' in sql for sql in sqls), 1)
+                # A posição no ranking fica no cursor, não em um CASE no SQL
+                self.assertFalse(any('CASE WHEN' in sql for sql in sqls))
+
+    def test_indice_invertido(self):
+        with self.settings(BUSCA_BACKEND='python'):
+            busca.reconstruir_indice()
+            with CaptureQueriesContext(connection) as consultas:
+                encontrados = buscar_imoveis('sao paulo')
+            self.assertEqual(buscar_imoveis('sao paulo', limite=1), [self.imoveis[2].pk])
+            self.assertEqual(buscar_imoveis('sao paulo inexistente'), [])
+        # Vendidos continuam no índice; quem tira da listagem é o filtro de status
+        self.assertEqual(sorted(encontrados), sorted(imovel.pk for imovel in self.imoveis))
+        self.assertEqual(encontrados[0], self.imoveis[2].pk)
+        # Pontuação somada no banco: frequências e ranking, sem ler as postings no Python
+        self.assertLessEqual(len(consultas), 3)
+
+
+@override_settings(CACHE_PAGINAS=False)
+class PaginacaoCursorTests(TestCase):
+    """Ida e volta pelos cursores em todas as ordenações: cada imóvel uma vez, na ordem da consulta inteira"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        criado_em = timezone.now()
+        for numero in range(11):
+            # Empates em data, preço, área e distância: o desempate pela pk é que mantém as páginas estáveis
+            imovel = Imovel.objects.create(
+                proprietario=proprietario, titulo=f'Casa {numero}' if numero % 3 else f'Apartamento {numero}',
+                tipo=Imovel.TipoImovel.CASA, endereco='Rua A, 1', bairro='Centro', cidade='Campinas',
+                cep='13000-000', area_util=50 + numero % 4, latitude=Decimal('-22.9') + Decimal(numero % 2) / 100,
+                longitude=Decimal('-47.06'),
+            )
+            PrecoPorFinalidade.objects.create(imovel=imovel, finalidade='venda', valor=400000 + numero % 3 * 1000)
+            if numero % 2:
+                PrecoPorFinalidade.objects.create(imovel=imovel, finalidade='aluguel', valor=2000 + numero % 4)
+        for modelo in [Imovel, ResumoImovel]:
+            modelo.objects.filter(pk__in=Imovel.objects.order_by('pk').values('pk')[:4]).update(criado_em=criado_em)
+
+    def setUp(self):
+        cache.clear()
+
+    def esperados(self, parametros):
+        filtros = ler_filtros(QueryDict(urlencode(parametros)))
+        consulta = aplicar_filtros(Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO), filtros)
+        if filtros['busca'] and filtros['ordenacao'] == 'relevancia':
+            # A ordem do ranking inteiro, só com os que passam nos filtros
+            encontrados = set(consulta.values_list('pk', flat=True))
+            return [pk for pk in buscar_imoveis(filtros['busca']) if pk in encontrados]
+        consulta, chaves, decrescente = ordenar(consulta, filtros['ordenacao'])
+        return list(consulta.order_by(*[f'-{chave}' if decrescente else chave for chave in chaves]).values_list(
+            'pk', flat=True
+        ))
+
+    def pagina(self, parametros, cursor=None):
+        response = self.client.get(reverse('core:api_imoveis'), dict(parametros, limite=3, **(
+            {'cursor': cursor} if cursor else {}
+        )))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ida_e_volta(self):
+        casos = [{}, {'finalidade': 'aluguel'}, {'busca': 'casa'}]
+        motores = [False, True] if motor_colunar.disponivel() else [False]
+        for motor in motores:
+            for ordenacao in ORDENACOES:
+                for caso in casos:
+                    parametros = dict(caso, ordenacao=ordenacao)
+                    if ordenacao == 'distancia':
+                        parametros.update(lat='-22.9', lng='-47.06', raio=50)
+                    with self.subTest(motor=motor, **parametros), self.settings(IMOVEIS_MOTOR_COLUNAR=motor):
+                        self.assert_ida_e_volta(parametros)
+
+    def assert_ida_e_volta(self, parametros):
+        esperados = self.esperados(parametros)
+        self.assertGreater(len(esperados), 3)
+
+        paginas, cursor = [], None
+        while True:
+            dados = self.pagina(parametros, cursor)
+            paginas.append([imovel['id'] for imovel in dados['imoveis']])
+            cursor = dados['cursor_proximo']
+            if cursor is None:
+                break
+        self.assertEqual([pk for pagina in paginas for pk in pagina], esperados)
+
+        # De volta, a partir da última página, as mesmas páginas na ordem inversa
+        cursor, voltando = dados['cursor_anterior'], []
+        while cursor is not None:
+            dados = self.pagina(parametros, cursor)
+            voltando.insert(0, [imovel['id'] for imovel in dados['imoveis']])
+            cursor = dados['cursor_anterior']
+        self.assertEqual(voltando, paginas[:-1])
+
+    def test_total_muda_com_o_catalogo(self):
+        parametros = {'cidade': 'Campinas'}
+        self.assertEqual(self.pagina(parametros)['total'], 11)
+        imovel = Imovel.objects.order_by('pk').first()
+        imovel.status = Imovel.StatusImovel.VENDIDO
+        imovel.save()
+        # Sem esperar IMOVEIS_CONTAGEM_TTL: a versão nova do catálogo troca a chave
+        self.assertEqual(self.pagina(parametros)['total'], 10)
+
+
+@skipUnless(motor_colunar.disponivel(), 'NumPy não instalado')
+class MotorColunarTests(TestCase):
+    """O motor colunar devolve os mesmos imóveis, na mesma ordem e com as mesmas contagens do ORM"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        piscina, churrasqueira = [InfraCondominio.objects.create(nome=nome) for nome in ['Piscina', 'Churrasqueira']]
+        cls.piscina, cls.churrasqueira = piscina, churrasqueira
+        sorteio = random.Random(11)
+        for numero in range(60):
+            imovel = Imovel.objects.create(
+                proprietario=proprietario, titulo=f'{sorteio.choice(["Casa", "Apartamento"])} {numero}',
+                tipo=sorteio.choice([Imovel.TipoImovel.CASA, Imovel.TipoImovel.APARTAMENTO, Imovel.TipoImovel.SOBRADO]),
+                endereco='Rua A, 1', bairro=sorteio.choice(['Centro', 'Cambuí', 'Taquaral']),
+                cidade=sorteio.choice(['Campinas', 'São Paulo']), cep='13000-000',
+                quartos=sorteio.randint(0, 4), banheiros=sorteio.randint(1, 3), vagas_garagem=sorteio.randint(0, 2),
+                area_util=sorteio.choice([None, Decimal(sorteio.randint(30, 300))]),
+                mobilia=sorteio.choice(Imovel.Mobilia.values), pet_friendly=sorteio.random() < 0.5,
+                aceita_financiamento=sorteio.random() < 0.5,
+                latitude=Decimal(f'{sorteio.uniform(-23.0, -22.8):.7f}'),
+                longitude=Decimal(f'{sorteio.uniform(-47.2, -46.9):.7f}'),
+                status=Imovel.StatusImovel.VENDIDO if numero % 10 == 9 else Imovel.StatusImovel.ATIVO,
+            )
+            for finalidade, valor in [('venda', 200000 + numero % 7 * 50000), ('aluguel', 1500 + numero % 5 * 500)]:
+                if sorteio.random() < 0.6:
+                    PrecoPorFinalidade.objects.create(imovel=imovel, finalidade=finalidade, valor=valor)
+            imovel.infraestrutura.set([infra for infra in [piscina, churrasqueira] if sorteio.random() < 0.4])
+            if numero % 3 == 0:
+                FotoImovel.objects.create(imovel=imovel, imagem=f'imoveis/foto{numero}.jpg')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_mesmos_ids_na_mesma_ordem(self):
+        casos = [
+            {}, {'busca': 'casa'}, {'finalidade': 'aluguel'}, {'tipo': 'casa', 'quartos': '2'},
+            {'cidade': 'são paulo'}, {'bairro': 'camb', 'banheiros': '2', 'vagas': '1'},
+            {'area_min': '100', 'preco_min': '250000', 'preco_max': '400000'},
+            {'mobilia': 'mobiliado', 'pet_friendly': 'true', 'financiamento': 'true', 'com_fotos': 'true'},
+            {'infraestrutura': [self.piscina.pk, self.churrasqueira.pk]},
+            {'lat': '-22.9', 'lng': '-47.05', 'raio': '12'},
+            {'bbox': '-22.95,-47.1,-22.85,-47.0', 'busca': 'apartamento'},
+        ]
+        motor = motor_colunar.MotorColunar()
+        for caso in casos:
+            for ordenacao in ORDENACOES:
+                parametros = dict(caso, ordenacao=ordenacao)
+                with self.subTest(**parametros):
+                    filtros = ler_filtros(QueryDict(urlencode(parametros, doseq=True)))
+                    ids_busca = buscar_imoveis(filtros['busca']) if filtros['busca'] else None
+                    consulta = aplicar_filtros(
+                        Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO), filtros, ids_busca
+                    )
+                    esperados = [imovel.pk for imovel in em_ordem(consulta, filtros, ids_busca)]
+                    pagina, total, contagens = motor.consultar(filtros, ids_busca, por_pagina=1000)
+                    self.assertEqual(pagina.object_list, esperados)
+                    self.assertEqual(total, len(esperados))
+                    self.assertEqual(contagens, facetas.contagens_por_faceta(consulta, parametros))
+        self.assertTrue(esperados)
+
+
+@skipUnless(compatibilidade.disponivel(), 'NumPy não instalado')
+class CompatibilidadeTests(TestCase):
+    """Notas de orçamento e tipo, e a execução incremental chegando ao mesmo resultado da completa"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        cls.imoveis = {}
+        for nome, tipo, finalidade, valor in [
+            ('barato', 'apartamento', 'venda', 100000),
+            ('na_medida', 'apartamento', 'venda', 400000),
+            ('pouco_acima', 'apartamento', 'venda', 540000),
+            ('muito_acima', 'apartamento', 'venda', 600000),
+            ('outro_tipo', 'casa', 'venda', 400000),
+            ('para_alugar', 'apartamento', 'aluguel', 3000),
+        ]:
+            imovel = Imovel.objects.create(
+                proprietario=proprietario, titulo=nome, tipo=tipo,
+                endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+            )
+            PrecoPorFinalidade.objects.create(imovel=imovel, finalidade=finalidade, valor=valor)
+            cls.imoveis[nome] = imovel
+        cls.cliente = Cliente.objects.create(
+            nome_completo='Maria Silva', telefone='11999990000', finalidade_interesse='venda',
+            orcamento_max=500000, observacoes='Procura apto perto do metrô',
+        )
+
+    def sugestoes(self):
+        return {
+            cliente_id: list(
+                CompatibilidadeCliente.objects.filter(cliente_id=cliente_id)
+                .order_by('-pontuacao', 'imovel_id').values_list('imovel_id', 'pontuacao', 'finalidade')
+            )
+            for cliente_id in Cliente.objects.values_list('pk', flat=True)
+        }
+
+    def test_notas(self):
+        compatibilidade.executar()
+        imoveis = self.imoveis
+        # Até o orçamento a nota é cheia a partir de 70% dele; 8% acima ainda entra, mais de 10% não.
+        # O tipo (apto nas observações) vale 40 pontos, e outra finalidade não é sugerida.
+        self.assertEqual(self.sugestoes()[self.cliente.pk], [
+            (imoveis['na_medida'].pk, 100.0, 'venda'),
+            (imoveis['pouco_acima'].pk, 76.0, 'venda'),
+            (imoveis['barato'].pk, 70.0, 'venda'),
+            (imoveis['outro_tipo'].pk, 60.0, 'venda'),
+        ])
+
+    def test_incremental_igual_a_completa(self):
+        compatibilidade.executar()
+        preco = self.imoveis['pouco_acima'].precos.get()
+        preco.valor = 450000
+        preco.save()
+        Cliente.objects.create(
+            nome_completo='João Souza', telefone='11988880000', finalidade_interesse='venda_aluguel',
+            observacoes='Quer uma casa',
+        )
+        execucao = compatibilidade.executar(incremental=True)
+        self.assertEqual(execucao.modo, 'incremental')
+        incremental = self.sugestoes()
+        compatibilidade.recalcular()
+        self.assertEqual(incremental, self.sugestoes())
+        self.assertEqual(incremental[self.cliente.pk][1][:2], (self.imoveis['pouco_acima'].pk, 100.0))
+
+
+@override_settings(CACHE_PAGINAS=False)
+class ApiTests(TestCase):
+    """fields escolhe os campos e as colunas lidas; o NDJSON traz o resultado inteiro na ordem da listagem"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        for numero in range(7):
+            imovel = Imovel.objects.create(
+                proprietario=proprietario, titulo=f'Casa {numero}', tipo=Imovel.TipoImovel.CASA,
+                descricao='Descrição longa ' * 20, endereco='Rua A, 1', bairro='Centro', cidade='Campinas',
+                cep='13000-000', latitude=Decimal('-22.9'), longitude=Decimal('-47.06'),
+                status=Imovel.StatusImovel.ALUGADO if numero == 6 else Imovel.StatusImovel.ATIVO,
+            )
+            PrecoPorFinalidade.objects.create(imovel=imovel, finalidade='venda', valor=300000 + numero * 1000)
+        cls.inativo = imovel
+
+    def get(self, nome, *args, **parametros):
+        return self.client.get(reverse(f'core:{nome}', args=args), parametros)
+
+    def test_campos_escolhidos(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.get('api_imoveis', fields='titulo,preco_venda', ordenacao='preco_menor', limite=2)
+        self.assertEqual(response.json()['imoveis'], [
+            {'titulo': 'Casa 0', 'preco_venda': '300000.00'}, {'titulo': 'Casa 1', 'preco_venda': '301000.00'},
+        ])
+        leitura = next(consulta['sql'] for consulta in consultas.captured_queries if '"titulo"' in consulta['sql'])
+        self.assertNotIn('"descricao"', leitura)
+        self.assertNotIn('"endereco"', leitura)
+
+    def test_campo_desconhecido(self):
+        response = self.get('api_imoveis', fields='titulo,senha')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('senha', response.json()['erro'])
+        # distancia_km só faz sentido na listagem
+        imovel = Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO).first()
+        self.assertEqual(self.get('api_imovel', imovel.pk, fields='distancia_km').status_code, 400)
+
+    def test_ndjson_igual_as_paginas(self):
+        parametros = {'fields': 'id,distancia_km', 'lat': '-22.9', 'lng': '-47.06', 'ordenacao': 'preco_maior'}
+        paginas, cursor = [], None
+        while True:
+            dados = self.get('api_imoveis', limite=4, **parametros, **({'cursor': cursor} if cursor else {})).json()
+            paginas.extend(dados['imoveis'])
+            cursor = dados['cursor_proximo']
+            if cursor is None:
+                break
+
+        with self.settings(API_STREAMING_CHUNK_SIZE=2):
+            response = self.get('api_imoveis', formato='ndjson', **parametros)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        linhas = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(linha) for linha in linhas], paginas)
+        self.assertEqual(len(linhas), 6)
+        self.assertEqual(paginas[0], {'id': paginas[0]['id'], 'distancia_km': 0.0})
+
+    def test_detalhe(self):
+        imovel = Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO).first()
+        dados = self.get('api_imovel', imovel.pk, fields='titulo,precos').json()
+        self.assertEqual(dados['titulo'], imovel.titulo)
+        self.assertEqual([preco['finalidade'] for preco in dados['precos']], ['venda'])
+        with self.assertLogs('django.request', 'WARNING'):
+            self.assertEqual(self.get('api_imovel', self.inativo.pk).status_code, 404)
+
+
+@override_settings(CACHE_PAGINAS=False)
+class FeedTests(TestCase):
+    """Feed dos portais: XML bem formado com qualquer texto, e ``desde`` trazendo só os alterados"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        cls.antigo, cls.especial, cls.vendido = [
+            Imovel.objects.create(
+                proprietario=proprietario, titulo=titulo, tipo=Imovel.TipoImovel.CASA, status=status,
+                endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+            )
+            for titulo, status in [
+                ('Casa antiga', Imovel.StatusImovel.ATIVO),
+                ('Casa <grande> & "linda" \u2014 R$ 1.000', Imovel.StatusImovel.ATIVO),
+                ('Casa vendida', Imovel.StatusImovel.VENDIDO),
+            ]
+        ]
+        FotoImovel.objects.create(imovel=cls.especial, imagem='imoveis/fachada.jpg', legenda='Vista "frontal" & <jardim>')
+        cls.corte = timezone.now() - timedelta(days=1)
+        Imovel.objects.filter(pk=cls.antigo.pk).update(atualizado_em=cls.corte - timedelta(days=30))
+
+    def feed(self, formato, **parametros):
+        response = self.client.get(reverse('core:feed_imoveis', args=[formato]), parametros)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_xml_escapado(self):
+        raiz = ElementTree.fromstring(self.feed('xml'))
+        imoveis = {int(imovel.findtext('id')): imovel for imovel in raiz.findall('imovel')}
+        # Sem desde: só os ativos
+        self.assertEqual(set(imoveis), {self.antigo.pk, self.especial.pk})
+        especial = imoveis[self.especial.pk]
+        self.assertEqual(especial.findtext('titulo'), self.especial.titulo)
+        foto = especial.find('fotos/foto')
+        self.assertEqual(foto.get('legenda'), 'Vista "frontal" & <jardim>')
+        self.assertTrue(foto.text.endswith('/media/imoveis/fachada.jpg'))
+
+    def test_desde(self):
+        desde = self.corte.isoformat()
+        raiz = ElementTree.fromstring(self.feed('xml', desde=desde))
+        self.assertEqual(raiz.get('desde'), desde)
+        # Os alterados em qualquer status, para o portal retirar o vendido
+        self.assertEqual(
+            {(int(imovel.findtext('id')), imovel.findtext('status')) for imovel in raiz.findall('imovel')},
+            {(self.especial.pk, 'ativo'), (self.vendido.pk, 'vendido')},
+        )
+        dados = json.loads(self.feed('json', desde=desde))
+        self.assertEqual([imovel['id'] for imovel in dados['imoveis']], [self.especial.pk, self.vendido.pk])
+        self.assertEqual(dados['desde'], desde)
+
+    def test_desde_invalido(self):
+        with self.assertLogs('django.request', 'WARNING'):
+            response = self.client.get(reverse('core:feed_imoveis', args=['xml']), {'desde': 'ontem'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_arquivo_gzip_em_blocos(self):
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminho = os.path.join(diretorio, 'feed.json.gz')
+            total = exportacao.exportar_arquivo(caminho, 'json', tamanho=1)
+            with gzip.open(caminho, 'rt', encoding='utf-8') as arquivo:
+                dados = json.load(arquivo)
+        self.assertEqual(total, 2)
+        self.assertEqual([imovel['id'] for imovel in dados['imoveis']], [self.antigo.pk, self.especial.pk])
+
+
+@override_settings(CACHE_PAGINAS=False, METRICAS_TOKEN='')
+class MetricasTests(TestCase):
+    def test_endpoint_exige_token_fora_do_debug(self):
+        url = reverse('metricas')
+        # O cliente de testes chega de 127.0.0.1, como tudo que passa por um proxy reverso
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with self.settings(METRICAS_TOKEN='segredo'):
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer errado').status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer segredo').status_code, 200)
+
+    def test_server_timing_mede_templates(self):
+        response = self.client.get(reverse('core:home'))
+        tempos = dict(parte.split(';')[:2] for parte in response['Server-Timing'].split(', '))
+        self.assertGreater(float(tempos['tpl'].removeprefix('dur=')), 0)
+
+
+@override_settings(REPLICAS_LEITURA=['replica'])
+class ReplicasTests(TestCase):
+    """Leituras na réplica, o primário depois de uma escrita e quando a réplica falha"""
+
+    def setUp(self):
+        replicas.saude.limpar()
+        self.addCleanup(replicas.saude.limpar)
+        self.bancos = []
+        # A verificação de saúde no lugar da conexão: a réplica responde até o teste dizer o contrário
+        self.responde = True
+        patcher = mock.patch.object(replicas, '_responde', side_effect=lambda alias: self.responde)
+        self.verificacoes = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def view(self, falhar_na_replica=False):
+        @replicas.leitura
+        def _view(request):
+            banco = router.db_for_read(Imovel)
+            self.bancos.append(banco)
+            if falhar_na_replica and banco == 'replica':
+                raise DatabaseError('no such table: core_imovel')
+            return HttpResponse(banco)
+        return _view
+
+    def test_leitura_vai_para_a_replica_e_escrita_para_o_primario(self):
+        self.view()(RequestFactory().get('/'))
+        self.assertEqual(self.bancos, ['replica'])
+        self.assertEqual(router.db_for_write(Imovel), 'default')
+        # Fora da view marcada, o primário
+        self.assertEqual(router.db_for_read(Imovel), 'default')
+
+    def test_post_marca_o_navegador_para_ler_do_primario(self):
+        response = self.client.post(reverse('admin:login'), {'username': 'ninguem', 'password': 'errada'})
+        self.assertIn(replicas.COOKIE, response.cookies)
+        self.assertEqual(response.cookies[replicas.COOKIE]['max-age'], replicas.janela_escrita())
+
+        request = RequestFactory().get('/')
+        request.COOKIES[replicas.COOKIE] = response.cookies[replicas.COOKIE].value
+        self.view()(request)
+        self.assertEqual(self.bancos, ['default'])
+
+    def test_sem_replicas_nao_marca_o_navegador(self):
+        with self.settings(REPLICAS_LEITURA=[]):
+            response = self.client.post(reverse('admin:login'), {'username': 'ninguem', 'password': 'errada'})
+        self.assertNotIn(replicas.COOKIE, response.cookies)
+
+    def test_replica_fora_do_ar_le_do_primario(self):
+        self.responde = False
+        view = self.view()
+        view(RequestFactory().get('/'))
+        view(RequestFactory().get('/'))
+        self.assertEqual(self.bancos, ['default', 'default'])
+        # O resultado da verificação vale pelo intervalo: a réplica não é testada a cada requisição
+        self.assertEqual(self.verificacoes.call_count, 1)
+
+    def test_falha_na_replica_refaz_no_primario_e_tira_a_replica(self):
+        view = self.view(falhar_na_replica=True)
+        with self.assertLogs('core.replicas', 'WARNING'):
+            response = view(RequestFactory().get('/'))
+        self.assertEqual(response.content, b'default')
+        self.assertEqual(self.bancos, ['replica', 'default'])
+        view(RequestFactory().get('/'))
+        self.assertEqual(self.bancos, ['replica', 'default', 'default'])
+
+
+@override_settings(CACHE_PAGINAS=False, LEADS_SINCRONOS=True)
+class LeadsTests(TestCase):
+    """Formulário de interesse: um cliente por telefone, um savepoint por lead e só envios do próprio site"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        cls.imovel = Imovel.objects.create(
+            proprietario=proprietario, titulo='Casa', tipo=Imovel.TipoImovel.CASA,
+            endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+        )
+
+    def enviar(self, telefone, **cabecalhos):
+        return self.client.post(
+            reverse('core:registrar_interesse', args=[self.imovel.pk]),
+            {'nome_completo': 'Maria Silva', 'telefone': telefone},
+            HTTP_ACCEPT='application/json', **cabecalhos,
+        )
+
+    def lead(self, nome, telefone):
+        return leads.Lead(self.imovel.pk, self.imovel.titulo, {'nome_completo': nome, 'telefone': telefone})
+
+    def test_formatos_do_mesmo_telefone_viram_um_cliente(self):
+        clientes = set()
+        for telefone in ['+55 (11) 99999-0000', '011 99999 0000', '11999990000']:
+            response = self.enviar(telefone)
+            self.assertEqual(response.status_code, 201)
+            clientes.add(response.json()['cliente'])
+        self.assertEqual(len(clientes), 1)
+        cliente = Cliente.objects.get()
+        self.assertEqual(cliente.telefone_normalizado, '11999990000')
+        self.assertEqual(len(cliente.observacoes.splitlines()), 3)
+        self.assertEqual(list(cliente.imoveis_interesse.all()), [self.imovel])
+
+    def test_formatos_do_mesmo_telefone_no_mesmo_lote(self):
+        lote = [self.lead('Maria Silva', telefone) for telefone in ['(11) 99999-0000', '0055 11 99999 0000']]
+        leads.gravar(lote)
+        self.assertEqual(Cliente.objects.count(), 1)
+        self.assertEqual({lead.cliente_id for lead in lote}, {Cliente.objects.get().pk})
+
+    def test_lead_que_falha_nao_desfaz_os_outros(self):
+        salvar = Cliente.save
+
+        def save(cliente, *args, **kwargs):
+            if 'Falha' in cliente.observacoes:
+                raise django.db.IntegrityError('falha simulada')
+            return salvar(cliente, *args, **kwargs)
+
+        primeiro, falha, outro, ultimo = lote = [
+            self.lead('Maria Silva', '11999990000'), self.lead('Falha', '11999990000'),
+            self.lead('João Souza', '19988887777'), self.lead('Maria Silva', '11999990000'),
+        ]
+        falha.titulo_imovel = 'Falha'
+        with mock.patch.object(Cliente, 'save', autospec=True, side_effect=save), self.assertLogs('core.leads'):
+            leads.gravar(lote)
+
+        self.assertIsInstance(falha.erro, django.db.IntegrityError)
+        self.assertIsNone(falha.cliente_id)
+        self.assertEqual(Cliente.objects.count(), 2)
+        self.assertEqual(primeiro.cliente_id, ultimo.cliente_id)
+        self.assertIsNotNone(outro.cliente_id)
+        # A linha do lead que falhou não sobra no cliente em memória para o próximo lead gravar
+        observacoes = Cliente.objects.get(pk=ultimo.cliente_id).observacoes
+        self.assertEqual(len(observacoes.splitlines()), 2)
+        self.assertNotIn('Falha', observacoes)
+
+    def test_envio_exige_o_token_csrf(self):
+        cliente = Client(enforce_csrf_checks=True)
+        url = reverse('core:registrar_interesse', args=[self.imovel.pk])
+        dados = {'nome_completo': 'Maria Silva', 'telefone': '11999990000'}
+
+        # A página em cache não leva o token: ele vem do endpoint sem cache
+        detalhe = cliente.get(reverse('core:detalhe_imovel', args=[self.imovel.pk]))
+        self.assertNotContains(detalhe, 'csrfmiddlewaretoken')
+        self.assertEqual(cliente.post(url, dados, HTTP_ACCEPT='application/json').status_code, 403)
+
+        response = cliente.get(reverse('core:token_csrf'))
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
+        token = response.json()['token']
+        # Com o token, mas de outro site: a verificação de Origin do Django recusa
+        outro_site = cliente.post(
+            url, dados, HTTP_ACCEPT='application/json', HTTP_X_CSRFTOKEN=token, HTTP_ORIGIN='https://outro.exemplo.com'
+        )
+        self.assertEqual(outro_site.status_code, 403)
+        self.assertFalse(Cliente.objects.exists())
+        # Sem Origin nem Referer (navegadores que os omitem) o token basta
+        self.assertEqual(cliente.post(url, dados, HTTP_ACCEPT='application/json', HTTP_X_CSRFTOKEN=token).status_code, 201)
+        with self.settings(CSRF_TRUSTED_ORIGINS=['https://www.exemplo.com.br']):
+            # O middleware guarda as origens confiáveis: outro cliente, com o cookie do primeiro
+            confiavel = Client(enforce_csrf_checks=True)
+            confiavel.cookies = cliente.cookies
+            response = confiavel.post(
+                url, dados, HTTP_ACCEPT='application/json', HTTP_X_CSRFTOKEN=token,
+                HTTP_ORIGIN='https://www.exemplo.com.br',
+            )
+        self.assertEqual(response.status_code, 201)
+
+
+
+FEED_CSV = """codigo,proprietario_email,proprietario_nome,titulo,tipo,endereco,bairro,cidade,preco_venda,preco_aluguel,infraestrutura,quartos
+A1,Joao@Exemplo.com,João Pereira,Casa com piscina,Casa,"Rua B, 2",Centro,Campinas,"1.250.000,00",,Piscina|Academia,3
+A2,joao@exemplo.com,João Pereira,Apartamento central,apartamento,"Rua C, 3",Cambuí,Campinas,,"3.500,00",piscina,2
+A3,joao@exemplo.com,João Pereira,Sem cidade,casa,"Rua D, 4",Centro,,100000,,,1
+"""
+
+FEED_XML = """<?xml version="1.0" encoding="utf-8"?>
+<imoveis>
+  <imovel codigo="A1">
+    <proprietario_email>joao@exemplo.com</proprietario_email>
+    <proprietario_nome>João Pereira</proprietario_nome>
+    <titulo>Casa com piscina &amp; jardim</titulo>
+    <tipo>casa</tipo>
+    <status>vendido</status>
+    <endereco>Rua B, 2</endereco>
+    <bairro>Centro</bairro>
+    <cidade>Campinas</cidade>
+    <precos><preco finalidade="aluguel">8000</preco></precos>
+    <infraestrutura><item>Piscina</item></infraestrutura>
+  </imovel>
+  <imovel codigo="A4">
+    <proprietario_email>maria@exemplo.com</proprietario_email>
+    <titulo>Kitnet mobiliada</titulo>
+    <tipo>Kitnet</tipo>
+    <endereco>Rua E, 5</endereco>
+    <bairro>Centro</bairro>
+    <cidade>Valinhos</cidade>
+    <precos><preco finalidade="aluguel">1200,50</preco></precos>
+  </imovel>
+</imoveis>
+"""
+
+
+@override_settings(CACHE_PAGINAS=False)
+class ImportacaoTests(TestCase):
+    """import_imoveis com feeds CSV e XML: cria, atualiza pelo código e reaproveita os proprietários"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Cadastrado à mão com maiúsculas no e-mail, que o feed traz em minúsculas
+        cls.proprietario = Proprietario.objects.create(nome_completo='João', email='Joao@Exemplo.com')
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.diretorio = diretorio.name
+
+    def importar(self, nome, conteudo):
+        caminho = os.path.join(self.diretorio, nome)
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(conteudo)
+        with self.assertLogs('core.importacao', 'WARNING') if nome.endswith('.csv') else nullcontext():
+            call_command('import_imoveis', caminho, '--sem-fotos', stdout=StringIO())
+
+    def test_csv(self):
+        self.importar('feed.csv', FEED_CSV)
+        # A3 sem cidade é ignorado
+        self.assertEqual(sorted(Imovel.objects.values_list('codigo_externo', flat=True)), ['A1', 'A2'])
+        casa = Imovel.objects.get(codigo_externo='A1')
+        self.assertEqual((casa.tipo, casa.status, casa.quartos), (Imovel.TipoImovel.CASA, Imovel.StatusImovel.ATIVO, 3))
+        self.assertEqual(dict(casa.precos.values_list('finalidade', 'valor')), {'venda': Decimal('1250000.00')})
+        # "piscina" e "Piscina" são a mesma infraestrutura
+        self.assertEqual(sorted(nome.lower() for nome in casa.infraestrutura.values_list('nome', flat=True)), [
+            'academia', 'piscina',
+        ])
+        self.assertEqual(InfraCondominio.objects.count(), 2)
+        # As gravações em lote mantêm o resumo dos cards e o índice de busca
+        self.assertEqual(ResumoImovel.objects.get(imovel=casa).preco_venda, Decimal('1250000.00'))
+        self.assertEqual(buscar_imoveis('piscina'), [casa.pk])
+
+    def test_xml_atualiza_pelo_codigo(self):
+        self.importar('feed.csv', FEED_CSV)
+        casa = Imovel.objects.get(codigo_externo='A1')
+        self.importar('feed.xml', FEED_XML)
+        self.assertEqual(Imovel.objects.count(), 3)
+        casa.refresh_from_db()
+        self.assertEqual(casa.titulo, 'Casa com piscina & jardim')
+        self.assertEqual(casa.status, Imovel.StatusImovel.VENDIDO)
+        self.assertIsNotNone(casa.negociado_em)
+        # A venda saiu do feed
+        self.assertEqual(dict(casa.precos.values_list('finalidade', 'valor')), {'aluguel': Decimal('8000')})
+        self.assertEqual(casa.infraestrutura.get().nome.lower(), 'piscina')
+        kitnet = Imovel.objects.get(codigo_externo='A4')
+        self.assertEqual(kitnet.tipo, Imovel.TipoImovel.KITNET)
+        self.assertEqual(kitnet.proprietario.email, 'maria@exemplo.com')
+        self.assertEqual(kitnet.precos.get().valor, Decimal('1200.50'))
+
+    def test_proprietario_cadastrado_com_maiusculas(self):
+        self.importar('feed.xml', FEED_XML)
+        self.importar('feed.csv', FEED_CSV)
+        # Só a Maria é nova: o João do feed é o proprietário já cadastrado
+        self.assertEqual(Proprietario.objects.count(), 2)
+        self.assertEqual(
+            set(Imovel.objects.filter(codigo_externo__in=['A1', 'A2']).values_list('proprietario', flat=True)),
+            {self.proprietario.pk},
+        )
+        self.proprietario.refresh_from_db()
+        self.assertEqual(self.proprietario.nome_completo, 'João Pereira')
+
+
+@skipUnless(similares.disponivel(), 'NumPy não instalado')
+@override_settings(TAREFAS_SINCRONAS=False)
+class SimilaresTests(TestCase):
+    """As gravações do admin só enfileiram os similares; o worker refaz os vizinhos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        cls.imoveis = [
+            Imovel.objects.create(
+                proprietario=proprietario, titulo=f'Apartamento {numero}', tipo=Imovel.TipoImovel.APARTAMENTO,
+                endereco=f'Rua A, {numero}', bairro='Centro', cidade='Campinas', cep='13000-000', quartos=numero,
+            )
+            for numero in range(1, 4)
+        ]
+
+    def salvar_precos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for numero, imovel in enumerate(self.imoveis, 1):
+                PrecoPorFinalidade.objects.create(
+                    imovel=imovel, finalidade=PrecoPorFinalidade.Finalidade.VENDA, valor=Decimal(numero * 300000),
+                )
+
+    def test_gravacao_so_enfileira(self):
+        self.salvar_precos()
+        self.assertFalse(ImovelSimilar.objects.exists())
+        # Uma tarefa para a transação inteira, não uma por gravação
+        tarefa = TarefaLote.objects.get(operacao='similares')
+        self.assertEqual(tarefa.status, TarefaLote.Status.PENDENTE)
+        self.assertLessEqual({imovel.pk for imovel in self.imoveis}, set(tarefa.ids))
+
+    def test_worker_atualiza_os_vizinhos(self):
+        self.salvar_precos()
+        self.assertEqual(tarefas.processar_pendentes(), 1)
+        primeiro, segundo, terceiro = self.imoveis
+        self.assertEqual(
+            list(ImovelSimilar.objects.filter(imovel=primeiro).values_list('similar', flat=True)),
+            [segundo.pk, terceiro.pk],
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            terceiro.delete()
+        # As listas que continham o excluído (o próprio id vem da exclusão dos preços em cascata)
+        self.assertLessEqual(
+            {primeiro.pk, segundo.pk}, set(TarefaLote.objects.get(status=TarefaLote.Status.PENDENTE).ids)
+        )
+        tarefas.processar_pendentes()
+        self.assertEqual(
+            list(ImovelSimilar.objects.filter(imovel=primeiro).values_list('similar', flat=True)), [segundo.pk]
+        )
+
+
+@override_settings(TAREFAS_SINCRONAS=False)
+class TarefasTests(TestCase):
+    """Ações em massa do admin: a requisição só enfileira, o worker processa em lotes e retoma de onde parou"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        cls.imoveis = [
+            Imovel.objects.create(
+                proprietario=proprietario, titulo=f'Casa {numero}', tipo=Imovel.TipoImovel.CASA,
+                endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+            )
+            for numero in range(3)
+        ]
+
+    def test_acao_do_admin_processada_pelo_worker(self):
+        self.client.force_login(self.usuario)
+        response = self.client.post(reverse('admin:core_imovel_changelist'), {
+            'action': 'marcar_como_vendido', '_selected_action': [imovel.pk for imovel in self.imoveis[:2]],
+        })
+        self.assertEqual(response.status_code, 302)
+        tarefa = TarefaLote.objects.get()
+        self.assertEqual((tarefa.status, tarefa.total, tarefa.solicitante), (TarefaLote.Status.PENDENTE, 2, 'admin'))
+        self.assertFalse(Imovel.objects.exclude(status=Imovel.StatusImovel.ATIVO).exists())
+
+        saida = StringIO()
+        call_command('processar_tarefas', '--uma-vez', stdout=saida)
+        self.assertIn('concluída, 2 de 2', saida.getvalue())
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, TarefaLote.Status.CONCLUIDA)
+        vendidos = Imovel.objects.filter(status=Imovel.StatusImovel.VENDIDO, negociado_em__isnull=False)
+        self.assertEqual(set(vendidos.values_list('pk', flat=True)), {imovel.pk for imovel in self.imoveis[:2]})
+        self.assertEqual(ResumoImovel.objects.filter(status=Imovel.StatusImovel.VENDIDO).count(), 2)
+
+    def test_falha_retoma_do_ultimo_lote(self):
+        lotes, falhar = [], [True]
+
+        def processar(ids):
+            if 4 in ids and falhar[0]:
+                raise ValueError('falha no lote')
+            lotes.append(ids)
+
+        with mock.patch.dict(tarefas.OPERACOES, {'teste': (processar, 2)}):
+            tarefa = tarefas.enfileirar('teste', [1, 2, 3, 4, 5], 'Teste')
+            with self.assertLogs('core.tarefas', 'ERROR'):
+                tarefas.processar_pendentes()
+            tarefa.refresh_from_db()
+            self.assertEqual((tarefa.status, tarefa.processados), (TarefaLote.Status.FALHOU, 2))
+            self.assertIn('falha no lote', tarefa.erro)
+
+            falhar[0] = False
+            TarefaLote.objects.filter(pk=tarefa.pk).update(status=TarefaLote.Status.PENDENTE)
+            self.assertEqual(tarefas.processar_pendentes(), 1)
+        tarefa.refresh_from_db()
+        self.assertEqual((tarefa.status, tarefa.processados), (TarefaLote.Status.CONCLUIDA, 5))
+        self.assertEqual(lotes, [[1, 2], [3, 4], [5]])
+
+    def test_tarefa_parada_volta_para_a_fila(self):
+        tarefa = tarefas.enfileirar('cliente_ultimo_contato', [], 'Parada')
+        TarefaLote.objects.filter(pk=tarefa.pk).update(
+            status=TarefaLote.Status.EXECUTANDO, atualizado_em=timezone.now() - timedelta(hours=1)
+        )
+        recente = tarefas.enfileirar('cliente_ultimo_contato', [], 'Em execução')
+        TarefaLote.objects.filter(pk=recente.pk).update(status=TarefaLote.Status.EXECUTANDO)
+        with self.assertLogs('core.tarefas', 'WARNING'):
+            self.assertEqual(tarefas.reservar().pk, tarefa.pk)
+        self.assertIsNone(tarefas.reservar())
+
+
+class HistoricoPrecosTests(TestCase):
+    """Histórico só com as mudanças de preço, e medianas mensais com o preço em vigor no fim de cada mês"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        cls.imoveis = []
+        for tipo, bairro, area, valor in [
+            ('casa', 'Centro', 100, 250000), ('casa', 'Centro', 100, 500000),
+            ('casa', 'Centro', 200, 400000), ('apartamento', 'Cambuí', 50, 1000000),
+        ]:
+            imovel = Imovel.objects.create(
+                proprietario=proprietario, titulo='Imóvel', tipo=tipo, area_util=area,
+                endereco='Rua A, 1', bairro=bairro, cidade='Campinas', cep='13000-000',
+            )
+            PrecoPorFinalidade.objects.create(imovel=imovel, finalidade='venda', valor=valor)
+            cls.imoveis.append(imovel)
+
+    def mediana(self, mes, bairro='', tipo=''):
+        return EstatisticaPreco.objects.values_list('quantidade', 'preco_mediano', 'preco_m2_mediano').get(
+            mes=mes, cidade='Campinas', finalidade='venda', bairro=bairro, tipo=tipo
+        )
+
+    def test_historico_so_com_mudancas(self):
+        primeiro = self.imoveis[0]
+        preco = primeiro.precos.get()
+        preco.save()
+        self.assertEqual(historico_precos.sincronizar(), 0)
+        primeiro.status = Imovel.StatusImovel.VENDIDO
+        primeiro.save()
+        # Saiu do ar: o preço deixa de estar em vigor
+        self.assertEqual(
+            list(primeiro.historico_precos.order_by('pk').values_list('valor', flat=True)), [Decimal('250000'), None]
+        )
+
+    def test_medianas_por_mes(self):
+        mes_atual = historico_precos.inicio_do_mes(timezone.now())
+        mes_passado = historico_precos.inicio_do_mes(historico_precos.limites_do_mes(mes_atual)[0] - timedelta(days=15))
+        # O primeiro imóvel já estava anunciado no mês passado; neste mês o preço subiu
+        primeiro = self.imoveis[0]
+        primeiro.historico_precos.update(registrado_em=historico_precos.limites_do_mes(mes_passado)[0] + timedelta(days=10))
+        preco = primeiro.precos.get()
+        preco.valor = 300000
+        preco.save()
+
+        self.assertEqual(historico_precos.calcular_estatisticas(completo=True), [mes_passado, mes_atual])
+        self.assertEqual(self.mediana(mes_passado), (1, Decimal('250000.00'), Decimal('2500.00')))
+        # 300, 500 e 400 mil; por m², 3000, 5000 e 2000
+        self.assertEqual(self.mediana(mes_atual, 'Centro', 'casa'), (3, Decimal('400000.00'), Decimal('3000.00')))
+        # A cidade inteira inclui o apartamento de 1 milhão (20000/m²)
+        self.assertEqual(self.mediana(mes_atual), (4, Decimal('450000.00'), Decimal('4000.00')))
+        self.assertEqual(
+            [estatistica.mes for estatistica in historico_precos.tendencia('Campinas', 'venda')],
+            [mes_passado, mes_atual],
+        )
+
+
+class RelatoriosTests(TestCase):
+    """Tabelas do painel: a atualização incremental chega ao resultado da completa, e o painel só lê os resumos"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = get_user_model().objects.create_superuser('admin', 'admin@exemplo.com', 'senha')
+        cls.proprietarios = [
+            Proprietario.objects.create(nome_completo=nome, email=f'{nome.lower()}@exemplo.com')
+            for nome in ['Ana', 'Bruno']
+        ]
+        cls.imoveis = [
+            Imovel.objects.create(
+                proprietario=cls.proprietarios[dono], titulo='Imóvel', tipo=tipo,
+                endereco='Rua A, 1', bairro='Centro', cidade=cidade, cep='13000-000',
+            )
+            for dono, tipo, cidade in [
+                (0, 'casa', 'Campinas'), (0, 'casa', 'Campinas'), (0, 'apartamento', 'Campinas'),
+                (1, 'casa', 'Valinhos'), (1, 'casa', 'Valinhos'),
+            ]
+        ]
+        for origem in ['site', 'site', 'whatsapp']:
+            Cliente.objects.create(nome_completo='Cliente', telefone='11999990000', origem=origem)
+
+    def vender(self, imovel, dias):
+        imovel.status = Imovel.StatusImovel.VENDIDO
+        imovel.save()
+        Imovel.objects.filter(pk=imovel.pk).update(criado_em=imovel.negociado_em - timedelta(days=dias))
+
+    def tabelas(self):
+        return {
+            modelo.__name__: sorted(modelo.objects.values_list(*campos))
+            for modelo, campos in [
+                (EstoqueRelatorio, ['cidade', 'tipo', 'ativos']),
+                (ProprietarioRelatorio, ['proprietario_id', 'ativos', 'total']),
+                (LeadsRelatorio, ['mes', 'origem', 'status', 'quantidade']),
+                (NegociacoesRelatorio, ['mes', 'status', 'quantidade', 'dias_medio', 'dias_mediano']),
+            ]
+        }
+
+    def test_tabelas(self):
+        self.vender(self.imoveis[3], dias=10)
+        relatorios.atualizar()
+        mes = historico_precos.inicio_do_mes(timezone.now())
+        tabelas = self.tabelas()
+        self.assertEqual(tabelas['EstoqueRelatorio'], [
+            ('Campinas', 'apartamento', 1), ('Campinas', 'casa', 2), ('Valinhos', 'casa', 1),
+        ])
+        self.assertEqual(tabelas['ProprietarioRelatorio'], sorted([
+            (self.proprietarios[0].pk, 3, 3), (self.proprietarios[1].pk, 1, 2),
+        ]))
+        self.assertEqual(tabelas['LeadsRelatorio'], [(mes, 'site', 'lead_frio', 2), (mes, 'whatsapp', 'lead_frio', 1)])
+        self.assertEqual(tabelas['NegociacoesRelatorio'], [(mes, 'vendido', 1, 10.0, 10.0)])
+
+    def test_incremental_igual_a_completa(self):
+        relatorios.atualizar()
+        self.vender(self.imoveis[0], dias=4)
+        self.vender(self.imoveis[4], dias=8)
+        Cliente.objects.create(nome_completo='Cliente', telefone='11988880000', origem='placa')
+        execucao = relatorios.atualizar()
+        self.assertFalse(execucao.completa)
+        incremental = self.tabelas()
+        relatorios.atualizar(completo=True)
+        self.assertEqual(incremental, self.tabelas())
+        self.assertEqual(incremental['NegociacoesRelatorio'][0][2:], (2, 6.0, 6.0))
+
+    def test_painel_le_so_os_resumos(self):
+        relatorios.atualizar()
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(reverse('admin_relatorios'))
+        self.assertContains(response, 'Valinhos')
+        tabelas_vivas = ['"core_imovel"', '"core_cliente"']
+        self.assertFalse([
+            consulta['sql'] for consulta in consultas.captured_queries
+            if any(f'FROM {tabela}' in consulta['sql'] for tabela in tabelas_vivas)
+        ])
+
+
+@override_settings(CACHE_PAGINAS=False, CONTADORES_ATIVOS=True)
+class ContadoresTests(TestCase):
+    """As páginas só contam em memória; a gravação soma tudo às linhas diárias em um upsert"""
+
+    @classmethod
+    def setUpTestData(cls):
+        proprietario = Proprietario.objects.create(nome_completo='Proprietário', email='dono@exemplo.com')
+        cls.imoveis = [
+            Imovel.objects.create(
+                proprietario=proprietario, titulo=f'Casa {numero}', tipo=Imovel.TipoImovel.CASA,
+                endereco='Rua A, 1', bairro='Centro', cidade='Campinas', cep='13000-000',
+            )
+            for numero in range(3)
+        ]
+
+    def setUp(self):
+        # Uma instância por teste, sem a thread de gravação: aqui quem grava é o teste
+        self.contadores = contadores.Contadores()
+        for alvo, atributo, valor in [
+            (contadores, 'contadores', self.contadores), (self.contadores, '_iniciar', lambda: None),
+        ]:
+            patcher = mock.patch.object(alvo, atributo, valor)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def acessos(self):
+        return {
+            imovel_id: (visualizacoes, impressoes)
+            for imovel_id, visualizacoes, impressoes in AcessoImovelDiario.objects.filter(
+                dia=timezone.localdate()
+            ).values_list('imovel_id', 'visualizacoes', 'impressoes')
+        }
+
+    def test_paginas_contam_sem_gravar(self):
+        primeiro = self.imoveis[0]
+        url = reverse('core:detalhe_imovel', args=[primeiro.pk])
+        with CaptureQueriesContext(connection) as consultas:
+            etag = self.client.get(url)['ETag']
+            # O 304 também é uma visualização
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.client.get(reverse('core:lista_imoveis'))
+        self.assertFalse([c['sql'] for c in consultas.captured_queries if 'core_acessoimoveldiario' in c['sql']])
+        self.assertEqual(self.contadores.gravar(), 3)
+        self.assertEqual(self.acessos(), {primeiro.pk: (2, 1), self.imoveis[1].pk: (0, 1), self.imoveis[2].pk: (0, 1)})
+
+    def test_gravacoes_somam(self):
+        primeiro, segundo, excluido = self.imoveis
+        contadores.registrar_impressoes([primeiro.pk, segundo.pk, excluido.pk])
+        excluido.delete()
+        # Imóvel excluído depois de visto fica de fora
+        self.assertEqual(self.contadores.gravar(), 2)
+        for _ in range(3):
+            contadores.registrar_visualizacao(primeiro.pk)
+        contadores.registrar_impressoes([primeiro.pk])
+        self.assertEqual(self.contadores.gravar(), 1)
+        self.assertEqual(self.contadores.gravar(), 0)
+        self.assertEqual(self.acessos(), {primeiro.pk: (3, 2), segundo.pk: (0, 1)})
+        self.assertEqual([(imovel.pk, imovel.visualizacoes_periodo) for imovel in contadores.mais_vistos()], [
+            (primeiro.pk, 3),
+        ])
+
+    def test_falha_devolve_as_contagens(self):
+        contadores.registrar_visualizacao(self.imoveis[0].pk)
+        with mock.patch.object(contadores.escritor, 'executar', side_effect=DatabaseError('database is locked')):
+            with self.assertRaises(DatabaseError):
+                self.contadores.gravar()
+        contadores.registrar_visualizacao(self.imoveis[0].pk)
+        self.contadores.gravar()
+        self.assertEqual(self.acessos(), {self.imoveis[0].pk: (2, 0)})
+
+    @override_settings(CONTADORES_EVENTOS_POR_GRAVACAO=3)
+    def test_gravacao_antecipada_com_muitos_eventos(self):
+        contadores.registrar_impressoes([self.imoveis[0].pk, self.imoveis[1].pk])
+        self.assertFalse(self.contadores._acordar.is_set())
+        contadores.registrar_visualizacao(self.imoveis[0].pk)
+        self.assertTrue(self.contadores._acordar.is_set())
+
+
+class BenchmarkTests(TestCase):
+    def semear(self, *args):
+        call_command('seed_benchmark_data', '30', '--lote', '12', '--sem-similares', *args, stdout=StringIO())
+
+    def base(self):
+        return (
+            list(Imovel.objects.order_by('codigo_externo').values_list(
+                'codigo_externo', 'titulo', 'tipo', 'status', 'cidade', 'bairro', 'area_total', 'quartos',
+            )),
+            sorted(PrecoPorFinalidade.objects.values_list('imovel__codigo_externo', 'finalidade', 'valor')),
+            Cliente.objects.count(),
+        )
+
+    def test_mesma_semente_mesma_base(self):
+        self.semear('--semente', '7')
+        base = self.base()
+        self.assertEqual(len(base[0]), 30)
+        self.assertEqual(base[2], 6)
+        with self.assertRaises(CommandError):
+            self.semear('--semente', '7')
+        self.semear('--semente', '7', '--limpar')
+        self.assertEqual(self.base(), base)
+        self.semear('--semente', '8', '--limpar')
+        self.assertNotEqual(self.base()[0], base[0])
+
+    def test_benchmark_views_grava_e_compara(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_views', stdout=StringIO(), stderr=StringIO())
+        self.semear()
+        with tempfile.TemporaryDirectory() as diretorio:
+            anterior = os.path.join(diretorio, 'anterior.json')
+            call_command(
+                'benchmark_views', '--repeticoes', '2', '--imoveis-detalhe', '2', '--saida', anterior,
+                stdout=StringIO(), stderr=StringIO(),
+            )
+            with open(anterior, encoding='utf-8') as arquivo:
+                resultado = json.load(arquivo)
+            self.assertEqual(resultado['imoveis'], 30)
+            for nome in ['home', 'lista: sem filtros', 'lista: busca por texto', 'detalhe']:
+                medicao = resultado['cenarios'][nome]
+                self.assertEqual(medicao['repeticoes'], 2)
+                self.assertLessEqual(medicao['p50_ms'], medicao['p95_ms'])
+                self.assertGreater(medicao['consultas'], 0)
+                self.assertGreater(medicao['pico_memoria_kb'], 0)
+            self.assertEqual(resultado['cenarios']['detalhe']['urls'], 2)
+
+            erros, saida = StringIO(), StringIO()
+            call_command(
+                'benchmark_views', '--repeticoes', '1', '--imoveis-detalhe', '1', '--sem-cache',
+                '--comparar', anterior, stdout=saida, stderr=erros,
+            )
+            self.assertFalse(json.loads(saida.getvalue())['cache_paginas'])
+            self.assertIn(f'Comparação com {anterior}', erros.getvalue())
+            self.assertIn('lista: sem filtros', erros.getvalue().split('Comparação')[1])
+            with self.assertRaises(CommandError):
+                call_command('benchmark_views', '--comparar', os.path.join(diretorio, 'nada.json'), stderr=StringIO())
+
+
+class EstaticosTests(SimpleTestCase):
+    """``servir``: cópia comprimida que o navegador aceita e cache longo só para os nomes com hash"""
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        self.enterContext(override_settings(STATIC_ROOT=diretorio.name))
+        self.conteudo = b'body { color: #333; margin: 0 auto; }\n' * 20
+        os.makedirs(os.path.join(diretorio.name, 'css'))
+        for nome in ['css/site.css', 'css/site.3f2a9c1b7e4d.css']:
+            caminho = os.path.join(diretorio.name, nome)
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(self.conteudo)
+            for extensao, dados in estaticos.comprimir(self.conteudo).items():
+                with open(caminho + extensao, 'wb') as arquivo:
+                    arquivo.write(dados)
+        # Sem o pacote brotli a cópia .br não é gerada; basta que exista para ser escolhida
+        with open(os.path.join(diretorio.name, 'css/site.3f2a9c1b7e4d.css.br'), 'wb') as arquivo:
+            arquivo.write(b'br')
+        self.enterContext(mock.patch.object(
+            estaticos, '_nomes_com_hash', return_value=frozenset({'css/site.3f2a9c1b7e4d.css'})
+        ))
+
+    def servir(self, caminho, **cabecalhos):
+        return estaticos.servir(RequestFactory().get(f'/static/{caminho}', **cabecalhos), caminho)
+
+    def conteudo_de(self, response):
+        dados = b''.join(response.streaming_content)
+        response.close()
+        return dados
+
+    def test_negocia_a_codificacao(self):
+        nome = 'css/site.3f2a9c1b7e4d.css'
+        for aceita, codificacao, conteudo in [
+            ('gzip, deflate, br', 'br', b'br'),
+            ('gzip, br;q=0', 'gzip', None),
+            ('GZIP', 'gzip', None),
+            ('br;q=0, gzip;q=0', None, self.conteudo),
+            ('', None, self.conteudo),
+        ]:
+            with self.subTest(aceita=aceita):
+                response = self.servir(nome, HTTP_ACCEPT_ENCODING=aceita)
+                self.assertEqual(response.get('Content-Encoding'), codificacao)
+                self.assertEqual(response['Content-Type'], 'text/css')
+                self.assertEqual(response['Vary'], 'Accept-Encoding')
+                dados = self.conteudo_de(response)
+                self.assertEqual(dados, conteudo or gzip.compress(self.conteudo, compresslevel=9, mtime=0))
+        # Sem .br ao lado, o gzip é a melhor cópia
+        self.assertEqual(self.servir('css/site.css', HTTP_ACCEPT_ENCODING='br, gzip')['Content-Encoding'], 'gzip')
+
+    def test_cache_longo_so_com_hash(self):
+        com_hash = self.servir('css/site.3f2a9c1b7e4d.css')
+        self.assertEqual(com_hash['Cache-Control'], estaticos.CACHE_IMUTAVEL)
+        sem_hash = self.servir('css/site.css')
+        self.assertEqual(sem_hash['Cache-Control'], estaticos.CACHE_SEM_HASH)
+        self.assertEqual(
+            self.servir('css/site.css', HTTP_IF_MODIFIED_SINCE=sem_hash['Last-Modified']).status_code, 304
+        )
+        for response in [com_hash, sem_hash]:
+            response.close()
+
+    def test_copias_e_caminhos_fora_nao_sao_servidos(self):
+        for caminho in ['css/site.css.gz', 'css/site.3f2a9c1b7e4d.css.br', '../settings.py', 'css/nada.css']:
+            with self.subTest(caminho=caminho), self.assertRaises(Http404):
+                self.servir(caminho)
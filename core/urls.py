@@ -1,10 +1,17 @@
-from django.urls import path
-from . import views
+from django.urls import path, re_path
+from . import api, views
 
 app_name = 'core'
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('imoveis/', views.lista_imoveis, name='lista_imoveis'),
+    path('imoveis/mapa/', views.imoveis_mapa, name='imoveis_mapa'),
     path('imovel/<int:pk>/', views.detalhe_imovel, name='detalhe_imovel'),
+    path('imovel/<int:pk>/interesse/', views.registrar_interesse, name='registrar_interesse'),
+    path('csrf/', views.token_csrf, name='token_csrf'),
+    path('api/imoveis/', api.imoveis, name='api_imoveis'),
+    path('api/imoveis/facetas/', api.facetas_imoveis, name='api_facetas'),
+    path('api/imoveis/<int:pk>/', api.imovel, name='api_imovel'),
+    re_path(r'^feed/imoveis\.(?P<formato>xml|json)$', views.feed_imoveis, name='feed_imoveis'),
 ]
\ No newline at end of file
@@ -1,21 +1,32 @@
-from django.shortcuts import render, get_object_or_404
-from django.db.models import Q, Prefetch
-from django.core.paginator import Paginator
-from django.http import Http404
-from .models import Imovel, InfraCondominio, PrecoPorFinalidade
+from django.shortcuts import redirect, render, get_object_or_404
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET, require_POST
+from . import cache_paginas, contadores, exportacao, facetas, leads, motor_colunar, replicas, similares
+from .busca import buscar_imoveis
+from .forms import InteresseForm
+from .filtros import aplicar_filtros, filtros_aplicados, ler_filtros, paginar
+from .paginacao import contagem_em_cache
+from .models import Imovel, ResumoImovel
 
 
+@replicas.leitura
+@cache_paginas.pagina_publica('home', cache_paginas.por_catalogo)
 def home(request):
     """Página inicial com busca rápida e destaques"""
-    # Imóveis em destaque (recentes e com fotos)
-    imoveis_destaque = Imovel.objects.filter(
+    # Imóveis em destaque (recentes), lidos do resumo dos cards
+    imoveis_destaque = ResumoImovel.objects.filter(
         status=Imovel.StatusImovel.ATIVO
-    ).prefetch_related('fotos', 'precos').order_by('-criado_em')[:6]
+    ).order_by('-criado_em')[:6]
     
-    # Cidades disponíveis para o filtro
-    cidades = Imovel.objects.filter(
-        status=Imovel.StatusImovel.ATIVO
-    ).values_list('cidade', flat=True).distinct().order_by('cidade')
+    # Cidades disponíveis para o filtro (cache invalidado por signals)
+    cidades = facetas.cidades_ativas()
     
     # Tipos de imóveis disponíveis
     tipos = Imovel.TipoImovel.choices
@@ -24,227 +35,227 @@ def home(request):
         'imoveis_destaque': imoveis_destaque,
         'cidades': cidades,
         'tipos': tipos,
+        'tempo_cache': cache_paginas.tempo_cache(),
     }
-    return render(request, 'core/home.html', context)
+    response = render(request, 'core/home.html', context)
+    contadores.registrar_impressoes([resumo.pk for resumo in imoveis_destaque])
+    return response
 
 
+@replicas.leitura
+@cache_paginas.pagina_publica('lista', cache_paginas.por_catalogo)
 def lista_imoveis(request):
     """Lista de imóveis com filtros"""
-    imoveis = Imovel.objects.filter(
-        status=Imovel.StatusImovel.ATIVO
-    ).select_related('proprietario').prefetch_related(
-        'fotos',
-        Prefetch('precos', queryset=PrecoPorFinalidade.objects.all()),
-        'infraestrutura'
-    )
-    
-    # Função helper para verificar se um valor é válido
-    def is_valid_value(value):
-        return value and value.strip() and value.strip().lower() not in ['none', '']
-    
-    # Aplicar filtros
-    # Busca por texto
-    busca = request.GET.get('busca', '').strip()
-    if is_valid_value(busca):
-        imoveis = imoveis.filter(
-            Q(titulo__icontains=busca) |
-            Q(endereco__icontains=busca) |
-            Q(bairro__icontains=busca) |
-            Q(cidade__icontains=busca) |
-            Q(descricao__icontains=busca)
-        )
-    
-    # Finalidade (venda, aluguel, temporada)
-    finalidade = request.GET.get('finalidade', '').strip()
-    if is_valid_value(finalidade):
-        imoveis = imoveis.filter(precos__finalidade=finalidade)
-    
-    # Tipo de imóvel
-    tipo = request.GET.get('tipo', '').strip()
-    if is_valid_value(tipo):
-        imoveis = imoveis.filter(tipo=tipo)
-    
-    # Cidade
-    cidade = request.GET.get('cidade', '').strip()
-    if is_valid_value(cidade):
-        imoveis = imoveis.filter(cidade__iexact=cidade)
-    
-    # Bairro
-    bairro = request.GET.get('bairro', '').strip()
-    if is_valid_value(bairro):
-        imoveis = imoveis.filter(bairro__icontains=bairro)
-    
-    # Quartos mínimos
-    quartos = request.GET.get('quartos', '').strip()
-    if is_valid_value(quartos):
-        try:
-            quartos_int = int(quartos)
-            if quartos_int > 0:
-                imoveis = imoveis.filter(quartos__gte=quartos_int)
-        except (ValueError, TypeError):
-            pass
-    
-    # Banheiros mínimos
-    banheiros = request.GET.get('banheiros', '').strip()
-    if is_valid_value(banheiros):
-        try:
-            banheiros_int = int(banheiros)
-            if banheiros_int > 0:
-                imoveis = imoveis.filter(banheiros__gte=banheiros_int)
-        except (ValueError, TypeError):
-            pass
-    
-    # Vagas de garagem mínimas
-    vagas = request.GET.get('vagas', '').strip()
-    if is_valid_value(vagas):
-        try:
-            vagas_int = int(vagas)
-            if vagas_int > 0:
-                imoveis = imoveis.filter(vagas_garagem__gte=vagas_int)
-        except (ValueError, TypeError):
-            pass
-    
-    # Área mínima
-    area_min = request.GET.get('area_min', '').strip()
-    if is_valid_value(area_min):
-        try:
-            area_min_float = float(area_min)
-            if area_min_float > 0:
-                imoveis = imoveis.filter(area_util__gte=area_min_float)
-        except (ValueError, TypeError):
-            pass
+    filtros = ler_filtros(request.GET)
     
-    # Preço mínimo e máximo
-    preco_min = request.GET.get('preco_min', '').strip()
-    preco_max = request.GET.get('preco_max', '').strip()
-    
-    if is_valid_value(preco_min):
-        try:
-            preco_min_float = float(preco_min)
-            if preco_min_float > 0:
-                imoveis = imoveis.filter(precos__valor__gte=preco_min_float)
-        except (ValueError, TypeError):
-            pass
-    
-    if is_valid_value(preco_max):
-        try:
-            preco_max_float = float(preco_max)
-            if preco_max_float > 0:
-                imoveis = imoveis.filter(precos__valor__lte=preco_max_float)
-        except (ValueError, TypeError):
-            pass
-    
-    # Mobília
-    mobilia = request.GET.get('mobilia', '').strip()
-    if is_valid_value(mobilia):
-        imoveis = imoveis.filter(mobilia=mobilia)
-    
-    # Pet friendly
-    pet_friendly = request.GET.get('pet_friendly', '').strip()
-    if pet_friendly == 'true':
-        imoveis = imoveis.filter(pet_friendly=True)
-    
-    # Aceita financiamento
-    financiamento = request.GET.get('financiamento', '').strip()
-    if financiamento == 'true':
-        imoveis = imoveis.filter(aceita_financiamento=True)
-    
-    # Somente com fotos
-    com_fotos = request.GET.get('com_fotos', '').strip()
-    if com_fotos == 'true':
-        imoveis = imoveis.filter(fotos__isnull=False)
-    
-    # Infraestrutura do condomínio
-    infraestrutura_ids = request.GET.getlist('infraestrutura')
-    if infraestrutura_ids:
-        for infra_id in infraestrutura_ids:
-            try:
-                infra_id_int = int(infra_id)
-                imoveis = imoveis.filter(infraestrutura=infra_id_int)
-            except (ValueError, TypeError):
-                pass
-    
-    # Ordenação
-    ordenacao = request.GET.get('ordenacao', '').strip()
-    if ordenacao == 'preco_menor':
-        imoveis = imoveis.order_by('precos__valor')
-    elif ordenacao == 'preco_maior':
-        imoveis = imoveis.order_by('-precos__valor')
-    elif ordenacao == 'mais_recentes':
-        imoveis = imoveis.order_by('-criado_em')
-    elif ordenacao == 'maior_area':
-        imoveis = imoveis.order_by('-area_util')
-    else:  # relevancia (padrão)
-        imoveis = imoveis.order_by('-criado_em', '-atualizado_em')
-        ordenacao = 'relevancia'
-    
-    # Remover duplicatas (devido aos joins com preços)
-    imoveis = imoveis.distinct()
-    
-    # Paginação
-    paginator = Paginator(imoveis, 12)  # 12 imóveis por página
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Dados para os filtros
-    cidades = Imovel.objects.filter(
-        status=Imovel.StatusImovel.ATIVO
-    ).values_list('cidade', flat=True).distinct().order_by('cidade')
-    
-    infraestruturas = InfraCondominio.objects.all().order_by('nome')
-    
-    tipos = Imovel.TipoImovel.choices
-    finalidades = PrecoPorFinalidade.Finalidade.choices
-    mobilias = Imovel.Mobilia.choices
+    # Busca por texto: todos os encontrados, do mais relevante ao menos; filtra e ordena sem reconsultar o índice
+    ids_busca = buscar_imoveis(filtros['busca']) if filtros['busca'] else None
     
     # Filtros aplicados - limpar valores None/vazios para o template
-    filtros_aplicados = {}
-    for key, value in request.GET.items():
-        if key != 'page' and is_valid_value(value):
-            filtros_aplicados[key] = value
+    filtros_template = filtros_aplicados(request.GET)
     
-    # Adicionar listas múltiplas
-    if infraestrutura_ids:
-        filtros_aplicados['infraestrutura'] = infraestrutura_ids
+    if motor_colunar.ativo():
+        # Filtro, ordenação, total e facetas em memória; o banco só lê os cards da página
+        page_obj, total_imoveis, contagens = motor_colunar.consultar(
+            filtros, ids_busca, request.GET.get('cursor')
+        )
+    else:
+        # Só as chaves de ordenação vêm de Imovel; os cards vêm do resumo no mesmo SELECT
+        imoveis = Imovel.objects.filter(
+            status=Imovel.StatusImovel.ATIVO
+        ).only('pk', 'criado_em', 'area_util', 'resumo').select_related('resumo')
+        imoveis = aplicar_filtros(imoveis, filtros, ids_busca)
+        
+        # Total vem do cache (a ordenação não altera a contagem)
+        filtros_contagem = {k: v for k, v in filtros_template.items() if k != 'ordenacao'}
+        total_imoveis = contagem_em_cache(imoveis.order_by().values('pk'), filtros_contagem)
+        contagens = facetas.contagens_por_faceta(imoveis, filtros_contagem)
+        
+        # Paginação por cursor (sem OFFSET): chaves de ordenação terminando na pk, ou a posição no ranking da busca
+        page_obj = paginar(imoveis, filtros, ids_busca, request.GET.get('cursor'))
+        page_obj.object_list = [imovel.resumo for imovel in page_obj]
+    
+    # Dados para os filtros (listas em cache, contagens do filtro atual)
+    cidades = facetas.cidades_ativas()
+    infraestruturas = facetas.infraestruturas()
+    escolhas = facetas.listas_de_escolha()
+    tipos = escolhas['tipos']
+    finalidades = escolhas['finalidades']
+    mobilias = escolhas['mobilias']
+    
+    cidades_facetas = [(cidade, contagens['cidades'].get(cidade, 0)) for cidade in cidades]
+    tipos_facetas = [(codigo, nome, contagens['tipos'].get(codigo, 0)) for codigo, nome in tipos]
+    quartos_facetas = list(contagens['quartos'].items())
     
     context = {
         'page_obj': page_obj,
-        'total_imoveis': paginator.count,
+        'total_imoveis': total_imoveis,
         'cidades': cidades,
         'infraestruturas': infraestruturas,
         'tipos': tipos,
         'finalidades': finalidades,
         'mobilias': mobilias,
-        'filtros_aplicados': filtros_aplicados,
+        'cidades_facetas': cidades_facetas,
+        'tipos_facetas': tipos_facetas,
+        'quartos_facetas': quartos_facetas,
+        'filtros_aplicados': filtros_template,
+        'tempo_cache': cache_paginas.tempo_cache(),
     }
     
-    return render(request, 'core/lista_imoveis.html', context)
+    response = render(request, 'core/lista_imoveis.html', context)
+    # Impressões dos cards da página (a pk do resumo é a do imóvel)
+    contadores.registrar_impressoes([resumo.pk for resumo in page_obj.object_list])
+    return response
 
 
+@replicas.leitura
+def imoveis_mapa(request):
+    """Imóveis de um raio (lat, lng, raio em km) ou de uma área do mapa (bbox), em JSON"""
+    filtros = ler_filtros(request.GET)
+    if filtros['geo'] is None:
+        return JsonResponse(
+            {'erro': 'Informe lat e lng (e opcionalmente raio, em km) ou bbox=sul,oeste,norte,leste.'},
+            status=400
+        )
+    
+    try:
+        limite = min(int(request.GET.get('limite', 200)), 500)
+    except ValueError:
+        limite = 200
+    
+    imoveis = aplicar_filtros(
+        Imovel.objects.filter(status=Imovel.StatusImovel.ATIVO), filtros
+    ).select_related('resumo').only(
+        'pk', 'latitude', 'longitude', 'resumo'
+    ).order_by('distancia_km', 'pk')[:limite + 1]
+    
+    resultados = []
+    for imovel in imoveis:
+        resumo = imovel.resumo
+        resultados.append({
+            'id': imovel.pk,
+            'titulo': resumo.titulo,
+            'tipo': resumo.tipo,
+            'bairro': resumo.bairro,
+            'cidade': resumo.cidade,
+            'latitude': float(imovel.latitude),
+            'longitude': float(imovel.longitude),
+            'distancia_km': round(imovel.distancia_km, 3),
+            'precos': {preco.finalidade: str(preco.valor) for preco in resumo.lista_precos},
+            'foto': resumo.foto_capa_url,
+            'url': reverse('core:detalhe_imovel', args=[imovel.pk]),
+        })
+    
+    return JsonResponse({
+        'centro': filtros['geo']['centro'],
+        'raio_km': filtros['geo']['raio_km'],
+        'truncado': len(resultados) > limite,
+        'imoveis': resultados[:limite],
+    })
+
+
+@contadores.conta_visualizacao
+@replicas.leitura
+@cache_paginas.pagina_publica('imovel', cache_paginas.por_detalhe)
 def detalhe_imovel(request, pk):
     """Página de detalhes do imóvel"""
-    imovel = get_object_or_404(
-        Imovel.objects.select_related('proprietario').prefetch_related(
-            'fotos', 'precos', 'infraestrutura'
-        ),
-        pk=pk,
-        status=Imovel.StatusImovel.ATIVO
+    if request.versao_pagina is None:
+        raise Http404('Imóvel não encontrado.')
+    
+    def montar():
+        imovel = get_object_or_404(
+            Imovel.objects.select_related('proprietario').prefetch_related(
+                'fotos', 'precos', 'infraestrutura'
+            ),
+            pk=pk,
+            status=Imovel.StatusImovel.ATIVO
+        )
+        
+        # Imóveis similares (vizinhos pré-calculados por core.similares)
+        imoveis_similares = list(similares.similares_de(imovel))
+        if not imoveis_similares:
+            # Ainda sem vizinhos calculados: mesmo tipo e cidade
+            imoveis_similares = ResumoImovel.objects.filter(
+                tipo=imovel.tipo,
+                cidade=imovel.cidade,
+                status=Imovel.StatusImovel.ATIVO
+            ).exclude(pk=imovel.pk).order_by('-criado_em')[:4]
+        
+        # Montar mensagem para WhatsApp
+        whatsapp_msg = f"Olá! Tenho interesse no imóvel: {imovel.titulo} - {imovel.endereco}, {imovel.bairro}, {imovel.cidade}"
+        
+        context = {
+            'imovel': imovel,
+            'imoveis_similares': imoveis_similares,
+            'whatsapp_msg': whatsapp_msg,
+            # Sem a querystring, que não entra na chave do cache
+            'url_pagina': request.build_absolute_uri(request.path),
+        }
+        
+        return render(request, 'core/detalhe_imovel.html', context)
+    
+    # HTML inteiro em cache; a chave muda a cada alteração do imóvel ou do catálogo.
+    # Da querystring o template só lê ``contato`` (resultado do formulário sem JavaScript)
+    return cache_paginas.pagina_em_cache(
+        request, f'imovel:{pk}:{request.versao_pagina.timestamp()}', montar, parametros=['contato']
     )
-    
-    # Imóveis similares (mesmo tipo e cidade)
-    imoveis_similares = Imovel.objects.filter(
-        tipo=imovel.tipo,
-        cidade=imovel.cidade,
-        status=Imovel.StatusImovel.ATIVO
-    ).exclude(pk=imovel.pk).prefetch_related('fotos', 'precos')[:4]
-    
-    # Montar mensagem para WhatsApp
-    whatsapp_msg = f"Olá! Tenho interesse no imóvel: {imovel.titulo} - {imovel.endereco}, {imovel.bairro}, {imovel.cidade}"
-    
-    context = {
-        'imovel': imovel,
-        'imoveis_similares': imoveis_similares,
-        'whatsapp_msg': whatsapp_msg,
-    }
-    
-    return render(request, 'core/detalhe_imovel.html', context)
\ No newline at end of file
+
+
+@never_cache
+@ensure_csrf_cookie
+@require_GET
+def token_csrf(request):
+    """Token CSRF dos formulários das páginas em cache, cujo HTML é o mesmo para todos e não pode levá-lo"""
+    return JsonResponse({'token': get_token(request)})
+
+
+# Com a proteção CSRF do Django: static/js/detalhe.js pede o token a token_csrf antes de enviar
+@require_POST
+def registrar_interesse(request, pk):
+    """Formulário de interesse do detalhe do imóvel; responde JSON ao fetch e redireciona sem JavaScript"""
+    imovel = get_object_or_404(Imovel.objects.only('pk', 'titulo'), pk=pk, status=Imovel.StatusImovel.ATIVO)
+    quer_json = request.accepts('application/json') and not request.accepts('text/html')
+    
+    def responder(status, dados, situacao):
+        if quer_json:
+            return JsonResponse(dados, status=status)
+        return redirect(f"{reverse('core:detalhe_imovel', args=[imovel.pk])}?contato={situacao}#contato")
+    
+    form = InteresseForm(request.POST)
+    if not form.is_valid():
+        campos = {campo: list(erros) for campo, erros in form.errors.items()}
+        return responder(400, {'erro': 'Confira os campos do formulário.', 'campos': campos}, 'erro')
+    if form.cleaned_data['website']:
+        # Robô: responde como se tivesse recebido, sem gravar
+        return responder(202, {'recebido': True}, 'enviado')
+    
+    try:
+        lead = leads.fila.enviar(leads.Lead(imovel.pk, imovel.titulo, form.cleaned_data))
+    except leads.FilaCheia:
+        return responder(503, {'erro': 'Muitos contatos agora; tente de novo em instantes.'}, 'erro')
+    if not lead.aguardar(leads.tempo_espera()):
+        # Continua na fila e será gravado
+        return responder(202, {'recebido': True}, 'enviado')
+    if lead.erro is not None:
+        return responder(503, {'erro': 'Não foi possível registrar o contato; tente de novo.'}, 'erro')
+    return responder(201, {'recebido': True, 'cliente': lead.cliente_id}, 'enviado')
+
+
+@gzip_page
+@replicas.leitura
+@cache_paginas.pagina_publica('feed', cache_paginas.por_catalogo)
+def feed_imoveis(request, formato):
+    """Feed dos imóveis ativos para os portais; ``desde`` (ISO 8601) traz só os alterados"""
+    desde = None
+    if request.GET.get('desde'):
+        try:
+            desde = parse_datetime(request.GET['desde'])
+        except ValueError:
+            desde = None
+        if desde is None:
+            return JsonResponse({'erro': 'desde deve ser uma data ISO 8601, como 2024-01-31T12:00:00.'}, status=400)
+        if timezone.is_naive(desde):
+            desde = timezone.make_aware(desde)
+    
+    partes = exportacao.gerar_feed(formato, desde, url_base=request.build_absolute_uri('/')[:-1])
+    return StreamingHttpResponse(partes, content_type=exportacao.FORMATOS[formato])
@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+from core.sqlite import banco_sqlite
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-sua-chave-secreta-aqui-mude-em-producao'
@@ -9,6 +11,10 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# Origens aceitas pela verificação CSRF além do próprio host, como 'https://www.exemplo.com.br' quando o
+# proxy reverso repassa outro Host ao Django
+CSRF_TRUSTED_ORIGINS = []
+
 INSTALLED_APPS = [
     'jazzmin',
     'django.contrib.admin',
@@ -21,6 +27,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metricas.MetricasMiddleware',
+    'core.replicas.ReplicasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -34,7 +42,8 @@ ROOT_URLCONF = 'imobiliaria.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que mede o tempo de renderização das requisições (core/metricas.py)
+        'BACKEND': 'core.metricas.TemplatesMedidos',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -50,13 +59,15 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'imobiliaria.wsgi.application'
 
+# SQLite com o perfil de produção (core/sqlite.py): WAL, espera pela trava, transações IMMEDIATE,
+# mmap, cache de páginas e conexões persistentes
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': banco_sqlite(BASE_DIR / 'db.sqlite3'),
 }
 
+# Leituras do site público nas réplicas de REPLICAS_LEITURA, quando houver (core.replicas)
+DATABASE_ROUTERS = ['core.replicas.RoteadorReplicas']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -81,6 +92,18 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Fora do DEBUG os estáticos ganham o hash do conteúdo no nome e cópias .gz/.br no collectstatic,
+# e saem com cache imutável (core/estaticos.py); em DEBUG vêm direto de static/
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'core.estaticos.EstaticosComprimidos'
+        ),
+    },
+}
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -108,7 +131,7 @@ JAZZMIN_SETTINGS = {
     "topmenu_links": [
         {"name": "Dashboard", "url": "admin:index", "permissions": ["auth.view_user"]},
         {"name": "Ver Site", "url": "/", "new_window": True},
-        {"name": "Relatórios", "url": "admin:index", "permissions": ["auth.view_user"]},
+        {"name": "Relatórios", "url": "admin_relatorios", "permissions": ["auth.view_user"]},
     ],
     
     # Menu do Usuário
@@ -147,8 +170,9 @@ JAZZMIN_SETTINGS = {
     
     # Modais e Customizações
     "related_modal_active": False,
-    "custom_css": None,
-    "custom_js": None,
+    # CSS e JS corporativos do admin, em static/ (com hash e comprimidos como os do site)
+    "custom_css": "css/admin.css",
+    "custom_js": "js/admin.js",
     "use_google_fonts_cdn": True,
     "show_ui_builder": False,
     
@@ -268,164 +292,7 @@ JAZZMIN_UI_TWEAKS = {
         "warning": "btn-warning",
         "danger": "btn-danger",
         "success": "btn-success"
-    },
-    
-    # =====================================
-    # 🎨 CUSTOM CSS CORPORATIVO
-    # =====================================
-    "custom_css": """
-        /* Paleta de cores corporativa */
-        :root {
-            --ds-gold: #C8A866;
-            --ds-gold-light: #D4AF37;
-            --ds-dark: #0D0D0D;
-            --ds-blue: #1E3A5F;
-        }
-        
-        /* Header corporativo */
-        .main-header {
-            background-color: var(--ds-blue) !important;
-            border-bottom: 3px solid var(--ds-gold) !important;
-        }
-        
-        /* Brand corporativo */
-        .navbar-brand {
-            color: var(--ds-gold-light) !important;
-            font-weight: bold !important;
-        }
-        
-        /* Sidebar corporativo */
-        .main-sidebar {
-            background-color: var(--ds-dark) !important;
-        }
-        
-        /* Botões corporativos */
-        .btn-warning {
-            background-color: var(--ds-gold) !important;
-            border-color: var(--ds-gold) !important;
-            color: var(--ds-dark) !important;
-            font-weight: 600 !important;
-        }
-        
-        .btn-warning:hover {
-            background-color: var(--ds-gold-light) !important;
-            border-color: var(--ds-gold-light) !important;
-            color: var(--ds-dark) !important;
-            transform: translateY(-1px) !important;
-            box-shadow: 0 4px 8px rgba(200, 168, 102, 0.3) !important;
-        }
-        
-        /* Cards corporativos */
-        .card {
-            border: 1px solid rgba(200, 168, 102, 0.2) !important;
-            border-radius: 8px !important;
-        }
-        
-        .card-header {
-            background-color: #f8f9fa !important;
-            border-bottom: 2px solid var(--ds-gold) !important;
-            color: var(--ds-blue) !important;
-            font-weight: bold !important;
-        }
-        
-        /* Links corporativos */
-        a {
-            color: var(--ds-blue) !important;
-        }
-        
-        a:hover {
-            color: var(--ds-gold) !important;
-        }
-        
-        /* Tabelas corporativas */
-        .table th {
-            background-color: #f8f9fa !important;
-            color: var(--ds-blue) !important;
-            font-weight: 600 !important;
-            border-bottom: 2px solid var(--ds-gold) !important;
-        }
-        
-        /* Badges corporativos */
-        .badge-success {
-            background-color: #28a745 !important;
-        }
-        
-        .badge-warning {
-            background-color: var(--ds-gold) !important;
-            color: var(--ds-dark) !important;
-        }
-        
-        /* Formulários corporativos */
-        .form-control:focus {
-            border-color: var(--ds-gold) !important;
-            box-shadow: 0 0 0 0.2rem rgba(200, 168, 102, 0.25) !important;
-        }
-        
-        /* Menu sidebar corporativo */
-        .nav-sidebar .nav-link {
-            color: rgba(255, 255, 255, 0.9) !important;
-        }
-        
-        .nav-sidebar .nav-link:hover {
-            background-color: rgba(200, 168, 102, 0.2) !important;
-            color: var(--ds-gold-light) !important;
-        }
-        
-        .nav-sidebar .nav-link.active {
-            background-color: var(--ds-gold) !important;
-            color: var(--ds-dark) !important;
-            font-weight: bold !important;
-        }
-        
-        /* Footer corporativo */
-        .main-footer {
-            background-color: var(--ds-dark) !important;
-            color: var(--ds-gold) !important;
-            border-top: 2px solid var(--ds-gold) !important;
-        }
-        
-        /* Animations corporativas */
-        .btn, .card, .form-control {
-            transition: all 0.3s ease !important;
-        }
-        
-        /* Dashboard cards corporativo */
-        .info-box {
-            border-radius: 8px !important;
-            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1) !important;
-            border: 1px solid rgba(200, 168, 102, 0.2) !important;
-        }
-        
-        .info-box-icon {
-            background-color: var(--ds-gold) !important;
-            color: var(--ds-dark) !important;
-        }
-    """,
-    
-    # JavaScript corporativo
-    "custom_js": """
-        // Adicionar efeitos corporativos
-        document.addEventListener('DOMContentLoaded', function() {
-            // Adicionar ícone no título
-            const brandElement = document.querySelector('.navbar-brand');
-            if (brandElement && !brandElement.querySelector('.fas')) {
-                brandElement.innerHTML = '<i class="fas fa-home me-2"></i>' + brandElement.innerHTML;
-            }
-            
-            // Smooth animations para botões
-            document.querySelectorAll('.btn').forEach(btn => {
-                btn.addEventListener('mouseenter', function() {
-                    this.style.transform = 'translateY(-1px)';
-                });
-                btn.addEventListener('mouseleave', function() {
-                    this.style.transform = 'translateY(0)';
-                });
-            });
-            
-            // Console log corporativo
-            console.log('🏠 DS Imóveis Admin carregado com sucesso!');
-        });
-    """
+    }
 }
 
 # ===============================
@@ -435,11 +302,15 @@ JAZZMIN_UI_TWEAKS = {
 # Configurações de e-mail (para produção)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # Para desenvolvimento
 
-# Configurações de cache (para produção)
+# Cache compartilhado por todos os processos do servidor (workers web, admin, processar_tarefas,
+# comandos): a versão do catálogo dos ETags e as listas dos filtros são invalidadas por quem grava
+# e a invalidação precisa chegar aos outros processos. Com mais de um servidor, troque por um cache
+# de rede (django.core.cache.backends.redis.RedisCache).
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 
@@ -1,14 +1,21 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core import estaticos, metricas, relatorios
+
 urlpatterns = [
+    path('admin/relatorios/', admin.site.admin_view(relatorios.painel), name='admin_relatorios'),
     path('admin/', admin.site.urls),
+    path('metricas/', metricas.exportar, name='metricas'),
     path('', include('core.urls')),
 ]
 
 # Servir arquivos de mídia em desenvolvimento
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+else:
+    # Quando nenhum servidor web atende /static/ antes do Django: cópias comprimidas e cache imutável
+    urlpatterns += [re_path(r'^%s(?P<caminho>.*)$' % settings.STATIC_URL.lstrip('/'), estaticos.servir)]
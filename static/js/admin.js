@@ -0,0 +1,21 @@
+// Adicionar efeitos corporativos
+document.addEventListener('DOMContentLoaded', function() {
+    // Adicionar ícone no título
+    const brandElement = document.querySelector('.navbar-brand');
+    if (brandElement && !brandElement.querySelector('.fas')) {
+        brandElement.innerHTML = '<i class="fas fa-home me-2"></i>' + brandElement.innerHTML;
+    }
+
+    // Smooth animations para botões
+    document.querySelectorAll('.btn').forEach(btn => {
+        btn.addEventListener('mouseenter', function() {
+            this.style.transform = 'translateY(-1px)';
+        });
+        btn.addEventListener('mouseleave', function() {
+            this.style.transform = 'translateY(0)';
+        });
+    });
+
+    // Console log corporativo
+    console.log('🏠 DS Imóveis Admin carregado com sucesso!');
+});
@@ -0,0 +1,88 @@
+// Copiar link para clipboard
+function copiarLink() {
+    navigator.clipboard.writeText(window.location.href).then(function() {
+        // Toast
+        const toast = document.createElement('div');
+        toast.className = 'position-fixed top-0 start-50 translate-middle-x mt-3';
+        toast.style.zIndex = '9999';
+        toast.style.backgroundColor = 'var(--dourado-metalico)';
+        toast.style.color = 'var(--preto-profundo)';
+        toast.style.padding = '12px 24px';
+        toast.style.borderRadius = '25px';
+        toast.style.fontWeight = 'bold';
+        toast.style.boxShadow = '0 8px 24px rgba(200, 168, 102, 0.4)';
+        toast.innerHTML = '<i class="fas fa-check me-2"></i>Link copiado com sucesso!';
+        document.body.appendChild(toast);
+
+        // Animação de entrada
+        toast.style.transform = 'translateX(-50%) translateY(-100px)';
+        toast.style.opacity = '0';
+        setTimeout(() => {
+            toast.style.transition = 'all 0.3s ease';
+            toast.style.transform = 'translateX(-50%) translateY(0)';
+            toast.style.opacity = '1';
+        }, 10);
+
+        setTimeout(() => {
+            toast.style.transform = 'translateX(-50%) translateY(-100px)';
+            toast.style.opacity = '0';
+            setTimeout(() => toast.remove(), 300);
+        }, 3000);
+    }).catch(function() {
+        alert('Erro ao copiar o link. Tente novamente.');
+    });
+}
+
+// Token CSRF do formulário: a página vem do cache, igual para todos, então ele é pedido à parte
+function tokenCsrf(formulario) {
+    return fetch(formulario.dataset.csrf, {headers: {'Accept': 'application/json'}, cache: 'no-store'})
+        .then(resposta => resposta.json())
+        .then(dados => dados.token);
+}
+
+// Formulário de interesse enviado sem recarregar a página
+document.getElementById('contato').addEventListener('submit', function(evento) {
+    evento.preventDefault();
+    const formulario = this;
+    const botao = formulario.querySelector('button[type="submit"]');
+    const resultado = document.getElementById('contato-resultado');
+    const mostrar = (classe, texto) => {
+        resultado.innerHTML = '';
+        const aviso = document.createElement('div');
+        aviso.className = 'alert py-2 ' + classe;
+        aviso.textContent = texto;
+        resultado.appendChild(aviso);
+    };
+    botao.disabled = true;
+    tokenCsrf(formulario).then(function(token) {
+        return fetch(formulario.action, {
+            method: 'POST',
+            body: new FormData(formulario),
+            headers: {'Accept': 'application/json', 'X-CSRFToken': token},
+        });
+    }).then(function(resposta) {
+        return resposta.json().then(function(dados) {
+            if (resposta.ok) {
+                formulario.reset();
+                mostrar('alert-success', 'Recebemos seu contato! Retornaremos em breve.');
+            } else {
+                const campos = Object.values(dados.campos || {}).flat().join(' ');
+                mostrar('alert-danger', [dados.erro || 'Não foi possível enviar. Tente de novo.', campos].join(' ').trim());
+            }
+        });
+    }).catch(function() {
+        mostrar('alert-danger', 'Não foi possível enviar. Tente de novo.');
+    }).finally(function() {
+        botao.disabled = false;
+    });
+});
+
+// Smooth scroll para características ao clicar
+document.querySelectorAll('.characteristic-item').forEach(item => {
+    item.addEventListener('click', function() {
+        this.style.transform = 'translateY(-8px) scale(1.02)';
+        setTimeout(() => {
+            this.style.transform = '';
+        }, 200);
+    });
+});
@@ -0,0 +1,28 @@
+// Adicionar efeitos no carregamento
+document.addEventListener('DOMContentLoaded', function() {
+    // Animação de entrada suave
+    document.body.style.opacity = '0';
+    document.body.style.transition = 'opacity 0.5s ease-in-out';
+
+    setTimeout(() => {
+        document.body.style.opacity = '1';
+    }, 100);
+
+    // Console log
+    console.log('%cDS Imóveis carregada com sucesso! 🏠',
+               'color: #D4AF37; font-weight: bold; font-size: 16px;');
+});
+
+// Smooth scroll para links internos
+document.querySelectorAll('a[href^="#"]').forEach(anchor => {
+    anchor.addEventListener('click', function (e) {
+        e.preventDefault();
+        const target = document.querySelector(this.getAttribute('href'));
+        if (target) {
+            target.scrollIntoView({
+                behavior: 'smooth',
+                block: 'start'
+            });
+        }
+    });
+});